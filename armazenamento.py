@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento persistente do histórico e da memória da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+
+O histórico é gravado em um log binário somente de acréscimo
+(`historico.log`) acompanhado de um índice de registros de tamanho fixo
+(`historico.idx`) com a posição e o instante de cada cálculo; o número de
+sequência de um registro é a sua posição no índice. As leituras usam
+mapeamento em memória (mmap), então abrir um armazenamento com milhões de
+registros não carrega nada e a paginação lê só o necessário. A memória de
+variáveis é gravada como um instantâneo (`memoria.snap`), substituído de
+forma atômica, assim como as definições das funções do usuário
+(`funcoes.snap`). Vários processos podem compartilhar o mesmo diretório: as
+gravações são serializadas com trava de arquivo quando disponível.
+"""
+
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from decimal import Decimal
+from fractions import Fraction
+from time import time
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from registro import RegistroHistorico
+
+_MAGICO_LOG = b'CALCLOG1'
+_MAGICO_INDICE = b'CALCIDX1'
+_MAGICO_MEMORIA = b'CALCMEM1'
+_MAGICO_FUNCOES = b'CALCFUN1'
+_CABECALHO = 16
+
+_ENTRADA_INDICE = struct.Struct('<Qd')    # posição no log, instante
+_REGISTRO = struct.Struct('<dI')          # instante, tamanho da expressão
+_TAMANHO = struct.Struct('<I')
+_FLOAT = struct.Struct('<d')
+_COMPLEXO = struct.Struct('<dd')
+_INT = struct.Struct('<q')
+
+
+def codificar_valor(valor: Any) -> bytes:
+    """Codifica um resultado ou variável em bytes com um marcador de tipo."""
+    tipo = type(valor)
+    if tipo is float:
+        return b'f' + _FLOAT.pack(valor)
+    if tipo is complex:
+        return b'c' + _COMPLEXO.pack(valor.real, valor.imag)
+    if tipo is int:
+        if -(1 << 63) <= valor < (1 << 63):
+            return b'i' + _INT.pack(valor)
+        marcador, texto = b'I', str(valor)
+    elif isinstance(valor, Decimal):
+        marcador, texto = b'D', str(valor)
+    elif isinstance(valor, Fraction):
+        marcador, texto = b'F', str(valor)
+    else:
+        marcador, texto = b's', str(valor)
+    dados = texto.encode('utf-8')
+    return marcador + _TAMANHO.pack(len(dados)) + dados
+
+
+def decodificar_valor(buffer: Any, posicao: int) -> Tuple[Any, int]:
+    """Decodifica um valor em `posicao`; retorna (valor, próxima posição)."""
+    marcador = buffer[posicao:posicao + 1]
+    posicao += 1
+    if marcador == b'f':
+        return _FLOAT.unpack_from(buffer, posicao)[0], posicao + 8
+    if marcador == b'i':
+        return _INT.unpack_from(buffer, posicao)[0], posicao + 8
+    if marcador == b'c':
+        return complex(*_COMPLEXO.unpack_from(buffer, posicao)), posicao + 16
+    tamanho = _TAMANHO.unpack_from(buffer, posicao)[0]
+    posicao += 4
+    texto = bytes(buffer[posicao:posicao + tamanho]).decode('utf-8')
+    posicao += tamanho
+    if marcador == b'I':
+        return int(texto), posicao
+    if marcador == b'D':
+        return Decimal(texto), posicao
+    if marcador == b'F':
+        return Fraction(texto), posicao
+    return texto, posicao
+
+
+def codificar_registro(expressao: str, resultado: Any, instante: float) -> bytes:
+    """Codifica um registro do histórico no formato do log."""
+    dados = expressao.encode('utf-8')
+    return _REGISTRO.pack(instante, len(dados)) + dados + codificar_valor(resultado)
+
+
+def decodificar_registro(buffer: Any, posicao: int) -> Tuple[RegistroHistorico, int]:
+    """Decodifica um registro do log; retorna (registro, próxima posição)."""
+    instante, tamanho = _REGISTRO.unpack_from(buffer, posicao)
+    posicao += _REGISTRO.size
+    expressao = bytes(buffer[posicao:posicao + tamanho]).decode('utf-8')
+    resultado, posicao = decodificar_valor(buffer, posicao + tamanho)
+    return RegistroHistorico(expressao, resultado, instante), posicao
+
+
+class _Trava:
+    """Trava exclusiva de arquivo entre processos (sem efeito sem fcntl)."""
+
+    def __init__(self, descritor: int):
+        self.descritor = descritor
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.descritor, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.descritor, fcntl.LOCK_UN)
+
+
+class _Instantes:
+    """Visão somente leitura dos instantes do índice, para busca binária."""
+
+    def __init__(self, armazenamento: 'ArmazenamentoPersistente'):
+        self.armazenamento = armazenamento
+
+    def __len__(self) -> int:
+        return len(self.armazenamento)
+
+    def __getitem__(self, sequencia: int) -> float:
+        return self.armazenamento._entrada(sequencia)[1]
+
+
+class ArmazenamentoPersistente:
+    """Histórico em log binário com índice e instantâneo da memória."""
+
+    def __init__(self, diretorio: str):
+        """Abre (ou cria) o armazenamento no diretório indicado."""
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+        bandeiras = os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0)
+        self._log = os.open(os.path.join(diretorio, 'historico.log'), bandeiras, 0o644)
+        self._indice = os.open(os.path.join(diretorio, 'historico.idx'), bandeiras, 0o644)
+        self._mapa_log: Optional[mmap.mmap] = None
+        self._mapa_indice: Optional[mmap.mmap] = None
+        self._total = 0
+
+        with _Trava(self._indice):
+            self._preparar(self._log, _MAGICO_LOG)
+            self._preparar(self._indice, _MAGICO_INDICE)
+        self._atualizar()
+
+    @staticmethod
+    def _preparar(descritor: int, magico: bytes):
+        """Grava o cabeçalho em arquivos novos e valida os existentes."""
+        if os.fstat(descritor).st_size == 0:
+            os.write(descritor, magico.ljust(_CABECALHO, b'\0'))
+            return
+        os.lseek(descritor, 0, os.SEEK_SET)
+        if os.read(descritor, len(magico)) != magico:
+            raise ValueError("arquivo de armazenamento com formato desconhecido")
+
+    def _atualizar(self):
+        """Remapeia os arquivos se outro processo acrescentou registros."""
+        tamanho = os.fstat(self._indice).st_size
+        total = (tamanho - _CABECALHO) // _ENTRADA_INDICE.size
+        if total == self._total and (self._mapa_indice is not None or not total):
+            return
+        # Os mapas antigos não são fechados: iteradores em andamento ainda os usam
+        self._total = total
+        if total:
+            self._mapa_indice = mmap.mmap(self._indice, 0, access=mmap.ACCESS_READ)
+            self._mapa_log = mmap.mmap(self._log, 0, access=mmap.ACCESS_READ)
+
+    def _fechar_mapas(self):
+        for mapa in (self._mapa_indice, self._mapa_log):
+            if mapa is not None:
+                mapa.close()
+        self._mapa_indice = self._mapa_log = None
+
+    def __len__(self) -> int:
+        self._atualizar()
+        return self._total
+
+    def _entrada(self, sequencia: int) -> Tuple[int, float]:
+        return _ENTRADA_INDICE.unpack_from(
+            self._mapa_indice, _CABECALHO + sequencia * _ENTRADA_INDICE.size)
+
+    def adicionar(self, expressao: str, resultado: Any, instante: Optional[float] = None) -> int:
+        """Acrescenta um cálculo ao log e retorna seu número de sequência."""
+        with _Trava(self._indice):
+            if instante is None:
+                instante = time()
+            posicao = os.fstat(self._log).st_size
+            os.write(self._log, codificar_registro(expressao, resultado, instante))
+            # O índice é gravado depois do registro: toda entrada indexada está completa
+            os.write(self._indice, _ENTRADA_INDICE.pack(posicao, instante))
+            tamanho = os.fstat(self._indice).st_size
+        return (tamanho - _CABECALHO) // _ENTRADA_INDICE.size - 1
+
+    def adicionar_varios(self, registros: Iterable[Tuple[str, Any, float]]):
+        """Acrescenta vários cálculos (expressao, resultado, instante) de uma vez.
+
+        Usa uma trava e duas gravações por chamada, em vez de por registro.
+        """
+        with _Trava(self._indice):
+            posicao = os.fstat(self._log).st_size
+            log = []
+            indice = []
+            for expressao, resultado, instante in registros:
+                dados = codificar_registro(expressao, resultado, instante)
+                log.append(dados)
+                indice.append(_ENTRADA_INDICE.pack(posicao, instante))
+                posicao += len(dados)
+            if log:
+                os.write(self._log, b''.join(log))
+                os.write(self._indice, b''.join(indice))
+
+    def limpar(self):
+        """Apaga todos os cálculos do log e do índice; a memória e as funções ficam."""
+        with _Trava(self._indice):
+            # O índice é truncado antes do log: nenhuma entrada aponta para fora dele
+            os.ftruncate(self._indice, _CABECALHO)
+            os.ftruncate(self._log, _CABECALHO)
+        # Os mapas cobrem o trecho truncado: lê-los depois daqui seria inválido
+        self._fechar_mapas()
+        self._total = 0
+
+    def __getitem__(self, sequencia: int) -> RegistroHistorico:
+        total = len(self)
+        if sequencia < 0:
+            sequencia += total
+        if not 0 <= sequencia < total:
+            raise IndexError("sequência fora do histórico")
+        return decodificar_registro(self._mapa_log, self._entrada(sequencia)[0])[0]
+
+    def registros(self, inicio: int = 0, fim: Optional[int] = None) -> Iterator[RegistroHistorico]:
+        """Gera os registros com sequência em [inicio, fim), sob demanda."""
+        total = len(self)
+        inicio, fim, _ = slice(inicio, fim).indices(total)
+        mapa_log = self._mapa_log
+        for sequencia in range(inicio, fim):
+            yield decodificar_registro(mapa_log, self._entrada(sequencia)[0])[0]
+
+    def trechos(self, inicio: int = 0, fim: Optional[int] = None,
+                bloco: int = 4096) -> Iterator[Tuple[int, bytes]]:
+        """Gera (quantidade, bytes) dos registros em [inicio, fim), sem decodificá-los.
+
+        Os registros de sequências consecutivas são contíguos no log, então
+        cada trecho de até `bloco` registros é uma única fatia do mapa.
+        """
+        total = len(self)
+        inicio, fim, _ = slice(inicio, fim).indices(total)
+        mapa_log = self._mapa_log
+        for comeco in range(inicio, fim, bloco):
+            ultimo = min(comeco + bloco, fim) - 1
+            final = decodificar_registro(mapa_log, self._entrada(ultimo)[0])[1]
+            yield ultimo - comeco + 1, mapa_log[self._entrada(comeco)[0]:final]
+
+    def buscar_instante(self, instante: float) -> int:
+        """Retorna a primeira sequência gravada em `instante` ou depois dele."""
+        self._atualizar()
+        return bisect_left(_Instantes(self), instante)
+
+    def intervalo(self, inicio: Optional[float] = None,
+                  fim: Optional[float] = None) -> Iterator[RegistroHistorico]:
+        """Gera os registros com instante em [inicio, fim)."""
+        primeiro = 0 if inicio is None else self.buscar_instante(inicio)
+        ultimo = None if fim is None else self.buscar_instante(fim)
+        return self.registros(primeiro, ultimo)
+
+    def _salvar_instantaneo(self, arquivo: str, magico: bytes, valores: Dict[str, Any]):
+        """Grava nomes e valores em `arquivo` de forma atômica."""
+        partes = [magico]
+        for nome, valor in valores.items():
+            dados = nome.encode('utf-8')
+            partes.append(_TAMANHO.pack(len(dados)) + dados + codificar_valor(valor))
+        destino = os.path.join(self.diretorio, arquivo)
+        temporario = f"{destino}.{os.getpid()}.tmp"
+        with open(temporario, 'wb') as saida:
+            saida.write(b''.join(partes))
+        os.replace(temporario, destino)
+
+    def _carregar_instantaneo(self, arquivo: str, magico: bytes) -> Dict[str, Any]:
+        """Lê um instantâneo gravado por `_salvar_instantaneo` (vazio se não houver)."""
+        try:
+            entrada = open(os.path.join(self.diretorio, arquivo), 'rb')
+        except FileNotFoundError:
+            return {}
+        valores = {}
+        with entrada:
+            if os.fstat(entrada.fileno()).st_size <= len(magico):
+                return valores
+            with mmap.mmap(entrada.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                if mapa[:len(magico)] != magico:
+                    raise ValueError(f"{arquivo} com formato desconhecido")
+                posicao = len(magico)
+                while posicao < len(mapa):
+                    tamanho = _TAMANHO.unpack_from(mapa, posicao)[0]
+                    posicao += 4
+                    nome = mapa[posicao:posicao + tamanho].decode('utf-8')
+                    valores[nome], posicao = decodificar_valor(mapa, posicao + tamanho)
+        return valores
+
+    def salvar_memoria(self, memoria: Dict[str, Any]):
+        """Grava o instantâneo da memória de forma atômica."""
+        self._salvar_instantaneo('memoria.snap', _MAGICO_MEMORIA, memoria)
+
+    def carregar_memoria(self) -> Dict[str, Any]:
+        """Lê o último instantâneo da memória (vazio se não houver)."""
+        return self._carregar_instantaneo('memoria.snap', _MAGICO_MEMORIA)
+
+    def salvar_funcoes(self, definicoes: Dict[str, str]):
+        """Grava as definições das funções do usuário (nome -> `f(x) = corpo`)."""
+        self._salvar_instantaneo('funcoes.snap', _MAGICO_FUNCOES, definicoes)
+
+    def carregar_funcoes(self) -> Dict[str, str]:
+        """Lê as definições das funções do usuário (vazio se não houver)."""
+        return self._carregar_instantaneo('funcoes.snap', _MAGICO_FUNCOES)
+
+    def fechar(self):
+        """Libera os mapeamentos e os descritores de arquivo."""
+        self._fechar_mapas()
+        for descritor in (self._log, self._indice):
+            os.close(descritor)
+        self._log = self._indice = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks do caminho de avaliação da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+
+Mede vazão (operações por segundo), latência p50/p99 e alocações por
+chamada dos caminhos quentes, usando as cargas de `examples.py`. A latência
+é medida em lotes de chamadas (o relógio não tem resolução para uma
+chamada de microssegundos) com o coletor de lixo desligado, como no
+`timeit`; a vazão vem do lote mediano, para que lotes interrompidos pelo
+sistema não distorçam a comparação. As alocações vêm do `tracemalloc`: `bytes_por_chamada` é o pico
+de memória alocada durante uma chamada e `blocos_retidos_por_chamada` é o
+que fica alocado depois dela (deve ser ~0 fora do histórico).
+
+A inicialização a frio (`--inicializacao`) é medida em subprocessos com
+`-X importtime`: o tempo de importação de `calculadora` deve caber no
+orçamento, e os módulos de `MODULOS_ADIADOS` não podem ser carregados por
+`python -m calculadora -c EXPR`.
+
+A vazão com várias threads (`--threads`) usa uma `CalculadoraConcorrente`
+compartilhada; em um CPython sem GIL ela deve crescer com as threads.
+
+Uso:
+    python benchmark.py --saida resultado.json
+    python benchmark.py --base base.json      # compara e sinaliza regressões
+    python benchmark.py --inicializacao       # orçamento de inicialização
+    python benchmark.py --threads 1 2 4 8     # vazão compartilhada entre threads
+"""
+
+import gc
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import tracemalloc
+from time import perf_counter_ns, time
+from typing import Any, Callable, Dict, List, Optional
+
+import examples
+from calculadora import CalculadoraOtimizada
+
+VERSAO_FORMATO = 1
+
+# Módulos que `python -m calculadora -c EXPR` não deve importar
+MODULOS_ADIADOS = ('re', 'json', 'typing', 'argparse', 'datetime', 'csv', 'subprocess')
+ORCAMENTO_INICIALIZACAO_MS = 25.0
+
+
+def _ciclo(funcao: Callable, argumentos: List[tuple]) -> Callable[[], Any]:
+    """Retorna uma operação que chama `funcao` percorrendo `argumentos` em ciclo."""
+    proximos = itertools.cycle(argumentos).__next__
+
+    def operacao():
+        return funcao(*proximos())
+    return operacao
+
+
+def _expressoes(*cargas) -> List[tuple]:
+    return [(expressao,) for carga in cargas for expressao, _ in carga]
+
+
+def _calcular(cargas, variaveis=None) -> Callable[[], Any]:
+    calc = CalculadoraOtimizada()
+    if variaveis:
+        calc.memoria.update(variaveis)
+    return _ciclo(calc.calcular, _expressoes(*cargas))
+
+
+def _expressoes_longas(termos: int = 16) -> List[tuple]:
+    """Junta as expressões dos exemplos em somas longas, todas diferentes."""
+    base = [expressao for expressao, _ in
+            examples.OPERACOES_BASICAS + examples.FUNCOES_MATEMATICAS
+            + examples.EXPRESSOES_COMPLEXAS]
+    return [(" + ".join(f"({base[(inicio + i) % len(base)]})" for i in range(termos)),)
+            for inicio in range(len(base))]
+
+
+def _calcular_longas() -> Callable[[], Any]:
+    return _ciclo(CalculadoraOtimizada().calcular, _expressoes_longas())
+
+
+def _calcular_sem_cache() -> Callable[[], Any]:
+    calc = CalculadoraOtimizada(tamanho_cache=0)
+    return _ciclo(calc.calcular, _expressoes(examples.OPERACOES_BASICAS,
+                                             examples.FUNCOES_MATEMATICAS))
+
+
+def _avaliar_variaveis() -> Callable[[], Any]:
+    calc = CalculadoraOtimizada()
+    return _ciclo(calc.avaliar, [(expressao, examples.VARIAVEIS) for expressao, _
+                                 in examples.EXPRESSOES_COM_VARIAVEIS])
+
+
+def _modelo_variaveis() -> Callable[[], Any]:
+    """Mesma carga de `_avaliar_variaveis`, com as expressões compiladas uma vez."""
+    calc = CalculadoraOtimizada()
+    modelos = [calc.compilar(expressao) for expressao, _ in examples.EXPRESSOES_COM_VARIAVEIS]
+    chamadas = itertools.cycle([(modelo, tuple(examples.VARIAVEIS[nome] for nome in modelo.variaveis))
+                                for modelo in modelos]).__next__
+
+    def operacao():
+        modelo, argumentos = chamadas()
+        return modelo(*argumentos)
+    return operacao
+
+
+def _validar() -> Callable[[], Any]:
+    calc = CalculadoraOtimizada()
+    return _ciclo(calc.validar_expressao, _expressoes(
+        examples.OPERACOES_BASICAS, examples.FUNCOES_MATEMATICAS,
+        examples.EXPRESSOES_COMPLEXAS, examples.EXPRESSOES_COM_ERRO))
+
+
+def _preparar() -> Callable[[], Any]:
+    calc = CalculadoraOtimizada()
+    calc.memoria.update(examples.VARIAVEIS)
+    return _ciclo(calc.preparar_expressao, _expressoes(
+        examples.OPERACOES_BASICAS, examples.FUNCOES_MATEMATICAS,
+        examples.EXPRESSOES_COMPLEXAS))
+
+
+def _historico_cheio() -> Callable[[], Any]:
+    calc = CalculadoraOtimizada()
+    for i in range(calc.historico.capacidade):
+        calc.adicionar_ao_historico(f"{i} + 0", i)
+    return _ciclo(calc.adicionar_ao_historico,
+                  [(expressao, i) for i, expressao in enumerate(examples.CALCULOS_HISTORICO)])
+
+
+def _converter() -> Callable[[], Any]:
+    return _ciclo(CalculadoraOtimizada().converter_unidades, examples.CONVERSOES)
+
+
+def _converter_lote() -> Callable[[], Any]:
+    valores = [float(i) for i in range(1000)]
+    return _ciclo(CalculadoraOtimizada().converter_lote,
+                  [(valores, de_unidade, para_unidade)
+                   for _, de_unidade, para_unidade in examples.CONVERSOES])
+
+
+def _subexpressoes(memoizar: bool = False, numerico: str = 'float') -> Callable[[], Any]:
+    """Expressões que repetem termos caros com as mesmas entradas."""
+    calc = CalculadoraOtimizada(numerico=numerico, precisao=50 if numerico != 'float' else None)
+    calc.memoria.update({'a': 3, 'b': 4, 'k': 0.5, 't': 2})
+    if memoizar:
+        calc.ativar_memoizacao()
+    return _ciclo(calc.calcular, [(f"exp(k*t) * {i} + sqrt(a**2 + b**2) / (1 + sqrt(a**2 + b**2))",)
+                                  for i in range(20)])
+
+
+def _tabular() -> Callable[[], Any]:
+    calc = CalculadoraOtimizada()
+    return lambda: sum(1 for _ in calc.tabular("sin(x) / x", 'x', -10, 10, 0.02))
+
+
+def _avaliar_conjunto() -> Callable[[], Any]:
+    """CSV de 2000 linhas em um diretório temporário removido na saída."""
+    import atexit
+    import shutil
+    import tempfile
+    diretorio = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, diretorio, True)
+    entrada = os.path.join(diretorio, 'dados.csv')
+    with open(entrada, 'w', encoding='utf-8') as arquivo:
+        arquivo.write("preco,taxa\n")
+        arquivo.writelines(f"{i % 97 + 0.5},{i % 13 / 100}\n" for i in range(2000))
+    saida = os.path.join(diretorio, 'saida.csv')
+    calc = CalculadoraOtimizada()
+    return lambda: calc.avaliar_conjunto("preco * (1 + taxa)", entrada, saida)
+
+
+# nome -> (descrição, fábrica da operação)
+CASOS: Dict[str, tuple] = {
+    'calcular_simples': ("calcular: aritmética básica",
+                         lambda: _calcular([examples.OPERACOES_BASICAS])),
+    'calcular_funcoes': ("calcular: funções e constantes",
+                         lambda: _calcular([examples.FUNCOES_MATEMATICAS, examples.CONSTANTES])),
+    'calcular_variaveis': ("calcular: expressões com variáveis",
+                           lambda: _calcular([examples.EXPRESSOES_COM_VARIAVEIS],
+                                             examples.VARIAVEIS)),
+    'calcular_complexas': ("calcular: expressões compostas",
+                           lambda: _calcular([examples.EXPRESSOES_COMPLEXAS])),
+    'calcular_longas': ("calcular: somas de 16 termos", _calcular_longas),
+    'calcular_erros': ("calcular: expressões com erro",
+                       lambda: _calcular([examples.EXPRESSOES_COM_ERRO])),
+    'calcular_sem_cache': ("calcular: análise e compilação a cada chamada",
+                           _calcular_sem_cache),
+    'avaliar_variaveis': ("avaliar com variáveis passadas por chamada", _avaliar_variaveis),
+    'modelo_variaveis': ("compilar: função reutilizável com argumentos", _modelo_variaveis),
+    'validar_expressao': ("validar_expressao", _validar),
+    'preparar_expressao': ("preparar_expressao", _preparar),
+    'historico_cheio': ("adicionar_ao_historico com o histórico no limite", _historico_cheio),
+    'converter_unidades': ("converter_unidades", _converter),
+    'converter_lote': ("converter_lote com 1000 valores", _converter_lote),
+    'tabular': ("tabular: 1001 pontos de sin(x)/x", _tabular),
+    'avaliar_conjunto': ("avaliar_conjunto: CSV com 2000 linhas", _avaliar_conjunto),
+    'subexpressoes': ("calcular: termos repetidos (calculados uma vez)", _subexpressoes),
+    'subexpressoes_decimal': ("calcular: termos repetidos, decimal com 50 dígitos",
+                              lambda: _subexpressoes(numerico='decimal')),
+    'memoizacao_decimal': ("calcular: termos repetidos, decimal com memoização",
+                           lambda: _subexpressoes(True, 'decimal')),
+}
+
+
+def _percentil(ordenados: List[float], percentual: float) -> float:
+    """Percentil por interpolação linear de uma lista já ordenada."""
+    posicao = (len(ordenados) - 1) * percentual / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def medir_tempo(operacao: Callable[[], Any], amostras: int = 200,
+                lote: int = 100) -> Dict[str, float]:
+    """Mede vazão e latência de `operacao` em `amostras` lotes de `lote` chamadas."""
+    for _ in range(lote):
+        operacao()
+    tempos = []
+    repeticoes = range(lote)
+    gc_ativo = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(amostras):
+            inicio = perf_counter_ns()
+            for _ in repeticoes:
+                operacao()
+            tempos.append((perf_counter_ns() - inicio) / lote)
+    finally:
+        if gc_ativo:
+            gc.enable()
+    tempos.sort()
+    mediana = _percentil(tempos, 50)
+    return {
+        'ops_por_segundo': 1e9 / mediana,
+        'p50_us': mediana / 1000,
+        'p99_us': _percentil(tempos, 99) / 1000,
+        'chamadas': amostras * lote,
+    }
+
+
+def medir_alocacoes(operacao: Callable[[], Any], chamadas: int = 200) -> Dict[str, float]:
+    """Mede com `tracemalloc` o pico alocado e os blocos retidos por chamada."""
+    for _ in range(10):
+        operacao()
+    reiniciar_pico = getattr(tracemalloc, 'reset_peak', None)
+    picos = 0
+    tracemalloc.start()
+    try:
+        blocos_inicio = sys.getallocatedblocks()
+        for _ in range(chamadas):
+            if reiniciar_pico is not None:
+                reiniciar_pico()
+            atual = tracemalloc.get_traced_memory()[0]
+            operacao()
+            picos += tracemalloc.get_traced_memory()[1] - atual
+        blocos_fim = sys.getallocatedblocks()
+    finally:
+        tracemalloc.stop()
+    return {
+        'bytes_por_chamada': picos / chamadas,
+        'blocos_retidos_por_chamada': max(0, blocos_fim - blocos_inicio) / chamadas,
+    }
+
+
+def executar(casos: Optional[List[str]] = None, amostras: int = 200,
+             lote: int = 100) -> Dict[str, Any]:
+    """Executa os casos pedidos (todos, por padrão) e retorna o relatório."""
+    resultados = {}
+    for nome in casos or CASOS:
+        _, fabrica = CASOS[nome]
+        medida = medir_tempo(fabrica(), amostras, lote)
+        medida.update(medir_alocacoes(fabrica()))
+        resultados[nome] = medida
+    return {
+        'versao': VERSAO_FORMATO,
+        'instante': time(),
+        'python': platform.python_version(),
+        'implementacao': platform.python_implementation(),
+        'plataforma': platform.platform(),
+        'casos': resultados,
+    }
+
+
+def comparar(atual: Dict[str, Any], base: Dict[str, Any],
+             tolerancia: float = 0.15) -> List[str]:
+    """Lista as regressões de `atual` em relação a `base`.
+
+    Regressão é vazão menor ou alocação maior que a base além da
+    `tolerancia` relativa; casos ausentes em um dos relatórios são ignorados.
+    """
+    regressoes = []
+    for nome, medida in atual['casos'].items():
+        anterior = base.get('casos', {}).get(nome)
+        if anterior is None:
+            continue
+        if medida['ops_por_segundo'] < anterior['ops_por_segundo'] * (1 - tolerancia):
+            variacao = medida['ops_por_segundo'] / anterior['ops_por_segundo'] - 1
+            regressoes.append(f"{nome}: ops/s {anterior['ops_por_segundo']:,.0f} → "
+                              f"{medida['ops_por_segundo']:,.0f} ({variacao:+.1%})")
+        # Margem absoluta de 64 bytes para o ruído do alocador
+        if medida['bytes_por_chamada'] > anterior['bytes_por_chamada'] * (1 + tolerancia) + 64:
+            regressoes.append(f"{nome}: bytes/chamada {anterior['bytes_por_chamada']:,.0f} → "
+                              f"{medida['bytes_por_chamada']:,.0f}")
+    return regressoes
+
+
+def formatar_relatorio(relatorio: Dict[str, Any], base: Optional[Dict[str, Any]] = None) -> str:
+    """Formata o relatório como tabela de texto (com a variação sobre a base)."""
+    linhas = [f"{'caso':<22} {'ops/s':>12} {'p50 µs':>9} {'p99 µs':>9} "
+              f"{'bytes':>8} {'retidos':>8}" + (f" {'Δ ops/s':>9}" if base else "")]
+    for nome, medida in relatorio['casos'].items():
+        linha = (f"{nome:<22} {medida['ops_por_segundo']:>12,.0f} {medida['p50_us']:>9.2f} "
+                 f"{medida['p99_us']:>9.2f} {medida['bytes_por_chamada']:>8,.0f} "
+                 f"{medida['blocos_retidos_por_chamada']:>8.2f}")
+        anterior = base.get('casos', {}).get(nome) if base else None
+        if anterior is not None:
+            linha += f" {medida['ops_por_segundo'] / anterior['ops_por_segundo'] - 1:>+9.1%}"
+        linhas.append(linha)
+    return "\n".join(linhas)
+
+
+def _tempos_importacao(argumentos: List[str]) -> Dict[str, float]:
+    """Executa o Python com `-X importtime` e retorna o tempo acumulado por módulo (ms)."""
+    diretorio = os.path.dirname(os.path.abspath(__file__))
+    # Mede com o bytecode em cache, como em uma instalação
+    ambiente = dict(os.environ)
+    ambiente.pop('PYTHONDONTWRITEBYTECODE', None)
+    processo = subprocess.run([sys.executable, '-X', 'importtime'] + argumentos,
+                              cwd=diretorio, env=ambiente, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    tempos = {}
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, modulo = linha.split('|')
+        tempos[modulo.strip()] = int(acumulado) / 1000
+    return tempos
+
+
+def medir_inicializacao(expressao: str = "2 + 3", amostras: int = 11) -> Dict[str, Any]:
+    """Mede a inicialização a frio do modo `-c` em subprocessos.
+
+    Retorna a mediana do tempo de importação de `calculadora` e do tempo
+    total do processo (ms) e os módulos de `MODULOS_ADIADOS` carregados
+    por `python -m calculadora -c EXPR`.
+    """
+    comando = f"import calculadora; calculadora.main(['-c', {expressao!r}])"
+    importacao, total = [], []
+    _tempos_importacao(['-c', comando])
+    for _ in range(amostras):
+        inicio = perf_counter_ns()
+        importacao.append(_tempos_importacao(['-c', comando])['calculadora'])
+        total.append((perf_counter_ns() - inicio) / 1e6)
+    carregados = _tempos_importacao(['-m', 'calculadora', '-c', expressao])
+    return {
+        'importacao_ms': sorted(importacao)[amostras // 2],
+        'processo_ms': sorted(total)[amostras // 2],
+        'modulos_adiados': [nome for nome in MODULOS_ADIADOS if nome in carregados],
+    }
+
+
+def medir_threads(contagens: List[int] = (1, 2, 4, 8),
+                  chamadas: int = 20000) -> Dict[int, float]:
+    """Vazão (ops/s) de uma `CalculadoraConcorrente` usada por N threads.
+
+    Cada thread faz `chamadas` cálculos das cargas de `examples.py`, com
+    o cache já aquecido; retorna a vazão total para cada N.
+    """
+    from concorrente import CalculadoraConcorrente
+    expressoes = [expressao for expressao, in _expressoes(
+        examples.OPERACOES_BASICAS, examples.FUNCOES_MATEMATICAS,
+        examples.EXPRESSOES_COM_VARIAVEIS, examples.EXPRESSOES_COMPLEXAS)]
+    vazao = {}
+    for quantidade in contagens:
+        calc = CalculadoraConcorrente()
+        calc.memoria.update(examples.VARIAVEIS)
+        for expressao in expressoes:
+            calc.calcular(expressao)
+        barreira = threading.Barrier(quantidade + 1)
+
+        def trabalhar():
+            calcular = calc.calcular
+            barreira.wait()
+            for expressao in itertools.islice(itertools.cycle(expressoes), chamadas):
+                calcular(expressao)
+
+        threads = [threading.Thread(target=trabalhar) for _ in range(quantidade)]
+        for thread in threads:
+            thread.start()
+        barreira.wait()
+        inicio = perf_counter_ns()
+        for thread in threads:
+            thread.join()
+        vazao[quantidade] = quantidade * chamadas * 1e9 / (perf_counter_ns() - inicio)
+    return vazao
+
+
+def _argumentos(argv: Optional[List[str]]) -> Any:
+    import argparse
+    parser = argparse.ArgumentParser(prog='benchmark',
+                                     description="Benchmarks da Calculadora Otimizada")
+    parser.add_argument('--saida', metavar='ARQUIVO', help="grava o resultado em JSON")
+    parser.add_argument('--base', metavar='ARQUIVO',
+                        help="JSON de uma execução anterior para comparar")
+    parser.add_argument('--tolerancia', type=float, default=0.15,
+                        help="variação relativa tolerada antes de sinalizar (padrão: 0.15)")
+    parser.add_argument('--casos', nargs='+', choices=list(CASOS), metavar='CASO',
+                        help="executa só estes casos")
+    parser.add_argument('--amostras', type=int, default=200, help="lotes medidos por caso")
+    parser.add_argument('--lote', type=int, default=100, help="chamadas por lote")
+    parser.add_argument('--inicializacao', action='store_true',
+                        help="mede só a inicialização a frio e a compara com o orçamento")
+    parser.add_argument('--orcamento-ms', type=float, default=ORCAMENTO_INICIALIZACAO_MS,
+                        help="tempo máximo de importação de calculadora "
+                             f"(padrão: {ORCAMENTO_INICIALIZACAO_MS:g} ms)")
+    parser.add_argument('--threads', type=int, nargs='+', metavar='N',
+                        help="mede só a vazão da calculadora concorrente com N threads")
+    return parser.parse_args(argv)
+
+
+def _verificar_inicializacao(orcamento_ms: float) -> int:
+    """Executa a verificação de `--inicializacao`; retorna 1 se falhar."""
+    medida = medir_inicializacao()
+    print(f"importação de calculadora: {medida['importacao_ms']:.1f} ms "
+          f"(orçamento: {orcamento_ms:g} ms)")
+    print(f"processo `-c` completo:    {medida['processo_ms']:.1f} ms")
+    falhas = []
+    if medida['importacao_ms'] > orcamento_ms:
+        falhas.append(f"importação acima do orçamento ({medida['importacao_ms']:.1f} ms)")
+    if medida['modulos_adiados']:
+        falhas.append(f"módulos adiados importados: {', '.join(medida['modulos_adiados'])}")
+    if falhas:
+        print("\n❌ Inicialização fora do orçamento:")
+        for falha in falhas:
+            print(f"  - {falha}")
+        return 1
+    print("\n✅ Inicialização dentro do orçamento")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Executa os benchmarks; retorna 1 se houver regressão em relação à base."""
+    argumentos = _argumentos(argv)
+    if argumentos.inicializacao:
+        return _verificar_inicializacao(argumentos.orcamento_ms)
+    if argumentos.threads:
+        vazao = medir_threads(argumentos.threads)
+        gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+        print(f"calculadora concorrente ({'com' if gil else 'sem'} GIL, {os.cpu_count()} CPUs)")
+        for quantidade, ops in vazao.items():
+            print(f"{quantidade:3d} threads  {ops:12,.0f} ops/s  "
+                  f"{ops / vazao[argumentos.threads[0]]:5.2f}x")
+        return 0
+    base = None
+    if argumentos.base:
+        with open(argumentos.base, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+
+    relatorio = executar(argumentos.casos, argumentos.amostras, argumentos.lote)
+    print(formatar_relatorio(relatorio, base))
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+            arquivo.write("\n")
+
+    if base is not None:
+        regressoes = comparar(relatorio, base, argumentos.tolerancia)
+        if regressoes:
+            print("\n❌ Regressões em relação à base:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            return 1
+        print("\n✅ Nenhuma regressão em relação à base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
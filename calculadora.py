@@ -6,21 +6,2254 @@ Autor: Calculadora Team
 Versão: 2.0.0
 """
 
+from __future__ import annotations
+
 import math
-import re
+import operator
 import sys
-from typing import Union, List, Dict, Any
-import json
+from array import array
+from collections import OrderedDict, deque
+from itertools import count, islice
 import os
-from datetime import datetime
+from time import perf_counter_ns, time
+
+from registro import RegistroHistorico
+
+# As anotações não são avaliadas em tempo de execução; `typing` (que importa
+# `re`) só é carregado pelos verificadores de tipo, o que acelera a inicialização.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import (Union, List, Dict, Any, Optional, Tuple, Iterable, Iterator, Deque,
+                        TextIO)
+
+
+class _TabelaFuncoes(dict):
+    """Dicionário de funções que incrementa uma versão a cada alteração."""
+
+    __slots__ = ('versao',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.versao = 0
+
+    def __setitem__(self, chave, valor):
+        super().__setitem__(chave, valor)
+        self.versao += 1
+
+    def __delitem__(self, chave):
+        super().__delitem__(chave)
+        self.versao += 1
+
+    def clear(self):
+        super().clear()
+        self.versao += 1
+
+    def pop(self, *args):
+        valor = super().pop(*args)
+        self.versao += 1
+        return valor
+
+    def popitem(self):
+        item = super().popitem()
+        self.versao += 1
+        return item
+
+    def setdefault(self, chave, valor=None):
+        if chave not in self:
+            self.versao += 1
+        return super().setdefault(chave, valor)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.versao += 1
+
+
+class CacheExpressoes:
+    """Cache LRU limitado de expressões já validadas e compiladas."""
+
+    def __init__(self, capacidade: int = 1024):
+        """Cria o cache; capacidade 0 desativa o armazenamento."""
+        self.capacidade = capacidade
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas: 'OrderedDict[str, Any]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def __contains__(self, chave: str) -> bool:
+        return chave in self._entradas
+
+    def obter(self, chave: str) -> Any:
+        """Retorna a entrada da chave (ou None), atualizando a ordem LRU."""
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            self.falhas += 1
+            return None
+        self._entradas.move_to_end(chave)
+        self.acertos += 1
+        return entrada
+
+    def armazenar(self, chave: str, entrada: Any):
+        """Armazena uma entrada, descartando a menos usada se necessário."""
+        if self.capacidade <= 0:
+            return
+        self._entradas[chave] = entrada
+        self._entradas.move_to_end(chave)
+        if len(self._entradas) > self.capacidade:
+            self._entradas.popitem(last=False)
+
+    def chaves(self) -> List[str]:
+        """Retorna as chaves em cache, da menos para a mais usada."""
+        return list(self._entradas)
+
+    def descartar(self, predicado: Any) -> int:
+        """Remove as entradas para as quais `predicado(entrada)` é verdadeiro; retorna quantas."""
+        chaves = [chave for chave, entrada in list(self._entradas.items()) if predicado(entrada)]
+        for chave in chaves:
+            self._entradas.pop(chave, None)
+        return len(chaves)
+
+    def limpar(self):
+        """Remove todas as entradas (os contadores são preservados)."""
+        self._entradas.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Retorna tamanho, capacidade, acertos, falhas e taxa de acerto."""
+        total = self.acertos + self.falhas
+        return {
+            'tamanho': len(self._entradas),
+            'capacidade': self.capacidade,
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'taxa_acerto': self.acertos / total if total else 0.0,
+        }
+
+
+class MemoizacaoResultados(CacheExpressoes):
+    """Cache LRU de resultados de subexpressões puras entre avaliações.
+
+    As chaves combinam a estrutura da subexpressão (numerada por
+    `identificador`) com os valores e tipos das variáveis que ela lê; um
+    valor novo na memória leva a outra chave, então não há resultados
+    vencidos, só entradas que envelhecem até serem descartadas. O mapa de
+    estruturas também é um LRU de `capacidade` entradas: uma estrutura
+    esquecida recebe outro número na próxima compilação, e as entradas do
+    número antigo envelhecem como as demais.
+    """
+
+    def __init__(self, capacidade: int = 4096):
+        super().__init__(capacidade)
+        self._identificadores: 'OrderedDict[tuple, int]' = OrderedDict()
+        self._contador = count()
+
+    def identificador(self, subarvore: tuple) -> int:
+        """Número da estrutura da subárvore; estruturas iguais têm o mesmo número."""
+        identificadores = self._identificadores
+        identificador = identificadores.get(subarvore)
+        try:
+            if identificador is not None:
+                identificadores.move_to_end(subarvore)
+                return identificador
+            identificador = identificadores.setdefault(subarvore, next(self._contador))
+            while len(identificadores) > self.capacidade:
+                identificadores.popitem(last=False)
+        except KeyError:
+            # Descartada por outra thread (MemoizacaoConcorrente)
+            pass
+        return identificador
+
+    def limpar(self):
+        """Remove as entradas e esquece as estruturas (os números não são reusados)."""
+        super().limpar()
+        self._identificadores.clear()
+
+
+def normalizar_expressao(expressao: str) -> str:
+    """Normaliza os espaços de uma expressão para uso como chave de cache."""
+    return ' '.join(expressao.split())
+
+
+class ExpressaoInvalida(Exception):
+    """Expressão com caractere ou construção não permitida."""
+
+    def __init__(self, mensagem: str, posicao: int = -1):
+        super().__init__(mensagem)
+        self.posicao = posicao
+
+
+class OrcamentoExcedido(Exception):
+    """Avaliação interrompida por um limite de `OrcamentoAvaliacao`."""
+
+
+# Tipos de nó da árvore de expressão (tuplas imutáveis e comparáveis)
+NUMERO = 'num'        # ('num', valor)
+NOME = 'nome'         # ('nome', identificador)
+UNARIO = 'un'         # ('un', operador, operando)
+BINARIO = 'bin'       # ('bin', operador, esquerda, direita)
+CHAMADA = 'chamada'   # ('chamada', funcao, (argumento, ...))
+
+# Tabelas do analisador léxico (sem `re`, para uma importação rápida)
+_DIGITOS = frozenset('0123456789')
+_INICIO_NOME = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_')
+_CARACTERES_NOME = _INICIO_NOME | _DIGITOS
+_OPERADORES = {
+    '+': '+', '-': '-', '*': '*', '/': '/', '%': '%', '(': '(', ')': ')', ',': ',',
+    '^': '**', '×': '*', '÷': '/',
+}
+_OPERADORES_DUPLOS = ('**', '//')
+_FIM = 'fim'
+
+
+# Tabelas de `verificar_expressao`
+_PERMITIDOS = _CARACTERES_NOME | frozenset(_OPERADORES) | frozenset(' \t\n\r\v\f')
+_SIMBOLOS_ALTERNATIVOS = tuple((simbolo, operador) for simbolo, operador in _OPERADORES.items()
+                               if simbolo != operador)
+# Recusados como nomes inteiros (tokens), não como trechos de outros nomes,
+# assim como os nomes iniciados por `__`
+_PALAVRAS_PERIGOSAS = ('import', 'exec', 'eval', 'open', 'file', 'system', 'subprocess')
+_NOMES_PERIGOSOS = frozenset(_PALAVRAS_PERIGOSAS)
+
+
+def tokenizar(expressao: str, literal: Optional[Any] = None) -> List[Tuple[str, Any, int]]:
+    """Divide a expressão em tokens (tipo, valor, posição) em uma única passada.
+
+    `literal` converte o texto de cada número (padrão: `int` ou `float`).
+    """
+    tokens = []
+    adicionar = tokens.append
+    operadores = _OPERADORES
+    inicio_nome = _INICIO_NOME
+    caracteres_nome = _CARACTERES_NOME
+    tamanho = len(expressao)
+    posicao = 0
+    while posicao < tamanho:
+        caractere = expressao[posicao]
+        if caractere in operadores:
+            duplo = expressao[posicao:posicao + 2]
+            if duplo in _OPERADORES_DUPLOS:
+                adicionar(('op', duplo, posicao))
+                posicao += 2
+            else:
+                adicionar(('op', operadores[caractere], posicao))
+                posicao += 1
+        elif caractere in inicio_nome:
+            fim = posicao + 1
+            while fim < tamanho and expressao[fim] in caracteres_nome:
+                fim += 1
+            adicionar(('nome', expressao[posicao:fim], posicao))
+            posicao = fim
+        elif caractere.isdecimal() or (caractere == '.' and expressao[posicao + 1:posicao + 2].isdecimal()):
+            fim = posicao + 1
+            while fim < tamanho and expressao[fim].isdecimal():
+                fim += 1
+            if caractere != '.' and fim < tamanho and expressao[fim] == '.':
+                fim += 1
+                while fim < tamanho and expressao[fim].isdecimal():
+                    fim += 1
+            if fim < tamanho and expressao[fim] in 'eE':
+                expoente = fim + 1
+                if expoente < tamanho and expressao[expoente] in '+-':
+                    expoente += 1
+                if expoente < tamanho and expressao[expoente].isdecimal():
+                    fim = expoente + 1
+                    while fim < tamanho and expressao[fim].isdecimal():
+                        fim += 1
+            texto = expressao[posicao:fim]
+            if literal is not None:
+                adicionar(('num', literal(texto), posicao))
+            else:
+                adicionar(('num', int(texto) if texto.isdigit() else float(texto), posicao))
+            posicao = fim
+        elif caractere.isspace():
+            posicao += 1
+        else:
+            raise ExpressaoInvalida(
+                f"caractere inválido '{caractere}' na posição {posicao}",
+                posicao
+            )
+    adicionar((_FIM, None, posicao))
+    return tokens
+
+
+def _verificar_nomes(tokens: List[Tuple[str, Any, int]]):
+    for tipo, valor, posicao in tokens:
+        if tipo == 'nome' and (valor in _NOMES_PERIGOSOS or valor.startswith('__')):
+            raise ExpressaoInvalida(f"palavra não permitida '{valor}' na posição {posicao}",
+                                    posicao)
+
+
+def verificar_expressao(expressao: str) -> str:
+    """Valida a expressão com as regras de `tokenizar` e normaliza `^`, `×` e `÷`.
+
+    Os caracteres são conferidos em uma passada contra o conjunto do
+    módulo; só quando há ponto, caractere fora do conjunto, `__` ou um
+    nome perigoso como trecho do texto a expressão é dividida em tokens, para
+    recusar exatamente o que `tokenizar` recusa e os nomes perigosos
+    inteiros (`profile` é aceito, `eval` não). Levanta ExpressaoInvalida
+    com a posição do primeiro problema.
+    """
+    if (not _PERMITIDOS.issuperset(expressao) or '.' in expressao or '__' in expressao
+            or any(palavra in expressao for palavra in _PALAVRAS_PERIGOSAS)):
+        try:
+            tokens = tokenizar(expressao, str)
+        except ExpressaoInvalida as erro:
+            # Nomes perigosos antes do caractere inválido são o primeiro problema
+            _verificar_nomes(tokenizar(expressao[:erro.posicao], str))
+            raise
+        _verificar_nomes(tokens)
+    # `replace` devolve o próprio texto quando o símbolo não aparece
+    for simbolo, operador in _SIMBOLOS_ALTERNATIVOS:
+        expressao = expressao.replace(simbolo, operador)
+    return expressao
+
+
+class _Analisador:
+    """Analisador sintático descendente recursivo com a precedência do Python."""
+
+    def __init__(self, tokens: List[Tuple[str, Any, int]],
+                 maximo_profundidade: Optional[int] = None):
+        self.tokens = tokens
+        self.indice = 0
+        self.profundidade = 0
+        self.maximo_profundidade = maximo_profundidade
+
+    def analisar(self) -> tuple:
+        """Retorna a árvore da expressão completa."""
+        arvore = self._soma()
+        tipo, valor, posicao = self.tokens[self.indice]
+        if tipo != _FIM:
+            raise SyntaxError(f"token inesperado '{valor}' na posição {posicao}")
+        return arvore
+
+    def _operador(self, operadores) -> Optional[str]:
+        """Consome e retorna o operador atual se ele estiver em `operadores`."""
+        tipo, valor, _ = self.tokens[self.indice]
+        if tipo == 'op' and valor in operadores:
+            self.indice += 1
+            return valor
+        return None
+
+    def _esperar(self, operador: str):
+        if self._operador((operador,)) is None:
+            _, valor, posicao = self.tokens[self.indice]
+            raise SyntaxError(f"esperado '{operador}' na posição {posicao}")
+
+    def _soma(self) -> tuple:
+        no = self._produto()
+        operador = self._operador(('+', '-'))
+        while operador is not None:
+            no = (BINARIO, operador, no, self._produto())
+            operador = self._operador(('+', '-'))
+        return no
+
+    def _produto(self) -> tuple:
+        no = self._unario()
+        operador = self._operador(('*', '/', '//', '%'))
+        while operador is not None:
+            no = (BINARIO, operador, no, self._unario())
+            operador = self._operador(('*', '/', '//', '%'))
+        return no
+
+    def _unario(self) -> tuple:
+        # Parênteses, argumentos, sinais e expoentes aninham por aqui
+        self.profundidade += 1
+        if (self.maximo_profundidade is not None
+                and self.profundidade > self.maximo_profundidade):
+            raise OrcamentoExcedido(
+                f"mais de {self.maximo_profundidade} níveis de aninhamento")
+        operador = self._operador(('+', '-'))
+        if operador is not None:
+            no = (UNARIO, operador, self._unario())
+        else:
+            no = self._potencia()
+        self.profundidade -= 1
+        return no
+
+    def _potencia(self) -> tuple:
+        base = self._primario()
+        # Associativa à direita e com precedência sobre o menos unário
+        if self._operador(('**',)) is not None:
+            return (BINARIO, '**', base, self._unario())
+        return base
+
+    def _primario(self) -> tuple:
+        tipo, valor, posicao = self.tokens[self.indice]
+        self.indice += 1
+        if tipo == 'num':
+            return (NUMERO, valor)
+        if tipo == 'nome':
+            if self._operador(('(',)) is None:
+                return (NOME, valor)
+            argumentos = []
+            if self._operador((')',)) is None:
+                argumentos.append(self._soma())
+                while self._operador((',',)) is not None:
+                    argumentos.append(self._soma())
+                self._esperar(')')
+            return (CHAMADA, valor, tuple(argumentos))
+        if tipo == 'op' and valor == '(':
+            no = self._soma()
+            self._esperar(')')
+            return no
+        if tipo == _FIM:
+            raise SyntaxError(f"fim inesperado da expressão na posição {posicao}")
+        raise SyntaxError(f"token inesperado '{valor}' na posição {posicao}")
+
+
+def analisar_expressao(expressao: str, literal: Optional[Any] = None,
+                       maximo_profundidade: Optional[int] = None) -> tuple:
+    """Converte o texto de uma expressão em sua árvore sintática.
+
+    Com `maximo_profundidade`, aninhamentos mais fundos levantam
+    OrcamentoExcedido antes de esgotar a pilha.
+    """
+    return _Analisador(tokenizar(expressao, literal), maximo_profundidade).analisar()
+
+
+# Fábricas de closures por operador: genérica, constante à esquerda e à direita
+_BINARIOS = {
+    '+': lambda a, b: lambda m: a(m) + b(m),
+    '-': lambda a, b: lambda m: a(m) - b(m),
+    '*': lambda a, b: lambda m: a(m) * b(m),
+    '/': lambda a, b: lambda m: a(m) / b(m),
+    '//': lambda a, b: lambda m: a(m) // b(m),
+    '%': lambda a, b: lambda m: a(m) % b(m),
+    '**': lambda a, b: lambda m: a(m) ** b(m),
+}
+_BINARIOS_CONSTANTE_ESQUERDA = {
+    '+': lambda v, b: lambda m: v + b(m),
+    '-': lambda v, b: lambda m: v - b(m),
+    '*': lambda v, b: lambda m: v * b(m),
+    '/': lambda v, b: lambda m: v / b(m),
+    '//': lambda v, b: lambda m: v // b(m),
+    '%': lambda v, b: lambda m: v % b(m),
+    '**': lambda v, b: lambda m: v ** b(m),
+}
+_BINARIOS_CONSTANTE_DIREITA = {
+    '+': lambda a, v: lambda m: a(m) + v,
+    '-': lambda a, v: lambda m: a(m) - v,
+    '*': lambda a, v: lambda m: a(m) * v,
+    '/': lambda a, v: lambda m: a(m) / v,
+    '//': lambda a, v: lambda m: a(m) // v,
+    '%': lambda a, v: lambda m: a(m) % v,
+    '**': lambda a, v: lambda m: a(m) ** v,
+}
+_UNARIOS = {
+    '-': lambda a: lambda m: -a(m),
+    '+': lambda a: lambda m: +a(m),
+}
+
+
+def _constante(valor: Any):
+    return lambda m: valor
+
+
+def _variavel(nome: str):
+    def avaliar(m):
+        try:
+            return m[nome]
+        except KeyError:
+            raise NameError(f"name '{nome}' is not defined") from None
+    return avaliar
+
+
+def _falha(erro: Exception):
+    def avaliar(m):
+        raise erro.with_traceback(None)
+    return avaliar
+
+
+def _chamada(funcao, argumentos: list):
+    if len(argumentos) == 1:
+        a = argumentos[0]
+        return lambda m: funcao(a(m))
+    if len(argumentos) == 2:
+        a, b = argumentos
+        return lambda m: funcao(a(m), b(m))
+    return lambda m: funcao(*[g(m) for g in argumentos])
+
+
+# Subexpressões repetidas: a avaliação recebe um quadro [memória, valor 0,
+# valor 1, ...] em vez da memória, e cada valor é calculado na primeira vez
+_AUSENTE = object()
+
+
+def _variavel_no_quadro(nome: str):
+    def avaliar(quadro):
+        try:
+            return quadro[0][nome]
+        except KeyError:
+            raise NameError(f"name '{nome}' is not defined") from None
+    return avaliar
+
+
+def _reaproveitada(avaliar, indice: int):
+    def reaproveitar(quadro):
+        valor = quadro[indice]
+        if valor is _AUSENTE:
+            valor = quadro[indice] = avaliar(quadro)
+        return valor
+    return reaproveitar
+
+
+def _com_quadro(avaliar, tamanho: int):
+    vazio = [_AUSENTE] * tamanho
+
+    def avaliar_com_quadro(m):
+        return avaliar([m] + vazio)
+    return avaliar_com_quadro
+
+
+def _memoizada(avaliar, memoizacao: 'MemoizacaoResultados', identificador: int,
+               nomes: Tuple[str, ...], no_quadro: bool):
+    """Consulta a memoização pelos valores (e tipos) das variáveis da subexpressão."""
+    obter, armazenar = memoizacao.obter, memoizacao.armazenar
+
+    def memoizar(m):
+        memoria = m[0] if no_quadro else m
+        try:
+            valores = tuple([memoria[nome] for nome in nomes])
+        except KeyError:
+            return avaliar(m)
+        # 0 e -0.0 são a mesma chave, mas não o mesmo argumento
+        if 0 in valores:
+            return avaliar(m)
+        chave = (identificador, valores, tuple(map(type, valores)))
+        resultado = obter(chave)
+        if resultado is None:
+            resultado = avaliar(m)
+            armazenar(chave, resultado)
+        return resultado
+    return memoizar
+
+
+class _Compilador:
+    """Converte a árvore sintática em closures aninhadas.
+
+    Com `puras`, `compilar_raiz` calcula uma única vez por avaliação as
+    subexpressões puras repetidas; com `memoizacao`, os resultados delas e
+    das chamadas puras são reaproveitados entre avaliações. `literal` lê
+    os números dos corpos de funções do usuário, como no backend.
+    """
+
+    def __init__(self, tabela: Dict[str, Any], memoria: Dict[str, Any],
+                 operacoes: Optional[Dict[str, Any]] = None, puras: frozenset = frozenset(),
+                 memoizacao: Optional['MemoizacaoResultados'] = None,
+                 literal: Optional[Any] = None):
+        self.tabela = tabela
+        self.memoria = memoria
+        self.operacoes = operacoes or {}
+        self.puras = puras
+        self.memoizacao = memoizacao
+        self.literal = literal
+        self.nomes_tabela = set()
+        # Funções chamadas (mesmo as ainda não definidas), para invalidar o cache
+        self.funcoes = set()
+        self.sombreados = set()
+        self.variaveis: List[str] = []
+        self.reaproveitaveis: Dict[tuple, int] = {}
+        # Chave de estrutura (veja `_subarvores_puras`) por id dos nós reaproveitáveis
+        self.chaves: Dict[int, tuple] = {}
+        self.repetidas: Dict[tuple, Any] = {}
+        self.no_quadro = False
+
+    def compilar_raiz(self, no: tuple, nos: Optional[int] = None) -> Any:
+        """Compila a árvore inteira e retorna a closure de avaliação.
+
+        `nos` é o tamanho da árvore, se conhecido: árvores pequenas demais
+        para repetir uma subárvore nem são analisadas.
+        """
+        if self.puras and (self.memoizacao is not None or nos is None
+                           or nos > 2 * _MINIMO_NOS_REAPROVEITAR):
+            self.reaproveitaveis, self.chaves = _subarvores_puras(
+                no, self.tabela, self.puras, self.memoizacao is not None)
+            self.no_quadro = any(vezes > 1 for vezes in self.reaproveitaveis.values())
+            if self.reaproveitaveis:
+                # Só esta instância paga a consulta em cada nó
+                self.compilar = self._compilar_reaproveitando
+        avaliar = self.compilar(no)[0]
+        if self.no_quadro:
+            return _com_quadro(avaliar, len(self.repetidas))
+        return avaliar
+
+    def _reaproveitar(self, no: tuple, chave: tuple) -> Any:
+        """Compila uma subárvore pura: repetida e/ou memoizada."""
+        avaliar = self.repetidas.get(chave)
+        if avaliar is not None:
+            return avaliar
+        avaliar = _Compilador.compilar(self, no)[0]
+        repetida = self.reaproveitaveis[chave] > 1
+        if self.memoizacao is not None and (repetida or no[0] == CHAMADA):
+            nomes = tuple(_variaveis_livres(no, {}, []))
+            avaliar = _memoizada(avaliar, self.memoizacao, self.memoizacao.identificador(chave),
+                                 nomes, self.no_quadro)
+        if repetida:
+            # O índice 0 do quadro é a memória
+            avaliar = _reaproveitada(avaliar, len(self.repetidas) + 1)
+            self.repetidas[chave] = avaliar
+        return avaliar
+
+    def _compilar_reaproveitando(self, no: tuple) -> Tuple[Any, bool, Any]:
+        chave = self.chaves.get(id(no))
+        if chave is not None:
+            return self._reaproveitar(no, chave), False, None
+        return _Compilador.compilar(self, no)
+
+    def compilar(self, no: tuple) -> Tuple[Any, bool, Any]:
+        """Retorna (closure, é_constante, valor_constante) para o nó."""
+        tipo = no[0]
+        if tipo == NUMERO:
+            return _constante(no[1]), True, no[1]
+
+        if tipo == NOME:
+            nome = no[1]
+            if nome in self.tabela:
+                # Variáveis em memória têm precedência sobre constantes
+                if nome in self.memoria:
+                    self.sombreados.add(nome)
+                else:
+                    self.nomes_tabela.add(nome)
+                    valor = self.tabela[nome]
+                    # Constantes que o backend não representa falham no uso
+                    if isinstance(valor, Exception):
+                        return _falha(valor), False, None
+                    return _constante(valor), True, valor
+            if nome not in self.variaveis:
+                self.variaveis.append(nome)
+            if self.no_quadro:
+                return _variavel_no_quadro(nome), False, None
+            return _variavel(nome), False, None
+
+        if tipo == UNARIO:
+            operando, _, _ = self.compilar(no[2])
+            return _UNARIOS[no[1]](operando), False, None
+
+        if tipo == BINARIO:
+            operador = no[1]
+            esquerda, const_esq, valor_esq = self.compilar(no[2])
+            direita, const_dir, valor_dir = self.compilar(no[3])
+            especial = self.operacoes.get(operador)
+            if especial is not None:
+                if const_dir and not const_esq:
+                    return (lambda m: especial(esquerda(m), valor_dir)), False, None
+                return _chamada(especial, [esquerda, direita]), False, None
+            if const_dir and not const_esq:
+                return _BINARIOS_CONSTANTE_DIREITA[operador](esquerda, valor_dir), False, None
+            if const_esq and not const_dir:
+                return _BINARIOS_CONSTANTE_ESQUERDA[operador](valor_esq, direita), False, None
+            return _BINARIOS[operador](esquerda, direita), False, None
+
+        # Chamada de função: resolvida uma única vez, na compilação
+        nome, argumentos = no[1], no[2]
+        self.funcoes.add(nome)
+        if nome not in self.tabela:
+            return _falha(NameError(f"name '{nome}' is not defined")), False, None
+        self.nomes_tabela.add(nome)
+        funcao = self.tabela[nome]
+        if type(funcao) is FuncaoUsuario:
+            self.funcoes.update(_dependencias(funcao, self.tabela))
+            funcao = funcao.compilar_para(self.tabela, self.operacoes, self.literal)
+        compilados = [self.compilar(argumento)[0] for argumento in argumentos]
+        return _chamada(funcao, compilados), False, None
+
+
+# Funções da tabela padrão sem efeitos colaterais (podem ser dobradas)
+_FUNCOES_PURAS = frozenset([
+    math.sin, math.cos, math.tan, math.asin, math.acos, math.atan, math.sqrt,
+    math.log10, math.log, math.exp, abs, round, math.floor, math.ceil,
+])
+_OPERACOES_BINARIAS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+    '//': operator.floordiv, '%': operator.mod, '**': operator.pow,
+}
+_OPERACOES_UNARIAS = {'-': operator.neg, '+': operator.pos}
+# Potências inteiras maiores que isso não são dobradas na compilação
+_MAXIMO_BITS_DOBRA = 4096
+# Subárvores menores que isso custam menos para calcular que para reaproveitar
+_MINIMO_NOS_REAPROVEITAR = 6
+
+
+def contar_nos(no: tuple) -> int:
+    """Conta os nós de uma árvore de expressão."""
+    tipo = no[0]
+    if tipo == UNARIO:
+        return 1 + contar_nos(no[2])
+    if tipo == BINARIO:
+        return 1 + contar_nos(no[2]) + contar_nos(no[3])
+    if tipo == CHAMADA:
+        return 1 + sum(contar_nos(argumento) for argumento in no[2])
+    return 1
+
+
+def _chave_numero(valor: Any) -> tuple:
+    """Chave de um literal: 2 e 2.0, 10**20 e 1e20, 0.0 e -0.0 são diferentes."""
+    tipo = type(valor)
+    if tipo is int:
+        return (NUMERO, int, valor)
+    if tipo is float:
+        return (NUMERO, float, valor, math.copysign(1.0, valor))
+    # Decimal: 0 e -0, 1.0 e 1.00 são iguais, mas não o mesmo literal
+    como_tupla = getattr(valor, 'as_tuple', None)
+    return (NUMERO, tipo, valor if como_tupla is None else como_tupla())
+
+
+def _subarvores_puras(no: tuple, tabela: Dict[str, Any], puras: frozenset,
+                      chamadas: bool = False) -> Tuple[Dict[tuple, int], Dict[int, tuple]]:
+    """Conta as ocorrências das subárvores que podem ser reaproveitadas.
+
+    Entram as subárvores com ao menos `_MINIMO_NOS_REAPROVEITAR` nós que só
+    chamam funções de `puras` (funções do usuário podem ter efeitos) e,
+    com `chamadas`, todas as chamadas puras. As árvores comparam números
+    por valor (`('num', 2) == ('num', 2.0)`), então as contagens usam uma
+    chave de estrutura com o tipo dos literais; retorna também essa chave
+    por `id` de cada nó contado (válida enquanto a árvore existir).
+    """
+    contagem: Dict[tuple, int] = {}
+    chaves: Dict[int, tuple] = {}
+
+    def visitar(no: tuple) -> Tuple[int, bool, tuple]:
+        tipo = no[0]
+        if tipo == UNARIO:
+            nos, pura, chave = visitar(no[2])
+            nos += 1
+            chave = (UNARIO, no[1], chave)
+        elif tipo == BINARIO:
+            nos_esquerda, pura_esquerda, chave_esquerda = visitar(no[2])
+            nos_direita, pura_direita, chave_direita = visitar(no[3])
+            nos, pura = 1 + nos_esquerda + nos_direita, pura_esquerda and pura_direita
+            chave = (BINARIO, no[1], chave_esquerda, chave_direita)
+        elif tipo == CHAMADA:
+            nos, pura = 1, tabela.get(no[1]) in puras
+            argumentos = []
+            for argumento in no[2]:
+                nos_argumento, pura_argumento, chave_argumento = visitar(argumento)
+                nos += nos_argumento
+                pura = pura and pura_argumento
+                argumentos.append(chave_argumento)
+            chave = (CHAMADA, no[1], tuple(argumentos))
+        elif tipo == NUMERO:
+            return 1, True, _chave_numero(no[1])
+        else:
+            return 1, True, no
+        if pura and (nos >= _MINIMO_NOS_REAPROVEITAR or chamadas and tipo == CHAMADA):
+            contagem[chave] = contagem.get(chave, 0) + 1
+            chaves[id(no)] = chave
+        return nos, pura, chave
+
+    visitar(no)
+    return contagem, chaves
+
+
+def _eh_inteiro(no: tuple, valor: int) -> bool:
+    return no[0] == NUMERO and type(no[1]) is int and no[1] == valor
+
+
+class EstatisticasOtimizacao:
+    """Resumo do que a otimização fez com uma expressão."""
+
+    __slots__ = ('nos_antes', 'nos_depois', 'dobras', 'identidades')
+
+    def __init__(self, nos_antes: int = 0, nos_depois: int = 0,
+                 dobras: int = 0, identidades: int = 0):
+        self.nos_antes = nos_antes
+        self.nos_depois = nos_depois
+        self.dobras = dobras
+        self.identidades = identidades
+
+    @property
+    def reducao(self) -> float:
+        """Fração de nós eliminados (0.0 a 1.0)."""
+        return 1 - self.nos_depois / self.nos_antes if self.nos_antes else 0.0
+
+    def como_dict(self) -> Dict[str, Any]:
+        """Retorna as estatísticas como dicionário."""
+        return {
+            'nos_antes': self.nos_antes,
+            'nos_depois': self.nos_depois,
+            'dobras': self.dobras,
+            'identidades': self.identidades,
+            'reducao': self.reducao,
+        }
+
+
+class _Otimizador:
+    """Dobra constantes e aplica identidades algébricas seguras.
+
+    Constantes da tabela (não sombreadas pela memória), aritmética entre
+    números e chamadas a funções puras com argumentos constantes são
+    avaliadas uma vez. Operações que falhariam (ex.: divisão por zero) são
+    mantidas para falhar na avaliação. Só são aplicadas identidades exatas
+    em ponto flutuante: x*1, 1*x, x**1 e x-0 (x+0 não, pois -0.0+0 é 0.0).
+    Funções do usuário pequenas são embutidas antes da dobra, desde que
+    nenhum argumento com efeitos colaterais seja repetido.
+    """
+
+    def __init__(self, tabela: Dict[str, Any], memoria: Dict[str, Any],
+                 backend: Optional['BackendNumerico'] = None):
+        self.tabela = tabela
+        self.memoria = memoria
+        backend = backend or BACKEND_FLOAT
+        self.tipos = backend.tipos
+        self.puras = backend.puras
+        self.literal = backend.literal
+        self.binarias = _OPERACOES_BINARIAS
+        if backend.operacoes:
+            self.binarias = dict(_OPERACOES_BINARIAS, **backend.operacoes)
+        self.constantes = set()
+        self.funcoes = set()
+        self.dobras = 0
+        self.identidades = 0
+
+    def _embutir(self, funcao: 'FuncaoUsuario', argumentos: Tuple[tuple, ...]) -> Optional[tuple]:
+        """Corpo de `funcao` aplicado aos argumentos, ou None se não deve ser embutido."""
+        if funcao.nos > _MAXIMO_NOS_EMBUTIR or len(argumentos) != len(funcao.parametros):
+            return None
+        for parametro, argumento in zip(funcao.parametros, argumentos):
+            if (funcao.usos.get(parametro, 0) > 1 and argumento[0] != NUMERO
+                    and argumento[0] != NOME
+                    and not _sem_efeitos(argumento, self.tabela, self.puras)):
+                return None
+        self.funcoes.update(_dependencias(funcao, self.tabela))
+        return funcao.embutir(argumentos, self.tabela, self.literal)
+
+    def _dobrar(self, operacao, *valores) -> Optional[tuple]:
+        """Tenta calcular a operação; retorna o nó numérico ou None."""
+        try:
+            resultado = operacao(*valores)
+        except Exception:
+            return None
+        self.dobras += 1
+        return (NUMERO, resultado)
+
+    def otimizar(self, no: tuple) -> tuple:
+        tipo = no[0]
+        if tipo == NOME:
+            nome = no[1]
+            if nome in self.tabela and nome not in self.memoria:
+                valor = self.tabela[nome]
+                if isinstance(valor, self.tipos):
+                    self.constantes.add(nome)
+                    self.dobras += 1
+                    return (NUMERO, valor)
+            return no
+
+        if tipo == UNARIO:
+            operando = self.otimizar(no[2])
+            if operando[0] == NUMERO:
+                dobrado = self._dobrar(_OPERACOES_UNARIAS[no[1]], operando[1])
+                if dobrado is not None:
+                    return dobrado
+            return (UNARIO, no[1], operando)
+
+        if tipo == BINARIO:
+            operador = no[1]
+            esquerda = self.otimizar(no[2])
+            direita = self.otimizar(no[3])
+            if esquerda[0] == NUMERO and direita[0] == NUMERO:
+                base, expoente = esquerda[1], direita[1]
+                grande = (operador == '**' and type(base) is int and type(expoente) is int
+                          and expoente * base.bit_length() > _MAXIMO_BITS_DOBRA)
+                if not grande:
+                    dobrado = self._dobrar(self.binarias[operador], base, expoente)
+                    if dobrado is not None:
+                        return dobrado
+            if ((operador == '*' or operador == '**') and _eh_inteiro(direita, 1)
+                    or operador == '-' and _eh_inteiro(direita, 0)):
+                self.identidades += 1
+                return esquerda
+            if operador == '*' and _eh_inteiro(esquerda, 1):
+                self.identidades += 1
+                return direita
+            return (BINARIO, operador, esquerda, direita)
+
+        if tipo == CHAMADA:
+            funcao = self.tabela.get(no[1])
+            if type(funcao) is FuncaoUsuario:
+                embutida = self._embutir(funcao, no[2])
+                if embutida is not None:
+                    return self.otimizar(embutida)
+            argumentos = tuple(self.otimizar(argumento) for argumento in no[2])
+            if (funcao in self.puras
+                    and all(argumento[0] == NUMERO for argumento in argumentos)):
+                dobrado = self._dobrar(funcao, *[argumento[1] for argumento in argumentos])
+                if dobrado is not None:
+                    return dobrado
+            return (CHAMADA, no[1], argumentos)
+
+        return no
+
+
+class BackendNumerico:
+    """Aritmética usada para avaliar as expressões.
+
+    `literal` converte o texto dos números (None: `int`/`float`),
+    `operacoes` substitui operadores binários, `adaptar` deriva a tabela do
+    backend de `funcoes_disponiveis`, `contexto` cria o gerenciador de
+    contexto da avaliação (ex.: precisão) e `converter` traz valores de
+    fora (memória, variáveis) para o tipo do backend. `paralelo` indica
+    se os valores podem ir e voltar de outros processos. Os outros
+    backends ficam em `numerico`.
+    """
+
+    __slots__ = ('nome', 'precisao', 'chave', 'tipos', 'literal', 'operacoes', 'adaptar',
+                 'contexto', 'converter', 'puras', 'paralelo')
+
+    def __init__(self, nome: str, precisao: Optional[int] = None,
+                 tipos: Tuple[type, ...] = (int, float), literal: Optional[Any] = None,
+                 operacoes: Optional[Dict[str, Any]] = None, adaptar: Optional[Any] = None,
+                 contexto: Optional[Any] = None, converter: Optional[Any] = None,
+                 puras: frozenset = _FUNCOES_PURAS, paralelo: bool = True):
+        self.nome = nome
+        self.precisao = precisao
+        # Parte da chave do cache de expressões (None para o float)
+        self.chave = None if nome == 'float' else (nome, precisao)
+        self.tipos = tipos
+        self.literal = literal
+        self.operacoes = operacoes or {}
+        self.adaptar = adaptar
+        self.contexto = contexto
+        self.converter = converter
+        self.puras = puras
+        self.paralelo = paralelo
+
+    def __repr__(self):
+        if self.precisao is None:
+            return f"BackendNumerico({self.nome!r})"
+        return f"BackendNumerico({self.nome!r}, precisao={self.precisao})"
+
+
+BACKEND_FLOAT = BackendNumerico('float')
+
+
+def _bits_potencia(base: Any, expoente: Any) -> int:
+    """Estimativa (por cima) dos bits de uma potência exata; 0 se não é exata.
+
+    Só inteiros e racionais com expoente inteiro crescem sem limite:
+    floats estouram e decimais são arredondados pelo contexto.
+    """
+    try:
+        numerador, denominador = expoente.numerator, expoente.denominator
+        bits = max(base.numerator.bit_length(), base.denominator.bit_length())
+    except AttributeError:
+        return 0
+    # 0, 1 e -1 não crescem; int ** int negativo é float
+    if denominador != 1 or bits <= 1 or numerador < 0 and type(base) is int:
+        return 0
+    return bits * abs(numerador)
+
+
+def _potencia_limitada(potencia: Optional[Any], maximo_bits: int):
+    """Envolve `potencia` (None: `**`) para recusar resultados maiores que `maximo_bits`."""
+    potencia = potencia or operator.pow
+
+    def limitada(base, expoente):
+        # int ** int é o caso comum; floats não crescem
+        if type(base) is int and type(expoente) is int:
+            bits = base.bit_length() * expoente if expoente > 1 else 0
+            # 1 e -1 têm 1 bit e não crescem
+            if bits > maximo_bits and bits > expoente:
+                raise OrcamentoExcedido(
+                    f"potência com cerca de {bits} bits (máximo {maximo_bits})")
+        elif type(base) is not float and type(expoente) is not float:
+            bits = _bits_potencia(base, expoente)
+            if bits > maximo_bits:
+                raise OrcamentoExcedido(
+                    f"potência com cerca de {bits} bits (máximo {maximo_bits})")
+        return potencia(base, expoente)
+    return limitada
+
+
+def _bits_exatos(valor: Any) -> int:
+    """Bits do maior termo de um inteiro ou racional; 0 para os demais tipos."""
+    try:
+        return max(valor.numerator.bit_length(), valor.denominator.bit_length())
+    except AttributeError:
+        return 0
+
+
+def _operacao_limitada(operacao: Any, simbolo: str, maximo_bits: int, inteiros: bool):
+    """Envolve `operacao` para recusar resultados exatos maiores que `maximo_bits`.
+
+    O tamanho é estimado pela soma dos bits dos operandos (o produto dos
+    numeradores e denominadores); com `inteiros` falso, int com int passa
+    sem verificação, pois o resultado não cresce além do maior operando.
+    """
+    def limitada(a, b):
+        # Floats não crescem
+        if type(a) is float or type(b) is float:
+            return operacao(a, b)
+        if inteiros or type(a) is not int or type(b) is not int:
+            bits = _bits_exatos(a) + _bits_exatos(b)
+            if bits > maximo_bits:
+                raise OrcamentoExcedido(
+                    f"resultado de '{simbolo}' com cerca de {bits} bits (máximo {maximo_bits})")
+        return operacao(a, b)
+    return limitada
+
+
+class OrcamentoAvaliacao:
+    """Limites verificados antes do trabalho caro de cada expressão.
+
+    `maximo_bits` limita o tamanho estimado dos resultados exatos
+    (inteiros e racionais) de potências, produtos e, nos backends exatos,
+    das demais operações, antes de calculá-los; `maximo_caracteres`, o texto da
+    expressão; `maximo_profundidade`, o aninhamento de parênteses,
+    chamadas, sinais e expoentes; e `tempo_limite` (em segundos; None
+    desativa), o tempo de cada avaliação. Qualquer limite None é
+    desativado. Violações levantam OrcamentoExcedido, assim como as
+    expressões que esgotam a pilha do Python antes da profundidade máxima.
+
+    O tempo é medido com `signal.setitimer`, então só vale na thread
+    principal de sistemas POSIX, e é armado em toda avaliação quando
+    `tempo_limite` é dado. Um alarme não interrompe uma única operação em
+    C (como uma potência ou um produto gigante), por isso o limite de bits.
+    """
+
+    __slots__ = ('maximo_bits', 'maximo_caracteres', 'maximo_profundidade', 'tempo_limite',
+                 '_backends')
+
+    def __init__(self, maximo_bits: Optional[int] = 1 << 20,
+                 maximo_caracteres: Optional[int] = 100000,
+                 maximo_profundidade: Optional[int] = 256,
+                 tempo_limite: Optional[float] = None):
+        self.maximo_bits = maximo_bits
+        self.maximo_caracteres = maximo_caracteres
+        self.maximo_profundidade = maximo_profundidade
+        self.tempo_limite = tempo_limite
+        self._backends: Dict[BackendNumerico, BackendNumerico] = {}
+
+    def __repr__(self):
+        return (f"OrcamentoAvaliacao(maximo_bits={self.maximo_bits}, "
+                f"maximo_caracteres={self.maximo_caracteres}, "
+                f"maximo_profundidade={self.maximo_profundidade}, "
+                f"tempo_limite={self.tempo_limite})")
+
+    def verificar_tamanho(self, expressao: str):
+        """Levanta OrcamentoExcedido se o texto passa de `maximo_caracteres`."""
+        if self.maximo_caracteres is not None and len(expressao) > self.maximo_caracteres:
+            raise OrcamentoExcedido(f"expressão com {len(expressao)} caracteres "
+                                    f"(máximo {self.maximo_caracteres})")
+
+    def limitar(self, backend: BackendNumerico) -> BackendNumerico:
+        """Cópia de `backend` cuja potência respeita `maximo_bits`."""
+        if self.maximo_bits is None:
+            return backend
+        limitado = self._backends.get(backend)
+        if limitado is None:
+            limitado = BackendNumerico.__new__(BackendNumerico)
+            for campo in BackendNumerico.__slots__:
+                setattr(limitado, campo, getattr(backend, campo))
+            operacoes = dict(backend.operacoes)
+            # Somas e restos de inteiros não crescem; no float, só `*` é verificado
+            simbolos = ('*',) if backend.chave is None else ('*', '//', '%', '+', '-')
+            for simbolo in simbolos:
+                operacoes[simbolo] = _operacao_limitada(
+                    operacoes.get(simbolo, _OPERACOES_BINARIAS[simbolo]), simbolo,
+                    self.maximo_bits, simbolo == '*')
+            operacoes['**'] = _potencia_limitada(backend.operacoes.get('**'), self.maximo_bits)
+            limitado.operacoes = operacoes
+            self._backends[backend] = limitado
+        return limitado
+
+
+def _com_tempo_limite(avaliar, segundos: float):
+    """Envolve `avaliar` com um alarme de `segundos` (sem efeito fora da thread principal)."""
+    import signal
+    if not hasattr(signal, 'setitimer'):
+        return avaliar
+
+    def estourar(sinal, quadro):
+        raise OrcamentoExcedido(f"tempo limite de {segundos:g} s")
+
+    def avaliar_com_tempo(m):
+        try:
+            anterior = signal.signal(signal.SIGALRM, estourar)
+        except ValueError:
+            return avaliar(m)
+        externo = signal.setitimer(signal.ITIMER_REAL, segundos)[0]
+        if externo and externo <= segundos:
+            # Um alarme já armado que vence antes fica como estava
+            signal.setitimer(signal.ITIMER_REAL, externo)
+            signal.signal(signal.SIGALRM, anterior)
+            return avaliar(m)
+        inicio = perf_counter_ns()
+        try:
+            return avaliar(m)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, anterior)
+            if externo:
+                decorrido = (perf_counter_ns() - inicio) / 1e9
+                signal.setitimer(signal.ITIMER_REAL, max(externo - decorrido, 1e-6))
+    return avaliar_com_tempo
+
+
+class ExpressaoCompilada:
+    """Expressão analisada, otimizada e compilada, pronta para avaliação repetida."""
+
+    __slots__ = ('texto', 'arvore', 'avaliar', 'nomes_tabela', 'sombreados', 'variaveis',
+                 'otimizacao', 'funcoes')
+
+    def __init__(self, texto: str, arvore: Optional[tuple], avaliar,
+                 nomes_tabela=frozenset(), sombreados=frozenset(), variaveis=(),
+                 otimizacao: Optional[EstatisticasOtimizacao] = None, funcoes=frozenset()):
+        self.texto = texto
+        self.arvore = arvore
+        self.avaliar = avaliar
+        self.nomes_tabela = nomes_tabela
+        self.sombreados = sombreados
+        self.variaveis = variaveis
+        self.otimizacao = otimizacao
+        # Funções de que a compilação depende, inclusive as embutidas
+        self.funcoes = funcoes
+
+    @classmethod
+    def compilar(cls, texto: str, tabela: Dict[str, Any], memoria: Dict[str, Any],
+                 backend: Optional[BackendNumerico] = None,
+                 memoizacao: Optional[MemoizacaoResultados] = None,
+                 orcamento: Optional[OrcamentoAvaliacao] = None) -> 'ExpressaoCompilada':
+        """Analisa, otimiza e compila o texto; erros são adiados para a avaliação.
+
+        Com um `backend` que tem contexto, a compilação e cada avaliação
+        acontecem dentro dele. Com `memoizacao`, os resultados das
+        subexpressões puras são reaproveitados entre avaliações. Com
+        `orcamento`, a profundidade, as potências e o tempo são limitados.
+        """
+        backend = backend or BACKEND_FLOAT
+        if orcamento is not None:
+            backend = orcamento.limitar(backend)
+        contexto = backend.contexto
+        if contexto is None:
+            compilada = cls._compilar(texto, tabela, memoria, backend, memoizacao, orcamento)
+        else:
+            with contexto():
+                compilada = cls._compilar(texto, tabela, memoria, backend, memoizacao,
+                                          orcamento)
+        avaliar = compilada.avaliar
+        if (orcamento is not None and orcamento.tempo_limite is not None
+                and compilada.arvore is not None):
+            avaliar = _com_tempo_limite(avaliar, orcamento.tempo_limite)
+        if contexto is not None:
+            avaliar_fora = avaliar
+
+            def avaliar_no_contexto(m):
+                with contexto():
+                    return avaliar_fora(m)
+            avaliar = avaliar_no_contexto
+        compilada.avaliar = avaliar
+        return compilada
+
+    @classmethod
+    def _compilar(cls, texto: str, tabela: Dict[str, Any], memoria: Dict[str, Any],
+                  backend: BackendNumerico, memoizacao: Optional[MemoizacaoResultados] = None,
+                  orcamento: Optional[OrcamentoAvaliacao] = None) -> 'ExpressaoCompilada':
+        profundidade = orcamento.maximo_profundidade if orcamento is not None else None
+        try:
+            arvore = analisar_expressao(texto, backend.literal, profundidade)
+            return cls._compilar_arvore(texto, arvore, tabela, memoria, backend, memoizacao)
+        except (ExpressaoInvalida, SyntaxError, OrcamentoExcedido) as erro:
+            return cls(texto, None, _falha(erro))
+        except RecursionError:
+            # A pilha do Python acaba antes de `maximo_profundidade` ou em
+            # cadeias longas (x + x + ...), que não aninham mas aprofundam a árvore
+            return cls(texto, None, _falha(OrcamentoExcedido("expressão profunda demais")))
+
+    @classmethod
+    def _compilar_arvore(cls, texto: str, arvore: tuple, tabela: Dict[str, Any],
+                         memoria: Dict[str, Any], backend: BackendNumerico,
+                         memoizacao: Optional[MemoizacaoResultados]) -> 'ExpressaoCompilada':
+        otimizador = _Otimizador(tabela, memoria, backend)
+        otimizada = otimizador.otimizar(arvore)
+        nos = contar_nos(otimizada)
+        compilador = _Compilador(tabela, memoria, backend.operacoes, backend.puras, memoizacao,
+                                 backend.literal)
+        avaliar = compilador.compilar_raiz(otimizada, nos)
+        otimizacao = EstatisticasOtimizacao(contar_nos(arvore), nos,
+                                            otimizador.dobras, otimizador.identidades)
+        return cls(texto, otimizada, avaliar,
+                   nomes_tabela=frozenset(compilador.nomes_tabela | otimizador.constantes),
+                   sombreados=frozenset(compilador.sombreados),
+                   variaveis=tuple(compilador.variaveis),
+                   otimizacao=otimizacao,
+                   funcoes=frozenset(compilador.funcoes | otimizador.funcoes))
+
+
+def _variaveis_livres(no: tuple, tabela: Dict[str, Any], encontradas: List[str]) -> List[str]:
+    """Acumula, na ordem em que aparecem, os nomes que não estão na tabela."""
+    tipo = no[0]
+    if tipo == NOME:
+        if no[1] not in tabela and no[1] not in encontradas:
+            encontradas.append(no[1])
+    elif tipo == UNARIO:
+        _variaveis_livres(no[2], tabela, encontradas)
+    elif tipo == BINARIO:
+        _variaveis_livres(no[2], tabela, encontradas)
+        _variaveis_livres(no[3], tabela, encontradas)
+    elif tipo == CHAMADA:
+        for argumento in no[2]:
+            _variaveis_livres(argumento, tabela, encontradas)
+    return encontradas
+
+
+def _verificar_aridades(no: tuple, tabela: Dict[str, Any]):
+    """Levanta TypeError se alguma chamada informa argumentos de menos ou demais."""
+    tipo = no[0]
+    if tipo == UNARIO:
+        _verificar_aridades(no[2], tabela)
+    elif tipo == BINARIO:
+        _verificar_aridades(no[2], tabela)
+        _verificar_aridades(no[3], tabela)
+    elif tipo == CHAMADA:
+        nome, argumentos = no[1], no[2]
+        for argumento in argumentos:
+            _verificar_aridades(argumento, tabela)
+        funcao = tabela.get(nome)
+        if isinstance(funcao, FuncaoUsuario):
+            minimo = maximo = len(funcao.parametros)
+        elif callable(funcao):
+            import inspect
+            try:
+                parametros = inspect.signature(funcao).parameters.values()
+            except (TypeError, ValueError):
+                return  # Sem assinatura conhecida: a chamada decide
+            if any(p.kind == p.VAR_POSITIONAL for p in parametros):
+                return
+            posicionais = [p for p in parametros
+                           if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+            maximo = len(posicionais)
+            minimo = sum(1 for p in posicionais if p.default is p.empty)
+        else:
+            return
+        if not minimo <= len(argumentos) <= maximo:
+            faixa = str(maximo) if minimo == maximo else f"de {minimo} a {maximo}"
+            raise TypeError(f"{nome}() recebe {faixa} argumento(s), "
+                            f"{len(argumentos)} informado(s)")
+
+
+# Corpos de funções do usuário com até tantos nós são embutidos em quem chama
+_MAXIMO_NOS_EMBUTIR = 32
+# Níveis de funções do usuário chamando funções do usuário
+_MAXIMO_NIVEIS_FUNCOES = 32
+
+
+def _chamadas(no: tuple, encontradas: Dict[str, None]) -> Dict[str, None]:
+    """Acumula, na ordem em que aparecem, os nomes de funções chamadas."""
+    tipo = no[0]
+    if tipo == UNARIO:
+        _chamadas(no[2], encontradas)
+    elif tipo == BINARIO:
+        _chamadas(no[2], encontradas)
+        _chamadas(no[3], encontradas)
+    elif tipo == CHAMADA:
+        encontradas[no[1]] = None
+        for argumento in no[2]:
+            _chamadas(argumento, encontradas)
+    return encontradas
+
+
+def _usos(no: tuple, usos: Dict[str, int]) -> Dict[str, int]:
+    """Conta quantas vezes cada nome aparece como variável."""
+    tipo = no[0]
+    if tipo == NOME:
+        usos[no[1]] = usos.get(no[1], 0) + 1
+    elif tipo == UNARIO:
+        _usos(no[2], usos)
+    elif tipo == BINARIO:
+        _usos(no[2], usos)
+        _usos(no[3], usos)
+    elif tipo == CHAMADA:
+        for argumento in no[2]:
+            _usos(argumento, usos)
+    return usos
+
+
+def _substituir(no: tuple, valores: Dict[str, tuple], tabela: Optional[Dict[str, Any]]) -> tuple:
+    """Troca os parâmetros por `valores`; com `tabela`, fixa também as constantes dela."""
+    tipo = no[0]
+    if tipo == NOME:
+        nome = no[1]
+        if nome in valores:
+            return valores[nome]
+        if tabela is not None and nome in tabela:
+            valor = tabela[nome]
+            # Fixadas, as constantes do corpo não são sombreadas pela memória de quem chama
+            if not callable(valor) and not isinstance(valor, Exception):
+                return (NUMERO, valor)
+        return no
+    if tipo == UNARIO:
+        return (UNARIO, no[1], _substituir(no[2], valores, tabela))
+    if tipo == BINARIO:
+        return (BINARIO, no[1], _substituir(no[2], valores, tabela),
+                _substituir(no[3], valores, tabela))
+    if tipo == CHAMADA:
+        return (CHAMADA, no[1], tuple(_substituir(argumento, valores, tabela)
+                                      for argumento in no[2]))
+    return no
+
+
+def _sem_efeitos(no: tuple, tabela: Dict[str, Any], puras: frozenset) -> bool:
+    """Se a subárvore só chama funções puras (ou do usuário sem outras chamadas impuras)."""
+    tipo = no[0]
+    if tipo == UNARIO:
+        return _sem_efeitos(no[2], tabela, puras)
+    if tipo == BINARIO:
+        return _sem_efeitos(no[2], tabela, puras) and _sem_efeitos(no[3], tabela, puras)
+    if tipo == CHAMADA:
+        funcao = tabela.get(no[1])
+        if type(funcao) is FuncaoUsuario:
+            if not _sem_efeitos(funcao.arvore(), tabela, puras):
+                return False
+        elif funcao not in puras:
+            return False
+        return all(_sem_efeitos(argumento, tabela, puras) for argumento in no[2])
+    return True
+
+
+def _dependencias(funcao: 'FuncaoUsuario', tabela: Dict[str, Any]) -> set:
+    """Nomes de `funcao` e de todas as funções que ela chama, direta ou indiretamente."""
+    encontradas = {funcao.nome}
+    pendentes = [funcao]
+    while pendentes:
+        for nome in pendentes.pop().chamadas:
+            if nome not in encontradas:
+                encontradas.add(nome)
+                chamada = tabela.get(nome)
+                if type(chamada) is FuncaoUsuario:
+                    pendentes.append(chamada)
+    return encontradas
+
+
+class FuncaoUsuario:
+    """Função definida pelo usuário: `nome(parametros) = corpo`.
+
+    O corpo usa só os parâmetros e os nomes da tabela de funções (outras
+    funções do usuário inclusive, mesmo as ainda não definidas). Na
+    otimização, corpos pequenos são embutidos na árvore de quem chama e
+    dobrados com ela; os maiores são compilados uma vez por tabela de
+    funções (`compilar_para`) e chamados diretamente. Chamada do Python,
+    usa a tabela em que foi registrada.
+    """
+
+    __slots__ = ('nome', 'parametros', 'corpo', 'chamadas', 'usos', 'nos', 'tabela',
+                 '_arvores', '_compiladas')
+
+    def __init__(self, nome: str, parametros: Iterable[str], corpo: str):
+        from keyword import iskeyword
+
+        parametros = tuple(parametros)
+        for identificador in (nome,) + parametros:
+            if not identificador.isidentifier() or iskeyword(identificador):
+                raise ExpressaoInvalida(f"nome inválido: {identificador!r}")
+        if len(set(parametros)) != len(parametros):
+            raise ExpressaoInvalida("parâmetros repetidos")
+        self.nome = nome
+        self.parametros = parametros
+        self.corpo = normalizar_expressao(verificar_expressao(corpo))
+        arvore = analisar_expressao(self.corpo)
+        self.chamadas = tuple(_chamadas(arvore, {}))
+        self.usos = _usos(arvore, {})
+        self.nos = contar_nos(arvore)
+        self.tabela: Dict[str, Any] = {}
+        self._arvores = {None: arvore}
+        self._compiladas: Dict[tuple, Tuple[Any, Any, Any, Any]] = {}
+
+    @property
+    def definicao(self) -> str:
+        """Texto da definição, como digitado no modo interativo."""
+        return f"{self.nome}({', '.join(self.parametros)}) = {self.corpo}"
+
+    def __str__(self):
+        return self.definicao
+
+    def __repr__(self):
+        return f"FuncaoUsuario({self.definicao!r})"
+
+    def __reduce__(self):
+        # Os caches e a tabela não vão para outros processos
+        return (FuncaoUsuario, (self.nome, self.parametros, self.corpo))
+
+    def arvore(self, literal: Optional[Any] = None) -> tuple:
+        """Árvore do corpo com os números lidos por `literal` (como no backend)."""
+        arvore = self._arvores.get(literal)
+        if arvore is None:
+            arvore = self._arvores[literal] = analisar_expressao(self.corpo, literal)
+        return arvore
+
+    def embutir(self, argumentos: Tuple[tuple, ...], tabela: Optional[Dict[str, Any]] = None,
+                literal: Optional[Any] = None) -> tuple:
+        """Árvore do corpo com os parâmetros trocados pelas árvores dos argumentos."""
+        return _substituir(self.arvore(literal), dict(zip(self.parametros, argumentos)), tabela)
+
+    def compilar_para(self, tabela: Dict[str, Any], operacoes: Optional[Dict[str, Any]] = None,
+                      literal: Optional[Any] = None) -> Any:
+        """Função Python que avalia o corpo com `tabela` e `operacoes` (compilada uma vez)."""
+        operacoes = operacoes or None
+        chave = (id(tabela), id(operacoes), literal)
+        versao = getattr(tabela, 'versao', None)
+        entrada = self._compiladas.get(chave)
+        if (entrada is not None and entrada[0] is tabela and entrada[1] is operacoes
+                and entrada[2] == versao):
+            return entrada[3]
+        parametros = self.parametros
+        # Os parâmetros sombreiam as constantes da tabela
+        avaliar = _Compilador(tabela, dict.fromkeys(parametros), operacoes,
+                              literal=literal).compilar(self.arvore(literal))[0]
+        nome, quantidade = self.nome, len(parametros)
+
+        def chamar(*valores):
+            if len(valores) != quantidade:
+                raise TypeError(f"{nome}() recebe {quantidade} argumento(s), "
+                                f"{len(valores)} informado(s)")
+            return avaliar(dict(zip(parametros, valores)))
+        if len(self._compiladas) >= 8:
+            self._compiladas.clear()
+        self._compiladas[chave] = (tabela, operacoes, versao, chamar)
+        return chamar
+
+    def __call__(self, *valores):
+        return self.compilar_para(self.tabela)(*valores)
+
+
+def _verificar_funcoes(tabela: Dict[str, Any]):
+    """Levanta ValueError se as funções do usuário formam um ciclo ou aninham demais.
+
+    Sem condicionais na linguagem, uma recursão nunca terminaria.
+    """
+    funcoes = {nome: valor for nome, valor in tabela.items() if type(valor) is FuncaoUsuario}
+    niveis: Dict[str, int] = {}
+    caminho: List[str] = []
+
+    def visitar(nome: str) -> int:
+        if nome in caminho:
+            ciclo = caminho[caminho.index(nome):] + [nome]
+            raise ValueError(f"definição recursiva: {' -> '.join(ciclo)}")
+        nivel = niveis.get(nome)
+        if nivel is None:
+            funcao = funcoes.get(nome)
+            if funcao is None:
+                return 0
+            caminho.append(nome)
+            nivel = 1 + max([visitar(chamada) for chamada in funcao.chamadas] or [0])
+            caminho.pop()
+            if nivel > _MAXIMO_NIVEIS_FUNCOES:
+                raise ValueError(f"mais de {_MAXIMO_NIVEIS_FUNCOES} níveis de funções do usuário")
+            niveis[nome] = nivel
+        return nivel
+
+    for nome in funcoes:
+        visitar(nome)
+
+
+def expandir_funcoes(no: tuple, tabela: Dict[str, Any], literal: Optional[Any] = None,
+                     constantes: bool = True) -> tuple:
+    """Embute todas as chamadas a funções do usuário (para derivadas e gradientes).
+
+    Com `constantes`, as constantes da tabela usadas nos corpos viram números.
+    """
+    tipo = no[0]
+    if tipo == UNARIO:
+        return (UNARIO, no[1], expandir_funcoes(no[2], tabela, literal, constantes))
+    if tipo == BINARIO:
+        return (BINARIO, no[1], expandir_funcoes(no[2], tabela, literal, constantes),
+                expandir_funcoes(no[3], tabela, literal, constantes))
+    if tipo == CHAMADA:
+        argumentos = tuple(expandir_funcoes(argumento, tabela, literal, constantes)
+                           for argumento in no[2])
+        funcao = tabela.get(no[1])
+        if type(funcao) is FuncaoUsuario and len(argumentos) == len(funcao.parametros):
+            embutida = funcao.embutir(argumentos, tabela if constantes else None, literal)
+            return expandir_funcoes(embutida, tabela, literal, constantes)
+        return (CHAMADA, no[1], argumentos)
+    return no
+
+
+# Precedência dos operadores no texto gerado (maior = liga mais forte)
+_PRECEDENCIA = {'+': 1, '-': 1, '*': 2, '/': 2, '//': 2, '%': 2, '**': 4}
+_PRECEDENCIA_UNARIO = 3
+_PRECEDENCIA_ATOMO = 5
+
+
+class _Formatador:
+    """Converte a árvore de volta em texto com o mínimo de parênteses.
+
+    Os parênteses seguem a precedência (que é a do Python), para que somas
+    longas não aninhem parênteses. Subclasses mudam como números, nomes e
+    funções são escritos.
+    """
+
+    def numero(self, valor: Any) -> Tuple[str, int]:
+        texto = repr(valor) if type(valor) is float else str(valor)
+        # Frações são escritas como divisões
+        if '/' in texto:
+            return texto, _PRECEDENCIA['/']
+        return texto, _PRECEDENCIA_UNARIO if texto[0] == '-' else _PRECEDENCIA_ATOMO
+
+    def nome(self, nome: str) -> str:
+        return nome
+
+    def funcao(self, nome: str) -> str:
+        return nome
+
+    def operacao(self, operador: str) -> Optional[str]:
+        """Função que substitui o operador (None = o próprio operador)."""
+        return None
+
+    def formatar(self, no: tuple) -> Tuple[str, int]:
+        """Retorna (texto, precedência) do nó."""
+        tipo = no[0]
+        if tipo == NUMERO:
+            return self.numero(no[1])
+
+        if tipo == NOME:
+            return self.nome(no[1]), _PRECEDENCIA_ATOMO
+
+        if tipo == UNARIO:
+            operando, precedencia = self.formatar(no[2])
+            if precedencia < _PRECEDENCIA_UNARIO:
+                operando = f'({operando})'
+            return f'{no[1]}{operando}', _PRECEDENCIA_UNARIO
+
+        if tipo == BINARIO:
+            operador = no[1]
+            esquerda, p_esq = self.formatar(no[2])
+            direita, p_dir = self.formatar(no[3])
+            especial = self.operacao(operador)
+            if especial is not None:
+                return f'{especial}({esquerda}, {direita})', _PRECEDENCIA_ATOMO
+            precedencia = _PRECEDENCIA[operador]
+            if operador == '**':
+                # Associativa à direita: a base precisa ser um átomo
+                agrupar_esq = p_esq <= precedencia
+                agrupar_dir = p_dir < _PRECEDENCIA_UNARIO
+            else:
+                agrupar_esq = p_esq < precedencia
+                agrupar_dir = p_dir <= precedencia
+            if agrupar_esq:
+                esquerda = f'({esquerda})'
+            if agrupar_dir:
+                direita = f'({direita})'
+            return f'{esquerda} {operador} {direita}', precedencia
+
+        funcao = self.funcao(no[1])
+        argumentos = ', '.join(self.formatar(argumento)[0] for argumento in no[2])
+        return f'{funcao}({argumentos})', _PRECEDENCIA_ATOMO
+
+
+def formatar_arvore(no: tuple) -> str:
+    """Converte uma árvore sintática em texto que a calculadora analisa de volta."""
+    return _Formatador().formatar(no)[0]
+
+
+class _GeradorModelo(_Formatador):
+    """Gera o código-fonte Python de uma árvore otimizada.
+
+    Parâmetros viram argumentos da função; números simples viram
+    literais, e funções, constantes e variáveis fixas viram globais do
+    código gerado. As subárvores de `repetidas` (chave de estrutura por
+    `id` do nó, como em `_subarvores_puras`) viram variáveis locais,
+    atribuídas (em `atribuicoes`) antes da expressão. Funções do usuário
+    não embutidas viram a compilação do corpo para a tabela.
+    """
+
+    def __init__(self, tabela: Dict[str, Any], parametros: Tuple[str, ...],
+                 fixas: Dict[str, Any], operacoes: Optional[Dict[str, Any]], prefixo: str,
+                 repetidas: Optional[Dict[int, tuple]] = None, literal: Optional[Any] = None):
+        self.tabela = tabela
+        self.literal = literal
+        self.parametros = frozenset(parametros)
+        self.fixas = fixas
+        self.operacoes = operacoes or {}
+        self.prefixo = prefixo
+        self.globais: Dict[str, Any] = {}
+        self._nomes: Dict[int, str] = {}
+        self.repetidas = repetidas or {}
+        self.temporarias: Dict[tuple, str] = {}
+        self.atribuicoes: List[str] = []
+
+    def formatar(self, no: tuple) -> Tuple[str, int]:
+        chave = self.repetidas.get(id(no)) if self.repetidas else None
+        if chave is not None:
+            nome = self.temporarias.get(chave)
+            if nome is None:
+                texto = super().formatar(no)[0]
+                nome = f'{self.prefixo}t{len(self.temporarias)}'
+                self.atribuicoes.append(f'{nome} = {texto}')
+                self.temporarias[chave] = nome
+            return nome, _PRECEDENCIA_ATOMO
+        return super().formatar(no)
+
+    def global_(self, valor: Any) -> str:
+        """Nome global do código gerado que se refere a `valor`."""
+        nome = self._nomes.get(id(valor))
+        if nome is None:
+            nome = f'{self.prefixo}{len(self.globais)}'
+            self.globais[nome] = valor
+            self._nomes[id(valor)] = nome
+        return nome
+
+    def numero(self, valor: Any) -> Tuple[str, int]:
+        if type(valor) is int or type(valor) is float and math.isfinite(valor):
+            texto = repr(valor)
+            return texto, _PRECEDENCIA_UNARIO if texto[0] == '-' else _PRECEDENCIA_ATOMO
+        return self.global_(valor), _PRECEDENCIA_ATOMO
+
+    def nome(self, nome: str) -> str:
+        if nome in self.parametros:
+            return nome
+        if nome in self.fixas:
+            return self.global_(self.fixas[nome])
+        if nome not in self.tabela:
+            raise NameError(f"name '{nome}' is not defined")
+        valor = self.tabela[nome]
+        if isinstance(valor, Exception):
+            raise valor
+        return self.global_(valor)
+
+    def funcao(self, nome: str) -> str:
+        if nome not in self.tabela:
+            raise NameError(f"name '{nome}' is not defined")
+        funcao = self.tabela[nome]
+        if type(funcao) is FuncaoUsuario:
+            funcao = funcao.compilar_para(self.tabela, self.operacoes, self.literal)
+        return self.global_(funcao)
+
+    def operacao(self, operador: str) -> Optional[str]:
+        especial = self.operacoes.get(operador)
+        return None if especial is None else self.global_(especial)
+
+
+def _prefixo_livre(parametros: Tuple[str, ...]) -> str:
+    """Prefixo de nomes auxiliares que não colide com nenhum parâmetro."""
+    prefixo = '_g'
+    while any(nome.startswith(prefixo) for nome in parametros):
+        prefixo = '_' + prefixo
+    return prefixo
+
+
+def _montar_funcao(texto: str, parametros: Tuple[str, ...], expressao: str,
+                   gerador: _GeradorModelo, backend: BackendNumerico) -> Any:
+    """Compila `def modelo(parametros): return expressao` com os globais do gerador.
+
+    Os argumentos são convertidos para o backend, a expressão é avaliada
+    no contexto dele e exceções viram a mensagem de erro, como em `calcular`.
+    """
+    prefixo = gerador.prefixo
+    erro = gerador.global_(_mensagem_erro)
+    linhas = [f"def modelo({', '.join(parametros)}):", "    try:"]
+    recuo = "        "
+    if backend.contexto is not None:
+        linhas.append(f"{recuo}with {gerador.global_(backend.contexto)}():")
+        recuo += "    "
+    if backend.converter is not None:
+        converter = gerador.global_(backend.converter)
+        linhas.extend(f"{recuo}{nome} = {converter}({nome})" for nome in parametros)
+    linhas.extend(f"{recuo}{atribuicao}" for atribuicao in gerador.atribuicoes)
+    linhas += [f"{recuo}return {expressao}",
+               f"    except Exception as {prefixo}e:",
+               f"        return {erro}({prefixo}e)"]
+    namespace = dict(gerador.globais)
+    exec(compile('\n'.join(linhas), f'<modelo {texto}>', 'exec'), namespace)
+    return namespace['modelo']
+
+
+def _gerar_modelo(texto: str, arvore: tuple, tabela: Dict[str, Any], parametros: Tuple[str, ...],
+                  fixas: Dict[str, Any], backend: BackendNumerico) -> Any:
+    """Compila a árvore em uma função Python com os parâmetros dados.
+
+    A função retorna o valor ou a mensagem de erro, como `calcular`. Se o
+    Python não conseguir compilar o código gerado (expressões muito
+    profundas), as closures de `_Compilador` são usadas no corpo.
+    """
+    otimizada = _Otimizador(tabela, dict.fromkeys((*parametros, *fixas)), backend).otimizar(arvore)
+    try:
+        contagem, chaves = _subarvores_puras(otimizada, tabela, backend.puras)
+        repetidas = {identificador: chave for identificador, chave in chaves.items()
+                     if contagem[chave] > 1}
+    except RecursionError:
+        repetidas = {}
+    gerador = _GeradorModelo(tabela, parametros, fixas, backend.operacoes,
+                             _prefixo_livre(parametros), repetidas, backend.literal)
+    try:
+        return _montar_funcao(texto, parametros, gerador.formatar(otimizada)[0], gerador, backend)
+    except (SyntaxError, RecursionError, MemoryError):
+        gerador.atribuicoes.clear()
+        nomes = dict(fixas, **dict.fromkeys(parametros, None))
+        avaliar = _Compilador(tabela, nomes, backend.operacoes,
+                              literal=backend.literal).compilar(otimizada)[0]
+        valores = ', '.join(f'{nome}={nome}' for nome in parametros)
+        expressao = f'{gerador.global_(avaliar)}(dict({gerador.global_(fixas)}, {valores}))'
+        return _montar_funcao(texto, parametros, expressao, gerador, backend)
+
+
+_numpy_carregado: Any = False
+
+
+def _numpy() -> Any:
+    """Importa o NumPy sob demanda; retorna None se ele não estiver instalado."""
+    global _numpy_carregado
+    if _numpy_carregado is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy_carregado = numpy
+    return _numpy_carregado
+
+
+def _tabela_vetorial(tabela: Dict[str, Any], np: Any) -> Dict[str, Any]:
+    """Espelha a tabela de funções com os ufuncs equivalentes do NumPy."""
+    def log(x, base=None):
+        # np.log interpretaria a base como o array de saída
+        return np.log(x) if base is None else np.log(x) / np.log(base)
+
+    equivalentes = {
+        math.sin: np.sin, math.cos: np.cos, math.tan: np.tan,
+        math.asin: np.arcsin, math.acos: np.arccos, math.atan: np.arctan,
+        math.sqrt: np.sqrt, math.log10: np.log10, math.log: log,
+        math.exp: np.exp, abs: np.abs, round: np.round,
+        math.floor: np.floor, math.ceil: np.ceil,
+    }
+    vetorial = {}
+    for nome, valor in tabela.items():
+        if type(valor) is FuncaoUsuario:
+            # O corpo é compilado com a própria tabela vetorial
+            vetorial[nome] = valor
+        elif callable(valor):
+            ufunc = equivalentes.get(valor)
+            vetorial[nome] = ufunc if ufunc is not None else np.vectorize(valor, otypes=[float])
+        else:
+            vetorial[nome] = valor
+    return vetorial
+
+
+def _mensagem_erro(erro: Exception) -> str:
+    """Converte uma exceção de avaliação na mensagem de erro da calculadora."""
+    if isinstance(erro, ExpressaoInvalida):
+        return f"Erro: Expressão inválida ou não permitida - {str(erro)}"
+    if isinstance(erro, OrcamentoExcedido):
+        return f"Erro: Limite excedido - {str(erro)}"
+    if isinstance(erro, ZeroDivisionError):
+        return "Erro: Divisão por zero"
+    if type(erro).__module__ == 'decimal':
+        return f"Erro: Operação decimal inválida - {type(erro).__name__}"
+    if isinstance(erro, ValueError):
+        return f"Erro: Valor inválido - {str(erro)}"
+    if isinstance(erro, SyntaxError):
+        # As mensagens do analisador trazem a posição do problema
+        return f"Erro: Sintaxe inválida - {erro.msg}" if erro.msg else "Erro: Sintaxe inválida"
+    return f"Erro: {str(erro)}"
+
+
+# Unidades por categoria: nome -> escala ou (escala, deslocamento) em relação
+# à unidade base da categoria (base = valor * escala + deslocamento). Os
+# números ficam em texto para que os fatores sejam calculados com racionais
+# exatos e arredondados uma única vez.
+_UNIDADES = {
+    'comprimento': {   # metro
+        'm': '1', 'km': '1000', 'cm': '0.01', 'mm': '0.001', 'um': '0.000001',
+        'nm': '0.000000001', 'mi': '1609.34', 'yd': '0.9144', 'ft': '0.3048',
+        'in': '0.0254', 'nmi': '1852',
+    },
+    'peso': {          # quilograma
+        'kg': '1', 'g': '0.001', 'mg': '0.000001', 't': '1000', 'lb': '0.453592',
+        'oz': '0.0283495', 'st': '6.35029318',
+    },
+    'temperatura': {   # grau Celsius
+        'celsius': '1', 'fahrenheit': ('5/9', '-160/9'), 'kelvin': ('1', '-273.15'),
+        'rankine': ('5/9', '-273.15'),
+    },
+    'tempo': {         # segundo
+        'ns': '0.000000001', 'us': '0.000001', 'ms': '0.001', 's': '1', 'min': '60',
+        'h': '3600', 'd': '86400', 'sem': '604800', 'ano': '31557600',
+    },
+    'dados': {         # byte
+        'b': '1/8', 'B': '1', 'kB': str(10 ** 3), 'MB': str(10 ** 6), 'GB': str(10 ** 9),
+        'TB': str(10 ** 12), 'KiB': str(2 ** 10), 'MiB': str(2 ** 20), 'GiB': str(2 ** 30),
+        'TiB': str(2 ** 40),
+    },
+    'area': {          # metro quadrado
+        'm2': '1', 'cm2': '0.0001', 'km2': '1000000', 'ha': '10000',
+        'acre': '4046.8564224', 'ft2': '0.09290304',
+    },
+    'volume': {        # litro
+        'l': '1', 'ml': '0.001', 'cm3': '0.001', 'm3': '1000', 'gal': '3.785411784',
+    },
+    'velocidade': {    # metro por segundo
+        'm/s': '1', 'km/h': '5/18', 'mph': '0.44704', 'kn': '463/900',
+    },
+    'angulo': {        # radiano
+        'rad': '1', 'grau': repr(math.pi / 180), 'volta': repr(2 * math.pi),
+    },
+}
+
+_SINONIMOS_UNIDADES = {'°C': 'celsius', '°F': 'fahrenheit', 'K': 'kelvin'}
+
+
+def _racional(texto: str) -> Tuple[int, int]:
+    """Converte '1609.34' ou '5/9' em (numerador, denominador) exatos."""
+    if '/' in texto:
+        numerador, denominador = texto.split('/')
+        return int(numerador), int(denominador)
+    inteiro, _, fracao = texto.partition('.')
+    return int(inteiro + fracao), 10 ** len(fracao)
+
+
+def _montar_conversoes() -> Dict[Tuple[str, str], Tuple[float, float]]:
+    """Pré-calcula (fator, deslocamento) para cada par de unidades da mesma categoria."""
+    conversoes = {}
+    for tabela in _UNIDADES.values():
+        racionais = {}
+        for unidade, definicao in tabela.items():
+            escala, deslocamento = definicao if isinstance(definicao, tuple) else (definicao, '0')
+            racionais[unidade] = _racional(escala) + _racional(deslocamento)
+        for sinonimo, unidade in _SINONIMOS_UNIDADES.items():
+            if unidade in racionais:
+                racionais[sinonimo] = racionais[unidade]
+        for de, (n1, d1, p1, q1) in racionais.items():
+            for para, (n2, d2, p2, q2) in racionais.items():
+                # para = (valor * n1/d1 + p1/q1 - p2/q2) * d2/n2, com uma divisão só
+                conversoes[(de, para)] = ((n1 * d2) / (d1 * n2),
+                                          ((p1 * q2 - p2 * q1) * d2) / (q1 * q2 * n2))
+    return conversoes
+
+
+_CONVERSOES = _montar_conversoes()
+
+
+class HistoricoCircular:
+    """Histórico de capacidade fixa armazenado em buffer circular.
+
+    Os campos ficam em vetores paralelos pré-alocados e o instante é
+    guardado como número (segundos desde a época); adicionar é O(1) e não
+    aloca registros. Capacidade 0 desativa o histórico.
+    """
+
+    __slots__ = ('capacidade', '_expressoes', '_resultados', '_instantes',
+                 '_proximo', '_tamanho')
+
+    def __init__(self, capacidade: int = 50):
+        self.capacidade = max(0, capacidade)
+        self._expressoes: List[Optional[str]] = [None] * self.capacidade
+        self._resultados: List[Any] = [None] * self.capacidade
+        self._instantes = array('d', bytes(8 * self.capacidade))
+        self._proximo = 0
+        self._tamanho = 0
+
+    def adicionar(self, expressao: str, resultado: Any, instante: Optional[float] = None):
+        """Adiciona um cálculo, sobrescrevendo o mais antigo se estiver cheio."""
+        capacidade = self.capacidade
+        if not capacidade:
+            return
+        posicao = self._proximo
+        self._expressoes[posicao] = expressao
+        self._resultados[posicao] = resultado
+        self._instantes[posicao] = time() if instante is None else instante
+        posicao += 1
+        self._proximo = posicao if posicao < capacidade else 0
+        if self._tamanho < capacidade:
+            self._tamanho += 1
+
+    def _posicao(self, indice: int) -> int:
+        """Converte um índice lógico (0 = mais antigo) em posição no buffer."""
+        return (self._proximo - self._tamanho + indice) % self.capacidade
+
+    def _registro(self, indice: int) -> RegistroHistorico:
+        posicao = self._posicao(indice)
+        return RegistroHistorico(self._expressoes[posicao], self._resultados[posicao],
+                                 self._instantes[posicao])
+
+    def __len__(self) -> int:
+        return self._tamanho
+
+    def __iter__(self) -> Iterator[RegistroHistorico]:
+        for indice in range(self._tamanho):
+            yield self._registro(indice)
+
+    def __getitem__(self, indice: Any) -> Any:
+        if isinstance(indice, slice):
+            return [self._registro(i) for i in range(*indice.indices(self._tamanho))]
+        if indice < 0:
+            indice += self._tamanho
+        if not 0 <= indice < self._tamanho:
+            raise IndexError("índice fora do histórico")
+        return self._registro(indice)
+
+    def registros(self, inicio: int = 0, fim: Optional[int] = None) -> List[RegistroHistorico]:
+        """Retorna os registros com índice em [inicio, fim)."""
+        return self[inicio:fim]
+
+    def ultimos(self, quantidade: int) -> List[RegistroHistorico]:
+        """Retorna os `quantidade` registros mais recentes, do mais antigo ao mais novo."""
+        return self[max(0, self._tamanho - quantidade):]
+
+    def clear(self):
+        """Remove todos os registros."""
+        for posicao in range(self.capacidade):
+            self._expressoes[posicao] = None
+            self._resultados[posicao] = None
+        self._proximo = 0
+        self._tamanho = 0
+
+
+class PlanilhaReativa:
+    """Definições de variáveis ligadas por um grafo de dependências.
+
+    Cada variável guarda a expressão que a define (já compilada); quando
+    uma definição muda, só as variáveis que dependem dela, direta ou
+    indiretamente, são recalculadas, em ordem topológica. Definições que
+    formariam um ciclo são recusadas. Os valores ficam na memória da
+    calculadora; uma variável cujo cálculo falha sai da memória e sua
+    mensagem de erro fica em `erros`.
+    """
+
+    def __init__(self, calculadora: 'CalculadoraOtimizada'):
+        self.calculadora = calculadora
+        self.definicoes: Dict[str, ExpressaoCompilada] = {}
+        self.dependencias: Dict[str, Tuple[str, ...]] = {}
+        self.dependentes: Dict[str, Dict[str, None]] = {}
+        self.erros: Dict[str, str] = {}
+        self.recalculadas: List[str] = []
+        self._versao = calculadora.funcoes_disponiveis.versao
+
+    def __len__(self) -> int:
+        return len(self.definicoes)
+
+    def __contains__(self, var: str) -> bool:
+        return var in self.definicoes
+
+    def expressao(self, var: str) -> str:
+        """Retorna o texto da definição de `var`."""
+        return self.definicoes[var].texto
+
+    def definir(self, var: str, expressao: str) -> Any:
+        """Define `var` e recalcula seus dependentes; retorna o valor ou o erro."""
+        if var in self.calculadora.funcoes_disponiveis:
+            return f"Erro: Nome reservado - '{var}' é uma função ou constante"
+        self._verificar_tabela()
+        compilada = self.calculadora.compilar_expressao(expressao)
+        if compilada.arvore is None:
+            return self._avaliar(compilada)[1]
+        ciclo = self._caminho(compilada.variaveis, var)
+        if ciclo is not None:
+            return "Erro: Dependência circular - " + " -> ".join([var] + ciclo)
+        self._ligar(var, compilada)
+        return self._propagar(var)
+
+    def alterar(self, var: str, valor: Any) -> Any:
+        """Atribui um valor numérico a `var` sem compilar texto (varreduras)."""
+        if var in self.calculadora.funcoes_disponiveis:
+            return f"Erro: Nome reservado - '{var}' é uma função ou constante"
+        converter = self.calculadora.backend.converter
+        if converter is not None:
+            valor = converter(valor)
+        self._verificar_tabela()
+        self._ligar(var, ExpressaoCompilada(str(valor), (NUMERO, valor), _constante(valor)))
+        return self._propagar(var)
+
+    def remover(self, var: str):
+        """Remove a definição e o valor de `var` e recalcula seus dependentes."""
+        if var not in self.definicoes:
+            raise KeyError(var)
+        self._desligar(var)
+        del self.definicoes[var]
+        self.erros.pop(var, None)
+        self.calculadora.memoria.pop(var, None)
+        self._propagar(var, incluir_origem=False)
+
+    def _caminho(self, origens: Iterable[str], destino: str) -> Optional[List[str]]:
+        """Retorna um caminho de dependências de `origens` até `destino`, se houver."""
+        anteriores: Dict[str, Optional[str]] = {}
+        pendentes = []
+        for origem in origens:
+            if origem not in anteriores:
+                anteriores[origem] = None
+                pendentes.append(origem)
+        while pendentes:
+            nome = pendentes.pop()
+            if nome == destino:
+                caminho = []
+                while nome is not None:
+                    caminho.append(nome)
+                    nome = anteriores[nome]
+                return caminho[::-1]
+            for dependencia in self.dependencias.get(nome, ()):
+                if dependencia not in anteriores:
+                    anteriores[dependencia] = nome
+                    pendentes.append(dependencia)
+        return None
+
+    def _ligar(self, var: str, compilada: ExpressaoCompilada):
+        """Substitui a definição de `var` e atualiza as arestas do grafo."""
+        self._desligar(var)
+        self.definicoes[var] = compilada
+        self.dependencias[var] = compilada.variaveis
+        for dependencia in compilada.variaveis:
+            self.dependentes.setdefault(dependencia, {})[var] = None
+
+    def _desligar(self, var: str):
+        for dependencia in self.dependencias.pop(var, ()):
+            dependentes = self.dependentes.get(dependencia)
+            if dependentes is not None:
+                dependentes.pop(var, None)
+                if not dependentes:
+                    del self.dependentes[dependencia]
+
+    def _verificar_tabela(self):
+        """Recompila todas as definições se a tabela de funções mudou."""
+        versao = self.calculadora.funcoes_disponiveis.versao
+        if versao == self._versao:
+            return
+        self._versao = versao
+        for var, compilada in list(self.definicoes.items()):
+            self._ligar(var, self.calculadora.compilar_expressao(compilada.texto))
+        self._recalcular(dict.fromkeys(self.definicoes))
+
+    def _funcao_alterada(self, nome: str):
+        """Recompila e recalcula só as definições que chamam `nome`, direta ou indiretamente."""
+        tabela = self.calculadora.funcoes_disponiveis
+        if self._versao is None:
+            # A tabela já tinha mudado por outro caminho: recompila tudo
+            self._verificar_tabela()
+            return
+        self._versao = tabela.versao
+        chamadoras: Dict[str, None] = {}
+        for var, compilada in self.definicoes.items():
+            for chamada in compilada.funcoes:
+                funcao = tabela.get(chamada)
+                if chamada == nome or (type(funcao) is FuncaoUsuario
+                                       and nome in _dependencias(funcao, tabela)):
+                    chamadoras[var] = None
+                    break
+        afetados: Dict[str, None] = {}
+        for var in chamadoras:
+            self._ligar(var, self.calculadora.compilar_expressao(self.definicoes[var].texto))
+            afetados[var] = None
+            afetados.update(self._afetados(var))
+        self._recalcular(afetados)
+
+    def _avaliar(self, compilada: ExpressaoCompilada) -> Tuple[Any, Optional[str]]:
+        """Retorna (valor, None) ou (None, mensagem de erro)."""
+        try:
+            valor = compilada.avaliar(self.calculadora.memoria)
+        except Exception as e:
+            return None, _mensagem_erro(e)
+        if not isinstance(valor, self.calculadora.backend.tipos):
+            return None, _mensagem_erro(ValueError("resultado não numérico"))
+        return valor, None
+
+    def _atualizar(self, var: str) -> Any:
+        """Recalcula `var` e grava o valor na memória (ou o erro em `erros`)."""
+        valor, erro = self._avaliar(self.definicoes[var])
+        if erro is None:
+            self.calculadora.memoria[var] = valor
+            self.erros.pop(var, None)
+            return valor
+        self.calculadora.memoria.pop(var, None)
+        self.erros[var] = erro
+        return erro
+
+    def _afetados(self, origem: str) -> Dict[str, None]:
+        """Coleta os dependentes diretos e indiretos de `origem`."""
+        afetados: Dict[str, None] = {}
+        pendentes = [origem]
+        while pendentes:
+            for dependente in self.dependentes.get(pendentes.pop(), ()):
+                if dependente not in afetados:
+                    afetados[dependente] = None
+                    pendentes.append(dependente)
+        return afetados
+
+    def _ordenar(self, afetados: Dict[str, None]) -> List[str]:
+        """Ordena `afetados` topologicamente (algoritmo de Kahn)."""
+        graus = {var: sum(1 for dependencia in self.dependencias[var] if dependencia in afetados)
+                 for var in afetados}
+        prontos = deque(var for var, grau in graus.items() if not grau)
+        ordem = []
+        while prontos:
+            var = prontos.popleft()
+            ordem.append(var)
+            for dependente in self.dependentes.get(var, ()):
+                if dependente in graus:
+                    graus[dependente] -= 1
+                    if not graus[dependente]:
+                        prontos.append(dependente)
+        return ordem
+
+    def _recalcular(self, afetados: Dict[str, None]):
+        ordem = self._ordenar(afetados)
+        for var in ordem:
+            self._atualizar(var)
+        if len(ordem) < len(afetados):
+            # Só acontece se a tabela de funções mudou e transformou uma
+            # constante em variável, fechando um ciclo
+            for var in afetados.keys() - set(ordem):
+                self.calculadora.memoria.pop(var, None)
+                self.erros[var] = "Erro: Dependência circular"
+        self.recalculadas = ordem
+
+    def _propagar(self, origem: str, incluir_origem: bool = True) -> Any:
+        """Recalcula `origem` e, em ordem topológica, tudo o que depende dela."""
+        resultado = self._atualizar(origem) if incluir_origem else None
+        self._recalcular(self._afetados(origem))
+        return resultado
+
+
+class _Fase:
+    """Contagem e tempos (em nanossegundos) de uma fase do cálculo."""
+
+    __slots__ = ('contagem', 'total', 'maximo')
+
+    def __init__(self):
+        self.contagem = 0
+        self.total = 0
+        self.maximo = 0
+
+    def registrar(self, duracao: int):
+        self.contagem += 1
+        self.total += duracao
+        if duracao > self.maximo:
+            self.maximo = duracao
+
+
+def _rotulo_prometheus(texto: str) -> str:
+    return texto.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentacao:
+    """Métricas de `calcular` e `avaliar`: fases, erros e expressões mais lentas.
+
+    As fases são `compilar` (cache, análise e compilação), `avaliar` e
+    `historico`; `total` cobre a chamada inteira, inclusive as que falham.
+    Só é usada quando ativada na calculadora (veja `ativar_instrumentacao`).
+    """
+
+    FASES = ('compilar', 'avaliar', 'historico', 'total')
+
+    def __init__(self, cache: CacheExpressoes, limite_lentas: int = 10):
+        self.cache = cache
+        self.limite_lentas = limite_lentas
+        self.zerar()
+
+    def zerar(self):
+        """Descarta as métricas acumuladas."""
+        self.fases = {fase: _Fase() for fase in self.FASES}
+        self.erros: Dict[str, int] = {}
+        self._lentas: Dict[str, int] = {}
+        self._limiar = -1
+        self._acertos_iniciais = self.cache.acertos
+        self._falhas_iniciais = self.cache.falhas
+
+    def registrar_lenta(self, expressao: str, duracao: int):
+        """Mantém a maior duração das `limite_lentas` expressões mais lentas."""
+        # Caminho comum: mais rápida que a mais lenta guardada, nada a fazer
+        if duracao <= self._limiar or not self.limite_lentas:
+            return
+        lentas = self._lentas
+        if duracao > lentas.get(expressao, -1):
+            lentas[expressao] = duracao
+            if len(lentas) > self.limite_lentas:
+                del lentas[min(lentas, key=lentas.get)]
+        if len(lentas) >= self.limite_lentas:
+            self._limiar = min(lentas.values())
+
+    def registrar_erro(self, erro: Exception):
+        nome = type(erro).__name__
+        self.erros[nome] = self.erros.get(nome, 0) + 1
+
+    def instantaneo(self) -> Dict[str, Any]:
+        """Retorna uma cópia das métricas em estruturas simples (para JSON)."""
+        acertos = self.cache.acertos - self._acertos_iniciais
+        falhas = self.cache.falhas - self._falhas_iniciais
+        consultas = acertos + falhas
+        return {
+            'chamadas': self.fases['total'].contagem,
+            'fases': {
+                nome: {
+                    'contagem': fase.contagem,
+                    'total_s': fase.total / 1e9,
+                    'media_us': fase.total / fase.contagem / 1e3 if fase.contagem else 0.0,
+                    'maximo_us': fase.maximo / 1e3,
+                }
+                for nome, fase in self.fases.items()
+            },
+            'cache': {
+                'acertos': acertos,
+                'falhas': falhas,
+                'taxa_acerto': acertos / consultas if consultas else 0.0,
+                'tamanho': len(self.cache),
+            },
+            'erros': dict(self.erros),
+            'mais_lentas': [{'expressao': expressao, 'duracao_us': duracao / 1e3}
+                            for expressao, duracao in sorted(self._lentas.items(),
+                                                             key=lambda item: -item[1])],
+        }
+
+    def prometheus(self, prefixo: str = 'calculadora') -> str:
+        """Formata as métricas no formato de texto de exposição do Prometheus."""
+        dados = self.instantaneo()
+        linhas = []
+
+        def metrica(nome, tipo, ajuda, amostras):
+            linhas.append(f"# HELP {prefixo}_{nome} {ajuda}")
+            linhas.append(f"# TYPE {prefixo}_{nome} {tipo}")
+            for rotulos, valor in amostras:
+                linhas.append(f"{prefixo}_{nome}{rotulos} {valor}")
+
+        metrica('chamadas_total', 'counter', "Expressões calculadas.",
+                [('', dados['chamadas'])])
+        metrica('fase_chamadas_total', 'counter', "Execuções de cada fase.",
+                [(f'{{fase="{nome}"}}', fase['contagem']) for nome, fase in dados['fases'].items()])
+        metrica('fase_segundos_total', 'counter', "Tempo acumulado em cada fase.",
+                [(f'{{fase="{nome}"}}', repr(fase['total_s']))
+                 for nome, fase in dados['fases'].items()])
+        metrica('erros_total', 'counter', "Erros por tipo de exceção.",
+                [(f'{{tipo="{tipo}"}}', quantidade) for tipo, quantidade in dados['erros'].items()])
+        metrica('cache_acertos_total', 'counter', "Acertos do cache de expressões.",
+                [('', dados['cache']['acertos'])])
+        metrica('cache_falhas_total', 'counter', "Falhas do cache de expressões.",
+                [('', dados['cache']['falhas'])])
+        metrica('cache_tamanho', 'gauge', "Expressões compiladas no cache.",
+                [('', dados['cache']['tamanho'])])
+        metrica('expressao_lenta_segundos', 'gauge', "Expressões mais lentas observadas.",
+                [(f'{{expressao="{_rotulo_prometheus(lenta["expressao"])}"}}',
+                  repr(lenta['duracao_us'] / 1e6)) for lenta in dados['mais_lentas']])
+        return "\n".join(linhas) + "\n"
+
 
 class CalculadoraOtimizada:
     """Classe principal da calculadora com funcionalidades avançadas."""
     
-    def __init__(self):
-        """Inicializa a calculadora com configurações padrão."""
-        self.historico: List[Dict[str, Any]] = []
+    def __init__(self, tamanho_cache: int = 1024, capacidade_historico: int = 50,
+                 diretorio_dados: Optional[str] = None, reativo: bool = False,
+                 instrumentar: bool = False, numerico: str = 'float',
+                 precisao: Optional[int] = None):
+        """Inicializa a calculadora com configurações padrão.
+
+        `capacidade_historico` limita o histórico (0 o desativa) e
+        `tamanho_cache` limita o cache de expressões compiladas. Com
+        `diretorio_dados`, o histórico e a memória persistem em disco
+        (veja `armazenamento.ArmazenamentoPersistente`). Com `reativo`,
+        as atribuições viram definições de uma `PlanilhaReativa`. Com
+        `instrumentar`, `calcular` e `avaliar` coletam métricas (veja
+        `ativar_instrumentacao`). `numerico` e `precisao` escolhem o backend
+        numérico (veja `usar_numerico`).
+        """
+        self.historico = HistoricoCircular(capacidade_historico)
         self.memoria: Dict[str, float] = {}
+        self.armazenamento = None
+        if diretorio_dados is not None:
+            from armazenamento import ArmazenamentoPersistente
+            self.armazenamento = ArmazenamentoPersistente(diretorio_dados)
+            self.memoria.update(self.armazenamento.carregar_memoria())
+        self.cache_expressoes = CacheExpressoes(tamanho_cache)
+        self.memoizacao: Optional[MemoizacaoResultados] = None
+        self._versao_cache = 0
+        self._executor = None
+        self._configuracao_executor = None
+        self.backend = BACKEND_FLOAT
+        self._tabela_backend: Tuple[Any, Dict[str, Any]] = (None, {})
+        self.orcamento: Optional[OrcamentoAvaliacao] = OrcamentoAvaliacao()
         self.funcoes_disponiveis = {
             'sin': math.sin,
             'cos': math.cos,
@@ -39,10 +2272,161 @@ class CalculadoraOtimizada:
             'pi': math.pi,
             'e': math.e
         }
-        
+        if self.armazenamento is not None:
+            self._carregar_funcoes(self.armazenamento.carregar_funcoes())
+        self.planilha = PlanilhaReativa(self) if reativo else None
+        self.instrumentacao: Optional[Instrumentacao] = None
+        if instrumentar:
+            self.ativar_instrumentacao()
+        if numerico != 'float' or precisao is not None:
+            self.usar_numerico(numerico, precisao)
+
+    def nova_sessao(self) -> 'CalculadoraOtimizada':
+        """Cria uma calculadora com memória e histórico próprios.
+
+        A nova instância compartilha a tabela de funções e o cache de
+        expressões compiladas com esta, então expressões já compiladas por
+        uma sessão servem às outras.
+        """
+        sessao = CalculadoraOtimizada(0, self.historico.capacidade)
+        sessao._funcoes = self._funcoes
+        sessao.cache_expressoes = self.cache_expressoes
+        sessao.memoizacao = self.memoizacao
+        sessao._versao_cache = self._versao_cache
+        sessao.backend = self.backend
+        sessao.orcamento = self.orcamento
+        return sessao
+
+    def definir_orcamento(self, orcamento: Optional[OrcamentoAvaliacao]) -> Optional[OrcamentoAvaliacao]:
+        """Troca os limites das avaliações (None desativa todos) e retorna-os.
+
+        Os limites são fixados na compilação, então o cache de expressões
+        é limpo. Por padrão, `OrcamentoAvaliacao()`: potências e tamanho
+        limitados, sem tempo limite.
+        """
+        self.orcamento = orcamento
+        self.cache_expressoes.limpar()
+        if self.planilha is not None:
+            self.planilha._versao = None
+        return orcamento
+
+    def usar_numerico(self, nome: str, precisao: Optional[int] = None) -> BackendNumerico:
+        """Troca o backend numérico e retorna-o.
+
+        `float` (padrão), `decimal` (precisão configurável, em dígitos
+        significativos), `fracao` (racionais exatos) ou `mpmath` (se
+        instalado). Cada backend tem sua tabela de funções e suas
+        compilações no cache; os valores da memória são convertidos.
+        """
+        if nome == 'float' and precisao is None:
+            backend = BACKEND_FLOAT
+        else:
+            from numerico import criar_backend
+            backend = criar_backend(nome, precisao)
+        self.backend = backend
+        if self.memoizacao is not None:
+            self.memoizacao.limpar()
+        if backend.converter is not None:
+            for var, valor in list(self.memoria.items()):
+                self.memoria[var] = backend.converter(valor)
+        if self.planilha is not None:
+            # Força a recompilação das definições no novo backend
+            self.planilha._versao = None
+        return backend
+
+    def _tabela_numerica(self) -> Dict[str, Any]:
+        """Tabela de funções do backend atual, derivada de `funcoes_disponiveis`."""
+        backend, funcoes = self.backend, self._funcoes
+        if backend.adaptar is None:
+            return funcoes
+        versao = (backend, funcoes, funcoes.versao)
+        anterior, tabela = self._tabela_backend
+        if anterior != versao:
+            tabela = backend.adaptar(funcoes)
+            self._tabela_backend = (versao, tabela)
+        return tabela
+
+    @property
+    def funcoes_disponiveis(self) -> Dict[str, Any]:
+        """Tabela de funções e constantes disponíveis nas expressões."""
+        return self._funcoes
+
+    @funcoes_disponiveis.setter
+    def funcoes_disponiveis(self, funcoes: Dict[str, Any]):
+        self._funcoes = _TabelaFuncoes(funcoes)
+        self._versao_cache = 0
+        self.cache_expressoes.limpar()
+
+    @property
+    def funcoes_usuario(self) -> Dict[str, FuncaoUsuario]:
+        """Funções definidas pelo usuário, por nome."""
+        return {nome: valor for nome, valor in self._funcoes.items()
+                if type(valor) is FuncaoUsuario}
+
+    def definir_funcao(self, nome: str, parametros: Iterable[str], corpo: str) -> FuncaoUsuario:
+        """Define (ou redefine) a função do usuário `nome(parametros) = corpo`.
+
+        O corpo só pode usar os parâmetros e os nomes da tabela; funções
+        ainda não definidas falham na avaliação. Recursões (diretas ou
+        indiretas) e cadeias longas demais são recusadas com ValueError,
+        e só as expressões em cache que chamam `nome` são descartadas; no
+        modo reativo, as definições que a chamam são recalculadas.
+        """
+        atual = self._funcoes.get(nome)
+        if atual is not None and type(atual) is not FuncaoUsuario:
+            raise ValueError(f"'{nome}' já é uma função ou constante da calculadora")
+        funcao = FuncaoUsuario(nome, parametros, corpo)
+        for var in _variaveis_livres(funcao.arvore(), self._funcoes, []):
+            if var not in funcao.parametros:
+                raise ValueError(f"'{var}' não é parâmetro de {nome} nem constante")
+        _verificar_funcoes(dict(self._funcoes, **{nome: funcao}))
+        funcao.tabela = self._funcoes
+        self._trocar_funcao(nome, funcao)
+        return funcao
+
+    def remover_funcao(self, nome: str):
+        """Remove uma função do usuário (KeyError se não houver)."""
+        if type(self._funcoes.get(nome)) is not FuncaoUsuario:
+            raise KeyError(nome)
+        self._trocar_funcao(nome, None)
+
+    def _trocar_funcao(self, nome: str, funcao: Optional[FuncaoUsuario]):
+        """Altera a tabela invalidando só as compilações que dependem de `nome`."""
+        sincronizado = self._funcoes.versao == self._versao_cache
+        planilha = self.planilha
+        if planilha is not None and planilha._versao != self._funcoes.versao:
+            planilha._versao = None
+        if funcao is None:
+            del self._funcoes[nome]
+        else:
+            self._funcoes[nome] = funcao
+        if sincronizado:
+            self._versao_cache = self._funcoes.versao
+            self.cache_expressoes.descartar(lambda compilada: nome in compilada.funcoes)
+        if planilha is not None:
+            planilha._funcao_alterada(nome)
+        if self.armazenamento is not None:
+            self.armazenamento.salvar_funcoes(
+                {chave: valor.definicao for chave, valor in self.funcoes_usuario.items()})
+
+    def _carregar_funcoes(self, definicoes: Dict[str, str]):
+        """Restaura as funções gravadas pelo armazenamento persistente."""
+        for definicao in definicoes.values():
+            nome, parametros, corpo = self.interpretar_definicao(definicao)
+            funcao = FuncaoUsuario(nome, parametros, corpo)
+            funcao.tabela = self._funcoes
+            self._funcoes[nome] = funcao
+
     def limpar_tela(self):
-        """Limpa a tela do terminal."""
-        os.system('cls' if os.name == 'nt' else 'clear')
+        """Limpa a tela do terminal; fora de um terminal não faz nada."""
+        if not sys.stdout.isatty():
+            return
+        if os.name == 'nt':
+            os.system('cls')
+        else:
+            # Sequência ANSI: evita iniciar um shell a cada execução
+            sys.stdout.write('\033[H\033[2J')
+            sys.stdout.flush()
         
     def exibir_banner(self):
         """Exibe o banner da calculadora."""
@@ -62,6 +2446,7 @@ class CalculadoraOtimizada:
 ║  Comandos especiais:                                         ║
 ║  • 'hist' - Ver histórico                                   ║
 ║  • 'mem' - Ver memória                                      ║
+║  • 'stats' - Ver métricas                                   ║
 ║  • 'clear' - Limpar histórico                               ║
 ║  • 'help' - Ajuda                                           ║
 ║  • 'quit' - Sair                                            ║
@@ -70,143 +2455,731 @@ class CalculadoraOtimizada:
         print(banner)
         
     def validar_expressao(self, expressao: str) -> bool:
-        """Valida se a expressão matemática é segura para execução."""
-        # Remove espaços em branco
-        expressao = expressao.replace(' ', '')
-        
-        # Caracteres permitidos
-        caracteres_permitidos = set('0123456789+-*/.()^%abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
-        
-        # Verifica se todos os caracteres são permitidos
-        if not all(c in caracteres_permitidos for c in expressao):
+        """Valida se a expressão matemática é segura para execução.
+
+        `verificar_expressao` informa o motivo e a posição da recusa.
+        """
+        try:
+            verificar_expressao(expressao)
+        except ExpressaoInvalida:
             return False
-            
-        # Verifica se há palavras-chave perigosas
-        palavras_perigosas = ['import', 'exec', 'eval', 'open', 'file', 'system', 'subprocess']
-        for palavra in palavras_perigosas:
-            if palavra in expressao.lower():
-                return False
-                
         return True
-        
-    def preparar_expressao(self, expressao: str) -> str:
-        """Prepara a expressão para avaliação segura."""
-        # Substitui operadores
-        expressao = expressao.replace('^', '**')
-        expressao = expressao.replace('×', '*')
-        expressao = expressao.replace('÷', '/')
-        
+
+    def preparar_expressao(self, expressao: str) -> Tuple[str, Dict[str, Any]]:
+        """Prepara a expressão para avaliação segura.
+
+        Valida e normaliza os operadores na mesma passada (levanta
+        ExpressaoInvalida) e retorna o texto com o namespace de funções e
+        variáveis.
+        """
+        expressao = verificar_expressao(expressao)
+
         # Adiciona funções matemáticas ao namespace
         namespace = self.funcoes_disponiveis.copy()
         namespace.update(self.memoria)
-        
+
         return expressao, namespace
         
+    def compilar_expressao(self, expressao: str,
+                           memoria: Optional[Dict[str, Any]] = None) -> 'ExpressaoCompilada':
+        """Valida e compila uma expressão, reaproveitando o cache LRU.
+
+        `memoria` indica as variáveis que serão usadas na avaliação (por
+        padrão, `self.memoria`), para que sombreiem constantes da tabela.
+        """
+        if memoria is None:
+            memoria = self.memoria
+
+        # Alterações na tabela de funções invalidam o cache inteiro
+        if self._funcoes.versao != self._versao_cache:
+            self.cache_expressoes.limpar()
+            if self.memoizacao is not None:
+                self.memoizacao.limpar()
+            self._versao_cache = self._funcoes.versao
+
+        texto = normalizar_expressao(expressao)
+        # Cada backend numérico tem as próprias compilações no cache
+        backend = self.backend
+        chave = texto if backend.chave is None else (backend.chave, texto)
+        compilada = self.cache_expressoes.obter(chave)
+        orcamento = self.orcamento
+        if compilada is None:
+            if orcamento is not None:
+                try:
+                    orcamento.verificar_tamanho(texto)
+                except OrcamentoExcedido as erro:
+                    # Textos grandes demais não ocupam o cache
+                    return ExpressaoCompilada(texto, None, _falha(erro))
+            compilada = ExpressaoCompilada.compilar(texto, self._tabela_numerica(), memoria,
+                                                    backend, self.memoizacao, orcamento)
+            # Compilações com constantes sombreadas pela memória não vão ao cache
+            if not compilada.sombreados:
+                self.cache_expressoes.armazenar(chave, compilada)
+        elif (compilada.nomes_tabela and memoria
+              and not compilada.nomes_tabela.isdisjoint(memoria)):
+            compilada = ExpressaoCompilada.compilar(texto, self._tabela_numerica(), memoria,
+                                                    backend, self.memoizacao, orcamento)
+        return compilada
+
+    def estatisticas_otimizacao(self, expressao: str) -> Dict[str, Any]:
+        """Retorna quanto a otimização reduziu a expressão (vazio se inválida)."""
+        compilada = self.compilar_expressao(expressao)
+        if compilada.otimizacao is None:
+            return {}
+        return compilada.otimizacao.como_dict()
+
     def calcular(self, expressao: str) -> Union[float, str]:
         """Calcula o resultado de uma expressão matemática."""
         try:
-            # Valida a expressão
-            if not self.validar_expressao(expressao):
-                return "Erro: Expressão inválida ou não permitida"
-                
-            # Prepara a expressão
-            expressao_limpa, namespace = self.preparar_expressao(expressao)
-            
-            # Avalia a expressão
-            resultado = eval(expressao_limpa, {"__builtins__": {}}, namespace)
+            # Analisa e compila a expressão (com cache) e a avalia
+            compilada = self.compilar_expressao(expressao)
+            resultado = compilada.avaliar(self.memoria)
             
             # Adiciona ao histórico
             self.adicionar_ao_historico(expressao, resultado)
             
             return resultado
             
-        except ZeroDivisionError:
-            return "Erro: Divisão por zero"
-        except ValueError as e:
-            return f"Erro: Valor inválido - {str(e)}"
-        except SyntaxError:
-            return "Erro: Sintaxe inválida"
         except Exception as e:
-            return f"Erro: {str(e)}"
-            
+            return _mensagem_erro(e)
+
+    def calcular_lote(self, expressao: str, **colunas) -> Any:
+        """Avalia uma expressão sobre colunas inteiras de valores.
+
+        Cada argumento nomeado é uma variável: sequências (listas, arrays)
+        são avaliadas elemento a elemento e números são repetidos em todas
+        as posições. Com NumPy a expressão é mapeada para ufuncs e o
+        resultado é um array; sem NumPy é usado um laço em Python puro que
+        retorna uma lista. Pontos inválidos (domínio, resultados complexos,
+        divisão por zero, estouro) resultam em NaN nos dois caminhos; chamadas
+        com o número errado de argumentos são um erro da expressão inteira.
+        O histórico não é usado.
+        Com um backend diferente de `float`, o laço em Python devolve os
+        valores do backend e None nos pontos inválidos.
+        """
+        try:
+            escalares = {}
+            vetores = {}
+            for nome, valor in colunas.items():
+                if isinstance(valor, (int, float)) or isinstance(valor, self.backend.tipos):
+                    escalares[nome] = valor
+                else:
+                    vetores[nome] = valor
+            tamanhos = {len(valor) for valor in vetores.values()}
+            if len(tamanhos) > 1:
+                raise ValueError("colunas com tamanhos diferentes")
+            tamanho = tamanhos.pop() if tamanhos else 1
+
+            # As colunas sombreiam as constantes da tabela, como a memória
+            valores = dict(self.memoria)
+            valores.update(escalares)
+            valores.update(dict.fromkeys(vetores))
+            compilada = self.compilar_expressao(expressao, valores)
+            if compilada.arvore is None:
+                compilada.avaliar(valores)
+            # A árvore sem dobras: a compilada pode ter constantes já calculadas
+            arvore = analisar_expressao(compilada.texto, self.backend.literal)
+            _verificar_aridades(arvore, self._tabela_numerica())
+
+            np = _numpy() if self.backend.chave is None else None
+            if np is not None:
+                return self._calcular_lote_numpy(np, arvore, valores, vetores, tamanho)
+            return self._calcular_lote_python(compilada, valores, vetores, tamanho)
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def _calcular_lote_numpy(self, np: Any, arvore: tuple, valores: Dict[str, Any],
+                             vetores: Dict[str, Any], tamanho: int) -> Any:
+        """Avalia a árvore uma única vez sobre arrays do NumPy."""
+        for nome, coluna in vetores.items():
+            valores[nome] = np.asarray(coluna, dtype=float)
+        avaliar = _Compilador(_tabela_vetorial(self._funcoes, np), valores).compilar(arvore)[0]
+        with np.errstate(all='ignore'):
+            resultado = avaliar(valores)
+            # Resultados complexos (ex.: potência fracionária de negativo) viram NaN
+            if np.iscomplexobj(resultado):
+                resultado = np.where(np.imag(resultado) == 0, np.real(resultado), np.nan)
+            resultado = np.array(np.broadcast_to(resultado, (tamanho,)), dtype=float)
+        resultado[~np.isfinite(resultado)] = np.nan
+        return resultado
+
+    def _calcular_lote_python(self, compilada: 'ExpressaoCompilada', valores: Dict[str, Any],
+                              vetores: Dict[str, Any], tamanho: int) -> List[float]:
+        """Avalia a expressão compilada ponto a ponto, sem NumPy."""
+        avaliar = compilada.avaliar
+        nomes = list(vetores)
+        colunas = [vetores[nome] for nome in nomes]
+        converter = self.backend.converter
+        if converter is not None:
+            return self._calcular_lote_backend(avaliar, valores, nomes, colunas, tamanho, converter)
+        nan = float('nan')
+        resultados = []
+        for i in range(tamanho):
+            for nome, coluna in zip(nomes, colunas):
+                valores[nome] = coluna[i]
+            try:
+                resultado = avaliar(valores)
+            except (ArithmeticError, ValueError):
+                resultados.append(nan)
+                continue
+            if type(resultado) is complex:
+                # Resultados complexos (ex.: potência fracionária de negativo) viram NaN
+                resultado = resultado.real if not resultado.imag else nan
+            resultado = float(resultado)
+            resultados.append(resultado if math.isfinite(resultado) else nan)
+        return resultados
+
+    @staticmethod
+    def _calcular_lote_backend(avaliar: Any, valores: Dict[str, Any], nomes: List[str],
+                               colunas: List[Any], tamanho: int, converter: Any) -> List[Any]:
+        """Laço do `calcular_lote` para backends exatos ou de precisão arbitrária."""
+        resultados = []
+        for i in range(tamanho):
+            for nome, coluna in zip(nomes, colunas):
+                valores[nome] = converter(coluna[i])
+            try:
+                resultado = avaliar(valores)
+            except (ArithmeticError, ValueError):
+                resultado = None
+            resultados.append(None if isinstance(resultado, complex) else resultado)
+        return resultados
+
+    def avaliar(self, expressao: str, variaveis: Optional[Dict[str, Any]] = None) -> Any:
+        """Avalia uma expressão sem registrar no histórico.
+
+        `variaveis` complementa (e tem precedência sobre) a memória apenas
+        nesta avaliação. Erros são retornados como em `calcular`.
+        """
+        try:
+            memoria = self._memoria_com(variaveis)
+            return self.compilar_expressao(expressao, memoria).avaliar(memoria)
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def _memoria_com(self, variaveis: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Memória complementada por `variaveis`, sem alterar `self.memoria`."""
+        memoria = self.memoria
+        if variaveis:
+            converter = self.backend.converter
+            if converter is not None:
+                variaveis = {nome: converter(valor) for nome, valor in variaveis.items()}
+            if memoria:
+                memoria = dict(memoria)
+                memoria.update(variaveis)
+            else:
+                memoria = variaveis
+        return memoria
+
+    def compilar(self, expressao: str, parametros: Optional[Iterable[str]] = None) -> Any:
+        """Compila a expressão em uma função Python para avaliações repetidas.
+
+        Os parâmetros da função (posicionais ou nomeados) são as variáveis
+        livres da expressão, na ordem em que aparecem, ou os nomes de
+        `parametros`, nessa ordem; com `parametros`, as demais variáveis
+        são lidas da memória agora. A tabela de funções e o backend também
+        são fixados na compilação. A função não usa texto, memória nem
+        histórico em cada chamada e pode ser chamada de várias threads;
+        erros de avaliação são retornados como em `calcular`, e erros de
+        sintaxe, nomes desconhecidos e chamadas com o número errado de
+        argumentos são levantados aqui. O atributo
+        `variaveis` lista os parâmetros.
+        """
+        return self._compilar_funcao(expressao, parametros, _gerar_modelo)
+
+    def compilar_gradiente(self, expressao: str, parametros: Optional[Iterable[str]] = None) -> Any:
+        """Como `compilar`, mas a função retorna (valor, gradiente).
+
+        O gradiente é uma tupla com a derivada em relação a cada parâmetro
+        (na ordem de `variaveis`), calculada junto com o valor em uma única
+        passada pela expressão (diferenciação automática progressiva).
+        """
+        from derivadas import gerar_gradiente
+        funcoes = self._funcoes
+        return self._compilar_funcao(
+            expressao, parametros,
+            lambda *argumentos: gerar_gradiente(*argumentos, funcoes=funcoes))
+
+    def _compilar_funcao(self, expressao: str, parametros: Optional[Iterable[str]],
+                         gerar: Any) -> Any:
+        """Analisa a expressão, resolve os parâmetros e chama `gerar` no backend."""
+        from keyword import iskeyword
+
+        texto = normalizar_expressao(expressao)
+        backend = self.backend
+        tabela = self._tabela_numerica()
+        orcamento = self.orcamento
+        profundidade = None
+        if orcamento is not None:
+            orcamento.verificar_tamanho(texto)
+            profundidade = orcamento.maximo_profundidade
+            backend = orcamento.limitar(backend)
+        try:
+            arvore = analisar_expressao(texto, backend.literal, profundidade)
+        except RecursionError:
+            raise OrcamentoExcedido("expressão profunda demais") from None
+        _verificar_aridades(arvore, tabela)
+        livres = _variaveis_livres(arvore, tabela, [])
+        fixas = {}
+        if parametros is None:
+            parametros = tuple(livres)
+        else:
+            parametros = tuple(parametros)
+            for nome in livres:
+                if nome not in parametros and nome in self.memoria:
+                    fixas[nome] = self.memoria[nome]
+        # Como em `calcular`, variáveis em memória têm precedência sobre constantes
+        for nome in _usos(arvore, {}):
+            if nome in tabela and nome in self.memoria and nome not in parametros:
+                fixas[nome] = self.memoria[nome]
+        for nome in parametros:
+            if not nome.isidentifier() or iskeyword(nome):
+                raise ExpressaoInvalida(f"nome de parâmetro inválido: {nome!r}")
+        if len(set(parametros)) != len(parametros):
+            raise ExpressaoInvalida("parâmetros repetidos")
+
+        if backend.contexto is None:
+            modelo = gerar(texto, arvore, tabela, parametros, fixas, backend)
+        else:
+            with backend.contexto():
+                modelo = gerar(texto, arvore, tabela, parametros, fixas, backend)
+        modelo.variaveis = parametros
+        modelo.expressao = texto
+        return modelo
+
+    def gradiente(self, expressao: str, variaveis: Optional[Dict[str, Any]] = None) -> Any:
+        """Valor e gradiente da expressão nos valores atuais, em uma passada.
+
+        Retorna (valor, {variável: derivada}) para todas as variáveis livres,
+        lidas da memória e de `variaveis`, ou a mensagem de erro. Para muitas
+        avaliações, use `compilar_gradiente`.
+        """
+        try:
+            funcao = self.compilar_gradiente(expressao)
+            memoria = self._memoria_com(variaveis)
+            argumentos = []
+            for nome in funcao.variaveis:
+                if nome not in memoria:
+                    raise NameError(f"name '{nome}' is not defined")
+                argumentos.append(memoria[nome])
+            resultado = funcao(*argumentos)
+            if isinstance(resultado, str):
+                return resultado
+            valor, derivadas = resultado
+            return valor, dict(zip(funcao.variaveis, derivadas))
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def derivar(self, expressao: str, var: str) -> str:
+        """Derivada simbólica simplificada da expressão em relação a `var`.
+
+        Retorna o texto da derivada, que pode ser passado a `calcular`, ou
+        a mensagem de erro. As demais variáveis são tratadas como
+        constantes; funções sem regra de derivação são um erro.
+        """
+        try:
+            from derivadas import derivar_texto
+            return derivar_texto(normalizar_expressao(expressao), var, self._funcoes)
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def tabular(self, expressao: str, var: str, inicio: Any, fim: Any, passo: Any,
+                blocos: bool = False) -> Any:
+        """Gerador de (x, f(x)) para `var` de `inicio` a `fim` (incluído).
+
+        A expressão é compilada uma vez, as demais variáveis são lidas da
+        memória agora e os pontos são gerados sob demanda, sem usar o
+        histórico. Com NumPy (backend `float`) os pontos são avaliados em
+        blocos vetorizados; com `blocos`, o gerador produz os pares de
+        blocos (xs, ys) em vez de pontos. Pontos inválidos valem NaN (None
+        nos outros backends); erros de sintaxe ou de limites retornam a
+        mensagem de erro em vez do gerador.
+        """
+        try:
+            import tabulacao
+            return tabulacao.tabular(self, expressao, var, inicio, fim, passo,
+                                     self._numpy_tabulacao(), blocos)
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def varrer(self, expressao: str, eixos: Dict[str, Tuple[Any, Any, Any]]) -> Any:
+        """Gerador de ((v1, v2, ...), f) sobre a grade `{var: (inicio, fim, passo)}`.
+
+        A última variável varia mais rápido. Como em `tabular`, a grade
+        não é materializada e os erros retornam a mensagem.
+        """
+        try:
+            import tabulacao
+            return tabulacao.varrer(self, expressao, eixos, self._numpy_tabulacao())
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def amostrar(self, expressao: str, var: str, inicio: Any, fim: Any, pontos: int = 65,
+                 tolerancia: float = 1e-3, profundidade: int = 10) -> Any:
+        """Gerador de (x, f(x)) com mais pontos onde a função muda rápido.
+
+        Parte de `pontos` pontos igualmente espaçados e divide ao meio os
+        intervalos em que o ponto médio se afasta da reta entre os extremos
+        mais que `tolerancia` vezes a amplitude dos valores, até
+        `profundidade` vezes. Os pontos saem em ordem crescente de x.
+        """
+        try:
+            import tabulacao
+            return tabulacao.amostrar(self, expressao, var, inicio, fim, pontos,
+                                      tolerancia, profundidade)
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def avaliar_conjunto(self, expressao: str, entrada: str, saida: str,
+                         coluna: str = 'resultado', bloco: Optional[int] = None) -> Any:
+        """Aplica a expressão a cada linha de um arquivo CSV ou Parquet.
+
+        As colunas usadas pela expressão viram variáveis (as demais vêm da
+        memória) e `saida` recebe as colunas da entrada mais `coluna` com o
+        resultado. O arquivo é processado em blocos de `bloco` linhas, com
+        leitura e escrita em threads próprias, e a memória usada não
+        depende do tamanho do arquivo. Retorna o número de linhas ou a
+        mensagem de erro.
+        """
+        try:
+            import conjuntos
+            return conjuntos.avaliar_conjunto(self, expressao, entrada, saida, coluna,
+                                              bloco or conjuntos.BLOCO, self._numpy_tabulacao())
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def exportar(self, caminho: str, formato: Optional[str] = None, conteudo: str = 'tudo',
+                 inicio: Any = None, fim: Any = None, padrao: Optional[str] = None) -> Any:
+        """Exporta o histórico e a memória para JSONL, CSV ou binário (`exportacao.py`).
+
+        O formato vem da extensão (`.jsonl`, `.csv`, `.bin`) se não for
+        dado; `conteudo` é `tudo`, `historico` ou `memoria`. O histórico
+        pode ser limitado a [inicio, fim) (segundos, `datetime` ou ISO
+        8601) e às expressões que casam com `padrao` (ex.: `*sqrt*`).
+        Retorna o número de registros ou a mensagem de erro.
+        """
+        try:
+            import exportacao
+            return exportacao.exportar(self, caminho, formato, conteudo, inicio, fim, padrao)
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def importar(self, caminho: str, formato: Optional[str] = None, conteudo: str = 'tudo',
+                 inicio: Any = None, fim: Any = None, padrao: Optional[str] = None) -> Any:
+        """Restaura um arquivo gerado por `exportar`, com os mesmos filtros.
+
+        Os cálculos são acrescentados ao histórico com seus instantes, as
+        variáveis e funções substituem as de mesmo nome. Retorna o número
+        de registros ou a mensagem de erro.
+        """
+        try:
+            import exportacao
+            return exportacao.importar(self, caminho, formato, conteudo, inicio, fim, padrao)
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def _numpy_tabulacao(self) -> Any:
+        return _numpy() if self.backend.chave is None else None
+
+    def ativar_memoizacao(self, capacidade: int = 4096) -> MemoizacaoResultados:
+        """Passa a reaproveitar resultados de subexpressões puras entre cálculos.
+
+        São memoizadas as chamadas a funções padrão (ex.: `exp(k*t)`) e as
+        subexpressões repetidas, pelos valores das variáveis que leem; até
+        `capacidade` resultados são mantidos (LRU). Compensa quando muitas
+        expressões repetem termos caros com as mesmas entradas. Retorna o
+        cache, com `estatisticas()` de acertos e falhas.
+        """
+        if self.memoizacao is None:
+            self.memoizacao = self._criar_memoizacao(capacidade)
+            # As compilações em cache não consultam a memoização
+            self.cache_expressoes.limpar()
+        return self.memoizacao
+
+    def desativar_memoizacao(self):
+        """Volta às compilações sem memoização e descarta os resultados."""
+        if self.memoizacao is not None:
+            self.memoizacao = None
+            self.cache_expressoes.limpar()
+
+    def _criar_memoizacao(self, capacidade: int) -> MemoizacaoResultados:
+        return MemoizacaoResultados(capacidade)
+
+    def ativar_instrumentacao(self, limite_lentas: int = 10) -> Instrumentacao:
+        """Passa a medir `calcular` e `avaliar` e retorna as métricas.
+
+        As versões instrumentadas substituem os métodos apenas nesta
+        instância; desativada, a instrumentação não custa nada.
+        """
+        if self.instrumentacao is None:
+            self.instrumentacao = Instrumentacao(self.cache_expressoes, limite_lentas)
+            self.calcular = self._calcular_instrumentado
+            self.avaliar = self._avaliar_instrumentado
+        return self.instrumentacao
+
+    def desativar_instrumentacao(self):
+        """Volta aos métodos sem medição e descarta as métricas."""
+        self.instrumentacao = None
+        self.__dict__.pop('calcular', None)
+        self.__dict__.pop('avaliar', None)
+
+    def _calcular_instrumentado(self, expressao: str) -> Union[float, str]:
+        """`calcular` medindo as fases compilar, avaliar e historico."""
+        instrumentacao = self.instrumentacao
+        fases = instrumentacao.fases
+        inicio = perf_counter_ns()
+        try:
+            compilada = self.compilar_expressao(expressao)
+            compilado = perf_counter_ns()
+            fases['compilar'].registrar(compilado - inicio)
+            resultado = compilada.avaliar(self.memoria)
+            avaliado = perf_counter_ns()
+            fases['avaliar'].registrar(avaliado - compilado)
+            self.adicionar_ao_historico(expressao, resultado)
+            fases['historico'].registrar(perf_counter_ns() - avaliado)
+            return resultado
+        except Exception as e:
+            instrumentacao.registrar_erro(e)
+            return _mensagem_erro(e)
+        finally:
+            duracao = perf_counter_ns() - inicio
+            fases['total'].registrar(duracao)
+            instrumentacao.registrar_lenta(expressao, duracao)
+
+    def _avaliar_instrumentado(self, expressao: str,
+                               variaveis: Optional[Dict[str, Any]] = None) -> Any:
+        """`avaliar` medindo as fases compilar e avaliar."""
+        instrumentacao = self.instrumentacao
+        fases = instrumentacao.fases
+        inicio = perf_counter_ns()
+        try:
+            memoria = self._memoria_com(variaveis)
+            compilada = self.compilar_expressao(expressao, memoria)
+            compilado = perf_counter_ns()
+            fases['compilar'].registrar(compilado - inicio)
+            resultado = compilada.avaliar(memoria)
+            fases['avaliar'].registrar(perf_counter_ns() - compilado)
+            return resultado
+        except Exception as e:
+            instrumentacao.registrar_erro(e)
+            return _mensagem_erro(e)
+        finally:
+            duracao = perf_counter_ns() - inicio
+            fases['total'].registrar(duracao)
+            instrumentacao.registrar_lenta(expressao, duracao)
+
+    def exibir_estatisticas(self):
+        """Exibe as métricas da instrumentação."""
+        if self.instrumentacao is None:
+            print("\n📈 Instrumentação desativada (use 'stats on')")
+            return
+        dados = self.instrumentacao.instantaneo()
+        print("\n📈 ESTATÍSTICAS:")
+        print("=" * 60)
+        print(f"Chamadas: {dados['chamadas']}")
+        for nome, fase in dados['fases'].items():
+            print(f"  {nome:10} {fase['contagem']:>8} x  média {fase['media_us']:9.2f} µs"
+                  f"  máx {fase['maximo_us']:9.2f} µs")
+        cache = dados['cache']
+        print(f"Cache: {cache['acertos']} acertos, {cache['falhas']} falhas "
+              f"({cache['taxa_acerto']:.1%})")
+        if dados['erros']:
+            print("Erros: " + ", ".join(f"{tipo}={quantidade}"
+                                        for tipo, quantidade in dados['erros'].items()))
+        if dados['mais_lentas']:
+            print("Mais lentas:")
+            for lenta in dados['mais_lentas']:
+                print(f"  {lenta['duracao_us']:9.2f} µs  {lenta['expressao']}")
+        print("=" * 60)
+
+    def _avaliar_bloco(self, bloco: List[Any],
+                       memoria: Optional[Dict[str, Any]] = None) -> List[Any]:
+        """Avalia um bloco de itens (texto ou par texto/variáveis)."""
+        if memoria is not None and memoria is not self.memoria:
+            original = self.memoria
+            self.memoria = memoria
+            try:
+                return self._avaliar_bloco(bloco)
+            finally:
+                self.memoria = original
+        resultados = []
+        for item in bloco:
+            if isinstance(item, str):
+                resultados.append(self.avaliar(item))
+            else:
+                try:
+                    expressao, variaveis = item
+                except (TypeError, ValueError):
+                    resultados.append(f"Erro: Item inválido - {item!r}")
+                    continue
+                resultados.append(self.avaliar(expressao, variaveis))
+        return resultados
+
+    def calcular_muitos(self, itens: Iterable[Any], workers: Optional[int] = None,
+                        chunk_size: int = 2048,
+                        memoria: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """Avalia muitas expressões independentes em paralelo, em processos.
+
+        Cada item é uma expressão ou um par (expressão, variáveis). Os itens
+        são agrupados em blocos de `chunk_size` e distribuídos a um pool de
+        `workers` processos (padrão: número de CPUs), cada um com uma
+        calculadora própria e o cache pré-aquecido com as expressões em
+        cache desta instância. Os resultados são gerados na ordem de
+        entrada, com erros por item como em `calcular`, e nada é registrado
+        no histórico. O pool é mantido entre chamadas até
+        `encerrar_processos()`. `memoria` substitui `self.memoria` nesta
+        chamada. Backends cujos valores não sobrevivem ao pickle (mpmath)
+        são avaliados neste processo.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if not self.backend.paralelo:
+            workers = 1
+        iterador = iter(itens)
+        blocos = iter(lambda: list(islice(iterador, chunk_size)), [])
+
+        if workers <= 1:
+            for bloco in blocos:
+                yield from self._avaliar_bloco(bloco, memoria)
+            return
+
+        executor = self._obter_executor(workers)
+        memoria = dict(self.memoria if memoria is None else memoria)
+        pendentes: Deque[Any] = deque()
+        for bloco in blocos:
+            pendentes.append(executor.submit(_avaliar_bloco_trabalhador, memoria, bloco))
+            # Limita os blocos em voo para manter a memória constante
+            if len(pendentes) >= 2 * workers:
+                yield from pendentes.popleft().result()
+        while pendentes:
+            yield from pendentes.popleft().result()
+
+    def _obter_executor(self, workers: int) -> Any:
+        """Retorna o pool de processos, recriando-o se a configuração mudou."""
+        configuracao = (workers, self._funcoes.versao, id(self._funcoes), self.backend.chave)
+        if self._executor is not None and self._configuracao_executor == configuracao:
+            return self._executor
+        self.encerrar_processos()
+
+        from concurrent.futures import ProcessPoolExecutor
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_iniciar_trabalhador,
+            initargs=(dict(self._funcoes), self.cache_expressoes.capacidade,
+                      self._expressoes_em_cache(), self.backend.nome, self.backend.precisao),
+        )
+        self._configuracao_executor = configuracao
+        return self._executor
+
+    def _expressoes_em_cache(self) -> List[str]:
+        """Textos das expressões em cache compiladas no backend atual."""
+        prefixo = self.backend.chave
+        if prefixo is None:
+            return [chave for chave in self.cache_expressoes.chaves() if isinstance(chave, str)]
+        return [chave[1] for chave in self.cache_expressoes.chaves()
+                if isinstance(chave, tuple) and chave[0] == prefixo]
+
+    def encerrar_processos(self):
+        """Encerra o pool de processos usado por `calcular_muitos`."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._configuracao_executor = None
+
     def adicionar_ao_historico(self, expressao: str, resultado: Any):
         """Adiciona um cálculo ao histórico."""
-        self.historico.append({
-            'expressao': expressao,
-            'resultado': resultado,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Mantém apenas os últimos 50 cálculos
-        if len(self.historico) > 50:
-            self.historico.pop(0)
+        self.historico.adicionar(expressao, resultado)
+        if self.armazenamento is not None:
+            self.armazenamento.adicionar(expressao, resultado)
             
-    def exibir_historico(self):
-        """Exibe o histórico de cálculos."""
-        if not self.historico:
+    def exibir_historico(self, pagina: Optional[int] = None, por_pagina: int = 10):
+        """Exibe o histórico de cálculos.
+
+        Sem `pagina`, mostra os últimos `por_pagina` cálculos; com ela,
+        mostra a página indicada (1 = mais antigos). Com armazenamento
+        persistente, apenas a página exibida é lida do disco.
+        """
+        fonte = self.armazenamento if self.armazenamento is not None else self.historico
+        total = len(fonte)
+        if not total:
             print("\n📋 Histórico vazio")
             return
             
-        print("\n📋 HISTÓRICO DE CÁLCULOS:")
+        paginas = (total + por_pagina - 1) // por_pagina
+        if pagina is None:
+            inicio = max(0, total - por_pagina)
+            pagina = paginas
+        else:
+            pagina = min(max(1, pagina), paginas)
+            inicio = (pagina - 1) * por_pagina
+            
+        print(f"\n📋 HISTÓRICO DE CÁLCULOS (página {pagina} de {paginas}):")
         print("=" * 60)
-        for i, calc in enumerate(self.historico[-10:], 1):  # Mostra apenas os últimos 10
-            print(f"{i:2d}. {calc['expressao']} = {calc['resultado']}")
+        for i, calc in enumerate(fonte.registros(inicio, inicio + por_pagina), inicio + 1):
+            print(f"{i:2d}. {calc.expressao} = {calc.resultado}")
         print("=" * 60)
         
     def exibir_memoria(self):
-        """Exibe as variáveis em memória."""
-        if not self.memoria:
+        """Exibe as variáveis em memória e as funções do usuário."""
+        funcoes = self.funcoes_usuario
+        if (not self.memoria and not funcoes
+                and (self.planilha is None or not self.planilha.erros)):
             print("\n💾 Memória vazia")
             return
             
         print("\n💾 VARIÁVEIS EM MEMÓRIA:")
         print("=" * 40)
+        planilha = self.planilha
         for var, valor in self.memoria.items():
-            print(f"{var} = {valor}")
+            if planilha is not None and var in planilha:
+                print(f"{var} = {valor}    [{planilha.expressao(var)}]")
+            else:
+                print(f"{var} = {valor}")
+        if planilha is not None:
+            for var, erro in planilha.erros.items():
+                print(f"{var} = {erro}    [{planilha.expressao(var)}]")
+        for funcao in funcoes.values():
+            print(funcao.definicao)
         print("=" * 40)
         
     def limpar_historico(self):
-        """Limpa o histórico de cálculos."""
+        """Limpa o histórico de cálculos, inclusive o persistido em `diretorio_dados`."""
         self.historico.clear()
+        if self.armazenamento is not None:
+            self.armazenamento.limpar()
         print("\n✅ Histórico limpo com sucesso!")
         
     def converter_unidades(self, valor: float, de_unidade: str, para_unidade: str) -> Union[float, str]:
-        """Converte unidades de medida."""
-        conversoes = {
-            'comprimento': {
-                'm': 1.0,
-                'km': 1000.0,
-                'cm': 0.01,
-                'mm': 0.001,
-                'mi': 1609.34,
-                'yd': 0.9144,
-                'ft': 0.3048,
-                'in': 0.0254
-            },
-            'peso': {
-                'kg': 1.0,
-                'g': 0.001,
-                'mg': 0.000001,
-                'lb': 0.453592,
-                'oz': 0.0283495
-            },
-            'temperatura': {
-                'celsius': lambda x: x,
-                'fahrenheit': lambda x: (x - 32) * 5/9,
-                'kelvin': lambda x: x - 273.15
-            }
-        }
-        
-        # Implementação básica - pode ser expandida
+        """Converte unidades de medida da mesma categoria (veja `unidades_suportadas`)."""
+        conversao = _CONVERSOES.get((de_unidade, para_unidade))
+        if conversao is None:
+            return "Unidades não suportadas"
         try:
-            if de_unidade in conversoes['comprimento'] and para_unidade in conversoes['comprimento']:
-                metros = valor * conversoes['comprimento'][de_unidade]
-                return metros / conversoes['comprimento'][para_unidade]
-            else:
-                return "Unidades não suportadas"
-        except:
+            return valor * conversao[0] + conversao[1]
+        except TypeError:
             return "Erro na conversão"
-            
+
+    def converter_lote(self, valores: Any, de_unidade: str, para_unidade: str) -> Any:
+        """Converte vários valores de uma vez.
+
+        Arrays do NumPy (ou objetos com `dtype`, como séries do pandas) são
+        convertidos de forma vetorizada e mantêm o tipo; outros iteráveis
+        geram uma lista.
+        """
+        conversao = _CONVERSOES.get((de_unidade, para_unidade))
+        if conversao is None:
+            return "Unidades não suportadas"
+        fator, deslocamento = conversao
+        try:
+            if hasattr(valores, 'dtype'):
+                return valores * fator + deslocamento
+            return [valor * fator + deslocamento for valor in valores]
+        except TypeError:
+            return "Erro na conversão"
+
+    def unidades_suportadas(self) -> Dict[str, List[str]]:
+        """Retorna as unidades aceitas por `converter_unidades`, por categoria."""
+        return {categoria: list(tabela) for categoria, tabela in _UNIDADES.items()}
+
     def exibir_ajuda(self):
         """Exibe a ajuda da calculadora."""
         ajuda = """
@@ -237,8 +3210,13 @@ class CalculadoraOtimizada:
    e : Número de Euler (2.71828...)
 
 💾 COMANDOS ESPECIAIS:
-   hist : Ver histórico
+   hist : Ver histórico (hist N mostra a página N)
    mem : Ver memória
+   stats : Ver métricas (stats on/off ativa ou desativa, stats prom no formato Prometheus)
+   modo : Modo numérico (modo decimal 50, modo fracao, modo mpmath 40, modo float)
+   tab : Tabela de valores (tab sin(x)/x, x, -pi, pi, 0.5)
+   export : Exporta histórico e memória (export calc.jsonl [hist|mem] [desde=2024-01-01] [ate=...] [padrao=*sqrt*])
+   import : Importa um arquivo exportado (import calc.jsonl; também .csv e .bin)
    clear : Limpar histórico
    help : Esta ajuda
    quit : Sair
@@ -249,9 +3227,182 @@ class CalculadoraOtimizada:
    sqrt(16)
    log(100)
    x = 5 (armazena na memória)
+   f(x) = x**2 + 1 (define uma função)
+   y = x * 2 (com --reativo, recalculado quando x muda)
         """
         print(ajuda)
         
+    def alterar_modo(self, argumentos: List[str]):
+        """Comando `modo [nome [precisão]]`: mostra ou troca o backend numérico."""
+        if argumentos:
+            try:
+                precisao = int(argumentos[1]) if len(argumentos) > 1 else None
+                self.usar_numerico(argumentos[0].lower(), precisao)
+            except ValueError as e:
+                print(f"❌ Erro: {e}")
+                return
+        backend = self.backend
+        detalhe = f" (precisão {backend.precisao})" if backend.precisao is not None else ""
+        print(f"🔢 Modo numérico: {backend.nome}{detalhe}")
+
+    def interpretar_atribuicao(self, entrada: str) -> Optional[Tuple[str, str]]:
+        """Retorna (variável, expressão) se a entrada for `x = expr`."""
+        if '=' in entrada and not entrada.startswith('='):
+            var, valor_expr = entrada.split('=', 1)
+            var = var.strip()
+            if var.isidentifier():
+                return var, valor_expr.strip()
+        return None
+
+    def interpretar_definicao(self, entrada: str) -> Optional[Tuple[str, Tuple[str, ...], str]]:
+        """Retorna (nome, parâmetros, corpo) se a entrada for `f(x, y) = expr`."""
+        if '=' not in entrada:
+            return None
+        cabecalho, corpo = entrada.split('=', 1)
+        cabecalho = cabecalho.strip()
+        if not cabecalho.endswith(')') or '(' not in cabecalho:
+            return None
+        nome, parametros = cabecalho[:-1].split('(', 1)
+        parametros = tuple(parametro.strip() for parametro in parametros.split(','))
+        if parametros == ('',):
+            parametros = ()
+        nome = nome.strip()
+        if not nome.isidentifier() or not all(p.isidentifier() for p in parametros):
+            return None
+        return nome, parametros, corpo.strip()
+
+    def interpretar_tabulacao(self, texto: str) -> Tuple[str, str, Any, Any, Any]:
+        """Interpreta `expr, var, inicio, fim, passo` para `tabular`.
+
+        Os limites e o passo podem ser expressões (ex.: `-pi`); levanta
+        ValueError com a mensagem de erro se algum deles for inválido.
+        """
+        partes = [parte.strip() for parte in texto.rsplit(',', 4)]
+        if len(partes) != 5 or not partes[1].isidentifier():
+            raise ValueError("Erro: use expressão, variável, início, fim, passo")
+        expressao, var = partes[:2]
+        limites = []
+        for parte in partes[2:]:
+            valor = self.avaliar(parte)
+            if isinstance(valor, str):
+                raise ValueError(valor)
+            limites.append(valor)
+        return (expressao, var, *limites)
+
+    def interpretar_transferencia(self, texto: str) -> Tuple[str, Dict[str, Any]]:
+        """Interpreta `ARQUIVO [hist|mem] [desde=...] [ate=...] [padrao=...] [formato=...]`.
+
+        Retorna o caminho e os argumentos de `exportar`/`importar`;
+        levanta ValueError se algo não for reconhecido.
+        """
+        import shlex
+        partes = shlex.split(texto)
+        if not partes:
+            raise ValueError("Erro: informe o arquivo")
+        opcoes: Dict[str, Any] = {}
+        nomes = {'desde': 'inicio', 'ate': 'fim', 'padrao': 'padrao', 'formato': 'formato'}
+        for parte in partes[1:]:
+            chave, igual, valor = parte.partition('=')
+            if not igual and parte in ('hist', 'mem'):
+                opcoes['conteudo'] = 'historico' if parte == 'hist' else 'memoria'
+            elif igual and chave in nomes:
+                opcoes[nomes[chave]] = valor
+            else:
+                raise ValueError(f"Erro: opção desconhecida '{parte}'")
+        return partes[0], opcoes
+
+    def exibir_transferencia(self, comando: str, texto: str):
+        """Comandos `export` e `import`: mostram quantos registros foram transferidos."""
+        try:
+            caminho, opcoes = self.interpretar_transferencia(texto)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        if comando == 'export':
+            resultado, verbo = self.exportar(caminho, **opcoes), "exportados para"
+        else:
+            resultado, verbo = self.importar(caminho, **opcoes), "importados de"
+        if isinstance(resultado, str):
+            print(f"❌ {resultado}")
+        else:
+            print(f"✅ {resultado} registros {verbo} {caminho}")
+
+    def exibir_tabela(self, texto: str):
+        """Comando `tab expr, var, inicio, fim, passo`: mostra a tabela de valores."""
+        try:
+            expressao, var, inicio, fim, passo = self.interpretar_tabulacao(texto)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        pontos = self.tabular(expressao, var, inicio, fim, passo)
+        if isinstance(pontos, str):
+            print(f"❌ {pontos}")
+            return
+        print(f"\n📈 TABELA DE {expressao}:")
+        print("=" * 40)
+        for x, y in pontos:
+            print(f"{var} = {x}\t{y}")
+        print("=" * 40)
+
+    def atribuir(self, var: str, expressao: str, registrar: bool = True) -> Any:
+        """Calcula a expressão e, se o resultado for numérico, o guarda em `var`.
+
+        No modo reativo a expressão passa a definir `var`, e as variáveis
+        que dependem dela são recalculadas.
+        """
+        if self.planilha is not None:
+            resultado = self.planilha.definir(var, expressao)
+            if isinstance(resultado, self.backend.tipos):
+                if registrar:
+                    self.adicionar_ao_historico(expressao, resultado)
+                if self.armazenamento is not None:
+                    self.salvar_memoria()
+            return resultado
+        resultado = self.calcular(expressao) if registrar else self.avaliar(expressao)
+        if isinstance(resultado, self.backend.tipos):
+            self.memoria[var] = resultado
+            if self.armazenamento is not None:
+                self.salvar_memoria()
+        return resultado
+
+    def salvar_memoria(self):
+        """Grava um instantâneo da memória no armazenamento persistente."""
+        if self.armazenamento is not None:
+            self.armazenamento.salvar_memoria(self.memoria)
+
+    def processar_fluxo(self, linhas: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+        """Avalia linhas sob demanda, gerando pares (entrada, resultado).
+
+        Linhas vazias e comentários (`#`) são ignorados; atribuições
+        `x = expr` e definições `f(x) = expr` seguem a mesma semântica de
+        `executar` (o resultado de uma definição é a `FuncaoUsuario`, cujo
+        texto é a definição). O histórico não é usado.
+        """
+        for linha in linhas:
+            entrada = linha.strip()
+            if not entrada or entrada.startswith('#'):
+                continue
+            definicao = self.interpretar_definicao(entrada)
+            if definicao is not None:
+                try:
+                    yield entrada, self.definir_funcao(*definicao)
+                except Exception as e:
+                    yield entrada, _mensagem_erro(e)
+                continue
+            atribuicao = self.interpretar_atribuicao(entrada)
+            if atribuicao is not None:
+                yield entrada, self.atribuir(*atribuicao, registrar=False)
+            else:
+                yield entrada, self.avaliar(entrada)
+
+    def executar_fluxo(self, entrada: Iterable[str], saida: TextIO, formato: str = 'plain'):
+        """Modo não interativo: lê expressões de `entrada` e escreve em `saida`.
+
+        Formatos: `plain` (um resultado por linha), `csv` e `jsonl`.
+        """
+        formatar = _FORMATADORES_FLUXO[formato]
+        saida.writelines(formatar(self.processar_fluxo(entrada)))
+
     def executar(self):
         """Executa o loop principal da calculadora."""
         self.limpar_tela()
@@ -272,31 +3423,67 @@ class CalculadoraOtimizada:
                 elif entrada.lower() == 'hist':
                     self.exibir_historico()
                     continue
+                elif entrada.lower().startswith('hist ') and entrada[5:].strip().isdigit():
+                    self.exibir_historico(int(entrada[5:]))
+                    continue
                 elif entrada.lower() == 'mem':
                     self.exibir_memoria()
                     continue
                 elif entrada.lower() == 'clear':
                     self.limpar_historico()
                     continue
+                elif entrada.lower() == 'stats':
+                    self.exibir_estatisticas()
+                    continue
+                elif entrada.lower() == 'stats on':
+                    self.ativar_instrumentacao()
+                    print("📈 Instrumentação ativada")
+                    continue
+                elif entrada.lower() == 'stats off':
+                    self.desativar_instrumentacao()
+                    print("📈 Instrumentação desativada")
+                    continue
+                elif entrada.lower() == 'stats prom':
+                    if self.instrumentacao is None:
+                        self.exibir_estatisticas()
+                    else:
+                        print(self.instrumentacao.prometheus(), end='')
+                    continue
                 elif entrada.lower() == 'help':
                     self.exibir_ajuda()
                     continue
+                elif entrada.lower() == 'modo' or entrada.lower().startswith('modo '):
+                    self.alterar_modo(entrada[5:].split())
+                    continue
+                elif entrada.lower().startswith('tab '):
+                    self.exibir_tabela(entrada[4:])
+                    continue
+                elif entrada.lower().split(' ', 1)[0] in ('export', 'import'):
+                    comando, _, argumentos = entrada.partition(' ')
+                    self.exibir_transferencia(comando.lower(), argumentos)
+                    continue
                     
+                # Definição de função: f(x) = expr
+                definicao = self.interpretar_definicao(entrada)
+                if definicao is not None:
+                    try:
+                        print(f"✅ {self.definir_funcao(*definicao).definicao}")
+                    except Exception as e:
+                        print(f"❌ {_mensagem_erro(e)}")
+                    continue
+
                 # Verifica se é uma atribuição de variável
-                if '=' in entrada and not entrada.startswith('='):
-                    partes = entrada.split('=', 1)
-                    if len(partes) == 2:
-                        var = partes[0].strip()
-                        valor_expr = partes[1].strip()
-                        
-                        if var.isidentifier():
-                            resultado = self.calcular(valor_expr)
-                            if isinstance(resultado, (int, float)):
-                                self.memoria[var] = resultado
-                                print(f"✅ {var} = {resultado}")
-                            else:
-                                print(f"❌ {resultado}")
-                            continue
+                atribuicao = self.interpretar_atribuicao(entrada)
+                if atribuicao is not None:
+                    var, valor_expr = atribuicao
+                    resultado = self.atribuir(var, valor_expr)
+                    if isinstance(resultado, self.backend.tipos):
+                        print(f"✅ {var} = {resultado}")
+                        if self.planilha is not None and self.planilha.recalculadas:
+                            print(f"🔁 Recalculadas: {', '.join(self.planilha.recalculadas)}")
+                    else:
+                        print(f"❌ {resultado}")
+                    continue
                             
                 # Cálculo normal
                 resultado = self.calcular(entrada)
@@ -311,14 +3498,257 @@ class CalculadoraOtimizada:
             except Exception as e:
                 print(f"❌ Erro inesperado: {str(e)}")
 
-def main():
+
+# Calculadora de cada processo do pool de `calcular_muitos`
+_calculadora_trabalhador: Optional[CalculadoraOtimizada] = None
+
+
+def _iniciar_trabalhador(funcoes: Dict[str, Any], tamanho_cache: int, expressoes: List[str],
+                        numerico: str = 'float', precisao: Optional[int] = None):
+    """Cria a calculadora do processo e pré-aquece seu cache."""
+    global _calculadora_trabalhador
+    _calculadora_trabalhador = CalculadoraOtimizada(tamanho_cache, numerico=numerico,
+                                                    precisao=precisao)
+    _calculadora_trabalhador.funcoes_disponiveis = funcoes
+    for expressao in expressoes:
+        _calculadora_trabalhador.compilar_expressao(expressao)
+
+
+def _avaliar_bloco_trabalhador(memoria: Dict[str, Any], bloco: List[Any]) -> List[Any]:
+    """Avalia um bloco no processo do pool com a memória do processo pai."""
+    _calculadora_trabalhador.memoria = memoria
+    return _calculadora_trabalhador._avaliar_bloco(bloco)
+
+
+def _formatar_plain(resultados: Iterable[Tuple[str, Any]]) -> Iterator[str]:
+    for _, resultado in resultados:
+        yield f"{resultado}\n"
+
+
+def _formatar_csv(resultados: Iterable[Tuple[str, Any]]) -> Iterator[str]:
+    import csv
+    import io
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    escritor.writerow(('expressao', 'resultado'))
+    for linha in resultados:
+        escritor.writerow(linha)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _formatar_jsonl(resultados: Iterable[Tuple[str, Any]]) -> Iterator[str]:
+    import json
+    for expressao, resultado in resultados:
+        if isinstance(resultado, str):
+            chave = 'erro'
+        elif isinstance(resultado, FuncaoUsuario):
+            chave, resultado = 'funcao', resultado.definicao
+        else:
+            chave = 'resultado'
+            # JSON não tem NaN nem infinito: em qualquer backend, viram null
+            if resultado != resultado or resultado in (math.inf, -math.inf):
+                resultado = None
+            # Decimal, Fraction, complexos e mpf vão como texto, como em --tabular
+            elif not isinstance(resultado, (int, float)):
+                resultado = str(resultado)
+        yield json.dumps({'expressao': expressao, chave: resultado}, ensure_ascii=False,
+                         allow_nan=False) + "\n"
+
+
+_FORMATADORES_FLUXO = {
+    'plain': _formatar_plain,
+    'csv': _formatar_csv,
+    'jsonl': _formatar_jsonl,
+}
+
+
+def _argumentos(argv: Optional[List[str]]) -> Any:
+    """Interpreta os argumentos da linha de comando."""
+    import argparse
+    parser = argparse.ArgumentParser(prog='calculadora', description="Calculadora Otimizada")
+    parser.add_argument('-c', '--comando', metavar='EXPR',
+                        help="avalia EXPR, escreve o resultado e termina")
+    parser.add_argument('--stream', nargs='?', const='-', metavar='ARQUIVO',
+                        help="avalia expressões linha a linha de ARQUIVO ou da entrada padrão")
+    parser.add_argument('--dados', metavar='DIRETORIO',
+                        help="persiste o histórico e a memória em DIRETORIO")
+    parser.add_argument('--reativo', action='store_true',
+                        help="atribuições formam uma planilha: dependentes são recalculados")
+    parser.add_argument('--metricas', metavar='ARQUIVO',
+                        help="coleta métricas e as grava em ARQUIVO (formato Prometheus) ao sair")
+    parser.add_argument('--numerico', choices=('float', 'decimal', 'fracao', 'mpmath'),
+                        default='float', help="backend numérico (padrão: float)")
+    parser.add_argument('--precisao', type=int, metavar='DIGITOS',
+                        help="dígitos significativos dos backends decimal e mpmath")
+    parser.add_argument('--tempo-limite', type=float, metavar='SEGUNDOS',
+                        help="interrompe avaliações que passem de SEGUNDOS")
+    parser.add_argument('--tabular', metavar='"EXPR, VAR, INICIO, FIM, PASSO"',
+                        help="escreve a tabela de EXPR com VAR de INICIO a FIM e termina")
+    parser.add_argument('--formato', choices=sorted(_FORMATADORES_FLUXO), default='plain',
+                        help="formato da saída nos modos --stream e --tabular (padrão: plain)")
+    return parser.parse_args(argv)
+
+
+def _argumentos_conjunto(argv: List[str]) -> Any:
+    """Interpreta os argumentos do subcomando eval-dataset."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='calculadora eval-dataset',
+        description="Aplica uma expressão a cada linha de um arquivo CSV ou Parquet")
+    parser.add_argument('--expr', required=True, metavar='EXPR',
+                        help="expressão; as colunas do arquivo são as variáveis")
+    parser.add_argument('--in', dest='entrada', required=True, metavar='ARQUIVO',
+                        help="arquivo de entrada (.csv, .parquet ou - para a entrada padrão)")
+    parser.add_argument('--out', dest='saida', required=True, metavar='ARQUIVO',
+                        help="arquivo de saída (.csv, .parquet ou - para a saída padrão)")
+    parser.add_argument('--coluna', default='resultado',
+                        help="nome da coluna do resultado (padrão: resultado)")
+    parser.add_argument('--bloco', type=int, metavar='LINHAS',
+                        help="linhas avaliadas por vez (padrão: 65536)")
+    parser.add_argument('--dados', metavar='DIRETORIO',
+                        help="usa a memória persistida em DIRETORIO")
+    parser.add_argument('--numerico', choices=('float', 'decimal', 'fracao', 'mpmath'),
+                        default='float', help="backend numérico (padrão: float)")
+    parser.add_argument('--precisao', type=int, metavar='DIGITOS',
+                        help="dígitos significativos dos backends decimal e mpmath")
+    return parser.parse_args(argv)
+
+
+def _executar_conjunto(argv: List[str]) -> int:
+    """Executa o subcomando eval-dataset e retorna o código de saída."""
+    argumentos = _argumentos_conjunto(argv)
+    calc = CalculadoraOtimizada(diretorio_dados=argumentos.dados, numerico=argumentos.numerico,
+                                precisao=argumentos.precisao)
+    resultado = calc.avaliar_conjunto(argumentos.expr, argumentos.entrada, argumentos.saida,
+                                      argumentos.coluna, argumentos.bloco)
+    if isinstance(resultado, str):
+        print(resultado, file=sys.stderr)
+        return 1
+    return 0
+
+
+def _executar_fluxo(calc: CalculadoraOtimizada, origem: str, formato: str):
+    """Executa o modo --stream com E/S bufferizada."""
+    try:
+        saida = open(sys.stdout.fileno(), 'w', encoding='utf-8',
+                     buffering=1 << 16, closefd=False)
+    except (AttributeError, OSError, ValueError):
+        saida = sys.stdout
+    try:
+        if origem == '-':
+            calc.executar_fluxo(sys.stdin, saida, formato)
+        else:
+            with open(origem, encoding='utf-8', buffering=1 << 16) as entrada:
+                calc.executar_fluxo(entrada, saida, formato)
+        saida.flush()
+    except BrokenPipeError:
+        # O consumidor (ex.: `head`) fechou a saída antes do fim
+        sys.stderr.close()
+
+
+def _formatar_tabela(pontos: Iterable[Tuple[Any, Any]], var: str,
+                     formato: str) -> Iterator[str]:
+    """Linhas do modo --tabular nos formatos de --stream; NaN fica vazio em CSV e null em JSONL."""
+    if formato == 'plain':
+        for x, y in pontos:
+            yield f"{x}\t{y}\n"
+        return
+    if formato == 'csv':
+        yield f"{var},resultado\n"
+        for x, y in pontos:
+            yield f"{x},{'' if y is None or y != y else y}\n"
+        return
+    import json
+    for x, y in pontos:
+        if y is None or y != y:
+            y = None
+        elif not isinstance(y, (int, float)):
+            y = str(y)
+        x = x if isinstance(x, (int, float)) else str(x)
+        yield json.dumps({var: x, 'resultado': y}, ensure_ascii=False) + "\n"
+
+
+def _executar_tabela(calc: CalculadoraOtimizada, texto: str, formato: str) -> int:
+    """Executa o modo --tabular e retorna o código de saída."""
+    try:
+        expressao, var, inicio, fim, passo = calc.interpretar_tabulacao(texto)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    pontos = calc.tabular(expressao, var, inicio, fim, passo)
+    if isinstance(pontos, str):
+        print(pontos, file=sys.stderr)
+        return 1
+    try:
+        sys.stdout.writelines(_formatar_tabela(pontos, var, formato))
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # O consumidor (ex.: `head`) fechou a saída antes do fim
+        sys.stderr.close()
+    return 0
+
+
+def _executar_comando(calc: CalculadoraOtimizada, entrada: str) -> int:
+    """Executa o modo -c: avalia uma entrada e retorna o código de saída."""
+    atribuicao = calc.interpretar_atribuicao(entrada)
+    if atribuicao is not None:
+        resultado = calc.atribuir(*atribuicao)
+    else:
+        resultado = calc.calcular(entrada)
+    if isinstance(resultado, str):
+        print(resultado, file=sys.stderr)
+        return 1
+    print(resultado)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None):
     """Função principal."""
+    if argv is None:
+        argv = sys.argv[1:]
+    codigo = 0
+    if argv and argv[0] == 'eval-dataset':
+        codigo = _executar_conjunto(argv[1:])
+        if codigo:
+            sys.exit(codigo)
+        return
+    if len(argv) == 2 and argv[0] in ('-c', '--comando'):
+        # Caminho rápido para invocações curtas: dispensa o argparse
+        argumentos = None
+        comando = argv[1]
+    else:
+        argumentos = _argumentos(argv) if argv else None
+        comando = argumentos.comando if argumentos is not None else None
     try:
-        calc = CalculadoraOtimizada()
-        calc.executar()
+        calc = CalculadoraOtimizada(
+            diretorio_dados=argumentos.dados if argumentos is not None else None,
+            reativo=argumentos is not None and argumentos.reativo,
+            instrumentar=argumentos is not None and argumentos.metricas is not None,
+            numerico=argumentos.numerico if argumentos is not None else 'float',
+            precisao=argumentos.precisao if argumentos is not None else None)
+        if argumentos is not None and argumentos.tempo_limite is not None:
+            calc.definir_orcamento(OrcamentoAvaliacao(tempo_limite=argumentos.tempo_limite))
+        try:
+            if comando is not None:
+                codigo = _executar_comando(calc, comando)
+            elif argumentos is not None and argumentos.tabular is not None:
+                codigo = _executar_tabela(calc, argumentos.tabular, argumentos.formato)
+            elif argumentos is not None and argumentos.stream is not None:
+                _executar_fluxo(calc, argumentos.stream, argumentos.formato)
+            else:
+                calc.executar()
+        finally:
+            if (calc.instrumentacao is not None and argumentos is not None
+                    and argumentos.metricas):
+                with open(argumentos.metricas, 'w', encoding='utf-8') as arquivo:
+                    arquivo.write(calc.instrumentacao.prometheus())
     except Exception as e:
         print(f"❌ Erro fatal: {str(e)}")
         sys.exit(1)
+    if codigo:
+        sys.exit(codigo)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Calculadora compartilhada entre threads
+Autor: Calculadora Team
+Versão: 2.0.0
+
+`CalculadoraConcorrente` pode ser usada por várias threads ao mesmo tempo
+(ex.: em um servidor). A avaliação não usa travas: as expressões
+compiladas não têm estado, e a memória é lida de um instantâneo imutável.
+Só as escritas são sincronizadas:
+
+- memória: cópia na escrita (`MemoriaCompartilhada`); cada escrita copia o
+  dicionário, altera a cópia e publica-a trocando uma referência;
+- histórico: cada thread acrescenta em um buffer próprio, e os buffers são
+  mesclados em ordem de tempo quando o histórico é lido ou quando uma nova
+  thread registra o seu e há threads encerradas.
+"""
+
+import heapq
+import threading
+from collections.abc import MutableMapping
+from collections import deque
+from operator import itemgetter
+from time import perf_counter_ns, time
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from calculadora import (CacheExpressoes, CalculadoraOtimizada, HistoricoCircular,
+                         MemoizacaoResultados, _mensagem_erro)
+
+_SEM_INSTRUMENTACAO = "a instrumentação não está disponível na calculadora concorrente"
+
+
+class MemoriaCompartilhada(MutableMapping):
+    """Memória com leituras sem trava e escritas por cópia.
+
+    O dicionário retornado por `instantaneo()` nunca é alterado depois de
+    publicado, então uma avaliação vê todas as variáveis de uma mesma
+    versão. As escritas são serializadas por uma trava; `update` copia uma
+    única vez para várias variáveis.
+    """
+
+    def __init__(self, valores: Any = ()):
+        self._atual: Dict[str, Any] = dict(valores)
+        self._trava = threading.Lock()
+
+    def instantaneo(self) -> Dict[str, Any]:
+        """Retorna a versão atual (não a altere)."""
+        return self._atual
+
+    def __getitem__(self, var: str) -> Any:
+        return self._atual[var]
+
+    def __contains__(self, var: object) -> bool:
+        return var in self._atual
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._atual)
+
+    def __len__(self) -> int:
+        return len(self._atual)
+
+    def get(self, var: str, padrao: Any = None) -> Any:
+        return self._atual.get(var, padrao)
+
+    def __setitem__(self, var: str, valor: Any):
+        with self._trava:
+            novo = dict(self._atual)
+            novo[var] = valor
+            self._atual = novo
+
+    def __delitem__(self, var: str):
+        with self._trava:
+            novo = dict(self._atual)
+            del novo[var]
+            self._atual = novo
+
+    def update(self, *args, **kwargs):
+        with self._trava:
+            novo = dict(self._atual)
+            novo.update(*args, **kwargs)
+            self._atual = novo
+
+    def clear(self):
+        with self._trava:
+            self._atual = {}
+
+    def copy(self) -> Dict[str, Any]:
+        return dict(self._atual)
+
+    def __repr__(self):
+        return f"MemoriaCompartilhada({self._atual!r})"
+
+
+class CacheConcorrente(CacheExpressoes):
+    """Cache LRU que tolera acessos simultâneos sem trava.
+
+    Cada operação do `OrderedDict` é atômica; o que pode acontecer entre
+    duas delas (outra thread descartar a chave) é ignorado. Os contadores
+    de acertos e falhas são aproximados sob concorrência.
+    """
+
+    def obter(self, chave: str) -> Any:
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            self.falhas += 1
+            return None
+        try:
+            self._entradas.move_to_end(chave)
+        except KeyError:
+            pass
+        self.acertos += 1
+        return entrada
+
+    def armazenar(self, chave: str, entrada: Any):
+        if self.capacidade <= 0:
+            return
+        self._entradas[chave] = entrada
+        try:
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+        except KeyError:
+            pass
+
+    def chaves(self) -> List[str]:
+        while True:
+            try:
+                return list(self._entradas)
+            except RuntimeError:
+                # Alterado durante a cópia por outra thread
+                continue
+
+    def descartar(self, predicado: Any) -> int:
+        while True:
+            try:
+                itens = list(self._entradas.items())
+                break
+            except RuntimeError:
+                continue
+        chaves = [chave for chave, entrada in itens if predicado(entrada)]
+        for chave in chaves:
+            self._entradas.pop(chave, None)
+        return len(chaves)
+
+
+class MemoizacaoConcorrente(CacheConcorrente, MemoizacaoResultados):
+    """Memoização de resultados que tolera acessos simultâneos sem trava."""
+
+
+class CalculadoraConcorrente(CalculadoraOtimizada):
+    """Calculadora que pode ser compartilhada entre threads.
+
+    `calcular` e `avaliar` não usam travas. `memoria` é uma
+    `MemoriaCompartilhada`, e `historico` reúne os registros de todas as
+    threads, ordenados pelo instante do cálculo. Os modos reativo,
+    persistente e instrumentado mantêm estado mutável por cálculo e não
+    estão disponíveis nesta variante (`instrumentar=True` e
+    `ativar_instrumentacao` levantam ValueError); trocar o backend numérico
+    também deve ser feito antes de compartilhar a instância.
+    """
+
+    def __init__(self, tamanho_cache: int = 1024, capacidade_historico: int = 50,
+                 numerico: str = 'float', precisao: Optional[int] = None,
+                 instrumentar: bool = False):
+        if instrumentar:
+            raise ValueError(_SEM_INSTRUMENTACAO)
+        self._trava_historico = threading.Lock()
+        self._buffers: List[tuple] = []
+        self._local = threading.local()
+        super().__init__(tamanho_cache, capacidade_historico, numerico=numerico,
+                         precisao=precisao)
+        self.memoria = MemoriaCompartilhada(self.memoria)
+        self.cache_expressoes = CacheConcorrente(tamanho_cache)
+
+    @property
+    def historico(self) -> HistoricoCircular:
+        """Histórico com os cálculos de todas as threads, em ordem."""
+        with self._trava_historico:
+            self._mesclar()
+        return self._historico
+
+    @historico.setter
+    def historico(self, historico: HistoricoCircular):
+        self._historico = historico
+
+    def _mesclar(self):
+        """Esvazia os buffers das threads no histórico (com a trava)."""
+        lotes = []
+        ativos = []
+        for thread, buffer in self._buffers:
+            registros = []
+            # popleft é atômico, e a thread dona pode continuar acrescentando
+            while buffer:
+                try:
+                    registros.append(buffer.popleft())
+                except IndexError:
+                    break
+            if registros:
+                lotes.append(registros)
+            if thread.is_alive() or buffer:
+                ativos.append((thread, buffer))
+        self._buffers = ativos
+        adicionar = self._historico.adicionar
+        for _, instante, expressao, resultado in heapq.merge(*lotes, key=itemgetter(0)):
+            adicionar(expressao, resultado, instante)
+
+    def _buffer(self) -> deque:
+        """Buffer de histórico da thread atual, registrado no primeiro uso."""
+        buffer = deque(maxlen=self._historico.capacidade)
+        with self._trava_historico:
+            # Sem isso, cada thread encerrada deixaria seu buffer até a próxima leitura
+            if not all(thread.is_alive() for thread, _ in self._buffers):
+                self._mesclar()
+            self._buffers.append((threading.current_thread(), buffer))
+        self._local.buffer = buffer
+        return buffer
+
+    def adicionar_ao_historico(self, expressao: str, resultado: Any):
+        """Registra o cálculo no buffer da thread atual, sem trava."""
+        try:
+            buffer = self._local.buffer
+        except AttributeError:
+            buffer = self._buffer()
+        buffer.append((perf_counter_ns(), time(), expressao, resultado))
+
+    def calcular(self, expressao: str) -> Union[float, str]:
+        """Calcula a expressão com um instantâneo da memória."""
+        try:
+            memoria = self.memoria.instantaneo()
+            resultado = self.compilar_expressao(expressao, memoria).avaliar(memoria)
+            self.adicionar_ao_historico(expressao, resultado)
+            return resultado
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def avaliar(self, expressao: str, variaveis: Optional[Dict[str, Any]] = None) -> Any:
+        """Avalia sem registrar no histórico, com um instantâneo da memória."""
+        try:
+            memoria = self._memoria_com(variaveis)
+            return self.compilar_expressao(expressao, memoria).avaliar(memoria)
+        except Exception as e:
+            return _mensagem_erro(e)
+
+    def _memoria_com(self, variaveis: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        memoria = self.memoria.instantaneo()
+        if variaveis:
+            converter = self.backend.converter
+            if converter is not None:
+                variaveis = {nome: converter(valor) for nome, valor in variaveis.items()}
+            memoria = dict(memoria, **variaveis) if memoria else variaveis
+        return memoria
+
+    def _avaliar_bloco(self, bloco: List[Any],
+                       memoria: Optional[Dict[str, Any]] = None) -> List[Any]:
+        if memoria is None:
+            return super()._avaliar_bloco(bloco)
+        # Sem trocar self.memoria, que as outras threads estão lendo
+        sessao = self.nova_sessao()
+        sessao.memoria = memoria
+        return sessao._avaliar_bloco(bloco)
+
+    def _criar_memoizacao(self, capacidade: int) -> MemoizacaoResultados:
+        return MemoizacaoConcorrente(capacidade)
+
+    def ativar_instrumentacao(self, limite_lentas: int = 10):
+        """Recusada: as métricas e os métodos instrumentados não são seguros entre threads."""
+        raise ValueError(_SEM_INSTRUMENTACAO)
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Avaliação de expressões sobre conjuntos de dados da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+
+Aplica uma expressão a cada linha de um arquivo CSV (ou Parquet, com o
+pyarrow instalado): as colunas usadas pela expressão viram variáveis, as
+demais variáveis vêm da memória, e a saída repete as colunas da entrada
+com uma coluna a mais para o resultado.
+
+O arquivo é lido em blocos de `BLOCO` linhas e cada bloco é avaliado de
+uma vez (com NumPy no backend `float`, como em `calcular_lote`). A
+leitura e a escrita correm em threads próprias, com filas limitadas, de
+modo que o disco trabalha enquanto o bloco anterior é calculado e a
+memória usada depende do tamanho do bloco, não do arquivo. A saída é
+gravada em um arquivo temporário e renomeada ao final: um erro no meio
+do caminho não deixa um resultado pela metade.
+
+Células vazias ou que não são números dão resultado vazio (null no
+Parquet), assim como os pontos inválidos (domínio, divisão por zero).
+"""
+
+import csv
+import os
+import queue
+import sys
+import threading
+from contextlib import ExitStack
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from calculadora import _usos, analisar_expressao
+from tabulacao import _Tabulador
+
+BLOCO = 65536
+
+# Blocos em espera em cada fila (leitura e escrita)
+_ADIANTADOS = 2
+
+_EXTENSOES_PARQUET = ('.parquet', '.pq')
+
+_INVALIDO = object()
+_FIM = object()
+_NAN = float('nan')
+
+Bloco = Dict[str, Sequence[Any]]
+
+
+def _parquet(caminho: str) -> bool:
+    return caminho.lower().endswith(_EXTENSOES_PARQUET)
+
+
+def _pyarrow() -> Tuple[Any, Any]:
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("o formato Parquet requer o pyarrow instalado") from None
+    return pyarrow, pyarrow.parquet
+
+
+# ---------------------------------------------------------------- leitura
+
+def _ler_csv(arquivo: Any, bloco: int) -> Tuple[List[str], Iterator[Bloco]]:
+    leitor = csv.reader(arquivo)
+    cabecalho = next(leitor, None)
+    if not cabecalho:
+        raise ValueError("arquivo sem cabeçalho")
+    return cabecalho, _blocos_csv(leitor, cabecalho, bloco)
+
+
+def _blocos_csv(leitor: Any, cabecalho: List[str], bloco: int) -> Iterator[Bloco]:
+    largura = len(cabecalho)
+    # O cabeçalho é o registro 1
+    primeiro = 2
+    while True:
+        linhas = list(islice(leitor, bloco))
+        if not linhas:
+            return
+        if any(len(linha) != largura for linha in linhas):
+            for registro, linha in enumerate(linhas, primeiro):
+                if len(linha) != largura:
+                    raise ValueError(f"registro {registro}: {len(linha)} campos, "
+                                     f"esperados {largura}")
+        primeiro += len(linhas)
+        yield dict(zip(cabecalho, zip(*linhas)))
+
+
+def _ler_parquet(caminho: str, bloco: int) -> Tuple[List[str], Iterator[Bloco]]:
+    _, pq = _pyarrow()
+    arquivo = pq.ParquetFile(caminho)
+    cabecalho = list(arquivo.schema_arrow.names)
+    lotes = arquivo.iter_batches(batch_size=bloco)
+    return cabecalho, (dict(zip(cabecalho, lote.columns)) for lote in lotes)
+
+
+def _em_segundo_plano(itens: Iterable[Any], limite: int = _ADIANTADOS) -> Iterator[Any]:
+    """Produz os itens de `itens` a partir de uma thread, até `limite` à frente."""
+    fila = queue.Queue(limite)
+    parar = threading.Event()
+
+    def colocar(item: Any) -> bool:
+        while not parar.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produzir():
+        try:
+            for item in itens:
+                if not colocar((item, None)):
+                    return
+        except BaseException as e:
+            colocar((_FIM, e))
+        else:
+            colocar((_FIM, None))
+
+    produtor = threading.Thread(target=produzir, name='conjuntos-leitura', daemon=True)
+    produtor.start()
+    try:
+        while True:
+            item, erro = fila.get()
+            if item is _FIM:
+                if erro is not None:
+                    raise erro
+                return
+            yield item
+    finally:
+        parar.set()
+        produtor.join()
+
+
+# ---------------------------------------------------------------- escrita
+
+def _texto_resultado(valor: Any) -> Any:
+    return '' if valor is None or valor != valor else valor
+
+
+class _EscritorCSV:
+    def __init__(self, arquivo: Any, cabecalho: List[str]):
+        self.escritor = csv.writer(arquivo, lineterminator='\n')
+        self.escritor.writerow(cabecalho)
+
+    def escrever(self, entrada: Bloco, resultados: Any):
+        colunas = [coluna.to_pylist() if hasattr(coluna, 'to_pylist') else coluna
+                   for coluna in entrada.values()]
+        if not isinstance(resultados, list):
+            resultados = resultados.tolist()
+        self.escritor.writerows(zip(*colunas, map(_texto_resultado, resultados)))
+
+    def fechar(self):
+        pass
+
+
+class _EscritorParquet:
+    def __init__(self, caminho: str, cabecalho: List[str]):
+        self.pa, self.pq = _pyarrow()
+        self.caminho = caminho
+        self.cabecalho = cabecalho
+        self.escritor = None
+
+    def escrever(self, entrada: Bloco, resultados: Any):
+        pa = self.pa
+        colunas = [coluna if isinstance(coluna, pa.Array) else pa.array(list(coluna))
+                   for coluna in entrada.values()]
+        if isinstance(resultados, list):
+            # Backends exatos: o texto preserva todos os dígitos
+            resultados = pa.array([None if valor is None or valor != valor else str(valor)
+                                   for valor in resultados])
+        else:
+            resultados = pa.array(resultados, from_pandas=True)
+        tabela = pa.Table.from_arrays(colunas + [resultados], names=self.cabecalho)
+        if self.escritor is None:
+            self.escritor = self.pq.ParquetWriter(self.caminho, tabela.schema)
+        self.escritor.write_table(tabela)
+
+    def fechar(self):
+        if self.escritor is None:
+            # Entrada sem linhas: grava só as colunas
+            pa = self.pa
+            esquema = pa.schema([(nome, pa.null()) for nome in self.cabecalho])
+            self.escritor = self.pq.ParquetWriter(self.caminho, esquema)
+        self.escritor.close()
+
+
+def _escrever_em_segundo_plano(escritor: Any, blocos: Iterable[Tuple[Bloco, Any]],
+                               limite: int = _ADIANTADOS) -> int:
+    """Entrega os blocos calculados a uma thread de escrita; retorna o total de linhas."""
+    fila = queue.Queue(limite)
+    erros = []
+    linhas = 0
+
+    def consumir():
+        try:
+            while True:
+                item = fila.get()
+                if item is _FIM:
+                    return
+                escritor.escrever(*item)
+        except BaseException as e:
+            erros.append(e)
+            # Libera o produtor, que pode estar esperando espaço na fila
+            while fila.get() is not _FIM:
+                pass
+
+    consumidor = threading.Thread(target=consumir, name='conjuntos-escrita', daemon=True)
+    consumidor.start()
+    try:
+        for item in blocos:
+            if erros:
+                break
+            linhas += len(item[1])
+            fila.put(item)
+    finally:
+        fila.put(_FIM)
+        consumidor.join()
+    if erros:
+        raise erros[0]
+    return linhas
+
+
+# ---------------------------------------------------------------- avaliação
+
+class _AvaliadorBlocos:
+    """Avalia a expressão compilada sobre os blocos de colunas."""
+
+    def __init__(self, calc: Any, expressao: str, cabecalho: Sequence[str], np: Any = None):
+        compilada = calc.compilar_expressao(expressao)
+        # Colunas com nomes de constantes (`e`, `pi`) também são lidas da linha
+        nomes = _usos(analisar_expressao(compilada.texto), {})
+        self.usadas = [nome for nome in nomes if nome in cabecalho]
+        self.tabulador = _Tabulador(calc, expressao, self.usadas, np)
+        self.np = np
+        self.faltante = _NAN if self.tabulador.converter is None else None
+
+    def avaliar(self, bloco: Bloco) -> Any:
+        tamanho = len(next(iter(bloco.values())))
+        if self.np is not None:
+            return self._avaliar_numpy(bloco, tamanho)
+        return self._avaliar_python(bloco, tamanho)
+
+    def _avaliar_numpy(self, bloco: Bloco, tamanho: int) -> Any:
+        np = self.np
+        colunas = {nome: _vetor(bloco[nome], np) for nome in self.usadas}
+        resultados = self.tabulador.vetor(colunas, tamanho)
+        for coluna in colunas.values():
+            resultados[np.isnan(coluna)] = np.nan
+        return resultados
+
+    def _avaliar_python(self, bloco: Bloco, tamanho: int) -> List[Any]:
+        numero, ponto, faltante = self.tabulador.numero, self.tabulador.ponto, self.faltante
+        colunas = []
+        for nome in self.usadas:
+            coluna = bloco[nome]
+            if hasattr(coluna, 'to_pylist'):
+                coluna = coluna.to_pylist()
+            colunas.append([_celula(numero, valor) for valor in coluna])
+        if not colunas:
+            return [ponto()] * tamanho
+        return [faltante if _INVALIDO in valores else ponto(*valores)
+                for valores in zip(*colunas)]
+
+
+def _celula(numero: Any, valor: Any) -> Any:
+    if valor is None:
+        return _INVALIDO
+    try:
+        valor = numero(valor)
+    except (TypeError, ValueError, ArithmeticError):
+        return _INVALIDO
+    # Os conversores dos backends exatos devolvem o texto que não entendem
+    return _INVALIDO if isinstance(valor, str) else valor
+
+
+def _vetor(coluna: Any, np: Any) -> Any:
+    if hasattr(coluna, 'to_numpy'):
+        coluna = coluna.to_numpy(zero_copy_only=False)
+    try:
+        return np.asarray(coluna, dtype=float)
+    except (TypeError, ValueError):
+        return np.array([_float_ou_nan(valor) for valor in coluna], dtype=float)
+
+
+def _float_ou_nan(valor: Any) -> float:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return _NAN
+
+
+def avaliar_conjunto(calc: Any, expressao: str, entrada: str, saida: str,
+                     coluna: str = 'resultado', bloco: int = BLOCO, np: Any = None) -> int:
+    """Avalia `expressao` em cada linha de `entrada` e grava em `saida`.
+
+    O formato vem da extensão (`.parquet`/`.pq` ou CSV); `-` é a entrada
+    ou a saída padrão, em CSV. Retorna o número de linhas. Erros de
+    sintaxe, de nomes e de colunas são levantados antes de qualquer
+    escrita.
+    """
+    if bloco < 1:
+        raise ValueError("o bloco deve ter ao menos uma linha")
+    with ExitStack() as pilha:
+        if _parquet(entrada):
+            cabecalho, blocos = _ler_parquet(entrada, bloco)
+        else:
+            arquivo = sys.stdin if entrada == '-' else pilha.enter_context(
+                open(entrada, newline='', encoding='utf-8', buffering=1 << 20))
+            cabecalho, blocos = _ler_csv(arquivo, bloco)
+        if coluna in cabecalho:
+            raise ValueError(f"a coluna '{coluna}' já existe na entrada")
+        avaliador = _AvaliadorBlocos(calc, expressao, cabecalho, np)
+        destino = pilha.enter_context(_Destino(saida))
+        if _parquet(saida):
+            escritor = _EscritorParquet(destino.caminho, cabecalho + [coluna])
+        else:
+            escritor = _EscritorCSV(destino.arquivo, cabecalho + [coluna])
+        calculados = ((colunas, avaliador.avaliar(colunas))
+                      for colunas in _em_segundo_plano(blocos))
+        try:
+            return _escrever_em_segundo_plano(escritor, calculados)
+        finally:
+            escritor.fechar()
+
+
+class _Destino:
+    """Arquivo temporário renomeado para `caminho` só se tudo der certo."""
+
+    def __init__(self, caminho: str):
+        self.final = caminho
+        self.caminho = None if caminho == '-' else f"{caminho}.{os.getpid()}.tmp"
+        self.arquivo = None
+
+    def __enter__(self) -> '_Destino':
+        if self.caminho is None:
+            self.arquivo = sys.stdout
+        elif not _parquet(self.final):
+            self.arquivo = open(self.caminho, 'w', newline='', encoding='utf-8',
+                                buffering=1 << 20)
+        return self
+
+    def __exit__(self, tipo, *exc):
+        if self.caminho is None:
+            self.arquivo.flush()
+            return
+        if self.arquivo is not None:
+            self.arquivo.close()
+        if tipo is None:
+            os.replace(self.caminho, self.final)
+        elif os.path.exists(self.caminho):
+            os.remove(self.caminho)
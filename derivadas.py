@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Derivadas simbólicas e gradientes da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+
+`derivar_arvore` aplica as regras de derivação à árvore sintática e
+`simplificar` remove os termos nulos e dobra a aritmética entre números.
+Os números são lidos como frações, então a dobra é exata e o texto da
+derivada é analisado de volta em qualquer backend.
+
+`gerar_gradiente` avalia a expressão com números duais (diferenciação
+automática progressiva): cada nó retorna o valor e as derivadas em relação
+a todos os parâmetros, em uma única passada.
+
+As regras valem para as funções padrão da tabela, identificadas pelo
+objeto (`math.sin` etc.) e não pelo nome; as funções do usuário são
+embutidas antes da derivação. Outras funções não têm derivada, a menos
+que não dependam da variável.
+"""
+
+import math
+from decimal import Decimal
+from fractions import Fraction
+from typing import Any, Dict, Optional, Tuple
+
+from calculadora import (NUMERO, NOME, UNARIO, BINARIO, CHAMADA, BackendNumerico,
+                         analisar_expressao, expandir_funcoes, _Formatador, _GeradorModelo,
+                         _Otimizador, _OPERACOES_BINARIAS, _MAXIMO_BITS_DOBRA, _montar_funcao,
+                         _prefixo_livre)
+
+_ZERO = (NUMERO, 0)
+_UM = (NUMERO, 1)
+_DOIS = (NUMERO, 2)
+
+
+def _binario(operador: str, esquerda: tuple, direita: tuple) -> tuple:
+    return (BINARIO, operador, esquerda, direita)
+
+
+def _chamar(nome: str, *argumentos: tuple) -> tuple:
+    return (CHAMADA, nome, argumentos)
+
+
+def _menos(no: tuple) -> tuple:
+    return (UNARIO, '-', no)
+
+
+def _inverso_raiz(u: tuple) -> tuple:
+    """1 / sqrt(1 - u**2)"""
+    return _binario('/', _UM, _chamar('sqrt', _binario('-', _UM, _binario('**', u, _DOIS))))
+
+
+# Função padrão -> (derivada simbólica em u, derivada numérica em (u, f(u), tabela));
+# None marca derivada nula (funções constantes por partes)
+_REGRAS = {
+    math.sin: (lambda u: _chamar('cos', u),
+               lambda u, v, t: t['cos'](u)),
+    math.cos: (lambda u: _menos(_chamar('sin', u)),
+               lambda u, v, t: -t['sin'](u)),
+    math.tan: (lambda u: _binario('+', _UM, _binario('**', _chamar('tan', u), _DOIS)),
+               lambda u, v, t: 1 + v * v),
+    math.asin: (_inverso_raiz,
+                lambda u, v, t: 1 / t['sqrt'](1 - u * u)),
+    math.acos: (lambda u: _menos(_inverso_raiz(u)),
+                lambda u, v, t: -1 / t['sqrt'](1 - u * u)),
+    math.atan: (lambda u: _binario('/', _UM, _binario('+', _UM, _binario('**', u, _DOIS))),
+                lambda u, v, t: 1 / (1 + u * u)),
+    math.sqrt: (lambda u: _binario('/', _UM, _binario('*', _DOIS, _chamar('sqrt', u))),
+                lambda u, v, t: 1 / (2 * v)),
+    math.log10: (lambda u: _binario('/', _UM, _binario('*', u, _chamar('ln', (NUMERO, 10)))),
+                 lambda u, v, t: 1 / (u * t['ln'](10))),
+    math.log: (lambda u: _binario('/', _UM, u),
+               lambda u, v, t: 1 / u),
+    math.exp: (lambda u: _chamar('exp', u),
+               lambda u, v, t: v),
+    abs: (lambda u: _binario('/', u, _chamar('abs', u)),
+          lambda u, v, t: (u > 0) - (u < 0)),
+    math.floor: None,
+    math.ceil: None,
+    round: None,
+}
+
+
+def _regra(no: tuple, funcoes: Dict[str, Any]) -> Tuple[Optional[tuple], Any]:
+    """Retorna (chamada reescrita ou None, regra) para um nó de chamada.
+
+    `ln(u, b)` é reescrita como `ln(u) / ln(b)`; `round(u, n)` aceita o
+    segundo argumento. Funções sem regra levantam ValueError.
+    """
+    nome, argumentos = no[1], no[2]
+    funcao = funcoes.get(nome)
+    try:
+        conhecida = funcao in _REGRAS
+    except TypeError:
+        conhecida = False
+    if conhecida:
+        if funcao is math.log and len(argumentos) == 2:
+            return _binario('/', _chamar(nome, argumentos[0]), _chamar(nome, argumentos[1])), None
+        if len(argumentos) == 1 or funcao is round and len(argumentos) == 2:
+            return None, _REGRAS[funcao]
+    raise ValueError(f"derivada de '{nome}' não disponível")
+
+
+def _depende(no: tuple, nomes: Any) -> bool:
+    """Indica se a árvore usa alguma das variáveis em `nomes`."""
+    tipo = no[0]
+    if tipo == NOME:
+        return no[1] in nomes
+    if tipo == UNARIO:
+        return _depende(no[2], nomes)
+    if tipo == BINARIO:
+        return _depende(no[2], nomes) or _depende(no[3], nomes)
+    if tipo == CHAMADA:
+        return any(_depende(argumento, nomes) for argumento in no[2])
+    return False
+
+
+def derivar_arvore(no: tuple, var: str, funcoes: Dict[str, Any]) -> tuple:
+    """Árvore da derivada de `no` em relação a `var` (sem simplificar).
+
+    Outros nomes são constantes. `funcoes` é a tabela de funções, usada
+    para reconhecer as funções padrão.
+    """
+    if not _depende(no, (var,)):
+        return _ZERO
+    tipo = no[0]
+    if tipo == NOME:
+        return _UM
+
+    if tipo == UNARIO:
+        derivada = derivar_arvore(no[2], var, funcoes)
+        return derivada if no[1] == '+' else _menos(derivada)
+
+    if tipo == BINARIO:
+        operador, a, b = no[1], no[2], no[3]
+        da = derivar_arvore(a, var, funcoes)
+        db = derivar_arvore(b, var, funcoes)
+        if operador in ('+', '-'):
+            return _binario(operador, da, db)
+        if operador == '*':
+            return _binario('+', _binario('*', da, b), _binario('*', a, db))
+        if operador == '/':
+            if not _depende(b, (var,)):
+                return _binario('/', da, b)
+            numerador = _binario('-', _binario('*', da, b), _binario('*', a, db))
+            return _binario('/', numerador, _binario('**', b, _DOIS))
+        if operador == '**':
+            if not _depende(b, (var,)):
+                return _binario('*', _binario('*', b, _binario('**', a, _binario('-', b, _UM))), da)
+            if not _depende(a, (var,)):
+                if a[0] == NOME and funcoes.get(a[1]) == math.e:
+                    return _binario('*', no, db)
+                return _binario('*', _binario('*', no, _chamar('ln', a)), db)
+            interno = _binario('+', _binario('*', db, _chamar('ln', a)),
+                               _binario('/', _binario('*', b, da), a))
+            return _binario('*', no, interno)
+        if operador == '//':
+            return _ZERO
+        # a % b = a - (a // b) * b, com a // b constante por partes
+        return _binario('-', da, _binario('*', _binario('//', a, b), db))
+
+    reescrita, regra = _regra(no, funcoes)
+    if reescrita is not None:
+        return derivar_arvore(reescrita, var, funcoes)
+    if regra is None:
+        return _ZERO
+    u = no[2][0]
+    return _binario('*', regra[0](u), derivar_arvore(u, var, funcoes))
+
+
+def _numero(no: tuple, valor: Any) -> bool:
+    return no[0] == NUMERO and no[1] == valor
+
+
+def _negativo(no: tuple) -> bool:
+    return no[0] == NUMERO and no[1] < 0 or no[0] == UNARIO and no[1] == '-'
+
+
+def _dobrar(operador: str, a: Any, b: Any) -> Optional[Any]:
+    """Resultado exato da operação entre inteiros/frações, ou None."""
+    if operador == '**':
+        if isinstance(b, Fraction) and b.denominator != 1:
+            return None
+        base = Fraction(a)
+        tamanho = max(base.numerator.bit_length(), base.denominator.bit_length())
+        if abs(b) * tamanho > _MAXIMO_BITS_DOBRA or base == 0 and b < 0:
+            return None
+        resultado = base ** int(b)
+    elif operador in ('/', '//', '%'):
+        if b == 0:
+            return None
+        resultado = Fraction(a) / b if operador == '/' else _OPERACOES_BINARIAS[operador](a, b)
+    else:
+        resultado = _OPERACOES_BINARIAS[operador](a, b)
+    resultado = Fraction(resultado)
+    return resultado.numerator if resultado.denominator == 1 else resultado
+
+
+def _negar(no: tuple) -> tuple:
+    if no[0] == NUMERO:
+        return (NUMERO, -no[1])
+    if no[0] == UNARIO and no[1] == '-':
+        return no[2]
+    if no[0] == BINARIO and no[1] == '-':
+        return _binario('-', no[3], no[2])
+    return _menos(no)
+
+
+def _simplificar_binario(operador: str, a: tuple, b: tuple) -> tuple:
+    if a[0] == NUMERO and b[0] == NUMERO:
+        dobrado = _dobrar(operador, a[1], b[1])
+        if dobrado is not None:
+            return (NUMERO, dobrado)
+
+    if operador == '+':
+        if _numero(a, 0):
+            return b
+        if _numero(b, 0):
+            return a
+        if a == b:
+            return _simplificar_binario('*', _DOIS, a)
+        if _negativo(b):
+            return _simplificar_binario('-', a, _negar(b))
+        if _negativo(a):
+            return _simplificar_binario('-', b, _negar(a))
+    elif operador == '-':
+        if _numero(b, 0):
+            return a
+        if _numero(a, 0):
+            return _negar(b)
+        if a == b:
+            return _ZERO
+        if _negativo(b):
+            return _simplificar_binario('+', a, _negar(b))
+    elif operador == '*':
+        if _numero(a, 0) or _numero(b, 0):
+            return _ZERO
+        if _numero(a, 1):
+            return b
+        if _numero(b, 1):
+            return a
+        if _negativo(a):
+            return _negar(_simplificar_binario('*', _negar(a), b))
+        if _negativo(b):
+            return _negar(_simplificar_binario('*', a, _negar(b)))
+        if a == b:
+            return _simplificar_binario('**', a, _DOIS)
+        # Números à esquerda, reunidos em um só coeficiente
+        if b[0] == NUMERO:
+            a, b = b, a
+        if b[0] == BINARIO and b[1] == '*' and b[2][0] == NUMERO:
+            return _simplificar_binario('*', _simplificar_binario('*', b[2], a), b[3])
+        if a[0] == BINARIO and a[1] == '*' and a[2][0] == NUMERO and a[3] == b:
+            return _simplificar_binario('*', a[2], _simplificar_binario('*', a[3], b))
+    elif operador == '/':
+        if _numero(a, 0):
+            return _ZERO
+        if _numero(b, 1):
+            return a
+        if a == b:
+            return _UM
+        if _negativo(a):
+            return _negar(_simplificar_binario('/', _negar(a), b))
+        if _negativo(b):
+            return _negar(_simplificar_binario('/', a, _negar(b)))
+    elif operador == '**':
+        if _numero(b, 0) or _numero(a, 1):
+            return _UM
+        if _numero(b, 1):
+            return a
+    return (BINARIO, operador, a, b)
+
+
+def simplificar(no: tuple) -> tuple:
+    """Remove termos nulos e identidades e dobra a aritmética entre números.
+
+    As regras são algébricas (ex.: 0 * x = 0), próprias para exibir
+    derivadas; não preservam NaN nem infinitos.
+    """
+    tipo = no[0]
+    if tipo == UNARIO:
+        operando = simplificar(no[2])
+        return operando if no[1] == '+' else _negar(operando)
+    if tipo == BINARIO:
+        return _simplificar_binario(no[1], simplificar(no[2]), simplificar(no[3]))
+    if tipo == CHAMADA:
+        return (CHAMADA, no[1], tuple(simplificar(argumento) for argumento in no[2]))
+    return no
+
+
+class _FormatadorExato(_Formatador):
+    """Escreve frações com denominador 2^a·5^b como decimais exatos."""
+
+    def numero(self, valor: Any) -> Tuple[str, int]:
+        if isinstance(valor, Fraction) and valor.denominator != 1:
+            denominador = valor.denominator
+            casas = 0
+            while denominador % 10 == 0 or denominador % 2 == 0 or denominador % 5 == 0:
+                for fator in (2, 5):
+                    if denominador % fator == 0:
+                        denominador //= fator
+                casas += 1
+            if denominador == 1:
+                escalado = valor.numerator * 10 ** casas // valor.denominator
+                valor = Decimal(escalado).scaleb(-casas)
+                return super().numero(format(valor, 'f'))
+        return super().numero(valor)
+
+
+def derivar_texto(texto: str, var: str, funcoes: Dict[str, Any]) -> str:
+    """Texto da derivada simplificada de `texto` em relação a `var`."""
+    arvore = expandir_funcoes(analisar_expressao(texto, Fraction), funcoes, Fraction,
+                              constantes=False)
+    derivada = simplificar(derivar_arvore(arvore, var, funcoes))
+    return _FormatadorExato().formatar(derivada)[0]
+
+
+# Vetores de derivadas (None = todas nulas)
+
+def _somar(a: Optional[list], b: Optional[list]) -> Optional[list]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return [x + y for x, y in zip(a, b)]
+
+
+def _escalar(a: Optional[list], fator: Any) -> Optional[list]:
+    return None if a is None else [fator * x for x in a]
+
+
+def _oposto(a: Optional[list]) -> Optional[list]:
+    return None if a is None else [-x for x in a]
+
+
+class _CompiladorDual:
+    """Compila a árvore em closures que retornam (valor, derivadas).
+
+    As closures recebem a tupla de valores dos parâmetros; as derivadas são
+    uma lista com uma posição por parâmetro, ou None quando o nó não
+    depende de nenhum deles.
+    """
+
+    def __init__(self, tabela: Dict[str, Any], funcoes: Dict[str, Any],
+                 parametros: Tuple[str, ...], fixas: Dict[str, Any],
+                 operacoes: Optional[Dict[str, Any]]):
+        self.tabela = tabela
+        self.funcoes = funcoes
+        self.parametros = parametros
+        self.indices = {nome: i for i, nome in enumerate(parametros)}
+        self.fixas = fixas
+        self.operacoes = dict(_OPERACOES_BINARIAS, **(operacoes or {}))
+
+    def _constante(self, valor: Any):
+        if isinstance(valor, Exception):
+            def falhar(x):
+                raise valor.with_traceback(None)
+            return falhar
+        constante = (valor, None)
+        return lambda x: constante
+
+    def compilar(self, no: tuple):
+        tipo = no[0]
+        if tipo == NUMERO:
+            return self._constante(no[1])
+
+        if tipo == NOME:
+            nome = no[1]
+            if nome in self.indices:
+                i = self.indices[nome]
+                unitario = [0] * len(self.parametros)
+                unitario[i] = 1
+                return lambda x: (x[i], unitario)
+            if nome in self.fixas:
+                return self._constante(self.fixas[nome])
+            if nome not in self.tabela:
+                raise NameError(f"name '{nome}' is not defined")
+            return self._constante(self.tabela[nome])
+
+        if tipo == UNARIO:
+            operando = self.compilar(no[2])
+            if no[1] == '+':
+                return operando
+
+            def negativo(x):
+                v, d = operando(x)
+                return -v, _oposto(d)
+            return negativo
+
+        if tipo == BINARIO:
+            return self._binario(no[1], self.compilar(no[2]), self.compilar(no[3]))
+
+        if no[1] not in self.tabela:
+            raise NameError(f"name '{no[1]}' is not defined")
+        funcao = self.tabela[no[1]]
+        argumentos = [self.compilar(argumento) for argumento in no[2]]
+        if not any(_depende(argumento, self.indices) for argumento in no[2]):
+            def constante(x):
+                return funcao(*[argumento(x)[0] for argumento in argumentos]), None
+            return constante
+        reescrita, regra = _regra(no, self.funcoes)
+        if reescrita is not None:
+            return self.compilar(reescrita)
+        primeiro, extras = argumentos[0], argumentos[1:]
+        tabela = self.tabela
+        if regra is None:
+            def por_partes(x):
+                return funcao(primeiro(x)[0], *[extra(x)[0] for extra in extras]), None
+            return por_partes
+        derivada = regra[1]
+
+        def chamada(x):
+            u, du = primeiro(x)
+            v = funcao(u, *[extra(x)[0] for extra in extras])
+            if du is None:
+                return v, None
+            return v, _escalar(du, derivada(u, v, tabela))
+        return chamada
+
+    def _binario(self, operador: str, a, b):
+        operacao = self.operacoes[operador]
+        if operador == '+' or operador == '-':
+            combinar = _somar if operador == '+' else lambda da, db: _somar(da, _oposto(db))
+
+            def soma(x):
+                va, da = a(x)
+                vb, db = b(x)
+                return operacao(va, vb), combinar(da, db)
+            return soma
+
+        if operador == '*':
+            def produto(x):
+                va, da = a(x)
+                vb, db = b(x)
+                return va * vb, _somar(_escalar(da, vb), _escalar(db, va))
+            return produto
+
+        if operador == '/':
+            def divisao(x):
+                va, da = a(x)
+                vb, db = b(x)
+                v = operacao(va, vb)
+                if da is None and db is None:
+                    return v, None
+                # (da - v * db) / vb
+                numerador = _somar(da, _escalar(db, -v))
+                return v, [operacao(n, vb) for n in numerador]
+            return divisao
+
+        if operador == '**':
+            potencia = operacao
+            ln = self.tabela.get('ln', math.log)
+
+            def elevar(x):
+                va, da = a(x)
+                vb, db = b(x)
+                v = potencia(va, vb)
+                d = None
+                if da is not None:
+                    d = _escalar(da, vb * potencia(va, vb - 1))
+                if db is not None:
+                    d = _somar(d, _escalar(db, v * ln(va)))
+                return v, d
+            return elevar
+
+        divisao_inteira = self.operacoes['//']
+        if operador == '//':
+            def inteira(x):
+                return divisao_inteira(a(x)[0], b(x)[0]), None
+            return inteira
+
+        def resto(x):
+            va, da = a(x)
+            vb, db = b(x)
+            return operacao(va, vb), _somar(da, _escalar(db, -divisao_inteira(va, vb)))
+        return resto
+
+
+def gerar_gradiente(texto: str, arvore: tuple, tabela: Dict[str, Any],
+                    parametros: Tuple[str, ...], fixas: Dict[str, Any],
+                    backend: BackendNumerico, funcoes: Dict[str, Any]) -> Any:
+    """Função com os parâmetros dados que retorna (valor, gradiente).
+
+    Mesma interface de `calculadora._gerar_modelo`; `funcoes` é a tabela
+    de funções padrão (antes da adaptação ao backend).
+    """
+    arvore = expandir_funcoes(arvore, tabela, backend.literal)
+    otimizada = _Otimizador(tabela, dict.fromkeys((*parametros, *fixas)), backend).otimizar(arvore)
+    avaliar = _CompiladorDual(tabela, funcoes, parametros, fixas,
+                              backend.operacoes).compilar(otimizada)
+    zeros = (0,) * len(parametros)
+
+    def gradiente(valores: tuple) -> Tuple[Any, tuple]:
+        valor, derivadas = avaliar(valores)
+        return valor, zeros if derivadas is None else tuple(derivadas)
+
+    gerador = _GeradorModelo(tabela, parametros, {}, None, _prefixo_livre(parametros))
+    valores = ''.join(f'{nome}, ' for nome in parametros)
+    return _montar_funcao(texto, parametros, f'{gerador.global_(gradiente)}(({valores}))',
+                          gerador, backend)
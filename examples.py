@@ -8,6 +8,77 @@ Versão: 2.0.0
 
 from calculadora import CalculadoraOtimizada
 
+# Cargas de exemplo (também usadas por benchmark.py)
+OPERACOES_BASICAS = [
+    ("2 + 3", "Adição"),
+    ("10 - 4", "Subtração"),
+    ("5 * 6", "Multiplicação"),
+    ("15 / 3", "Divisão"),
+    ("2 ** 3", "Potenciação"),
+    ("17 % 5", "Módulo"),
+    ("(2 + 3) * 4", "Parênteses"),
+    ("10 + 5 * 2 - 3", "Precedência")
+]
+
+FUNCOES_MATEMATICAS = [
+    ("sin(0)", "Seno de 0"),
+    ("cos(0)", "Cosseno de 0"),
+    ("tan(0)", "Tangente de 0"),
+    ("sin(pi/2)", "Seno de π/2"),
+    ("sqrt(16)", "Raiz quadrada de 16"),
+    ("log(100)", "Log base 10 de 100"),
+    ("ln(1)", "Log natural de 1"),
+    ("abs(-5)", "Valor absoluto de -5"),
+    ("round(3.7)", "Arredondamento de 3.7"),
+    ("floor(3.7)", "Piso de 3.7"),
+    ("ceil(3.2)", "Teto de 3.2")
+]
+
+CONSTANTES = [
+    ("pi", "π (Pi)"),
+    ("e", "e (Número de Euler)"),
+    ("2 * pi", "2π"),
+    ("e ** 2", "e²"),
+    ("sin(pi)", "Seno de π"),
+    ("ln(e)", "Log natural de e")
+]
+
+VARIAVEIS = {'x': 5.0, 'y': 10.0, 'raio': 3.0}
+
+EXPRESSOES_COM_VARIAVEIS = [
+    ("x + y", "Soma de variáveis"),
+    ("x * y", "Produto de variáveis"),
+    ("2 * pi * raio", "Perímetro do círculo"),
+    ("pi * raio ** 2", "Área do círculo"),
+    ("sqrt(x**2 + y**2)", "Hipotenusa")
+]
+
+EXPRESSOES_COMPLEXAS = [
+    ("((2 + 3) * (4 - 1)) / 3", "Expressão aninhada"),
+    ("sin(pi/2) + cos(0)", "Funções trigonométricas"),
+    ("sqrt(16) + log(100)", "Funções mistas"),
+    ("2 * pi * 5", "Cálculo de perímetro"),
+    ("e ** (ln(10))", "Propriedades logarítmicas"),
+    ("abs(-5) + round(3.7)", "Funções de arredondamento")
+]
+
+EXPRESSOES_COM_ERRO = [
+    ("10 / 0", "Divisão por zero"),
+    ("sqrt(-1)", "Raiz de número negativo"),
+    ("log(-1)", "Log de número negativo"),
+    ("invalid", "Expressão inválida"),
+    ("import os", "Comando perigoso")
+]
+
+CONVERSOES = [
+    (1000, 'm', 'km'),
+    (1, 'km', 'm'),
+    (100, 'cm', 'm'),
+    (1, 'mi', 'km')
+]
+
+CALCULOS_HISTORICO = ["2 + 3", "5 * 4", "sqrt(16)", "sin(pi/2)"]
+
 def exemplo_operacoes_basicas():
     """Exemplo de operações matemáticas básicas."""
     print("🔢 EXEMPLOS DE OPERAÇÕES BÁSICAS")
@@ -15,18 +86,7 @@ def exemplo_operacoes_basicas():
     
     calc = CalculadoraOtimizada()
     
-    exemplos = [
-        ("2 + 3", "Adição"),
-        ("10 - 4", "Subtração"),
-        ("5 * 6", "Multiplicação"),
-        ("15 / 3", "Divisão"),
-        ("2 ** 3", "Potenciação"),
-        ("17 % 5", "Módulo"),
-        ("(2 + 3) * 4", "Parênteses"),
-        ("10 + 5 * 2 - 3", "Precedência")
-    ]
-    
-    for expressao, descricao in exemplos:
+    for expressao, descricao in OPERACOES_BASICAS:
         resultado = calc.calcular(expressao)
         print(f"{descricao:15} | {expressao:15} = {resultado}")
     
@@ -39,21 +99,7 @@ def exemplo_funcoes_matematicas():
     
     calc = CalculadoraOtimizada()
     
-    exemplos = [
-        ("sin(0)", "Seno de 0"),
-        ("cos(0)", "Cosseno de 0"),
-        ("tan(0)", "Tangente de 0"),
-        ("sin(pi/2)", "Seno de π/2"),
-        ("sqrt(16)", "Raiz quadrada de 16"),
-        ("log(100)", "Log base 10 de 100"),
-        ("ln(1)", "Log natural de 1"),
-        ("abs(-5)", "Valor absoluto de -5"),
-        ("round(3.7)", "Arredondamento de 3.7"),
-        ("floor(3.7)", "Piso de 3.7"),
-        ("ceil(3.2)", "Teto de 3.2")
-    ]
-    
-    for expressao, descricao in exemplos:
+    for expressao, descricao in FUNCOES_MATEMATICAS:
         resultado = calc.calcular(expressao)
         print(f"{descricao:20} | {expressao:15} = {resultado}")
     
@@ -66,16 +112,7 @@ def exemplo_constantes():
     
     calc = CalculadoraOtimizada()
     
-    exemplos = [
-        ("pi", "π (Pi)"),
-        ("e", "e (Número de Euler)"),
-        ("2 * pi", "2π"),
-        ("e ** 2", "e²"),
-        ("sin(pi)", "Seno de π"),
-        ("ln(e)", "Log natural de e")
-    ]
-    
-    for expressao, descricao in exemplos:
+    for expressao, descricao in CONSTANTES:
         resultado = calc.calcular(expressao)
         print(f"{descricao:20} | {expressao:15} = {resultado}")
     
@@ -89,19 +126,9 @@ def exemplo_memoria_variaveis():
     calc = CalculadoraOtimizada()
     
     # Simula atribuições de variáveis
-    calc.memoria['x'] = 5.0
-    calc.memoria['y'] = 10.0
-    calc.memoria['raio'] = 3.0
-    
-    exemplos = [
-        ("x + y", "Soma de variáveis"),
-        ("x * y", "Produto de variáveis"),
-        ("2 * pi * raio", "Perímetro do círculo"),
-        ("pi * raio ** 2", "Área do círculo"),
-        ("sqrt(x**2 + y**2)", "Hipotenusa")
-    ]
-    
-    for expressao, descricao in exemplos:
+    calc.memoria.update(VARIAVEIS)
+    
+    for expressao, descricao in EXPRESSOES_COM_VARIAVEIS:
         resultado = calc.calcular(expressao)
         print(f"{descricao:25} | {expressao:20} = {resultado}")
     
@@ -116,10 +143,9 @@ def exemplo_conversoes():
     
     # Conversões de comprimento
     print("📏 COMPRIMENTO:")
-    print(f"1000 m → km: {calc.converter_unidades(1000, 'm', 'km')}")
-    print(f"1 km → m: {calc.converter_unidades(1, 'km', 'm')}")
-    print(f"100 cm → m: {calc.converter_unidades(100, 'cm', 'm')}")
-    print(f"1 mi → km: {calc.converter_unidades(1, 'mi', 'km')}")
+    for valor, de_unidade, para_unidade in CONVERSOES:
+        resultado = calc.converter_unidades(valor, de_unidade, para_unidade)
+        print(f"{valor} {de_unidade} → {para_unidade}: {resultado}")
     
     print()
 
@@ -131,10 +157,8 @@ def exemplo_historico():
     calc = CalculadoraOtimizada()
     
     # Faz alguns cálculos
-    calc.calcular("2 + 3")
-    calc.calcular("5 * 4")
-    calc.calcular("sqrt(16)")
-    calc.calcular("sin(pi/2)")
+    for expressao in CALCULOS_HISTORICO:
+        calc.calcular(expressao)
     
     print("Histórico de cálculos:")
     calc.exibir_historico()
@@ -148,15 +172,7 @@ def exemplo_tratamento_erros():
     
     calc = CalculadoraOtimizada()
     
-    exemplos_erro = [
-        ("10 / 0", "Divisão por zero"),
-        ("sqrt(-1)", "Raiz de número negativo"),
-        ("log(-1)", "Log de número negativo"),
-        ("invalid", "Expressão inválida"),
-        ("import os", "Comando perigoso")
-    ]
-    
-    for expressao, descricao in exemplos_erro:
+    for expressao, descricao in EXPRESSOES_COM_ERRO:
         resultado = calc.calcular(expressao)
         print(f"{descricao:25} | {expressao:15} → {resultado}")
     
@@ -169,16 +185,7 @@ def exemplo_expressoes_complexas():
     
     calc = CalculadoraOtimizada()
     
-    exemplos = [
-        ("((2 + 3) * (4 - 1)) / 3", "Expressão aninhada"),
-        ("sin(pi/2) + cos(0)", "Funções trigonométricas"),
-        ("sqrt(16) + log(100)", "Funções mistas"),
-        ("2 * pi * 5", "Cálculo de perímetro"),
-        ("e ** (ln(10))", "Propriedades logarítmicas"),
-        ("abs(-5) + round(3.7)", "Funções de arredondamento")
-    ]
-    
-    for expressao, descricao in exemplos:
+    for expressao, descricao in EXPRESSOES_COMPLEXAS:
         resultado = calc.calcular(expressao)
         print(f"{descricao:30} | {expressao:25} = {resultado}")
     
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exportação e importação do histórico e da memória da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+
+Três formatos, escolhidos pela extensão do arquivo:
+
+- `.jsonl`: um objeto por linha, com o campo `registro` (`historico`,
+  `memoria` ou `funcao`);
+- `.csv`: colunas `registro,expressao,resultado,tipo,instante` (na memória,
+  `expressao` é o nome da variável; nas funções, `resultado` é a definição);
+- `.bin`: binário compacto, com o histórico em seções de até `BLOCO`
+  registros no formato do log de `armazenamento.py` e as variáveis e
+  funções no formato dos instantâneos. Com o armazenamento persistente e
+  sem filtro de expressão, as seções são copiadas do log sem decodificar.
+
+Os instantes são segundos desde a época. Nos formatos de texto, `tipo`
+preserva os valores exatos (`decimal`, `fracao`), os complexos
+(`complexo`) e os textos (erros); no
+JSON Lines, NaN e infinitos vão como texto com o tipo `float`.
+
+Os registros são lidos e escritos sob demanda: com o armazenamento
+persistente, o histórico vem do log mapeado em memória e o filtro de
+instantes usa busca binária no índice, então exportar ou importar milhões
+de cálculos não carrega o histórico de uma vez. A exportação é gravada em
+um arquivo temporário e renomeada ao final.
+"""
+
+import csv
+import json
+import math
+import mmap
+import os
+import struct
+from datetime import datetime
+from decimal import Decimal
+from fractions import Fraction
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from armazenamento import (codificar_registro, codificar_valor, decodificar_registro,
+                           decodificar_valor, _TAMANHO)
+
+FORMATOS = ('jsonl', 'csv', 'binario')
+CONTEUDOS = ('tudo', 'historico', 'memoria')
+
+# Registros por gravação no armazenamento persistente durante a importação
+BLOCO = 4096
+
+_MAGICO = b'CALCEXP1'
+_CABECALHO_CSV = ('registro', 'expressao', 'resultado', 'tipo', 'instante')
+
+_EXTENSOES = {
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.csv': 'csv',
+    '.bin': 'binario',
+}
+
+_LEITORES = {'int': int, 'float': float, 'decimal': Decimal, 'fracao': Fraction,
+             'complexo': complex, 'texto': str}
+
+# Registro lido: ('historico', expressao, resultado, instante),
+# ('memoria', nome, valor, None) ou ('funcao', nome, definicao, None)
+Registro = Tuple[str, str, Any, Optional[float]]
+
+
+def formato_do_arquivo(caminho: str, formato: Optional[str] = None) -> str:
+    """Formato informado ou deduzido da extensão de `caminho`."""
+    if formato is None:
+        formato = _EXTENSOES.get(os.path.splitext(caminho)[1].lower())
+        if formato is None:
+            raise ValueError("extensão desconhecida; use .jsonl, .csv ou .bin")
+    elif formato not in FORMATOS:
+        raise ValueError(f"formato desconhecido: {formato}")
+    return formato
+
+
+def instante(valor: Any) -> Optional[float]:
+    """Converte segundos, `datetime` ou texto ISO 8601 em segundos desde a época."""
+    if valor is None or isinstance(valor, (int, float)):
+        return valor
+    if isinstance(valor, str):
+        try:
+            return float(valor)
+        except ValueError:
+            valor = datetime.fromisoformat(valor)
+    return valor.timestamp()
+
+
+def _filtro(inicio: Optional[float], fim: Optional[float],
+            padrao: Optional[str]) -> Optional[Callable[[str, float], bool]]:
+    """Predicado (expressao, instante) dos filtros dados, ou None sem filtros."""
+    if inicio is None and fim is None and padrao is None:
+        return None
+    casar = None
+    if padrao is not None:
+        import fnmatch
+        import re
+        casar = re.compile(fnmatch.translate(padrao)).match
+
+    def aceitar(expressao: str, momento: float) -> bool:
+        if inicio is not None and momento < inicio:
+            return False
+        if fim is not None and momento >= fim:
+            return False
+        return casar is None or casar(expressao) is not None
+    return aceitar
+
+
+# Leitura da calculadora
+
+def _historico(calc: Any, inicio: Optional[float], fim: Optional[float],
+               aceitar: Optional[Callable[[str, float], bool]]) -> Iterator[Registro]:
+    if calc.armazenamento is not None:
+        registros = calc.armazenamento.intervalo(inicio, fim)
+    else:
+        registros = iter(calc.historico)
+    for registro in registros:
+        if aceitar is None or aceitar(registro.expressao, registro.instante):
+            yield 'historico', registro.expressao, registro.resultado, registro.instante
+
+
+def _memoria(calc: Any) -> Iterator[Registro]:
+    for nome, valor in list(calc.memoria.items()):
+        yield 'memoria', nome, valor, None
+    for nome, funcao in calc.funcoes_usuario.items():
+        yield 'funcao', nome, funcao.definicao, None
+
+
+def _registros(calc: Any, conteudo: str, inicio: Optional[float], fim: Optional[float],
+               padrao: Optional[str]) -> Iterator[Registro]:
+    if conteudo != 'memoria':
+        yield from _historico(calc, inicio, fim, _filtro(inicio, fim, padrao))
+    if conteudo != 'historico':
+        yield from _memoria(calc)
+
+
+# Escrita
+
+def _tipo(valor: Any) -> str:
+    """Nome do tipo de `valor` nos formatos de texto (chave de `_LEITORES`)."""
+    tipo = type(valor)
+    if tipo is float:
+        return 'float'
+    if tipo is int:
+        return 'int'
+    if isinstance(valor, Decimal):
+        return 'decimal'
+    if isinstance(valor, Fraction):
+        return 'fracao'
+    if tipo is complex:
+        return 'complexo'
+    return 'texto'
+
+
+def _escrever_jsonl(arquivo: Any, registros: Iterable[Registro]) -> int:
+    codificar = json.JSONEncoder(ensure_ascii=False, allow_nan=False).encode
+    total = 0
+    for registro, nome, valor, momento in registros:
+        total += 1
+        if registro == 'funcao':
+            arquivo.write(codificar({'registro': registro, 'nome': nome, 'definicao': valor}))
+            arquivo.write("\n")
+            continue
+        if registro == 'historico':
+            objeto = {'registro': registro, 'expressao': nome, 'resultado': valor,
+                      'instante': momento}
+            chave = 'resultado'
+        else:
+            objeto = {'registro': registro, 'nome': nome, 'valor': valor}
+            chave = 'valor'
+        # int e float finitos são números JSON; os demais vão como texto com o tipo
+        tipo = _tipo(valor)
+        if tipo not in ('int', 'float') or tipo == 'float' and not math.isfinite(valor):
+            objeto[chave] = str(valor)
+            objeto['tipo'] = tipo
+        arquivo.write(codificar(objeto))
+        arquivo.write("\n")
+    return total
+
+
+def _escrever_csv(arquivo: Any, registros: Iterable[Registro]) -> int:
+    escritor = csv.writer(arquivo, lineterminator='\n')
+    escritor.writerow(_CABECALHO_CSV)
+    total = 0
+    for registro, nome, valor, momento in registros:
+        total += 1
+        escritor.writerow((registro, nome, repr(valor) if type(valor) is float else valor,
+                           _tipo(valor), '' if momento is None else repr(momento)))
+    return total
+
+
+def _secoes_historico(calc: Any, inicio: Optional[float], fim: Optional[float],
+                      padrao: Optional[str]) -> Iterator[Tuple[int, bytes]]:
+    """Gera (quantidade, bytes) do histórico no formato do log, em blocos."""
+    armazenamento = calc.armazenamento
+    if armazenamento is not None and padrao is None:
+        # Sem filtro de expressão, os trechos do log são copiados como estão
+        primeiro = 0 if inicio is None else armazenamento.buscar_instante(inicio)
+        ultimo = None if fim is None else armazenamento.buscar_instante(fim)
+        yield from armazenamento.trechos(primeiro, ultimo, BLOCO)
+        return
+    partes = []
+    for _, expressao, resultado, momento in _historico(calc, inicio, fim,
+                                                      _filtro(inicio, fim, padrao)):
+        partes.append(codificar_registro(expressao, resultado, momento))
+        if len(partes) == BLOCO:
+            yield len(partes), b''.join(partes)
+            partes.clear()
+    if partes:
+        yield len(partes), b''.join(partes)
+
+
+def _escrever_binario(arquivo: Any, calc: Any, conteudo: str, inicio: Optional[float],
+                      fim: Optional[float], padrao: Optional[str]) -> int:
+    arquivo.write(_MAGICO)
+    total = 0
+    if conteudo != 'memoria':
+        for quantidade, dados in _secoes_historico(calc, inicio, fim, padrao):
+            arquivo.write(b'H' + _TAMANHO.pack(quantidade))
+            arquivo.write(dados)
+            total += quantidade
+    if conteudo != 'historico':
+        for registro, nome, valor, _ in _memoria(calc):
+            dados = nome.encode('utf-8')
+            marcador = b'M' if registro == 'memoria' else b'U'
+            arquivo.write(marcador + _TAMANHO.pack(len(dados)) + dados + codificar_valor(valor))
+            total += 1
+    return total
+
+
+def _gravar(caminho: str, binario: bool, escrever: Callable[[Any], int]) -> int:
+    """Chama `escrever(arquivo)` em um temporário renomeado para `caminho` ao final."""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        if binario:
+            arquivo = open(temporario, 'wb', buffering=1 << 20)
+        else:
+            arquivo = open(temporario, 'w', newline='', encoding='utf-8', buffering=1 << 20)
+        with arquivo:
+            total = escrever(arquivo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return total
+
+
+# Leitura
+
+def _ler_jsonl(arquivo: Any) -> Iterator[Registro]:
+    decodificar = json.JSONDecoder().decode
+    for linha, texto in enumerate(arquivo, 1):
+        if not texto.strip():
+            continue
+        try:
+            objeto = decodificar(texto)
+            registro = objeto['registro']
+            if registro == 'historico':
+                nome, chave, momento = objeto['expressao'], 'resultado', float(objeto['instante'])
+            elif registro in ('memoria', 'funcao'):
+                nome, momento = objeto['nome'], None
+                chave = 'valor' if registro == 'memoria' else 'definicao'
+            else:
+                raise ValueError(f"registro desconhecido '{registro}'")
+            valor = objeto[chave]
+            tipo = objeto.get('tipo')
+            if tipo is not None:
+                valor = _LEITORES[tipo](valor)
+        except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+            raise ValueError(f"linha {linha}: registro inválido ({e!r})") from None
+        yield registro, nome, valor, momento
+
+
+def _ler_csv(arquivo: Any) -> Iterator[Registro]:
+    leitor = csv.reader(arquivo)
+    cabecalho = next(leitor, None)
+    if cabecalho is not None and tuple(cabecalho) != _CABECALHO_CSV:
+        raise ValueError(f"cabeçalho CSV inválido; esperado {','.join(_CABECALHO_CSV)}")
+    for linha, campos in enumerate(leitor, 2):
+        if len(campos) != 5:
+            raise ValueError(f"linha {linha}: {len(campos)} campos, esperados 5")
+        registro, nome, texto, tipo, momento = campos
+        if registro not in ('historico', 'memoria', 'funcao'):
+            raise ValueError(f"linha {linha}: registro desconhecido '{registro}'")
+        try:
+            valor = _LEITORES[tipo](texto)
+            momento = float(momento) if registro == 'historico' else None
+        except (KeyError, ValueError, ArithmeticError) as e:
+            raise ValueError(f"linha {linha}: valor inválido ({e!r})") from None
+        yield registro, nome, valor, momento
+
+
+def _ler_binario(arquivo: Any) -> Iterator[Registro]:
+    if os.fstat(arquivo.fileno()).st_size < len(_MAGICO):
+        raise ValueError("arquivo binário vazio ou truncado")
+    with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+        if mapa[:len(_MAGICO)] != _MAGICO:
+            raise ValueError("arquivo binário com formato desconhecido")
+        posicao = len(_MAGICO)
+        fim = len(mapa)
+        while posicao < fim:
+            marcador = mapa[posicao:posicao + 1]
+            try:
+                if marcador == b'H':
+                    quantidade = _TAMANHO.unpack_from(mapa, posicao + 1)[0]
+                    posicao += 5
+                    for _ in range(quantidade):
+                        registro, posicao = decodificar_registro(mapa, posicao)
+                        if posicao > fim:
+                            break
+                        yield ('historico', registro.expressao, registro.resultado,
+                               registro.instante)
+                elif marcador in (b'M', b'U'):
+                    tamanho = _TAMANHO.unpack_from(mapa, posicao + 1)[0]
+                    nome = mapa[posicao + 5:posicao + 5 + tamanho].decode('utf-8')
+                    valor, posicao = decodificar_valor(mapa, posicao + 5 + tamanho)
+                    if posicao <= fim:
+                        yield 'memoria' if marcador == b'M' else 'funcao', nome, valor, None
+                else:
+                    raise ValueError(f"marcador desconhecido na posição {posicao}")
+            except (struct.error, UnicodeDecodeError):
+                posicao = fim + 1
+            if posicao > fim:
+                raise ValueError("arquivo binário truncado")
+
+
+def ler(caminho: str, formato: Optional[str] = None) -> Iterator[Registro]:
+    """Gera os registros de um arquivo exportado, sob demanda."""
+    formato = formato_do_arquivo(caminho, formato)
+    if formato == 'binario':
+        with open(caminho, 'rb') as arquivo:
+            yield from _ler_binario(arquivo)
+    else:
+        with open(caminho, newline='', encoding='utf-8', buffering=1 << 20) as arquivo:
+            yield from (_ler_jsonl if formato == 'jsonl' else _ler_csv)(arquivo)
+
+
+# Operações da calculadora
+
+def exportar(calc: Any, caminho: str, formato: Optional[str] = None, conteudo: str = 'tudo',
+             inicio: Any = None, fim: Any = None, padrao: Optional[str] = None) -> int:
+    """Exporta o histórico e/ou a memória de `calc`; retorna quantos registros.
+
+    `inicio` e `fim` limitam o histórico ao intervalo [inicio, fim) e
+    `padrao` às expressões que casam com o padrão (`*`, `?`, `[...]`).
+    O arquivo só aparece (ou é substituído) se a gravação terminar sem
+    erro.
+    """
+    formato = formato_do_arquivo(caminho, formato)
+    if conteudo not in CONTEUDOS:
+        raise ValueError(f"conteúdo desconhecido: {conteudo}")
+    inicio, fim = instante(inicio), instante(fim)
+    if formato == 'binario':
+        return _gravar(caminho, True, lambda arquivo: _escrever_binario(
+            arquivo, calc, conteudo, inicio, fim, padrao))
+    escrever = _escrever_jsonl if formato == 'jsonl' else _escrever_csv
+    return _gravar(caminho, False, lambda arquivo: escrever(
+        arquivo, _registros(calc, conteudo, inicio, fim, padrao)))
+
+
+def importar(calc: Any, caminho: str, formato: Optional[str] = None, conteudo: str = 'tudo',
+             inicio: Any = None, fim: Any = None, padrao: Optional[str] = None) -> int:
+    """Acrescenta ao histórico e à memória de `calc` os registros de `caminho`.
+
+    Os valores são convertidos para o backend de `calc` (como em
+    `usar_numerico`). Os cálculos mantêm seus instantes e vão, em blocos,
+    para o armazenamento persistente quando houver; as variáveis
+    substituem as de mesmo nome (no modo reativo, via `planilha.alterar`,
+    que recalcula os dependentes) e as funções são definidas ao final,
+    depois de lido todo o arquivo. Aceita os mesmos filtros de `exportar`.
+    Retorna o número de registros importados.
+
+    A busca por instante do armazenamento supõe o log em ordem: para
+    restaurar uma sessão, importe em um diretório de dados novo.
+    """
+    if conteudo not in CONTEUDOS:
+        raise ValueError(f"conteúdo desconhecido: {conteudo}")
+    inicio, fim = instante(inicio), instante(fim)
+    aceitar = _filtro(inicio, fim, padrao)
+    converter = _conversor(calc.backend)
+    historico = calc.historico
+    armazenamento = calc.armazenamento
+    pendentes = []
+    memoria: Dict[str, Any] = {}
+    funcoes: Dict[str, str] = {}
+    total = 0
+    registros = ler(caminho, formato)
+    try:
+        for registro, nome, valor, momento in registros:
+            if registro == 'historico':
+                if conteudo == 'memoria' or (aceitar is not None and not aceitar(nome, momento)):
+                    continue
+                if not isinstance(valor, str):
+                    valor = converter(valor)
+                historico.adicionar(nome, valor, momento)
+                if armazenamento is not None:
+                    pendentes.append((nome, valor, momento))
+                    if len(pendentes) >= BLOCO:
+                        armazenamento.adicionar_varios(pendentes)
+                        pendentes.clear()
+            elif conteudo != 'historico':
+                if registro == 'memoria':
+                    memoria[nome] = converter(valor)
+                else:
+                    funcoes[nome] = valor
+            else:
+                continue
+            total += 1
+    finally:
+        registros.close()
+        if pendentes:
+            armazenamento.adicionar_varios(pendentes)
+    if memoria:
+        if calc.planilha is not None:
+            for nome, valor in memoria.items():
+                calc.planilha.alterar(nome, valor)
+        else:
+            calc.memoria.update(memoria)
+        calc.salvar_memoria()
+    for definicao in funcoes.values():
+        calc.definir_funcao(*_interpretar_definicao(calc, definicao))
+    return total
+
+
+def _conversor(backend: Any) -> Callable[[Any], Any]:
+    """Conversão dos valores lidos para `backend`; no `float`, exatos viram float."""
+    if backend.converter is not None:
+        return backend.converter
+    return _para_float
+
+
+def _para_float(valor: Any) -> Any:
+    return float(valor) if isinstance(valor, (Decimal, Fraction)) else valor
+
+
+def _interpretar_definicao(calc: Any, definicao: str) -> Tuple[str, Tuple[str, ...], str]:
+    partes = calc.interpretar_definicao(definicao)
+    if partes is None:
+        raise ValueError(f"definição de função inválida: {definicao}")
+    return partes
+
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backends numéricos da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+
+`decimal` (precisão configurável), `fracao` (racionais exatos) e `mpmath`
+(precisão arbitrária, se instalado). Os literais são convertidos a partir
+do texto da expressão e os valores permanecem no tipo do backend durante
+toda a avaliação. Cada backend deriva sua tabela de funções de
+`funcoes_disponiveis`: as funções padrão são trocadas pelas equivalentes
+do backend e as funções do usuário são mantidas. O backend `float` fica em
+`calculadora`, para que estes módulos não sejam carregados na inicialização.
+"""
+
+import math
+import operator
+from decimal import Decimal, Context, localcontext, ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_EVEN
+from fractions import Fraction
+from typing import Any, Callable, Dict, Optional
+
+from calculadora import BackendNumerico, BACKEND_FLOAT
+
+NOMES = ('float', 'decimal', 'fracao', 'mpmath')
+PRECISAO_PADRAO = 28
+# Resultados exatos com mais bits que isso são recusados (ex.: 3 ** 10 ** 9)
+MAXIMO_BITS_EXATOS = 1 << 22
+
+
+def criar_backend(nome: str, precisao: Optional[int] = None) -> BackendNumerico:
+    """Cria o backend `nome`; `precisao` vale para `decimal` e `mpmath`."""
+    if nome not in NOMES:
+        raise ValueError(f"backend numérico desconhecido: '{nome}' (use {', '.join(NOMES)})")
+    if precisao is not None and (nome in ('float', 'fracao') or precisao < 1):
+        raise ValueError(f"precisão inválida para o backend '{nome}': {precisao}")
+    if nome == 'float':
+        return BACKEND_FLOAT
+    if nome == 'fracao':
+        return _backend_fracao()
+    if nome == 'decimal':
+        return _backend_decimal(precisao or PRECISAO_PADRAO)
+    return _backend_mpmath(precisao or PRECISAO_PADRAO)
+
+
+def _adaptador(equivalentes: Dict[Any, Any], constantes: Dict[str, Any],
+               converter: Callable[[Any], Any]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Cria a função que deriva a tabela do backend da tabela de floats."""
+    def adaptar(funcoes: Dict[str, Any]) -> Dict[str, Any]:
+        tabela = {}
+        for nome, valor in funcoes.items():
+            if callable(valor):
+                tabela[nome] = equivalentes.get(valor, valor)
+            elif nome in constantes and valor == getattr(math, nome):
+                tabela[nome] = constantes[nome]
+            else:
+                tabela[nome] = converter(valor)
+        return tabela
+    return adaptar
+
+
+def _irracional(nome: str) -> ValueError:
+    return ValueError(f"{nome} não é racional")
+
+
+# ---------------------------------------------------------------------------
+# decimal.Decimal
+# ---------------------------------------------------------------------------
+
+def _para_decimal(valor: Any) -> Any:
+    """Converte para Decimal; floats usam a representação curta (0.1 -> 0.1)."""
+    tipo = type(valor)
+    if tipo is Decimal:
+        return valor
+    if tipo is float:
+        return Decimal(repr(valor))
+    if tipo is Fraction:
+        return Decimal(valor.numerator) / valor.denominator
+    try:
+        return Decimal(valor)
+    except (TypeError, ValueError, ArithmeticError):
+        return valor
+
+
+def _pi_decimal() -> Decimal:
+    """π na precisão do contexto atual (receita da documentação de `decimal`)."""
+    with localcontext() as contexto:
+        contexto.prec += 2
+        tres = Decimal(3)
+        anterior, t, s, n, na, d, da = 0, tres, 3, 1, 0, 0, 24
+        while s != anterior:
+            anterior = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+    return +s
+
+
+def _seno_cosseno(x: Any, seno: bool) -> Decimal:
+    """Série de Taylor com redução do argumento a [-π, π]."""
+    x = _para_decimal(x)
+    if not x.is_finite():
+        raise ValueError("math domain error")
+    with localcontext() as contexto:
+        # Dígitos extras para a redução de argumentos grandes
+        contexto.prec += 4 + max(x.adjusted(), 0)
+        if abs(x) > 3:
+            x = x.remainder_near(2 * _pi_decimal())
+        quadrado = x * x
+        if seno:
+            i, anterior, s, fatorial, termo, sinal = 1, 0, x, 1, x, 1
+        else:
+            i, anterior, s, fatorial, termo, sinal = 0, 0, Decimal(1), 1, 1, 1
+        while s != anterior:
+            anterior = s
+            i += 2
+            fatorial *= i * (i - 1)
+            termo *= quadrado
+            sinal = -sinal
+            s += termo / fatorial * sinal
+    return +s
+
+
+def _sin_decimal(x: Any) -> Decimal:
+    return _seno_cosseno(x, True)
+
+
+def _cos_decimal(x: Any) -> Decimal:
+    return _seno_cosseno(x, False)
+
+
+def _tan_decimal(x: Any) -> Decimal:
+    with localcontext() as contexto:
+        contexto.prec += 2
+        resultado = _seno_cosseno(x, True) / _seno_cosseno(x, False)
+    return +resultado
+
+
+def _atan_decimal(x: Any) -> Decimal:
+    """Série de Taylor após reduzir |x| abaixo de 0.1 com a fórmula do arco-metade."""
+    x = _para_decimal(x)
+    if x.is_nan():
+        raise ValueError("math domain error")
+    with localcontext() as contexto:
+        contexto.prec += 5
+        if x.is_infinite():
+            s = _pi_decimal() / 2
+        else:
+            s = abs(x)
+            inverter = s > 1
+            if inverter:
+                s = 1 / s
+            dobras = 0
+            while s > Decimal('0.1'):
+                s = s / (1 + (1 + s * s).sqrt())
+                dobras += 1
+            quadrado, termo, n, soma, anterior = s * s, s, 1, s, 0
+            while soma != anterior:
+                anterior = soma
+                termo *= -quadrado
+                n += 2
+                soma += termo / n
+            s = soma * (1 << dobras)
+            if inverter:
+                s = _pi_decimal() / 2 - s
+        if x < 0:
+            s = -s
+    return +s
+
+
+def _asin_decimal(x: Any) -> Decimal:
+    x = _para_decimal(x)
+    if not -1 <= x <= 1:
+        raise ValueError("math domain error")
+    with localcontext() as contexto:
+        contexto.prec += 5
+        if abs(x) == 1:
+            s = _pi_decimal() / 2 * x
+        else:
+            s = _atan_decimal(x / (1 - x * x).sqrt())
+    return +s
+
+
+def _acos_decimal(x: Any) -> Decimal:
+    with localcontext() as contexto:
+        contexto.prec += 5
+        s = _pi_decimal() / 2 - _asin_decimal(x)
+    return +s
+
+
+def _sqrt_decimal(x: Any) -> Decimal:
+    x = _para_decimal(x)
+    if x < 0:
+        raise ValueError("math domain error")
+    return x.sqrt()
+
+
+def _ln_decimal(x: Any) -> Decimal:
+    x = _para_decimal(x)
+    if x <= 0:
+        raise ValueError("math domain error")
+    return x.ln()
+
+
+def _log10_decimal(x: Any) -> Decimal:
+    x = _para_decimal(x)
+    if x <= 0:
+        raise ValueError("math domain error")
+    return x.log10()
+
+
+def _exp_decimal(x: Any) -> Decimal:
+    return _para_decimal(x).exp()
+
+
+def _floor_decimal(x: Any) -> Decimal:
+    return _para_decimal(x).to_integral_value(rounding=ROUND_FLOOR)
+
+
+def _ceil_decimal(x: Any) -> Decimal:
+    return _para_decimal(x).to_integral_value(rounding=ROUND_CEILING)
+
+
+def _round_decimal(x: Any, digitos: Optional[int] = None) -> Decimal:
+    if digitos is not None:
+        return round(_para_decimal(x), int(digitos))
+    return _para_decimal(x).to_integral_value(rounding=ROUND_HALF_EVEN)
+
+
+def _dividir_decimal(a: Any, b: Any) -> Any:
+    # int / int daria float (ex.: variáveis inteiras da memória)
+    if type(a) is int and type(b) is int:
+        return Decimal(a) / b
+    return a / b
+
+
+def _resto_decimal(a: Any, b: Any) -> Any:
+    # O resto do Decimal segue o sinal do dividendo; o da calculadora, o do divisor
+    if type(a) is int and type(b) is int:
+        return a % b
+    if not b:
+        raise ZeroDivisionError("division by zero")
+    resto = a % b
+    if resto and (resto < 0) != (b < 0):
+        resto += b
+    return resto
+
+
+def _divisao_inteira_decimal(a: Any, b: Any) -> Any:
+    # O `//` do Decimal trunca em direção a zero; o da calculadora arredonda para baixo
+    if type(a) is int and type(b) is int:
+        return a // b
+    if not b:
+        raise ZeroDivisionError("division by zero")
+    quociente = a // b
+    if a % b and (a < 0) != (b < 0):
+        quociente -= 1
+    return quociente
+
+
+def _potencia_decimal(base: Any, expoente: Any) -> Any:
+    # Potência entre inteiros seria exata e sem limite de tamanho
+    if type(base) is int:
+        base = Decimal(base)
+    return base ** expoente
+
+
+_EQUIVALENTES_DECIMAL = {
+    math.sin: _sin_decimal, math.cos: _cos_decimal, math.tan: _tan_decimal,
+    math.asin: _asin_decimal, math.acos: _acos_decimal, math.atan: _atan_decimal,
+    math.sqrt: _sqrt_decimal, math.log10: _log10_decimal, math.log: _ln_decimal,
+    math.exp: _exp_decimal, round: _round_decimal,
+    math.floor: _floor_decimal, math.ceil: _ceil_decimal,
+}
+
+
+def _backend_decimal(precisao: int) -> BackendNumerico:
+    contexto = Context(prec=precisao)
+    with localcontext(contexto):
+        constantes = {'pi': _pi_decimal(), 'e': Decimal(1).exp()}
+    return BackendNumerico(
+        'decimal', precisao,
+        tipos=(int, Decimal),
+        literal=Decimal,
+        operacoes={'/': _dividir_decimal, '**': _potencia_decimal,
+                   '%': _resto_decimal, '//': _divisao_inteira_decimal},
+        adaptar=_adaptador(_EQUIVALENTES_DECIMAL, constantes, _para_decimal),
+        contexto=lambda: localcontext(contexto),
+        converter=_para_decimal,
+        puras=frozenset(_EQUIVALENTES_DECIMAL.values()) | {abs},
+    )
+
+
+# ---------------------------------------------------------------------------
+# fractions.Fraction
+# ---------------------------------------------------------------------------
+
+def _para_fracao(valor: Any) -> Any:
+    """Converte para Fraction; floats usam a representação curta (0.1 -> 1/10)."""
+    tipo = type(valor)
+    if tipo is Fraction or tipo is int:
+        return valor
+    try:
+        if tipo is float:
+            return Fraction(repr(valor))
+        return Fraction(valor)
+    except (TypeError, ValueError, OverflowError):
+        return valor
+
+
+def _literal_fracao(texto: str) -> Fraction:
+    return Fraction(int(texto)) if texto.isdigit() else Fraction(texto)
+
+
+def _raiz_inteira(n: int, grau: int) -> int:
+    """Maior r com r ** grau <= n (Newton em inteiros)."""
+    if n < 2:
+        return n
+    if grau >= n.bit_length():
+        return 1
+    x = 1 << -(-n.bit_length() // grau)
+    while True:
+        y = ((grau - 1) * x + n // x ** (grau - 1)) // grau
+        if y >= x:
+            return x
+        x = y
+
+
+def _raiz_exata(x: Any, grau: int) -> Fraction:
+    """Raiz racional exata de `x`; ValueError se ela não existir."""
+    x = Fraction(x)
+    if x < 0:
+        if grau % 2 == 0:
+            raise ValueError("math domain error")
+        return -_raiz_exata(-x, grau)
+    numerador = _raiz_inteira(x.numerator, grau)
+    denominador = _raiz_inteira(x.denominator, grau)
+    if numerador ** grau != x.numerator or denominador ** grau != x.denominator:
+        raise _irracional("o resultado")
+    return Fraction(numerador, denominador)
+
+
+def _potencia_fracao(base: Any, expoente: Any) -> Fraction:
+    """Potência exata: expoentes racionais exigem raiz exata; resultados enormes falham."""
+    if isinstance(expoente, Fraction):
+        if expoente.denominator != 1:
+            base = _raiz_exata(base, expoente.denominator)
+        expoente = expoente.numerator
+    elif not isinstance(expoente, int):
+        raise _irracional("o expoente")
+    base = Fraction(base)
+    if base.denominator == 1 and base.numerator in (-1, 0, 1):
+        return base ** expoente
+    bits = max(base.numerator.bit_length(), base.denominator.bit_length())
+    if abs(expoente) * bits > MAXIMO_BITS_EXATOS:
+        raise OverflowError("resultado exato grande demais")
+    return base ** expoente
+
+
+def _dividir_fracao(a: Any, b: Any) -> Any:
+    if type(a) is int and type(b) is int:
+        return Fraction(a, b)
+    return a / b
+
+
+def _exato_em(funcao: str, pontos: Dict[Any, Any], dominio: Optional[Callable] = None):
+    """Função com valores racionais só em `pontos`; nos demais, ValueError."""
+    def avaliar(x):
+        if dominio is not None and not dominio(x):
+            raise ValueError("math domain error")
+        try:
+            return pontos[x]
+        except (KeyError, TypeError):
+            raise _irracional(f"{funcao}({x})") from None
+    avaliar.__name__ = funcao
+    return avaliar
+
+
+def _log10_fracao(x: Any) -> int:
+    x = Fraction(x)
+    if x <= 0:
+        raise ValueError("math domain error")
+    numerador, denominador = x.numerator, x.denominator
+    potencia, expoente = (numerador, 1) if denominador == 1 else (denominador, -1)
+    if min(numerador, denominador) == 1:
+        digitos = len(str(potencia)) - 1
+        if potencia == 10 ** digitos:
+            return expoente * digitos
+    raise _irracional(f"log({x})")
+
+
+def _sqrt_fracao(x: Any) -> Fraction:
+    return _raiz_exata(x, 2)
+
+
+_DENTRO_DE_UM = lambda x: -1 <= x <= 1
+_POSITIVO = lambda x: x > 0
+
+_EQUIVALENTES_FRACAO = {
+    math.sin: _exato_em('sin', {0: Fraction(0)}),
+    math.cos: _exato_em('cos', {0: Fraction(1)}),
+    math.tan: _exato_em('tan', {0: Fraction(0)}),
+    math.asin: _exato_em('asin', {0: Fraction(0)}, _DENTRO_DE_UM),
+    math.acos: _exato_em('acos', {1: Fraction(0)}, _DENTRO_DE_UM),
+    math.atan: _exato_em('atan', {0: Fraction(0)}),
+    math.exp: _exato_em('exp', {0: Fraction(1)}),
+    math.log: _exato_em('ln', {1: Fraction(0)}, _POSITIVO),
+    math.log10: _log10_fracao,
+    math.sqrt: _sqrt_fracao,
+}
+
+
+def _backend_fracao() -> BackendNumerico:
+    constantes = {'pi': _irracional('pi'), 'e': _irracional('e')}
+    return BackendNumerico(
+        'fracao',
+        tipos=(int, Fraction),
+        literal=_literal_fracao,
+        operacoes={'/': _dividir_fracao, '**': _potencia_fracao},
+        adaptar=_adaptador(_EQUIVALENTES_FRACAO, constantes, _para_fracao),
+        converter=_para_fracao,
+        puras=frozenset(_EQUIVALENTES_FRACAO.values()) | {abs, round, math.floor, math.ceil},
+    )
+
+
+# ---------------------------------------------------------------------------
+# mpmath (opcional)
+# ---------------------------------------------------------------------------
+
+def _backend_mpmath(precisao: int) -> BackendNumerico:
+    try:
+        import mpmath
+    except ImportError:
+        raise ValueError("o backend 'mpmath' requer o pacote mpmath (pip install mpmath)") from None
+    # Contexto próprio: a precisão não altera o `mpmath.mp` global, e os
+    # valores são exibidos com os dígitos pedidos
+    ctx = mpmath.MPContext()
+    ctx.dps = precisao
+    mpf, mpc = ctx.mpf, ctx.mpc
+
+    def real(funcao: Callable) -> Callable:
+        # mpmath estende o domínio aos complexos; a calculadora é real
+        def avaliar(*argumentos):
+            resultado = funcao(*argumentos)
+            if isinstance(resultado, mpc):
+                raise ValueError("math domain error")
+            return resultado
+        avaliar.__name__ = getattr(funcao, '__name__', 'mpmath')
+        return avaliar
+
+    def converter(valor: Any) -> Any:
+        if isinstance(valor, mpf):
+            return valor
+        if isinstance(valor, Fraction):
+            return mpf(valor.numerator) / valor.denominator
+        try:
+            return mpf(repr(valor) if isinstance(valor, float) else valor)
+        except (TypeError, ValueError):
+            return valor
+
+    def dividir(a: Any, b: Any) -> Any:
+        if type(a) is int and type(b) is int:
+            return mpf(a) / b
+        return a / b
+
+    equivalentes = {
+        math.sin: ctx.sin, math.cos: ctx.cos, math.tan: ctx.tan,
+        math.asin: real(ctx.asin), math.acos: real(ctx.acos), math.atan: ctx.atan,
+        math.sqrt: real(ctx.sqrt), math.log10: real(ctx.log10),
+        math.log: real(ctx.ln), math.exp: ctx.exp, abs: ctx.fabs,
+        round: ctx.nint, math.floor: ctx.floor, math.ceil: ctx.ceil,
+    }
+    return BackendNumerico(
+        'mpmath', precisao,
+        tipos=(int, mpf),
+        literal=mpf,
+        operacoes={'/': dividir, '**': real(operator.pow)},
+        adaptar=_adaptador(equivalentes, {'pi': +ctx.pi, 'e': +ctx.e}, converter),
+        converter=converter,
+        puras=frozenset(equivalentes.values()),
+        # O pickle recria os valores no contexto global, com 53 bits
+        paralelo=False,
+    )
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro de um cálculo do histórico da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+
+Fica em um módulo próprio para que `calculadora` e `armazenamento` o
+compartilhem sem que um importe o outro.
+"""
+
+from __future__ import annotations
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, Tuple
+
+
+class RegistroHistorico:
+    """Registro de um cálculo do histórico, criado apenas na leitura."""
+
+    __slots__ = ('expressao', 'resultado', 'instante')
+    _CAMPOS = ('expressao', 'resultado', 'timestamp')
+
+    def __init__(self, expressao: str, resultado: Any, instante: float):
+        self.expressao = expressao
+        self.resultado = resultado
+        self.instante = instante
+
+    @property
+    def timestamp(self) -> str:
+        """Instante do cálculo em ISO 8601 (formatado sob demanda)."""
+        from datetime import datetime
+        return datetime.fromtimestamp(self.instante).isoformat()
+
+    # Acesso como dicionário, compatível com o formato antigo do histórico
+    def __getitem__(self, campo: str) -> Any:
+        if campo not in self._CAMPOS:
+            raise KeyError(campo)
+        return getattr(self, campo)
+
+    def __contains__(self, campo: str) -> bool:
+        return campo in self._CAMPOS
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._CAMPOS
+
+    def como_dict(self) -> Dict[str, Any]:
+        """Retorna o registro como dicionário."""
+        return {campo: getattr(self, campo) for campo in self._CAMPOS}
+
+    def __repr__(self):
+        return f"RegistroHistorico({self.expressao!r}, {self.resultado!r}, {self.instante!r})"
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serviço HTTP da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+
+Servidor asyncio (somente biblioteca padrão) que expõe a calculadora como
+API JSON sobre HTTP/1.1, para que vários clientes (como `index.html`)
+usem o mesmo motor. Cada sessão (cabeçalho `X-Sessao`, campo `sessao` ou
+parâmetro `?sessao=`) tem memória e histórico próprios; todas compartilham
+a tabela de funções e o cache de expressões compiladas.
+
+Rotas:
+    GET    /                  interface web (index.html)
+    GET    /saude             estado do serviço
+    POST   /calcular          {"expressao": "x = 2 * 3"}
+    POST   /lote              {"itens": [...]} ou {"expressao": ..., "colunas": {...}}
+    POST   /converter         {"valor" | "valores": ..., "de": "km", "para": "m"}
+    GET    /unidades          unidades suportadas por categoria
+    GET    /historico         ?pagina=1&por_pagina=10
+    DELETE /historico
+    GET    /memoria
+    POST   /memoria           {"variaveis": {"x": 1}}
+    DELETE /memoria
+
+Lotes são avaliados fora do laço de eventos: em uma thread, ou no pool de
+processos de `calcular_muitos` quando são grandes. Requisições além de
+`max_simultaneas` recebem 503.
+"""
+
+import asyncio
+import json
+import math
+import os
+import re
+import sys
+from collections import OrderedDict
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from calculadora import CalculadoraOtimizada
+
+_SESSAO_VALIDA = re.compile(r'[A-Za-z0-9_-]{1,64}\Z')
+_ROTAS_SEM_SESSAO = frozenset(['/', '/saude'])
+_INDEX_HTML = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'index.html')
+
+
+_LOG10_2 = math.log10(2)
+# Python 3.11+ limita a conversão de inteiros grandes para texto
+_limite_digitos = getattr(sys, 'get_int_max_str_digits', lambda: 0)
+
+
+class ErroRequisicao(Exception):
+    """Requisição inválida; vira uma resposta com o status indicado."""
+
+    def __init__(self, mensagem: str, status: int = 400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _serializavel(valor: Any) -> Any:
+    """Converte resultados para JSON (não finitos viram null, outros tipos texto).
+
+    Inteiros com mais dígitos que o limite de `int` -> texto do Python
+    (`sys.get_int_max_str_digits`) vão como texto com todos os dígitos.
+    """
+    if valor is None or isinstance(valor, (bool, str)):
+        return valor
+    if isinstance(valor, int):
+        limite = _limite_digitos()
+        if limite and valor.bit_length() * _LOG10_2 + 1 >= limite:
+            # Decimal converte sem passar pelo limite de int -> str
+            return str(Decimal(valor))
+        return valor
+    if isinstance(valor, float):
+        return valor if math.isfinite(valor) else None
+    if isinstance(valor, (list, tuple)):
+        return [_serializavel(item) for item in valor]
+    if hasattr(valor, 'tolist'):
+        return _serializavel(valor.tolist())
+    return str(valor)
+
+
+def _resultado(valor: Any) -> Dict[str, Any]:
+    """Resposta de um cálculo: `resultado` ou `erro` (como no modo --stream)."""
+    if isinstance(valor, str):
+        return {'erro': valor}
+    return {'resultado': _serializavel(valor)}
+
+
+class _Sessao:
+    """Calculadora de um cliente e a trava que serializa suas requisições."""
+
+    __slots__ = ('identificador', 'calculadora', 'trava')
+
+    def __init__(self, identificador: str, calculadora: CalculadoraOtimizada):
+        self.identificador = identificador
+        self.calculadora = calculadora
+        self.trava = asyncio.Lock()
+
+
+class ServidorCalculadora:
+    """API JSON sobre HTTP para a calculadora, com sessões isoladas."""
+
+    def __init__(self, calculadora: Optional[CalculadoraOtimizada] = None,
+                 max_simultaneas: int = 64, max_sessoes: int = 1024,
+                 workers: Optional[int] = None, limiar_processos: int = 10000,
+                 tamanho_maximo: int = 8 << 20, tempo_ocioso: float = 30.0):
+        """Configura o serviço.
+
+        `calculadora` é a base das sessões (tabela de funções e cache) e
+        dona do pool de processos; lotes com pelo menos `limiar_processos`
+        itens usam esse pool com `workers` processos. `tamanho_maximo`
+        limita o corpo das requisições, em bytes.
+        """
+        self.calculadora = calculadora or CalculadoraOtimizada()
+        self.max_simultaneas = max_simultaneas
+        self.max_sessoes = max_sessoes
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.limiar_processos = limiar_processos
+        self.tamanho_maximo = tamanho_maximo
+        self.tempo_ocioso = tempo_ocioso
+        self.sessoes: 'OrderedDict[str, _Sessao]' = OrderedDict()
+        self._simultaneas = 0
+        self._servidor: Optional[asyncio.AbstractServer] = None
+        self._executor = ThreadPoolExecutor(thread_name_prefix='calculadora')
+        # Um lote por vez no pool de processos, que já usa todos os núcleos
+        self._executor_processos = ThreadPoolExecutor(1, thread_name_prefix='calculadora-lote')
+        self._rotas = {
+            ('GET', '/'): self._rota_index,
+            ('GET', '/saude'): self._rota_saude,
+            ('POST', '/calcular'): self._rota_calcular,
+            ('POST', '/lote'): self._rota_lote,
+            ('POST', '/converter'): self._rota_converter,
+            ('GET', '/unidades'): self._rota_unidades,
+            ('GET', '/historico'): self._rota_historico,
+            ('DELETE', '/historico'): self._rota_limpar_historico,
+            ('GET', '/memoria'): self._rota_memoria,
+            ('POST', '/memoria'): self._rota_atualizar_memoria,
+            ('DELETE', '/memoria'): self._rota_limpar_memoria,
+        }
+
+    async def iniciar(self, host: str = '127.0.0.1', porta: int = 8765) -> Tuple[str, int]:
+        """Começa a aceitar conexões; retorna o endereço (porta 0 escolhe uma livre)."""
+        self._servidor = await asyncio.start_server(self._atender, host, porta)
+        return self._servidor.sockets[0].getsockname()[:2]
+
+    async def servir(self, host: str = '127.0.0.1', porta: int = 8765):
+        """Inicia o serviço e atende até ser cancelado."""
+        endereco = await self.iniciar(host, porta)
+        print(f"🌐 Calculadora em http://{endereco[0]}:{endereco[1]}/", flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.encerrar()
+
+    async def encerrar(self):
+        """Para de aceitar conexões e libera executores e processos."""
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+            self._servidor = None
+        self._executor.shutdown(wait=False)
+        self._executor_processos.shutdown(wait=False)
+        self.calculadora.encerrar_processos()
+
+    def sessao(self, identificador: Optional[str]) -> _Sessao:
+        """Retorna a sessão (criando-a se preciso); descarta a menos usada se cheio."""
+        if identificador is None:
+            identificador = os.urandom(16).hex()
+        elif not isinstance(identificador, str) or not _SESSAO_VALIDA.match(identificador):
+            raise ErroRequisicao("Erro: Sessão inválida")
+        sessao = self.sessoes.get(identificador)
+        if sessao is None:
+            sessao = _Sessao(identificador, self.calculadora.nova_sessao())
+            self.sessoes[identificador] = sessao
+            if len(self.sessoes) > self.max_sessoes:
+                self.sessoes.popitem(last=False)
+        else:
+            self.sessoes.move_to_end(identificador)
+        return sessao
+
+    async def _atender(self, leitor: asyncio.StreamReader, escritor: asyncio.StreamWriter):
+        """Atende as requisições de uma conexão (com keep-alive)."""
+        try:
+            manter = True
+            while manter:
+                try:
+                    cabecalho = await asyncio.wait_for(leitor.readuntil(b'\r\n\r\n'),
+                                                       self.tempo_ocioso)
+                except asyncio.LimitOverrunError:
+                    escritor.write(self._resposta(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                                  {'erro': "Erro: Cabeçalho muito grande"},
+                                                  manter=False))
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                resposta, manter = await self._processar(cabecalho, leitor)
+                escritor.write(resposta)
+                await escritor.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _processar(self, cabecalho: bytes, leitor: asyncio.StreamReader) -> Tuple[bytes, bool]:
+        """Lê o corpo, despacha a rota e monta a resposta."""
+        try:
+            linha, *campos = cabecalho.decode('latin-1').split('\r\n')
+            metodo, alvo, versao = linha.split(' ', 2)
+        except ValueError:
+            return self._resposta(HTTPStatus.BAD_REQUEST, {'erro': "Erro: Requisição inválida"},
+                                  manter=False), False
+        cabecalhos = {}
+        for campo in campos:
+            if ':' in campo:
+                nome, valor = campo.split(':', 1)
+                cabecalhos[nome.strip().lower()] = valor.strip()
+        conexao = cabecalhos.get('connection', '').lower()
+        manter = conexao != 'close' and (versao != 'HTTP/1.0' or conexao == 'keep-alive')
+
+        try:
+            tamanho = int(cabecalhos.get('content-length', 0))
+        except ValueError:
+            tamanho = -1
+        if not 0 <= tamanho <= self.tamanho_maximo:
+            return self._resposta(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                  {'erro': "Erro: Corpo da requisição inválido ou muito grande"},
+                                  manter=False), False
+        corpo = await leitor.readexactly(tamanho) if tamanho else b''
+
+        if metodo == 'OPTIONS':
+            return self._resposta(HTTPStatus.NO_CONTENT, None, manter=manter), manter
+        if self._simultaneas >= self.max_simultaneas:
+            return self._resposta(HTTPStatus.SERVICE_UNAVAILABLE,
+                                  {'erro': "Erro: Servidor ocupado"}, manter=manter,
+                                  extras={'Retry-After': '1'}), manter
+
+        self._simultaneas += 1
+        try:
+            status, dados, extras = await self._despachar(metodo, alvo, cabecalhos, corpo)
+        finally:
+            self._simultaneas -= 1
+        try:
+            return self._resposta(status, dados, manter=manter, extras=extras), manter
+        except (TypeError, ValueError) as erro:
+            return self._resposta(HTTPStatus.INTERNAL_SERVER_ERROR,
+                                  {'erro': f"Erro: resposta não serializável ({erro})"},
+                                  manter=manter), manter
+
+    async def _despachar(self, metodo: str, alvo: str, cabecalhos: Dict[str, str],
+                         corpo: bytes) -> Tuple[int, Any, Dict[str, str]]:
+        """Encontra a rota e executa o tratador dentro da sessão do cliente."""
+        url = urlsplit(alvo)
+        consulta = {chave: valores[-1] for chave, valores in parse_qs(url.query).items()}
+        tratador = self._rotas.get((metodo, url.path))
+        if tratador is None:
+            if any(caminho == url.path for _, caminho in self._rotas):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'erro': "Erro: Método não permitido"}, {}
+            return HTTPStatus.NOT_FOUND, {'erro': "Erro: Rota não encontrada"}, {}
+        try:
+            dados = json.loads(corpo) if corpo else {}
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {'erro': "Erro: JSON inválido"}, {}
+        if not isinstance(dados, dict):
+            return HTTPStatus.BAD_REQUEST, {'erro': "Erro: O corpo deve ser um objeto JSON"}, {}
+        try:
+            if url.path in _ROTAS_SEM_SESSAO:
+                return await tratador(None, dados, consulta)
+            identificador = (cabecalhos.get('x-sessao') or dados.get('sessao')
+                             or consulta.get('sessao'))
+            sessao = self.sessao(identificador)
+            async with sessao.trava:
+                status, resposta, extras = await tratador(sessao, dados, consulta)
+            if isinstance(resposta, dict):
+                resposta.setdefault('sessao', sessao.identificador)
+            extras['X-Sessao'] = sessao.identificador
+            return status, resposta, extras
+        except ErroRequisicao as erro:
+            return erro.status, {'erro': str(erro)}, {}
+        except Exception as erro:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'erro': f"Erro: {erro}"}, {}
+
+    def _resposta(self, status: int, dados: Any, manter: bool = True,
+                  extras: Optional[Dict[str, str]] = None) -> bytes:
+        """Monta a resposta HTTP; bytes são enviados como HTML."""
+        status = HTTPStatus(status)
+        if isinstance(dados, bytes):
+            corpo, tipo = dados, 'text/html; charset=utf-8'
+        elif dados is None:
+            corpo, tipo = b'', 'application/json; charset=utf-8'
+        else:
+            corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+            tipo = 'application/json; charset=utf-8'
+        linhas = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {tipo}",
+            f"Content-Length: {len(corpo)}",
+            "Access-Control-Allow-Origin: *",
+            "Access-Control-Allow-Methods: GET, POST, DELETE, OPTIONS",
+            "Access-Control-Allow-Headers: Content-Type, X-Sessao",
+            "Access-Control-Expose-Headers: X-Sessao",
+            "Connection: " + ("keep-alive" if manter else "close"),
+        ]
+        for nome, valor in (extras or {}).items():
+            linhas.append(f"{nome}: {valor}")
+        return ("\r\n".join(linhas) + "\r\n\r\n").encode('latin-1') + corpo
+
+    async def _em_executor(self, executor: ThreadPoolExecutor, funcao, *argumentos) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(executor, funcao, *argumentos)
+
+    # Rotas: recebem (sessão, corpo JSON, parâmetros da URL) e retornam
+    # (status, dados, cabeçalhos extras)
+
+    async def _rota_index(self, sessao, dados, consulta):
+        try:
+            with open(_INDEX_HTML, 'rb') as arquivo:
+                return HTTPStatus.OK, arquivo.read(), {}
+        except OSError:
+            return HTTPStatus.NOT_FOUND, {'erro': "Erro: index.html não encontrado"}, {}
+
+    async def _rota_saude(self, sessao, dados, consulta):
+        return HTTPStatus.OK, {'status': 'ok', 'sessoes': len(self.sessoes),
+                               'simultaneas': self._simultaneas}, {}
+
+    async def _rota_calcular(self, sessao, dados, consulta):
+        expressao = dados.get('expressao')
+        if not isinstance(expressao, str):
+            raise ErroRequisicao("Erro: Campo 'expressao' ausente ou inválido")
+        calc = sessao.calculadora
+        atribuicao = calc.interpretar_atribuicao(expressao.strip())
+        if atribuicao is not None:
+            resposta = _resultado(calc.atribuir(*atribuicao))
+            resposta['variavel'] = atribuicao[0]
+        else:
+            resposta = _resultado(calc.calcular(expressao))
+        return HTTPStatus.OK, resposta, {}
+
+    async def _rota_lote(self, sessao, dados, consulta):
+        calc = sessao.calculadora
+        if 'colunas' in dados:
+            expressao, colunas = dados.get('expressao'), dados['colunas']
+            if not isinstance(expressao, str) or not isinstance(colunas, dict):
+                raise ErroRequisicao("Erro: Use 'expressao' e 'colunas' (objeto)")
+            resultado = await self._em_executor(
+                self._executor, lambda: calc.calcular_lote(expressao, **colunas))
+            return HTTPStatus.OK, _resultado(resultado), {}
+
+        itens = dados.get('itens')
+        if not isinstance(itens, list):
+            raise ErroRequisicao("Erro: Campo 'itens' ausente ou inválido")
+        if len(itens) >= self.limiar_processos and self.workers > 1:
+            memoria = dict(calc.memoria)
+            resultados = await self._em_executor(
+                self._executor_processos,
+                lambda: list(self.calculadora.calcular_muitos(itens, self.workers,
+                                                              memoria=memoria)))
+        else:
+            resultados = await self._em_executor(
+                self._executor, lambda: list(calc.calcular_muitos(itens, workers=1)))
+        return HTTPStatus.OK, {'resultados': [_resultado(r) for r in resultados]}, {}
+
+    async def _rota_converter(self, sessao, dados, consulta):
+        de_unidade, para_unidade = dados.get('de'), dados.get('para')
+        calc = sessao.calculadora
+        if 'valores' in dados:
+            if not isinstance(dados['valores'], list):
+                raise ErroRequisicao("Erro: Campo 'valores' deve ser uma lista")
+            return HTTPStatus.OK, _resultado(
+                calc.converter_lote(dados['valores'], de_unidade, para_unidade)), {}
+        return HTTPStatus.OK, _resultado(
+            calc.converter_unidades(dados.get('valor'), de_unidade, para_unidade)), {}
+
+    async def _rota_unidades(self, sessao, dados, consulta):
+        return HTTPStatus.OK, {'unidades': sessao.calculadora.unidades_suportadas()}, {}
+
+    async def _rota_historico(self, sessao, dados, consulta):
+        historico = sessao.calculadora.historico
+        try:
+            pagina = max(1, int(consulta.get('pagina', 1)))
+            por_pagina = max(1, int(consulta.get('por_pagina', 10)))
+        except ValueError:
+            raise ErroRequisicao("Erro: 'pagina' e 'por_pagina' devem ser inteiros")
+        # Página 1 = cálculos mais recentes
+        fim = max(0, len(historico) - (pagina - 1) * por_pagina)
+        registros = historico.registros(max(0, fim - por_pagina), fim)
+        return HTTPStatus.OK, {
+            'total': len(historico),
+            'pagina': pagina,
+            'registros': [{'expressao': r.expressao, 'resultado': _serializavel(r.resultado),
+                           'timestamp': r.timestamp} for r in registros],
+        }, {}
+
+    async def _rota_limpar_historico(self, sessao, dados, consulta):
+        sessao.calculadora.historico.clear()
+        return HTTPStatus.OK, {'total': 0}, {}
+
+    async def _rota_memoria(self, sessao, dados, consulta):
+        return HTTPStatus.OK, {'memoria': _serializavel_dict(sessao.calculadora.memoria)}, {}
+
+    async def _rota_atualizar_memoria(self, sessao, dados, consulta):
+        variaveis = dados.get('variaveis')
+        if not isinstance(variaveis, dict) or not all(
+                isinstance(nome, str) and nome.isidentifier()
+                and isinstance(valor, (int, float)) and not isinstance(valor, bool)
+                for nome, valor in variaveis.items()):
+            raise ErroRequisicao("Erro: 'variaveis' deve mapear nomes a números")
+        sessao.calculadora.memoria.update(variaveis)
+        return HTTPStatus.OK, {'memoria': _serializavel_dict(sessao.calculadora.memoria)}, {}
+
+    async def _rota_limpar_memoria(self, sessao, dados, consulta):
+        sessao.calculadora.memoria.clear()
+        return HTTPStatus.OK, {'memoria': {}}, {}
+
+
+def _serializavel_dict(memoria: Dict[str, Any]) -> Dict[str, Any]:
+    return {nome: _serializavel(valor) for nome, valor in memoria.items()}
+
+
+def _argumentos(argv: Optional[List[str]]) -> Any:
+    """Interpreta os argumentos da linha de comando."""
+    import argparse
+    parser = argparse.ArgumentParser(prog='servidor', description="Serviço HTTP da calculadora")
+    parser.add_argument('--host', default='127.0.0.1', help="endereço (padrão: 127.0.0.1)")
+    parser.add_argument('--porta', type=int, default=8765, help="porta (padrão: 8765)")
+    parser.add_argument('--max-simultaneas', type=int, default=64,
+                        help="requisições em andamento antes de responder 503 (padrão: 64)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processos para lotes grandes (padrão: número de CPUs)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Função principal."""
+    argumentos = _argumentos(sys.argv[1:] if argv is None else argv)
+    servidor = ServidorCalculadora(max_simultaneas=argumentos.max_simultaneas,
+                                   workers=argumentos.workers)
+    try:
+        asyncio.run(servidor.servir(argumentos.host, argumentos.porta))
+    except KeyboardInterrupt:
+        print("\n👋 Servidor encerrado")
+
+
+if __name__ == "__main__":
+    main()
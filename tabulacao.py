@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tabulação de expressões da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+
+A expressão é compilada uma vez e os pontos são gerados sob demanda, sem
+passar pelo histórico. Com NumPy (backend `float`), os pontos são
+avaliados em blocos de `BLOCO` valores com ufuncs; a memória usada não
+depende do tamanho do intervalo.
+
+- `tabular`: uma variável em passos fixos, com o fim incluído;
+- `varrer`: grade com várias variáveis, em ordem de linha (a última
+  variável varia mais rápido);
+- `amostrar`: amostragem adaptativa, que subdivide os intervalos onde a
+  função se afasta da reta entre os extremos.
+
+Pontos inválidos (domínio, divisão por zero, estouro) valem NaN no
+backend `float` e None nos demais, como em `calcular_lote`.
+"""
+
+import math
+from itertools import product
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from calculadora import _Compilador, _tabela_vetorial, analisar_expressao
+
+BLOCO = 4096
+
+_NAN = float('nan')
+
+
+def quantidade_pontos(inicio: Any, fim: Any, passo: Any) -> int:
+    """Número de pontos de `inicio` a `fim` (incluído) em passos de `passo`.
+
+    Como em `range`, um passo na direção oposta ao intervalo não gera pontos.
+    """
+    if passo == 0:
+        raise ValueError("o passo deve ser diferente de zero")
+    passos = float((fim - inicio) / passo)
+    if not math.isfinite(passos):
+        raise ValueError("intervalo ou passo não finito")
+    if passos < 0:
+        return 0
+    # Tolera o erro de arredondamento de passos como 0.1
+    return math.floor(passos + 1e-9) + 1
+
+
+def _limpar_float(resultado: Any) -> float:
+    if isinstance(resultado, str):
+        return _NAN
+    if isinstance(resultado, complex):
+        # Raízes de negativos etc. saem do domínio real, como no NumPy
+        if resultado.imag:
+            return _NAN
+        resultado = resultado.real
+    resultado = float(resultado)
+    return resultado if math.isfinite(resultado) else _NAN
+
+
+def _limpar_backend(resultado: Any) -> Any:
+    return None if isinstance(resultado, str) else resultado
+
+
+class _Tabulador:
+    """Avalia uma expressão compilada sobre conjuntos de pontos."""
+
+    def __init__(self, calc: Any, expressao: str, variaveis: Sequence[str], np: Any = None):
+        self.variaveis = tuple(variaveis)
+        self.modelo = calc.compilar(expressao, parametros=self.variaveis)
+        self.converter = calc.backend.converter
+        self.limpar = _limpar_float if self.converter is None else _limpar_backend
+        self.np = np
+        if np is not None:
+            arvore = analisar_expressao(self.modelo.expressao)
+            # As variáveis tabuladas sombreiam as constantes, como os parâmetros
+            self.valores = dict(calc.memoria, **dict.fromkeys(self.variaveis))
+            self.avaliar_vetor = _Compilador(_tabela_vetorial(calc._funcoes, np),
+                                             self.valores).compilar(arvore)[0]
+
+    def numero(self, valor: Any) -> Any:
+        """Converte um limite ou passo para o backend."""
+        return float(valor) if self.converter is None else self.converter(valor)
+
+    def ponto(self, *coordenadas: Any) -> Any:
+        return self.limpar(self.modelo(*coordenadas))
+
+    def vetor(self, colunas: Dict[str, Any], tamanho: int) -> Any:
+        """Avalia um bloco com NumPy; não finitos viram NaN."""
+        np = self.np
+        self.valores.update(colunas)
+        with np.errstate(all='ignore'):
+            resultado = self.avaliar_vetor(self.valores)
+            if np.iscomplexobj(resultado):
+                resultado = np.where(np.imag(resultado) == 0, np.real(resultado), np.nan)
+            resultado = np.array(np.broadcast_to(resultado, (tamanho,)), dtype=float)
+        resultado[~np.isfinite(resultado)] = np.nan
+        return resultado
+
+
+def tabular(calc: Any, expressao: str, var: str, inicio: Any, fim: Any, passo: Any,
+            np: Any = None, blocos: bool = False) -> Iterator[Any]:
+    """Gerador de (x, f(x)) para x de `inicio` a `fim` em passos de `passo`.
+
+    Com `blocos`, gera pares (xs, ys) com até `BLOCO` pontos cada: arrays
+    do NumPy quando `np` é dado, listas caso contrário. Erros de sintaxe,
+    de nomes e de limites são levantados aqui, antes do primeiro ponto.
+    """
+    tabulador = _Tabulador(calc, expressao, (var,), np)
+    inicio, passo = tabulador.numero(inicio), tabulador.numero(passo)
+    quantidade = quantidade_pontos(inicio, tabulador.numero(fim), passo)
+    if np is not None:
+        gerador = _blocos_numpy(tabulador, var, inicio, passo, quantidade)
+    else:
+        gerador = _blocos_python(tabulador, inicio, passo, quantidade)
+    return gerador if blocos else _pares(gerador)
+
+
+def _blocos_numpy(tabulador: _Tabulador, var: str, inicio: float, passo: float,
+                  quantidade: int) -> Iterator[Tuple[Any, Any]]:
+    np = tabulador.np
+    for comeco in range(0, quantidade, BLOCO):
+        xs = inicio + np.arange(comeco, min(comeco + BLOCO, quantidade), dtype=float) * passo
+        yield xs, tabulador.vetor({var: xs}, len(xs))
+
+
+def _blocos_python(tabulador: _Tabulador, inicio: Any, passo: Any,
+                   quantidade: int) -> Iterator[Tuple[List[Any], List[Any]]]:
+    ponto = tabulador.ponto
+    for comeco in range(0, quantidade, BLOCO):
+        xs = [inicio + i * passo for i in range(comeco, min(comeco + BLOCO, quantidade))]
+        yield xs, [ponto(x) for x in xs]
+
+
+def _pares(blocos: Iterator[Tuple[Any, Any]]) -> Iterator[Tuple[Any, Any]]:
+    for xs, ys in blocos:
+        if not isinstance(xs, list):
+            xs, ys = xs.tolist(), ys.tolist()
+        yield from zip(xs, ys)
+
+
+def varrer(calc: Any, expressao: str, eixos: Dict[str, Tuple[Any, Any, Any]],
+           np: Any = None) -> Iterator[Tuple[Tuple[Any, ...], Any]]:
+    """Gerador de ((v1, v2, ...), f(v1, v2, ...)) sobre a grade dos eixos.
+
+    `eixos` mapeia cada variável para (inicio, fim, passo), como em
+    `tabular`. A grade não é materializada: com NumPy, cada bloco de
+    índices é convertido em coordenadas com `unravel_index`.
+    """
+    if not eixos:
+        raise ValueError("informe ao menos um eixo")
+    tabulador = _Tabulador(calc, expressao, list(eixos), np)
+    limites = []
+    for var, (inicio, fim, passo) in eixos.items():
+        inicio, passo = tabulador.numero(inicio), tabulador.numero(passo)
+        limites.append((inicio, passo, quantidade_pontos(inicio, tabulador.numero(fim), passo)))
+    if np is not None:
+        return _varrer_numpy(tabulador, limites)
+    return _varrer_python(tabulador, limites)
+
+
+def _varrer_numpy(tabulador: _Tabulador,
+                  limites: List[Tuple[float, float, int]]) -> Iterator[Tuple[tuple, float]]:
+    np = tabulador.np
+    forma = tuple(quantidade for _, _, quantidade in limites)
+    total = 1
+    for quantidade in forma:
+        total *= quantidade
+    for comeco in range(0, total, BLOCO):
+        indices = np.unravel_index(np.arange(comeco, min(comeco + BLOCO, total)), forma)
+        colunas = {var: inicio + indice * passo for var, indice, (inicio, passo, _)
+                   in zip(tabulador.variaveis, indices, limites)}
+        ys = tabulador.vetor(colunas, len(indices[0])).tolist()
+        coordenadas = zip(*(colunas[var].tolist() for var in tabulador.variaveis))
+        yield from zip(coordenadas, ys)
+
+
+def _varrer_python(tabulador: _Tabulador,
+                   limites: List[Tuple[Any, Any, int]]) -> Iterator[Tuple[tuple, Any]]:
+    ponto = tabulador.ponto
+    eixos = [[inicio + i * passo for i in range(quantidade)]
+             for inicio, passo, quantidade in limites]
+    for coordenadas in product(*eixos):
+        yield coordenadas, ponto(*coordenadas)
+
+
+def amostrar(calc: Any, expressao: str, var: str, inicio: Any, fim: Any, pontos: int = 65,
+             tolerancia: float = 1e-3, profundidade: int = 10) -> Iterator[Tuple[Any, Any]]:
+    """Gerador de (x, f(x)) com amostragem adaptativa, em ordem crescente de x.
+
+    Começa com `pontos` pontos igualmente espaçados e divide ao meio cada
+    intervalo em que o ponto médio se afasta da reta entre os extremos
+    mais que `tolerancia` vezes a amplitude inicial dos valores, ou em que
+    só parte dos pontos é válida (bordas de domínio, descontinuidades),
+    até `profundidade` divisões.
+    """
+    if pontos < 2:
+        raise ValueError("são necessários ao menos 2 pontos iniciais")
+    tabulador = _Tabulador(calc, expressao, (var,))
+    inicio, fim = tabulador.numero(inicio), tabulador.numero(fim)
+    passo = (fim - inicio) / (pontos - 1)
+    xs = [inicio + i * passo for i in range(pontos - 1)] + [fim]
+    ys = [tabulador.ponto(x) for x in xs]
+    finitos = [y for y in map(_como_float, ys) if math.isfinite(y)]
+    amplitude = (max(finitos) - min(finitos)) if finitos else 0.0
+    limite = tolerancia * (amplitude or 1.0)
+    return _amostrar(tabulador, xs, ys, limite, profundidade)
+
+
+def _como_float(valor: Any) -> float:
+    return _NAN if valor is None else float(valor)
+
+
+def _amostrar(tabulador: _Tabulador, xs: List[Any], ys: List[Any], limite: float,
+              profundidade: int) -> Iterator[Tuple[Any, Any]]:
+    for i in range(len(xs) - 1):
+        yield xs[i], ys[i]
+        yield from _subdividir(tabulador, xs[i], ys[i], xs[i + 1], ys[i + 1],
+                               limite, profundidade)
+    yield xs[-1], ys[-1]
+
+
+def _subdividir(tabulador: _Tabulador, a: Any, fa: Any, b: Any, fb: Any, limite: float,
+                profundidade: int) -> Iterator[Tuple[Any, Any]]:
+    """Pontos interiores de (a, b), em ordem; a recursão é limitada por `profundidade`."""
+    if profundidade <= 0:
+        return
+    meio = a + (b - a) / 2
+    fmeio = tabulador.ponto(meio)
+    valores = (_como_float(fa), _como_float(fmeio), _como_float(fb))
+    validos = sum(math.isfinite(valor) for valor in valores)
+    if validos == 3:
+        dividir = abs(valores[1] - (valores[0] + valores[2]) / 2) > limite
+    else:
+        dividir = validos > 0
+    if not dividir:
+        return
+    yield from _subdividir(tabulador, a, fa, meio, fmeio, limite, profundidade - 1)
+    yield meio, fmeio
+    yield from _subdividir(tabulador, meio, fmeio, b, fb, limite, profundidade - 1)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do armazenamento persistente da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from fractions import Fraction
+from unittest.mock import patch
+from io import StringIO
+
+# Adiciona o diretório atual ao path para importar o módulo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from calculadora import CalculadoraOtimizada
+from armazenamento import ArmazenamentoPersistente, codificar_valor, decodificar_valor
+
+class TestArmazenamentoPersistente(unittest.TestCase):
+    """Testes para o log de histórico e o instantâneo da memória."""
+
+    def setUp(self):
+        """Cria um diretório temporário para os arquivos."""
+        self.diretorio = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove o diretório temporário."""
+        shutil.rmtree(self.diretorio)
+
+    def test_codificacao_de_valores(self):
+        """Testa ida e volta de todos os tipos suportados."""
+        for valor in [1.5, -7, 10 ** 40, "Erro: Divisão por zero", Decimal("0.1"), Fraction(1, 3)]:
+            dados = codificar_valor(valor)
+            decodificado, fim = decodificar_valor(dados, 0)
+            self.assertEqual(decodificado, valor)
+            self.assertIs(type(decodificado), type(valor))
+            self.assertEqual(fim, len(dados))
+
+    def test_sequencia_e_instante(self):
+        """Testa acesso por sequência e busca por instante."""
+        with ArmazenamentoPersistente(self.diretorio) as armazenamento:
+            for i in range(100):
+                sequencia = armazenamento.adicionar(f"{i} + 1", i + 1, instante=1000.0 + i)
+                self.assertEqual(sequencia, i)
+            self.assertEqual(len(armazenamento), 100)
+            self.assertEqual(armazenamento[42].expressao, "42 + 1")
+            self.assertEqual(armazenamento[-1].resultado, 100)
+            self.assertEqual(armazenamento.buscar_instante(1050.0), 50)
+            intervalo = list(armazenamento.intervalo(1010.0, 1013.0))
+            self.assertEqual([r.resultado for r in intervalo], [11, 12, 13])
+
+    def test_reabertura_e_compartilhamento(self):
+        """Testa que os registros sobrevivem e são vistos por outra instância."""
+        escritor = ArmazenamentoPersistente(self.diretorio)
+        leitor = ArmazenamentoPersistente(self.diretorio)
+        escritor.adicionar("1 + 1", 2)
+        self.assertEqual(len(leitor), 1)
+        escritor.adicionar("2 + 2", 4)
+        self.assertEqual(leitor[1].resultado, 4)
+        escritor.fechar()
+        leitor.fechar()
+
+        with ArmazenamentoPersistente(self.diretorio) as reaberto:
+            self.assertEqual([r.expressao for r in reaberto.registros()], ["1 + 1", "2 + 2"])
+
+    def test_formato_desconhecido(self):
+        """Testa que arquivos estranhos não são sobrescritos."""
+        with open(os.path.join(self.diretorio, 'historico.log'), 'wb') as arquivo:
+            arquivo.write(b'outra coisa')
+        with self.assertRaises(ValueError):
+            ArmazenamentoPersistente(self.diretorio)
+
+    def test_calculadora_persistente(self):
+        """Testa histórico e memória persistidos pela calculadora."""
+        calc = CalculadoraOtimizada(diretorio_dados=self.diretorio)
+        calc.atribuir('x', '5')
+        calc.calcular("x * 2")
+        calc.armazenamento.fechar()
+
+        nova = CalculadoraOtimizada(diretorio_dados=self.diretorio)
+        self.assertEqual(nova.memoria, {'x': 5})
+        self.assertEqual(len(nova.armazenamento), 2)
+        self.assertEqual(nova.armazenamento[-1].resultado, 10)
+        nova.armazenamento.fechar()
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_limpar_historico(self, mock_stdout):
+        """Testa que `clear` apaga o log e o índice, mas não a memória."""
+        calc = CalculadoraOtimizada(diretorio_dados=self.diretorio)
+        calc.atribuir('x', '5')
+        calc.calcular("x * 2")
+        outra = ArmazenamentoPersistente(self.diretorio)
+        self.assertEqual(len(outra), 2)
+        calc.limpar_historico()
+        self.assertEqual(len(calc.armazenamento), 0)
+        self.assertEqual(len(outra), 0)
+        calc.exibir_historico()
+        self.assertNotIn("x * 2", mock_stdout.getvalue())
+        calc.calcular("x + 1")
+        self.assertEqual([r.expressao for r in outra.registros()], ["x + 1"])
+        outra.fechar()
+        calc.armazenamento.fechar()
+
+        nova = CalculadoraOtimizada(diretorio_dados=self.diretorio)
+        self.assertEqual(nova.memoria, {'x': 5})
+        self.assertEqual(nova.armazenamento[0].resultado, 6)
+        nova.armazenamento.fechar()
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_paginacao_do_historico(self, mock_stdout):
+        """Testa `exibir_historico` paginando o armazenamento."""
+        calc = CalculadoraOtimizada(capacidade_historico=0, diretorio_dados=self.diretorio)
+        for i in range(25):
+            calc.calcular(f"{i} * 1")
+        calc.exibir_historico(pagina=2)
+        saida = mock_stdout.getvalue()
+        self.assertIn("página 2 de 3", saida)
+        self.assertIn("11. 10 * 1 = 10", saida)
+        self.assertNotIn("21. ", saida)
+        calc.armazenamento.fechar()
+
+if __name__ == '__main__':
+    unittest.main()
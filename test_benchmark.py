@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da suíte de benchmarks da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+"""
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest.mock import patch
+from io import StringIO
+
+# Adiciona o diretório atual ao path para importar o módulo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+
+class TestBenchmark(unittest.TestCase):
+    """Testes para medição, relatório e comparação com a base."""
+
+    def test_todos_os_casos_executam(self):
+        """Testa que cada caso produz uma operação válida e as métricas."""
+        relatorio = benchmark.executar(amostras=2, lote=2)
+        self.assertEqual(set(relatorio['casos']), set(benchmark.CASOS))
+        for medida in relatorio['casos'].values():
+            self.assertGreater(medida['ops_por_segundo'], 0)
+            self.assertLessEqual(medida['p50_us'], medida['p99_us'])
+            self.assertGreaterEqual(medida['bytes_por_chamada'], 0)
+
+    def test_comparacao(self):
+        """Testa a sinalização de regressões de vazão e de alocação."""
+        base = {'casos': {'a': {'ops_por_segundo': 1000.0, 'bytes_por_chamada': 100.0},
+                          'b': {'ops_por_segundo': 1000.0, 'bytes_por_chamada': 100.0}}}
+        atual = {'casos': {'a': {'ops_por_segundo': 950.0, 'bytes_por_chamada': 120.0},
+                           'b': {'ops_por_segundo': 500.0, 'bytes_por_chamada': 1000.0},
+                           'c': {'ops_por_segundo': 1.0, 'bytes_por_chamada': 0.0}}}
+        regressoes = benchmark.comparar(atual, base, tolerancia=0.10)
+        self.assertEqual(len(regressoes), 2)
+        self.assertTrue(all(regressao.startswith('b:') for regressao in regressoes))
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_main_grava_json_e_compara(self, mock_stdout):
+        """Testa a gravação do JSON e o código de saída com regressão."""
+        with tempfile.TemporaryDirectory() as diretorio:
+            saida = os.path.join(diretorio, 'resultado.json')
+            argumentos = ['--casos', 'calcular_simples', '--amostras', '2', '--lote', '2']
+            self.assertEqual(benchmark.main(argumentos + ['--saida', saida]), 0)
+            with open(saida, encoding='utf-8') as arquivo:
+                relatorio = json.load(arquivo)
+            self.assertEqual(list(relatorio['casos']), ['calcular_simples'])
+
+            relatorio['casos']['calcular_simples']['ops_por_segundo'] *= 1000
+            base = os.path.join(diretorio, 'base.json')
+            with open(base, 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo)
+            self.assertEqual(benchmark.main(argumentos + ['--base', base]), 1)
+        self.assertIn("Regressões", mock_stdout.getvalue())
+
+    def test_inicializacao_sem_modulos_adiados(self):
+        """Testa com `-X importtime` que o modo `-c` não importa módulos adiados."""
+        tempos = benchmark._tempos_importacao(['-m', 'calculadora', '-c', '2 + 3'])
+        self.assertIn('math', tempos)
+        self.assertEqual([nome for nome in benchmark.MODULOS_ADIADOS if nome in tempos], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,15 +7,22 @@ Versão: 2.0.0
 """
 
 import unittest
+import json
+import math
 import sys
 import os
+import signal
+import tempfile
 from unittest.mock import patch, MagicMock
 from io import StringIO
 
 # Adiciona o diretório atual ao path para importar o módulo
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from calculadora import CalculadoraOtimizada
+import calculadora
+from calculadora import (CalculadoraOtimizada, analisar_expressao, ExpressaoInvalida,
+                         HistoricoCircular, OrcamentoAvaliacao, OrcamentoExcedido,
+                         verificar_expressao)
 
 class TestCalculadoraOtimizada(unittest.TestCase):
     """Testes para a classe CalculadoraOtimizada."""
@@ -31,7 +38,7 @@ class TestCalculadoraOtimizada(unittest.TestCase):
         
     def test_inicializacao(self):
         """Testa se a calculadora é inicializada corretamente."""
-        self.assertIsInstance(self.calc.historico, list)
+        self.assertIsInstance(self.calc.historico, HistoricoCircular)
         self.assertIsInstance(self.calc.memoria, dict)
         self.assertIsInstance(self.calc.funcoes_disponiveis, dict)
         self.assertEqual(len(self.calc.historico), 0)
@@ -218,6 +225,36 @@ class TestCalculadoraOtimizada(unittest.TestCase):
         self.assertIn('cos', namespace)
         self.assertIn('pi', namespace)
         
+    def test_validar_expressao(self):
+        """Testa a validação de caracteres e palavras e a posição dos erros."""
+        for expressao in ["2^3 × 4 ÷ 1", "round(x, 2)", "sin(x)\t+ 1", "١٢ + 1", "",
+                          "x + PROFILE", "profile * 2", "1.5e3 + .5", "evaluate(x)"]:
+            self.assertTrue(self.calc.validar_expressao(expressao), expressao)
+        casos = {
+            "2 + $": 4,
+            "x * é": 4,
+            "__import__('os')": 0,
+            "1 + eval('x')": 4,
+            "__import__(2)": 0,
+            "1 + eval(2)": 4,
+            "x.real": 1,
+            "2 + open": 4,
+        }
+        for expressao, posicao in casos.items():
+            with self.subTest(expressao=expressao):
+                self.assertFalse(self.calc.validar_expressao(expressao))
+                with self.assertRaises(ExpressaoInvalida) as contexto:
+                    verificar_expressao(expressao)
+                self.assertEqual(contexto.exception.posicao, posicao)
+        with self.assertRaises(ExpressaoInvalida):
+            self.calc.preparar_expressao("2 ^ 3; open('x')")
+        # validar_expressao e calcular seguem as mesmas regras do analisador léxico
+        self.calc.memoria['profile'] = 3
+        self.assertEqual(self.calc.calcular("profile * 2"), 6)
+        self.assertEqual(self.calc.calcular("2 + @"),
+                         "Erro: Expressão inválida ou não permitida - "
+                         "caractere inválido '@' na posição 4")
+
     def test_limite_historico(self):
         """Testa limite do histórico (50 itens)."""
         # Adiciona mais de 50 cálculos
@@ -231,6 +268,1023 @@ class TestCalculadoraOtimizada(unittest.TestCase):
         primeiro_item = self.calc.historico[0]
         self.assertIn("5 + 1", primeiro_item['expressao'])
 
+class TestHistoricoCircular(unittest.TestCase):
+    """Testes para o histórico em buffer circular."""
+    
+    def test_sobrescreve_mais_antigos(self):
+        """Testa a ordem e o descarte ao atingir a capacidade."""
+        historico = HistoricoCircular(3)
+        for i in range(5):
+            historico.adicionar(f"{i} + 0", i, instante=1000.0 + i)
+        self.assertEqual(len(historico), 3)
+        self.assertEqual([r.resultado for r in historico], [2, 3, 4])
+        self.assertEqual(historico[-1].expressao, "4 + 0")
+        self.assertEqual([r.resultado for r in historico[1:]], [3, 4])
+        self.assertEqual([r.resultado for r in historico.ultimos(2)], [3, 4])
+        with self.assertRaises(IndexError):
+            historico[3]
+            
+    def test_timestamp_sob_demanda(self):
+        """Testa que o instante é numérico e formatado só na leitura."""
+        historico = HistoricoCircular(2)
+        historico.adicionar("1 + 1", 2, instante=0.0)
+        registro = historico[0]
+        self.assertEqual(registro.instante, 0.0)
+        self.assertIsInstance(registro['timestamp'], str)
+        self.assertEqual(registro.como_dict()['resultado'], 2)
+        
+    def test_historico_desativado(self):
+        """Testa capacidade 0 (histórico desligado)."""
+        calc = CalculadoraOtimizada(capacidade_historico=0)
+        self.assertEqual(calc.calcular("2 + 2"), 4)
+        self.assertEqual(len(calc.historico), 0)
+        
+    def test_capacidade_configuravel(self):
+        """Testa capacidade definida na construção."""
+        calc = CalculadoraOtimizada(capacidade_historico=5)
+        for i in range(8):
+            calc.calcular(f"{i} * 2")
+        self.assertEqual(len(calc.historico), 5)
+        self.assertEqual(calc.historico[0]['expressao'], "3 * 2")
+        calc.historico.clear()
+        self.assertEqual(len(calc.historico), 0)
+
+class TestCacheExpressoes(unittest.TestCase):
+    """Testes para o cache de expressões compiladas."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada(tamanho_cache=3)
+        
+    def test_acertos_e_falhas(self):
+        """Testa contadores de acerto e falha."""
+        self.calc.calcular("2 + 3")
+        self.calc.calcular("2  +   3")
+        self.calc.calcular(" 2 + 3 ")
+        
+        estatisticas = self.calc.cache_expressoes.estatisticas()
+        self.assertEqual(estatisticas['falhas'], 1)
+        self.assertEqual(estatisticas['acertos'], 2)
+        self.assertEqual(estatisticas['tamanho'], 1)
+        
+    def test_limite_lru(self):
+        """Testa descarte da expressão menos usada."""
+        for expressao in ["1 + 1", "2 + 2", "3 + 3"]:
+            self.calc.calcular(expressao)
+        self.calc.calcular("1 + 1")
+        self.calc.calcular("4 + 4")
+        
+        self.assertEqual(len(self.calc.cache_expressoes), 3)
+        self.assertIn("1 + 1", self.calc.cache_expressoes)
+        self.assertNotIn("2 + 2", self.calc.cache_expressoes)
+        
+    def test_expressao_invalida_em_cache(self):
+        """Testa que expressões inválidas também são reaproveitadas."""
+        for _ in range(2):
+            resultado = self.calc.calcular("import os")
+            self.assertIn("inválida", resultado)
+        self.assertEqual(self.calc.cache_expressoes.acertos, 1)
+        
+    def test_invalidacao_por_funcoes(self):
+        """Testa invalidação quando a tabela de funções muda."""
+        self.calc.calcular("dobro(2)")
+        self.calc.funcoes_disponiveis['dobro'] = lambda x: 2 * x
+        self.assertEqual(self.calc.calcular("dobro(2)"), 4)
+        
+        self.calc.funcoes_disponiveis = {'dobro': lambda x: 3 * x}
+        self.assertEqual(len(self.calc.cache_expressoes), 0)
+        self.assertEqual(self.calc.calcular("dobro(2)"), 6)
+        
+    def test_memoria_nao_invalida_cache(self):
+        """Testa que variáveis são lidas a cada cálculo."""
+        self.calc.memoria['x'] = 1
+        self.assertEqual(self.calc.calcular("x + 1"), 2)
+        self.calc.memoria['x'] = 10
+        self.assertEqual(self.calc.calcular("x + 1"), 11)
+        self.assertEqual(self.calc.cache_expressoes.acertos, 1)
+        
+    def test_cache_desativado(self):
+        """Testa calculadora sem cache."""
+        calc = CalculadoraOtimizada(tamanho_cache=0)
+        self.assertEqual(calc.calcular("2 * 3"), 6)
+        self.assertEqual(len(calc.cache_expressoes), 0)
+
+class TestMotorExpressoes(unittest.TestCase):
+    """Testes para o analisador e o avaliador de expressões."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+        
+    def test_precedencia(self):
+        """Testa precedência e associatividade iguais às do Python."""
+        casos = ["-2 ** 2", "2 ** -1", "2 ** 3 ** 2", "7 // 2 * 3", "-7 % 3",
+                 "2 ^ 3", "6 ÷ 4 × 2", "1e3 + .5", "+-+3"]
+        esperados = [-4, 0.5, 512, 9, 2, 8, 3.0, 1000.5, -3]
+        for expressao, esperado in zip(casos, esperados):
+            self.assertEqual(self.calc.calcular(expressao), esperado, expressao)
+            
+    def test_arvore(self):
+        """Testa a árvore produzida pelo analisador."""
+        arvore = analisar_expressao("round(x, 2) + 1")
+        self.assertEqual(arvore, ('bin', '+', ('chamada', 'round', (('nome', 'x'), ('num', 2))), ('num', 1)))
+        
+    def test_erros_de_analise(self):
+        """Testa erros léxicos e sintáticos."""
+        with self.assertRaises(ExpressaoInvalida) as contexto:
+            analisar_expressao("2 + $")
+        self.assertEqual(contexto.exception.posicao, 4)
+        casos = {
+            "": "fim inesperado da expressão na posição 0",
+            "2 +": "fim inesperado da expressão na posição 3",
+            "(1 + 2": "esperado ')' na posição 6",
+            "((1)": "esperado ')' na posição 4",
+            "sin(1,)": "token inesperado ')' na posição 6",
+            "2 3": "token inesperado '3' na posição 2",
+            "2 +* 3": "token inesperado '*' na posição 3",
+        }
+        for expressao, mensagem in casos.items():
+            self.assertEqual(self.calc.calcular(expressao), "Erro: Sintaxe inválida - " + mensagem,
+                             expressao)
+            
+    def test_nomes_sem_lista_negra(self):
+        """Testa que identificadores comuns não são mais bloqueados."""
+        self.calc.memoria['profile'] = 2
+        self.calc.memoria['filesystem'] = 3
+        self.assertEqual(self.calc.calcular("profile * filesystem"), 6)
+        self.assertIn("Erro", str(self.calc.calcular("__import__(1)")))
+        
+    def test_memoria_sombreia_constante(self):
+        """Testa que variáveis em memória têm precedência sobre constantes."""
+        self.assertEqual(self.calc.calcular("e * 2"), self.calc.funcoes_disponiveis['e'] * 2)
+        self.calc.memoria['e'] = 5
+        self.assertEqual(self.calc.calcular("e * 2"), 10)
+        del self.calc.memoria['e']
+        self.assertAlmostEqual(self.calc.calcular("e * 2"), 5.43656365691809)
+        
+    def test_funcao_desconhecida(self):
+        """Testa chamada de função inexistente."""
+        resultado = self.calc.calcular("foo(1)")
+        self.assertEqual(resultado, "Erro: name 'foo' is not defined")
+
+class TestOtimizacao(unittest.TestCase):
+    """Testes para a dobra de constantes e simplificação algébrica."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+        self.calc.memoria['x'] = 3.0
+        
+    def test_dobra_constantes(self):
+        """Testa que subexpressões constantes viram um único número."""
+        compilada = self.calc.compilar_expressao("x * (2 * pi / 360) + sqrt(2) / 2")
+        self.assertEqual(compilada.arvore[0], 'bin')
+        self.assertEqual(compilada.arvore[3], ('num', math.sqrt(2) / 2))
+        self.assertEqual(compilada.arvore[2][3], ('num', 2 * math.pi / 360))
+        estatisticas = self.calc.estatisticas_otimizacao("x * (2 * pi / 360) + sqrt(2) / 2")
+        self.assertEqual(estatisticas['nos_antes'], 12)
+        self.assertEqual(estatisticas['nos_depois'], 5)
+        self.assertGreater(estatisticas['reducao'], 0.5)
+        
+    def test_identidades(self):
+        """Testa x*1, 1*x, x**1 e x-0."""
+        for expressao in ["x * 1", "1 * x", "x ** 1", "x - 0", "(x - 0) * 1 ** 1"]:
+            self.assertEqual(self.calc.compilar_expressao(expressao).arvore, ('nome', 'x'), expressao)
+            
+    def test_semantica_de_ponto_flutuante(self):
+        """Testa que a otimização não muda resultados nem tipos."""
+        self.calc.memoria['z'] = -0.0
+        self.assertEqual(str(self.calc.calcular("z + 0")), "0.0")
+        self.assertEqual(str(self.calc.calcular("z * 1")), "-0.0")
+        self.assertIsInstance(self.calc.calcular("4 / 1"), float)
+        self.assertIsInstance(self.calc.calcular("x / 1"), float)
+        
+    def test_erros_nao_sao_dobrados(self):
+        """Testa que divisão por zero e domínio inválido falham só na avaliação."""
+        compilada = self.calc.compilar_expressao("x + 1 / 0")
+        self.assertEqual(compilada.arvore[3], ('bin', '/', ('num', 1), ('num', 0)))
+        self.assertEqual(self.calc.calcular("x + 1 / 0"), "Erro: Divisão por zero")
+        self.assertIn("math domain error", self.calc.calcular("sqrt(-1) + x"))
+        self.assertEqual(self.calc.compilar_expressao("2 ** 100000").arvore[0], 'bin')
+        
+    def test_constante_sombreada_nao_dobrada(self):
+        """Testa que `pi` em memória não é trocado pela constante."""
+        self.calc.memoria['pi'] = 3
+        self.assertEqual(self.calc.calcular("pi * 2"), 6)
+
+class TestCalculoLote(unittest.TestCase):
+    """Testes para a avaliação vetorizada em lote."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+        self.calc.memoria['k'] = 2.0
+        self.x = [i / 10 - 5 for i in range(101)]
+        self.y = [i - 50 for i in range(101)]
+        
+    def assertMesmosValores(self, obtidos, esperados):
+        """Compara listas de floats considerando NaN igual a NaN."""
+        self.assertEqual(len(obtidos), len(esperados))
+        for obtido, esperado in zip(obtidos, esperados):
+            if math.isnan(esperado):
+                self.assertTrue(math.isnan(obtido))
+            else:
+                self.assertAlmostEqual(obtido, esperado, places=12)
+                
+    @patch('calculadora._numpy', return_value=None)
+    def test_lote_python_puro(self, _):
+        """Testa o laço em Python puro contra chamadas a calcular."""
+        resultado = self.calc.calcular_lote("sin(x)*k + sqrt(y)", x=self.x, y=self.y)
+        self.assertIsInstance(resultado, list)
+        self.assertEqual(len(self.calc.historico), 0)
+        esperados = []
+        for x, y in zip(self.x, self.y):
+            self.calc.memoria.update(x=x, y=y)
+            valor = self.calc.calcular("sin(x)*k + sqrt(y)")
+            esperados.append(valor if isinstance(valor, float) else float('nan'))
+        self.assertMesmosValores(resultado, esperados)
+        
+    @patch('calculadora._numpy', return_value=None)
+    def test_lote_escalares_e_erros(self, _):
+        """Testa escalares, pontos inválidos e erros da expressão."""
+        resultado = self.calc.calcular_lote("1 / x + c", x=[0, 2, 4], c=1)
+        self.assertMesmosValores(resultado, [float('nan'), 1.5, 1.25])
+        self.assertMesmosValores(self.calc.calcular_lote("x**0.5", x=[-1.0, 4.0]),
+                                 [float('nan'), 2.0])
+        self.assertEqual(self.calc.calcular_lote("2 *", x=[1]),
+                         "Erro: Sintaxe inválida - fim inesperado da expressão na posição 3")
+        self.assertIn("tamanhos", self.calc.calcular_lote("x + y", x=[1], y=[1, 2]))
+        
+    @unittest.skipUnless(calculadora._numpy(), "NumPy não instalado")
+    def test_lote_numpy_igual_python(self):
+        """Testa que os caminhos com e sem NumPy coincidem."""
+        expressao = "sin(x)*k + sqrt(y) + round(x, 1) + x % 3 + log(abs(y) + 1) / x"
+        vetorizado = self.calc.calcular_lote(expressao, x=self.x, y=self.y)
+        with patch('calculadora._numpy', return_value=None):
+            puro = self.calc.calcular_lote(expressao, x=self.x, y=self.y)
+        self.assertMesmosValores(list(vetorizado), puro)
+
+    @unittest.skipUnless(calculadora._numpy(), "NumPy não instalado")
+    def test_lote_numpy_igual_python_casos_limite(self):
+        """Testa constantes sombreadas, complexos e aridade nos dois caminhos."""
+        casos = [("pi * x", {'pi': 2, 'x': [1, 2]}),
+                 ("pi * x", {'pi': [1, 2], 'x': 3}),
+                 ("(-8)**(1/3) + x", {'x': [1, 2]}),
+                 ("x**0.5", {'x': [-1.0, 4.0]})]
+        for expressao, colunas in casos:
+            vetorizado = self.calc.calcular_lote(expressao, **colunas)
+            with patch('calculadora._numpy', return_value=None):
+                puro = self.calc.calcular_lote(expressao, **colunas)
+            self.assertMesmosValores(list(vetorizado), puro)
+        self.assertMesmosValores(list(self.calc.calcular_lote("pi * x", pi=2, x=[1, 2])),
+                                 [2.0, 4.0])
+        for expressao in ("log(x, 2)", "sqrt(x, 2)"):
+            vetorizado = self.calc.calcular_lote(expressao, x=[1, 2])
+            with patch('calculadora._numpy', return_value=None):
+                puro = self.calc.calcular_lote(expressao, x=[1, 2])
+            self.assertEqual(vetorizado, puro)
+            self.assertIn("recebe 1 argumento(s), 2 informado(s)", puro)
+
+class TestModeloExpressao(unittest.TestCase):
+    """Testes para expressões compiladas em funções reutilizáveis."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+        
+    def test_argumentos(self):
+        """Testa argumentos posicionais e nomeados e a introspecção."""
+        modelo = self.calc.compilar("a * sin(b) + c")
+        self.assertEqual(modelo.variaveis, ('a', 'b', 'c'))
+        esperado = 2 * math.sin(0.5) + 1
+        self.assertEqual(modelo(2, 0.5, 1), esperado)
+        self.assertEqual(modelo(c=1, a=2, b=0.5), esperado)
+        self.assertEqual(modelo(2, 0.5, c=1), esperado)
+        with self.assertRaises(TypeError):
+            modelo(1, 2)
+        self.assertEqual(len(self.calc.historico), 0)
+        
+    def test_mesmo_resultado_que_avaliar(self):
+        """Testa precedência e associatividade no código gerado."""
+        for expressao in ["-x ** 2", "(-x) ** 2", "x ** -y", "x - (y - z)", "x / (y * z)",
+                          "x ** y ** z", "(x ** y) ** z", "-x ** -y", "--x", "-(x + y) % z",
+                          "x // y * z", "2 ** 0.5 * x", "-0.0 ** 2 + x"]:
+            variaveis = {'x': 1.5, 'y': 2.0, 'z': 3.0}
+            modelo = self.calc.compilar(expressao)
+            argumentos = {nome: variaveis[nome] for nome in modelo.variaveis}
+            self.assertEqual(modelo(**argumentos), self.calc.avaliar(expressao, argumentos),
+                             expressao)
+        
+    def test_erros(self):
+        """Testa erros de avaliação como texto e erros de compilação levantados."""
+        modelo = self.calc.compilar("1 / x")
+        self.assertEqual(modelo(0), "Erro: Divisão por zero")
+        self.assertEqual(modelo(4), 0.25)
+        with self.assertRaises(SyntaxError):
+            self.calc.compilar("1 +")
+        with self.assertRaises(NameError):
+            self.calc.compilar("desconhecida(x)")
+        with self.assertRaises(ExpressaoInvalida):
+            self.calc.compilar("x", parametros=['if'])
+        
+    def test_parametros_e_memoria(self):
+        """Testa a ordem explícita e as variáveis fixadas da memória."""
+        self.calc.memoria.update({'taxa': 0.5, 'pi': 3})
+        modelo = self.calc.compilar("x * taxa + y", parametros=['y', 'x'])
+        self.calc.memoria['taxa'] = 10
+        self.assertEqual(modelo(1, 4), 3.0)
+        # Como em `calcular`, a memória sombreia as constantes
+        self.assertEqual(self.calc.calcular("pi * 2"), 6)
+        self.assertEqual(self.calc.compilar("pi")(), 3)
+        self.assertEqual(self.calc.compilar("pi * x")(1), 3)
+        self.assertEqual(self.calc.compilar("pi * x", parametros=['x'])(1), 3)
+        self.assertEqual(self.calc.compilar_gradiente("pi * x")(1), (3, (3,)))
+        self.assertEqual(self.calc.compilar("pi * r", parametros=['r', 'pi'])(1, 2), 2)
+        del self.calc.memoria['pi']
+        self.assertEqual(self.calc.compilar("pi")(), math.pi)
+        with self.assertRaises(NameError):
+            self.calc.compilar("x * y", parametros=['x'])
+        
+    def test_expressao_profunda(self):
+        """Testa a volta às closures quando o Python não compila o código gerado."""
+        limite = sys.getrecursionlimit()
+        sys.setrecursionlimit(5000)
+        try:
+            modelo = self.calc.compilar("abs(" * 210 + "x" + ")" * 210)
+        finally:
+            sys.setrecursionlimit(limite)
+        self.assertEqual(modelo(-3), 3)
+        
+    def test_threads(self):
+        """Testa chamadas simultâneas de várias threads."""
+        from concurrent.futures import ThreadPoolExecutor
+        modelo = CalculadoraOtimizada(numerico='decimal', precisao=30).compilar("x / 3")
+        with ThreadPoolExecutor(4) as executor:
+            resultados = list(executor.map(modelo, range(2000)))
+        self.assertEqual(resultados, [modelo(i) for i in range(2000)])
+        self.assertEqual(str(resultados[1]), '0.' + '3' * 30)
+
+class TestSubexpressoes(unittest.TestCase):
+    """Testes para a eliminação de subexpressões comuns e a memoização."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+        self.calc.memoria.update({'a': 3.0, 'b': 4.0, 'k': 0.5, 't': 2.0})
+        
+    def test_subarvores_repetidas(self):
+        """Testa quais subárvores são reaproveitadas na mesma expressão."""
+        tabela = self.calc.funcoes_disponiveis
+        arvore = analisar_expressao("sqrt(a**2 + b**2) + 1 / sqrt(a**2 + b**2) + dobro(a*a*a*a)")
+        contagem, chaves = calculadora._subarvores_puras(arvore, tabela,
+                                                         calculadora._FUNCOES_PURAS)
+        contados = {}
+        pendentes = [arvore]
+        while pendentes:
+            no = pendentes.pop()
+            if id(no) in chaves:
+                contados.setdefault(calculadora.formatar_arvore(no), contagem[chaves[id(no)]])
+            if no[0] == calculadora.BINARIO:
+                pendentes.extend(no[2:])
+            elif no[0] == calculadora.UNARIO:
+                pendentes.append(no[2])
+            elif no[0] == calculadora.CHAMADA:
+                pendentes.extend(no[2])
+        repetidas = sorted(texto for texto, vezes in contados.items() if vezes > 1)
+        self.assertEqual(repetidas, ["a ** 2 + b ** 2", "sqrt(a ** 2 + b ** 2)"])
+        # Funções do usuário podem ter efeitos e não são reaproveitadas
+        self.assertNotIn("dobro(a * a * a * a)", contados)
+
+    def test_literais_de_tipos_diferentes(self):
+        """Testa que 2 e 2.0 (ou 10**20 e 1e20) não compartilham subexpressão nem memoização."""
+        self.calc.memoria['x'] = 2 ** 60 + 1
+        expressao = "abs(x*2) % 10 + abs(x*2.0) % 10 + abs(x*2) % 10 + abs(x*2.0) % 10"
+        esperado = 2 * ((2 ** 61 + 2) % 10) + 2 * (abs((2 ** 60 + 1) * 2.0) % 10)
+        self.assertEqual(self.calc.calcular(expressao), esperado)
+        self.assertEqual(self.calc.compilar(expressao, ['x'])(2 ** 60 + 1), esperado)
+        self.calc.memoria['x'] = 3
+        self.calc.ativar_memoizacao()
+        self.assertEqual(self.calc.calcular("abs(x*1e20)"), 3e20)
+        self.assertEqual(self.calc.calcular("abs(x*10**20) + 1"), 3 * 10 ** 20 + 1)
+        self.assertEqual(math.copysign(1, self.calc.calcular("sin(x * -0.0)")), -1)
+        self.assertEqual(math.copysign(1, self.calc.calcular("sin(x * 0.0)")), 1)
+        
+    def test_mesmo_resultado(self):
+        """Testa valores e erros com subexpressões repetidas nos dois compiladores."""
+        casos = {
+            "sqrt(a**2 + b**2) + 1 / sqrt(a**2 + b**2) - exp(k*t) * sqrt(a**2 + b**2)":
+                5 + 1 / 5 - math.e * 5,
+            "(a*b + 1) * (a*b + 1) * (a*b + 1)": 13.0 ** 3,
+            "sqrt(b*b - a*a*3) + sqrt(b*b - a*a*3)": "Erro: Valor inválido - math domain error",
+            "1 / (a*a - 3*3) + 1 / (a*a - 3*3)": "Erro: Divisão por zero",
+        }
+        for expressao, esperado in casos.items():
+            with self.subTest(expressao=expressao):
+                resultado = self.calc.calcular(expressao)
+                modelo = self.calc.compilar(expressao)
+                self.assertEqual(modelo(*[self.calc.memoria[v] for v in modelo.variaveis]),
+                                 resultado)
+                if isinstance(esperado, str):
+                    self.assertEqual(resultado, esperado)
+                else:
+                    self.assertAlmostEqual(resultado, esperado)
+        
+    def test_funcao_do_usuario_chamada_a_cada_ocorrencia(self):
+        """Testa que chamadas repetidas a funções do usuário não são unificadas."""
+        chamadas = []
+        self.calc.funcoes_disponiveis['conta'] = lambda x: chamadas.append(x) or x
+        self.assertEqual(self.calc.calcular("conta(a*b*a*b) + conta(a*b*a*b)"), 288.0)
+        self.assertEqual(len(chamadas), 2)
+        
+    def test_memoizacao(self):
+        """Testa acertos entre cálculos e novos valores da memória."""
+        memoizacao = self.calc.ativar_memoizacao(capacidade=8)
+        expressao = "exp(k*t) * 2 + sqrt(a**2 + b**2)"
+        self.assertAlmostEqual(self.calc.calcular(expressao), 2 * math.e + 5)
+        self.assertAlmostEqual(self.calc.calcular("exp(k*t) + 1"), math.e + 1)
+        self.assertGreaterEqual(memoizacao.acertos, 1)
+        self.calc.memoria['a'] = 6.0
+        self.calc.memoria['b'] = 8.0
+        self.assertAlmostEqual(self.calc.calcular(expressao), 2 * math.e + 10)
+        for i in range(20):
+            self.calc.calcular(f"exp({i} * t)")
+        self.assertLessEqual(len(memoizacao), 8)
+        self.calc.desativar_memoizacao()
+        self.assertIsNone(self.calc.memoizacao)
+        self.assertAlmostEqual(self.calc.calcular(expressao), 2 * math.e + 10)
+        
+    def test_memoizacao_estruturas_limitadas(self):
+        """Testa que o mapa de estruturas não cresce além da capacidade."""
+        memoizacao = self.calc.ativar_memoizacao(capacidade=16)
+        for i in range(5000):
+            self.calc.calcular(f"exp({i} * t) + k")
+        self.assertLessEqual(len(memoizacao._identificadores), 16)
+        self.assertLessEqual(len(memoizacao), 16)
+        subarvore = ('bin', '*', ('nome', 'k'), ('nome', 't'))
+        self.assertEqual(memoizacao.identificador(subarvore), memoizacao.identificador(subarvore))
+
+    def test_memoizacao_valores_iguais_de_tipos_diferentes(self):
+        """Testa 2 e 2.0, 0.0 e -0.0 como entradas distintas."""
+        self.calc.ativar_memoizacao()
+        self.calc.memoria['x'] = 2
+        self.assertIs(type(self.calc.calcular("abs(x)")), int)
+        self.calc.memoria['x'] = 2.0
+        self.assertIs(type(self.calc.calcular("abs(x)")), float)
+        self.calc.memoria['x'] = 0.0
+        self.calc.calcular("sin(x)")
+        self.calc.memoria['x'] = -0.0
+        self.assertEqual(math.copysign(1, self.calc.calcular("sin(x)")), -1)
+        
+    def test_memoizacao_invalidada(self):
+        """Testa trocas da tabela de funções e do backend numérico."""
+        self.calc.ativar_memoizacao()
+        self.assertEqual(self.calc.calcular("sqrt(a*a + b*b)"), 5.0)
+        self.calc.funcoes_disponiveis['sqrt'] = lambda x: -1
+        self.assertEqual(self.calc.calcular("sqrt(a*a + b*b)"), -1)
+        del self.calc.funcoes_disponiveis['sqrt']
+        self.calc.funcoes_disponiveis['sqrt'] = math.sqrt
+        self.calc.memoria['x'] = 1
+        self.assertEqual(self.calc.calcular("exp(x / 3)"), math.exp(1 / 3))
+        self.calc.usar_numerico('fracao')
+        self.assertEqual(str(self.calc.calcular("abs(x / 3)")), "1/3")
+        self.calc.usar_numerico('decimal', 20)
+        self.assertEqual(str(self.calc.calcular("exp(x / 3)")), "1.3956124250860895286")
+        
+
+class TestOrcamentoAvaliacao(unittest.TestCase):
+    """Testes para os limites de tamanho, profundidade, potência e tempo."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+
+    def assertLimite(self, resultado):
+        self.assertTrue(str(resultado).startswith("Erro: Limite excedido - "), resultado)
+
+    def test_potencias(self):
+        """Testa que potências enormes são recusadas antes do cálculo."""
+        self.assertLimite(self.calc.calcular("9 ** 9 ** 9"))
+        self.calc.memoria['n'] = 10 ** 8
+        self.assertLimite(self.calc.calcular("10 ** n"))
+        self.assertEqual(self.calc.calcular("2 ** 1000"), 2 ** 1000)
+        self.assertEqual(self.calc.calcular("(-1) ** n + 1 ** n"), 2)
+        self.assertNotIn("Limite", self.calc.calcular("2.0 ** n"))
+        self.assertLimite(self.calc.compilar("x ** n", parametros=['x'])(3))
+        fracao = CalculadoraOtimizada(numerico='fracao')
+        self.assertLimite(fracao.calcular("(3/2) ** 10 ** 7"))
+        self.assertEqual(str(fracao.calcular("(3/2) ** 3")), "27/8")
+
+    def test_produtos_e_somas_exatas(self):
+        """Testa que produtos de potências permitidas não escapam do limite de bits."""
+        self.assertLimite(self.calc.calcular("(3**300000) * (3**300000) * (3**300000)"))
+        self.assertEqual(self.calc.calcular("2**500000 // 2**499990 % 1000"), 24)
+        self.assertEqual(self.calc.calcular("3 * 2.5"), 7.5)
+        fracao = CalculadoraOtimizada(numerico='fracao')
+        self.assertLimite(fracao.calcular(
+            " + ".join(f"1/{p}**90000" for p in (3, 5, 7, 11, 13, 17, 19, 23, 29, 31))))
+        self.assertEqual(str(fracao.calcular("1/3 + 1/5 - 1/7")), "41/105")
+
+    def test_tamanho_e_profundidade(self):
+        """Testa textos longos, aninhamentos e cadeias que esgotariam a pilha."""
+        self.assertLimite(self.calc.calcular("1" + " + 1" * 30000))
+        self.assertEqual(len(self.calc.cache_expressoes), 0)
+        self.assertLimite(self.calc.calcular("(" * 300 + "1" + ")" * 300))
+        self.assertLimite(self.calc.calcular("1" + " + 1" * 5000))
+        self.calc.definir_orcamento(OrcamentoAvaliacao(maximo_profundidade=3))
+        self.assertEqual(self.calc.calcular("((1))"), 1)
+        self.assertEqual(self.calc.calcular("(((1)))"),
+                         "Erro: Limite excedido - mais de 3 níveis de aninhamento")
+        with self.assertRaises(OrcamentoExcedido):
+            self.calc.compilar("-(-(-x))")
+        self.calc.definir_orcamento(OrcamentoAvaliacao(maximo_caracteres=5))
+        self.assertLimite(self.calc.calcular("1 + 2 + 3"))
+        self.assertEqual(self.calc.calcular("1+2+3"), 6)
+
+    @unittest.skipUnless(hasattr(signal, 'setitimer'), "sem signal.setitimer")
+    def test_tempo_limite(self):
+        """Testa que funções lentas são interrompidas e o alarme é desarmado."""
+        def lenta(x):
+            while True:
+                pass
+        self.calc.funcoes_disponiveis['lenta'] = lenta
+        self.calc.definir_orcamento(OrcamentoAvaliacao(tempo_limite=0.05))
+        self.assertEqual(self.calc.calcular("lenta(1) + 1"),
+                         "Erro: Limite excedido - tempo limite de 0.05 s")
+        self.assertEqual(self.calc.calcular("sin(0) + 1"), 1.0)
+        # Expressões só com operadores também são interrompidas
+        lenta = " + ".join(f"7**{150000 - i} * 6**150000 % 10" for i in range(20))
+        self.assertEqual(self.calc.calcular(lenta),
+                         "Erro: Limite excedido - tempo limite de 0.05 s")
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+        self.assertIs(signal.getsignal(signal.SIGALRM), signal.SIG_DFL)
+
+    def test_sem_orcamento(self):
+        """Testa que None desativa os limites e que as sessões compartilham o orçamento."""
+        self.assertIs(self.calc.nova_sessao().orcamento, self.calc.orcamento)
+        self.calc.definir_orcamento(None)
+        self.assertEqual(self.calc.calcular("2 ** 2 ** 21").bit_length(), 2 ** 21 + 1)
+
+
+class TestFuncoesUsuario(unittest.TestCase):
+    """Testes para as funções definidas pelo usuário."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+        self.calc.definir_funcao('f', ['x'], 'x**2 + 1')
+
+    def test_definicao_e_chamada(self):
+        """Testa a sintaxe `f(x) = ...` no fluxo e a API."""
+        self.assertEqual(self.calc.interpretar_definicao("g(a, b) = a * b"),
+                         ('g', ('a', 'b'), 'a * b'))
+        self.assertIsNone(self.calc.interpretar_definicao("x = 2"))
+        saidas = list(self.calc.processar_fluxo(["g(a, b) = f(a) * b", "g(2, 3)"]))
+        self.assertEqual(saidas[0][0], "g(a, b) = f(a) * b")
+        self.assertEqual(str(saidas[0][1]), "g(a, b) = f(a) * b")
+        self.assertEqual(saidas[1], ("g(2, 3)", 15))
+        self.assertEqual(self.calc.calcular("f(1, 2)"),
+                         "Erro: f() recebe 1 argumento(s), 2 informado(s)")
+        self.assertEqual(sorted(self.calc.funcoes_usuario), ['f', 'g'])
+        self.calc.remover_funcao('g')
+        self.assertTrue(self.calc.calcular("g(2, 3)").startswith("Erro"))
+
+    def test_embutir_e_chamar(self):
+        """Testa que funções pequenas são embutidas e as grandes chamadas direto."""
+        self.assertEqual(self.calc.compilar_expressao("f(2)").arvore, ('num', 5))
+        self.assertNotIn('chamada', repr(self.calc.compilar_expressao("f(y)").arvore))
+        corpo = ' + '.join(f'x*{i}' for i in range(40))
+        self.calc.definir_funcao('grande', ['x'], corpo)
+        self.calc.memoria['y'] = 2
+        compilada = self.calc.compilar_expressao("grande(y)")
+        self.assertEqual(compilada.arvore, ('chamada', 'grande', (('nome', 'y'),)))
+        self.assertEqual(self.calc.calcular("grande(y)"), 2 * sum(range(40)))
+        self.assertEqual(self.calc.compilar("grande(x) + f(x)", parametros=['x'])(1),
+                         sum(range(40)) + 2)
+
+    def test_recusas(self):
+        """Testa recursões, nomes livres e nomes reservados."""
+        self.calc.definir_funcao('g', ['x'], 'f(x) + 1')
+        with self.assertRaisesRegex(ValueError, "definição recursiva: f -> g -> f"):
+            self.calc.definir_funcao('f', ['x'], 'g(x)')
+        with self.assertRaisesRegex(ValueError, "'a' não é parâmetro"):
+            self.calc.definir_funcao('h', ['x'], 'x + a')
+        with self.assertRaises(ValueError):
+            self.calc.definir_funcao('sin', ['x'], 'x')
+        with self.assertRaises(ExpressaoInvalida):
+            self.calc.definir_funcao('h', ['x', 'x'], 'x')
+        self.assertEqual(self.calc.calcular("g(2)"), 6)
+
+    def test_invalidacao_seletiva(self):
+        """Testa que redefinir descarta só as expressões que usam a função."""
+        self.calc.definir_funcao('g', ['x'], 'f(x) * 2')
+        for expressao in ("g(1)", "f(1)", "1 + 1"):
+            self.calc.calcular(expressao)
+        self.calc.definir_funcao('f', ['x'], 'x + 10')
+        self.assertEqual(self.calc.cache_expressoes.chaves(), ["1 + 1"])
+        self.assertEqual(self.calc.calcular("g(1)"), 22)
+
+    def test_backends_e_derivadas(self):
+        """Testa literais do backend, tabulação e derivadas."""
+        decimal = CalculadoraOtimizada(numerico='decimal', precisao=30)
+        decimal.definir_funcao('t', ['x'], 'x / 3 + 0.1')
+        self.assertEqual(str(decimal.calcular("t(1)")), '0.433333333333333333333333333333')
+        self.assertEqual([y for _, y in self.calc.tabular("f(x)", 'x', 0, 2, 1)],
+                         [1.0, 2.0, 5.0])
+        self.assertEqual(self.calc.derivar("f(x) * 3", 'x'), "6 * x")
+
+    def test_persistencia(self):
+        """Testa que as definições sobrevivem entre sessões."""
+        with tempfile.TemporaryDirectory() as diretorio:
+            calc = CalculadoraOtimizada(diretorio_dados=diretorio)
+            calc.definir_funcao('q', ['a', 'b'], 'a * b')
+            calc.definir_funcao('r', ['a'], 'q(a, a)')
+            self.assertEqual(CalculadoraOtimizada(diretorio_dados=diretorio).calcular("r(3)"), 9)
+            calc.remover_funcao('r')
+            restaurada = CalculadoraOtimizada(diretorio_dados=diretorio)
+            self.assertEqual(list(restaurada.funcoes_usuario), ['q'])
+
+
+class TestCalculoParalelo(unittest.TestCase):
+    """Testes para a avaliação paralela de muitas expressões."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+        self.calc.memoria['k'] = 3
+        self.itens = [("x * k + 1", {'x': i}) for i in range(500)]
+        self.itens += ["1 / 0", "2 +", 42, "k ** 2"]
+        
+    def tearDown(self):
+        """Encerra o pool de processos."""
+        self.calc.encerrar_processos()
+        
+    def test_sequencial(self):
+        """Testa a avaliação no próprio processo."""
+        resultados = list(self.calc.calcular_muitos(self.itens, workers=1, chunk_size=64))
+        self.assertEqual(resultados[:500], [i * 3 + 1 for i in range(500)])
+        self.assertEqual(resultados[500:502], [
+            "Erro: Divisão por zero",
+            "Erro: Sintaxe inválida - fim inesperado da expressão na posição 3"])
+        self.assertIn("Item inválido", resultados[502])
+        self.assertEqual(resultados[503], 9)
+        self.assertEqual(len(self.calc.historico), 0)
+        self.assertNotIn('x', self.calc.memoria)
+        
+    def test_processos_preservam_ordem(self):
+        """Testa que o pool retorna os resultados na ordem de entrada."""
+        sequencial = list(self.calc.calcular_muitos(self.itens, workers=1))
+        paralelo = list(self.calc.calcular_muitos(self.itens, workers=2, chunk_size=37))
+        self.assertEqual(paralelo, sequencial)
+        
+    def test_pool_reaproveitado(self):
+        """Testa que o pool é mantido entre chamadas."""
+        list(self.calc.calcular_muitos(["1 + 1"], workers=2))
+        executor = self.calc._executor
+        list(self.calc.calcular_muitos(["2 + 2"], workers=2))
+        self.assertIs(self.calc._executor, executor)
+        self.calc.memoria['k'] = 10
+        self.assertEqual(list(self.calc.calcular_muitos(["k"], workers=2)), [10])
+
+    def test_sessoes(self):
+        """Testa sessões com memória própria e cache compartilhado."""
+        sessao = self.calc.nova_sessao()
+        sessao.atribuir('k', '7')
+        self.assertEqual(sessao.calcular("k + 1"), 8)
+        self.assertEqual(self.calc.memoria['k'], 3)
+        self.assertIs(sessao.cache_expressoes, self.calc.cache_expressoes)
+        self.assertEqual(list(self.calc.calcular_muitos(["k * 2"], workers=1, memoria=sessao.memoria)), [14])
+        self.assertEqual(self.calc.memoria, {'k': 3})
+
+class TestModoFluxo(unittest.TestCase):
+    """Testes para o modo não interativo (--stream)."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+        self.linhas = ["x = 5\n", "y = x * 2\n", "\n", "# comentário\n", "x + y\n", "1 / 0\n"]
+        
+    def executar(self, formato):
+        """Executa o fluxo e retorna a saída produzida."""
+        saida = StringIO()
+        self.calc.executar_fluxo(iter(self.linhas), saida, formato)
+        return saida.getvalue()
+        
+    def test_formato_plain(self):
+        """Testa um resultado por linha, com atribuições."""
+        self.assertEqual(self.executar('plain'), "5\n10\n15\nErro: Divisão por zero\n")
+        self.assertEqual(self.calc.memoria, {'x': 5, 'y': 10})
+        self.assertEqual(len(self.calc.historico), 0)
+        
+    def test_formato_csv(self):
+        """Testa a saída em CSV."""
+        linhas = self.executar('csv').splitlines()
+        self.assertEqual(linhas[0], "expressao,resultado")
+        self.assertEqual(linhas[3], "x + y,15")
+        self.assertEqual(len(linhas), 5)
+        
+    def test_formato_jsonl(self):
+        """Testa a saída em JSON Lines, separando erros."""
+        registros = [json.loads(linha) for linha in self.executar('jsonl').splitlines()]
+        self.assertEqual(registros[2], {'expressao': 'x + y', 'resultado': 15})
+        self.assertEqual(registros[3]['erro'], "Erro: Divisão por zero")
+        self.linhas = ["f(a) = a*a\n", "f(a, b) = c\n", "f(3)\n"]
+        registros = [json.loads(linha) for linha in self.executar('jsonl').splitlines()]
+        self.assertEqual(registros[0], {'expressao': 'f(a) = a*a', 'funcao': 'f(a) = a*a'})
+        self.assertIn('erro', registros[1])
+        self.assertEqual(registros[2], {'expressao': 'f(3)', 'resultado': 9})
+        self.assertEqual(self.executar('plain').splitlines()[0], "f(a) = a*a")
+        self.assertEqual(self.executar('csv').splitlines()[1], "f(a) = a*a,f(a) = a*a")
+
+    def test_formato_jsonl_nao_finitos(self):
+        """Testa que NaN e infinitos saem como null em JSON válido."""
+        for expressao in ("1e308 * 10", "-1e308 * 10"):
+            self.linhas = [expressao + "\n"]
+            saida = self.executar('jsonl')
+            self.assertNotIn("Infinity", saida)
+            self.assertEqual(json.loads(saida), {'expressao': expressao, 'resultado': None})
+        from decimal import Decimal
+        linhas = calculadora._formatar_jsonl([('a', Decimal('Infinity')), ('b', Decimal('NaN'))])
+        self.assertEqual([json.loads(linha)['resultado'] for linha in linhas], [None, None])
+
+    def test_formato_jsonl_backends(self):
+        """Testa que valores que não são números JSON saem como texto em cada backend."""
+        casos = [('float', "(-8)**0.5", str((-8) ** 0.5)), ('float', "2 * 3", 6),
+                 ('decimal', "1 / 4", "0.25"), ('fracao', "1 / 3", "1/3")]
+        try:
+            import mpmath  # noqa: F401
+            casos.append(('mpmath', "1 / 4", "0.25"))
+        except ImportError:
+            pass
+        for numerico, expressao, esperado in casos:
+            with self.subTest(numerico=numerico):
+                self.calc = CalculadoraOtimizada(numerico=numerico)
+                self.linhas = [expressao + "\n"]
+                registro = json.loads(self.executar('jsonl'))
+                self.assertEqual(registro, {'expressao': expressao, 'resultado': esperado})
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_main_com_arquivo(self, mock_stdout):
+        """Testa `calculadora --stream arquivo` sem banner."""
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as arquivo:
+            arquivo.writelines(self.linhas)
+        try:
+            calculadora.main(['--stream', arquivo.name, '--formato', 'plain'])
+        finally:
+            os.unlink(arquivo.name)
+        self.assertEqual(mock_stdout.getvalue(), "5\n10\n15\nErro: Divisão por zero\n")
+
+    @patch('sys.stderr', new_callable=StringIO)
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_main_comando(self, mock_stdout, mock_stderr):
+        """Testa `calculadora -c EXPR` e o código de saída em caso de erro."""
+        calculadora.main(['-c', '2 + 3 * 4'])
+        calculadora.main(['--comando', 'x = 2 ** 3'])
+        self.assertEqual(mock_stdout.getvalue(), "14\n8\n")
+        with self.assertRaises(SystemExit) as saida:
+            calculadora.main(['-c', '1 / 0'])
+        self.assertEqual(saida.exception.code, 1)
+        self.assertEqual(mock_stderr.getvalue(), "Erro: Divisão por zero\n")
+
+    @patch('builtins.input', side_effect=['stats on', 'quit'])
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_main_interativo_com_metricas(self, mock_stdout, mock_input):
+        """Testa `stats on` seguido de `quit` no modo interativo sem argumentos."""
+        try:
+            calculadora.main([])
+        except SystemExit as saida:
+            self.assertFalse(saida.code)
+        self.assertNotIn("Erro fatal", mock_stdout.getvalue())
+
+    @patch('os.system')
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_limpar_tela_fora_do_terminal(self, mock_stdout, mock_system):
+        """Testa que a tela não é limpa (nem um shell iniciado) sem terminal."""
+        self.calc.limpar_tela()
+        self.assertEqual(mock_stdout.getvalue(), "")
+        mock_system.assert_not_called()
+
+class TestConversaoUnidades(unittest.TestCase):
+    """Testes para as tabelas de conversão pré-calculadas."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+        
+    def test_categorias(self):
+        """Testa conversões de várias categorias, inclusive peso."""
+        converter = self.calc.converter_unidades
+        self.assertEqual(converter(1, 'kg', 'g'), 1000.0)
+        self.assertEqual(converter(1, 'h', 'min'), 60.0)
+        self.assertEqual(converter(1, 'GiB', 'MiB'), 1024.0)
+        self.assertEqual(converter(8, 'b', 'B'), 1.0)
+        self.assertEqual(converter(90, 'km/h', 'm/s'), 25.0)
+        self.assertEqual(converter(1, 'ha', 'm2'), 10000.0)
+        self.assertAlmostEqual(converter(1, 'mi', 'km'), 1.60934)
+        
+    def test_temperatura_afim(self):
+        """Testa conversões com deslocamento (temperatura)."""
+        converter = self.calc.converter_unidades
+        self.assertEqual(converter(100, 'celsius', 'fahrenheit'), 212.0)
+        self.assertEqual(converter(212, 'fahrenheit', 'celsius'), 100.0)
+        self.assertEqual(converter(0, 'celsius', 'kelvin'), 273.15)
+        self.assertAlmostEqual(converter(0, 'K', '°F'), -459.67)
+        self.assertAlmostEqual(converter(491.67, 'rankine', 'celsius'), 0.0)
+        
+    def test_erros(self):
+        """Testa categorias diferentes e valores inválidos."""
+        self.assertEqual(self.calc.converter_unidades(1, 'm', 'kg'), "Unidades não suportadas")
+        self.assertEqual(self.calc.converter_unidades('x', 'm', 'km'), "Erro na conversão")
+        self.assertEqual(self.calc.converter_lote([1], 'm', 's'), "Unidades não suportadas")
+        
+    def test_unidades_unicas(self):
+        """Testa que nenhuma unidade aparece em duas categorias."""
+        unidades = [u for lista in self.calc.unidades_suportadas().values() for u in lista]
+        self.assertEqual(len(unidades), len(set(unidades)))
+        self.assertIn('temperatura', self.calc.unidades_suportadas())
+        
+    def test_lote(self):
+        """Testa a conversão em lote de iteráveis."""
+        resultado = self.calc.converter_lote(range(3), 'celsius', 'fahrenheit')
+        self.assertEqual(resultado, [32.0, 33.8, 35.6])
+        self.assertEqual(self.calc.converter_lote((v for v in [1, 2]), 'km', 'm'), [1000.0, 2000.0])
+        
+    @unittest.skipUnless(calculadora._numpy() is not None, "NumPy não instalado")
+    def test_lote_numpy(self):
+        """Testa que arrays do NumPy são convertidos de forma vetorizada."""
+        np = calculadora._numpy()
+        resultado = self.calc.converter_lote(np.array([0.0, 100.0]), 'celsius', 'kelvin')
+        self.assertIsInstance(resultado, np.ndarray)
+        self.assertEqual(resultado.tolist(), [273.15, 373.15])
+
+class TestPlanilhaReativa(unittest.TestCase):
+    """Testes para o modo reativo (definições com dependências)."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada(reativo=True)
+        
+    def test_recalcula_dependentes(self):
+        """Testa que mudar uma entrada atualiza os valores derivados."""
+        self.calc.atribuir('x', '5')
+        self.calc.atribuir('y', 'x * 2')
+        self.calc.atribuir('z', 'y + x')
+        self.assertEqual(self.calc.atribuir('x', '10'), 10)
+        self.assertEqual(self.calc.memoria, {'x': 10, 'y': 20, 'z': 30})
+        self.assertEqual(self.calc.planilha.recalculadas, ['y', 'z'])
+        
+    def test_recalcula_apenas_afetados(self):
+        """Testa que variáveis independentes não são recalculadas."""
+        self.calc.atribuir('a', '1')
+        self.calc.atribuir('b', '2')
+        self.calc.atribuir('c', 'a + 1')
+        self.calc.atribuir('d', 'b + 1')
+        self.calc.atribuir('e2', 'c + d')
+        self.calc.atribuir('a', '3')
+        self.assertEqual(self.calc.planilha.recalculadas, ['c', 'e2'])
+        self.assertEqual(self.calc.memoria['e2'], 7)
+        
+    def test_ordem_topologica(self):
+        """Testa um losango de dependências e uma cadeia longa."""
+        self.calc.atribuir('d', 'b + c')
+        self.calc.atribuir('b', 'a * 2')
+        self.calc.atribuir('c', 'a + b')
+        self.calc.atribuir('a', '1')
+        self.assertEqual(self.calc.planilha.recalculadas, ['b', 'c', 'd'])
+        self.assertEqual(self.calc.memoria['d'], 5)
+        
+        planilha = self.calc.planilha
+        planilha.alterar('v0', 0)
+        for i in range(1, 2000):
+            planilha.definir(f'v{i}', f'v{i - 1} + 1')
+        planilha.alterar('v0', 10)
+        self.assertEqual(self.calc.memoria['v1999'], 2009)
+        self.assertEqual(len(planilha.recalculadas), 1999)
+        
+    def test_dependencia_circular(self):
+        """Testa que ciclos são recusados sem alterar a definição anterior."""
+        self.calc.atribuir('x', '1')
+        self.calc.atribuir('y', 'x + 1')
+        resultado = self.calc.atribuir('x', 'y * 2')
+        self.assertEqual(resultado, "Erro: Dependência circular - x -> y -> x")
+        self.assertIn("Dependência circular", self.calc.atribuir('x', 'x + 1'))
+        self.assertEqual(self.calc.planilha.expressao('x'), '1')
+        self.assertEqual(self.calc.memoria, {'x': 1, 'y': 2})
+        
+    def test_erros_propagam_e_se_recuperam(self):
+        """Testa dependentes com erro e a recuperação quando a entrada muda."""
+        self.calc.atribuir('x', '0')
+        self.assertEqual(self.calc.atribuir('y', '1 / x'), "Erro: Divisão por zero")
+        self.calc.atribuir('z', 'y + 1')
+        self.assertNotIn('y', self.calc.memoria)
+        self.assertIn('z', self.calc.planilha.erros)
+        self.calc.atribuir('x', '4')
+        self.assertEqual(self.calc.memoria['z'], 1.25)
+        self.assertEqual(self.calc.planilha.erros, {})
+        
+    def test_nome_reservado_e_remocao(self):
+        """Testa nomes da tabela de funções e a remoção de definições."""
+        self.assertIn("Nome reservado", self.calc.atribuir('pi', '3'))
+        self.calc.atribuir('x', '2')
+        self.calc.atribuir('y', 'x * pi')
+        self.calc.planilha.remover('x')
+        self.assertNotIn('x', self.calc.memoria)
+        self.assertIn('y', self.calc.planilha.erros)
+        
+    def test_tabela_alterada(self):
+        """Testa que mudanças na tabela de funções recompilam as definições."""
+        self.calc.funcoes_disponiveis['k'] = 2
+        self.calc.atribuir('x', '3')
+        self.calc.atribuir('y', 'k * x')
+        self.calc.funcoes_disponiveis['k'] = 5
+        self.calc.atribuir('x', '4')
+        self.assertEqual(self.calc.memoria['y'], 20)
+        
+    def test_funcao_redefinida(self):
+        """Testa que redefinir uma função recalcula só quem a chama."""
+        self.calc.definir_funcao('f', ['a'], 'a * 2')
+        self.calc.definir_funcao('g', ['a'], 'f(a) + 1')
+        self.calc.atribuir('x', '3')
+        self.calc.atribuir('y', 'f(x)')
+        self.calc.atribuir('z', 'g(x)')
+        self.calc.atribuir('w', 'y + 1')
+        self.calc.atribuir('v', 'x * 10')
+        self.calc.definir_funcao('f', ['a'], 'a * 3')
+        self.assertEqual(self.calc.memoria, {'x': 3, 'y': 9, 'z': 10, 'w': 10, 'v': 30})
+        self.assertEqual(sorted(self.calc.planilha.recalculadas), ['w', 'y', 'z'])
+        self.calc.remover_funcao('g')
+        self.assertNotIn('z', self.calc.memoria)
+        self.assertIn('z', self.calc.planilha.erros)
+        self.assertEqual(self.calc.planilha.recalculadas, ['z'])
+        
+    def test_modo_padrao_nao_reativo(self):
+        """Testa que sem `reativo` os valores continuam congelados."""
+        calc = CalculadoraOtimizada()
+        calc.atribuir('x', '5')
+        calc.atribuir('y', 'x * 2')
+        calc.atribuir('x', '10')
+        self.assertEqual(calc.memoria['y'], 10)
+        self.assertIsNone(calc.planilha)
+
+class TestInstrumentacao(unittest.TestCase):
+    """Testes para as métricas opcionais de `calcular` e `avaliar`."""
+    
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada(instrumentar=True)
+        
+    def test_desativada_por_padrao(self):
+        """Testa que sem instrumentação os métodos originais são usados."""
+        calc = CalculadoraOtimizada()
+        self.assertIsNone(calc.instrumentacao)
+        self.assertNotIn('calcular', vars(calc))
+        self.calc.desativar_instrumentacao()
+        self.assertNotIn('calcular', vars(self.calc))
+        self.assertEqual(self.calc.calcular("1 + 1"), 2)
+        
+    def test_fases_cache_e_erros(self):
+        """Testa contagens por fase, taxa de acerto e erros por tipo."""
+        for expressao in ["1 + 1", "1 + 1", "1 / 0", "sqrt(-1)", "("]:
+            self.calc.calcular(expressao)
+        self.calc.avaliar("y * 2", {'y': 3})
+        dados = self.calc.instrumentacao.instantaneo()
+        self.assertEqual(dados['chamadas'], 6)
+        self.assertEqual(dados['fases']['compilar']['contagem'], 6)
+        self.assertEqual(dados['fases']['historico']['contagem'], 2)
+        self.assertEqual(dados['cache']['acertos'], 1)
+        self.assertEqual(dados['erros'], {'ZeroDivisionError': 1, 'ValueError': 1,
+                                          'SyntaxError': 1})
+        self.assertEqual(len(dados['mais_lentas']), 5)
+        json.dumps(dados)
+        
+    def test_mais_lentas_sem_repeticao(self):
+        """Testa que cada expressão aparece uma vez, com sua maior duração."""
+        instrumentacao = CalculadoraOtimizada().ativar_instrumentacao(limite_lentas=2)
+        for expressao, duracao in [("a", 5), ("a", 9), ("b", 3), ("c", 4), ("a", 1), ("b", 2)]:
+            instrumentacao.registrar_lenta(expressao, duracao * 1000)
+        lentas = instrumentacao.instantaneo()['mais_lentas']
+        self.assertEqual([(l['expressao'], l['duracao_us']) for l in lentas], [("a", 9), ("c", 4)])
+        
+    def test_prometheus(self):
+        """Testa o texto no formato de exposição do Prometheus."""
+        self.calc.calcular('1 / 0')
+        self.calc.calcular('"a"')
+        texto = self.calc.instrumentacao.prometheus()
+        self.assertIn("# TYPE calculadora_chamadas_total counter\ncalculadora_chamadas_total 2\n",
+                      texto)
+        self.assertIn('calculadora_erros_total{tipo="ZeroDivisionError"} 1', texto)
+        self.assertIn('calculadora_fase_segundos_total{fase="total"} ', texto)
+        self.assertIn('{expressao="\\"a\\""}', texto)
+        
+    def test_metricas_na_linha_de_comando(self):
+        """Testa `--metricas` gravando o arquivo ao fim do modo --stream."""
+        with tempfile.TemporaryDirectory() as diretorio:
+            destino = os.path.join(diretorio, 'metricas.prom')
+            with patch('sys.stdin', StringIO("1 + 1\n2 * 3\n")), \
+                    patch('sys.stdout', new_callable=StringIO):
+                calculadora.main(['--stream', '--metricas', destino])
+            with open(destino, encoding='utf-8') as arquivo:
+                self.assertIn("calculadora_chamadas_total 2", arquivo.read())
+
 class TestCalculadoraInterface(unittest.TestCase):
     """Testes para interface da calculadora."""
     
@@ -268,6 +1322,24 @@ class TestCalculadoraInterface(unittest.TestCase):
             
         output = mock_stdout.getvalue()
         self.assertIn("Histórico vazio", output)
+        
+    @patch('builtins.input', side_effect=['x = 5', 'x * 2', 'quit'])
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_atribuicao_interativa(self, mock_stdout, mock_input):
+        """Testa atribuição de variável no modo interativo."""
+        self.calc.executar()
+        output = mock_stdout.getvalue()
+        self.assertIn("✅ x = 5", output)
+        self.assertIn("Resultado: 10", output)
+        
+    @patch('builtins.input', side_effect=['stats', 'stats on', '2 + 2', 'stats', 'quit'])
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_comando_stats(self, mock_stdout, mock_input):
+        """Testa o comando de métricas no modo interativo."""
+        self.calc.executar()
+        output = mock_stdout.getvalue()
+        self.assertIn("Instrumentação desativada", output)
+        self.assertIn("Chamadas: 1", output)
 
 def run_tests():
     """Executa todos os testes."""
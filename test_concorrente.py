@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da calculadora compartilhada entre threads
+Autor: Calculadora Team
+Versão: 2.0.0
+"""
+
+import unittest
+import sys
+import os
+import threading
+
+# Adiciona o diretório atual ao path para importar o módulo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+from concorrente import CalculadoraConcorrente, MemoriaCompartilhada
+
+THREADS = 8
+CALCULOS = 2000
+SEM_GIL = not getattr(sys, '_is_gil_enabled', lambda: True)()
+
+
+def _em_threads(alvo, quantidade=THREADS):
+    """Executa `alvo(indice)` em várias threads e propaga a primeira falha."""
+    falhas = []
+    barreira = threading.Barrier(quantidade)
+
+    def executar(indice):
+        barreira.wait()
+        try:
+            alvo(indice)
+        except BaseException as erro:
+            falhas.append(erro)
+
+    threads = [threading.Thread(target=executar, args=(i,)) for i in range(quantidade)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if falhas:
+        raise falhas[0]
+
+
+class TestMemoriaCompartilhada(unittest.TestCase):
+    """Testes para a memória com cópia na escrita."""
+
+    def test_instantaneo_imutavel(self):
+        """Testa que escritas publicam uma nova versão sem alterar a anterior."""
+        memoria = MemoriaCompartilhada({'a': 1})
+        antes = memoria.instantaneo()
+        memoria['b'] = 2
+        memoria.update(a=10, c=3)
+        del memoria['b']
+        self.assertEqual(antes, {'a': 1})
+        self.assertEqual(memoria, {'a': 10, 'c': 3})
+        self.assertEqual(memoria.pop('c'), 3)
+        memoria.clear()
+        self.assertEqual(len(memoria), 0)
+        self.assertEqual(antes, {'a': 1})
+
+    def test_leituras_consistentes(self):
+        """Testa que cada instantâneo tem as variáveis de uma mesma escrita."""
+        memoria = MemoriaCompartilhada({'a': 0, 'b': 0})
+        parar = threading.Event()
+
+        def trabalhar(indice):
+            if indice == 0:
+                for i in range(20000):
+                    memoria.update(a=i, b=-i)
+                parar.set()
+            else:
+                while not parar.is_set():
+                    instantaneo = memoria.instantaneo()
+                    self.assertEqual(instantaneo['a'], -instantaneo['b'])
+
+        _em_threads(trabalhar, 4)
+
+
+class TestCalculadoraConcorrente(unittest.TestCase):
+    """Testes de estresse com uma calculadora compartilhada."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraConcorrente(capacidade_historico=THREADS * CALCULOS * 2)
+        self.calc.memoria['k'] = 1
+
+    def test_estresse(self):
+        """Testa resultados, histórico e memória com várias threads ao mesmo tempo."""
+        calc = self.calc
+
+        def trabalhar(indice):
+            for i in range(CALCULOS):
+                self.assertEqual(calc.calcular(f"{indice} * 100000 + {i} * k"), indice * 100000 + i)
+                self.assertEqual(calc.avaliar("x * k", {'x': i}), i)
+                if i % 100 == 0:
+                    calc.atribuir(f"v{indice}", str(i), registrar=False)
+                if i % 500 == 0:
+                    # Mescla enquanto as outras threads continuam escrevendo
+                    len(calc.historico)
+
+        _em_threads(trabalhar)
+        historico = calc.historico
+        self.assertEqual(len(historico), THREADS * CALCULOS)
+        # A ordem de cada thread é preservada na mesclagem
+        por_thread = {}
+        for registro in historico:
+            por_thread.setdefault(registro.resultado // 100000, []).append(registro.resultado)
+        self.assertEqual(sorted(por_thread), list(range(THREADS)))
+        for indice, resultados in por_thread.items():
+            self.assertEqual(resultados, [indice * 100000 + i for i in range(CALCULOS)])
+        esperado = {'k': 1}
+        esperado.update({f"v{indice}": CALCULOS - 100 for indice in range(THREADS)})
+        self.assertEqual(dict(calc.memoria), esperado)
+
+    def test_historico_limitado(self):
+        """Testa que o histórico mesclado mantém só os mais recentes."""
+        calc = CalculadoraConcorrente(capacidade_historico=10)
+        _em_threads(lambda indice: [calc.calcular(f"{indice} + {i}") for i in range(50)], 4)
+        self.assertEqual(len(calc.historico), 10)
+        calc.historico.clear()
+        self.assertEqual(len(calc.historico), 0)
+        self.assertEqual(calc._buffers, [])
+
+    def test_cache_pequeno(self):
+        """Testa descartes simultâneos no cache LRU."""
+        calc = CalculadoraConcorrente(tamanho_cache=4)
+
+        def trabalhar(indice):
+            for i in range(1000):
+                self.assertEqual(calc.calcular(f"{i % 16} + {indice}"), i % 16 + indice)
+
+        _em_threads(trabalhar)
+        self.assertLessEqual(len(calc.cache_expressoes), 4)
+
+    def test_lote_com_memoria(self):
+        """Testa lotes com outra memória sem alterar a memória compartilhada."""
+        resultados = list(self.calc.calcular_muitos(["k * 3"], workers=1, memoria={'k': 5}))
+        self.assertEqual(resultados, [15])
+        self.assertIsInstance(self.calc.memoria, MemoriaCompartilhada)
+        self.assertEqual(self.calc.memoria['k'], 1)
+
+    def test_memoizacao(self):
+        """Testa a memoização compartilhada com valores diferentes por thread."""
+        memoizacao = self.calc.ativar_memoizacao(capacidade=64)
+
+        def trabalhar(indice):
+            for i in range(500):
+                x = (indice * 7 + i) % 100
+                self.assertEqual(self.calc.avaliar("abs(x * x - k * 50)", {'x': x}),
+                                 abs(x * x - 50))
+
+        _em_threads(trabalhar)
+        self.assertLessEqual(len(memoizacao), 64)
+        self.assertGreater(memoizacao.acertos, 0)
+
+    def test_buffers_de_threads_encerradas(self):
+        """Testa que os buffers de threads encerradas não se acumulam."""
+        calc = CalculadoraConcorrente(capacidade_historico=1000)
+        for i in range(200):
+            thread = threading.Thread(target=calc.calcular, args=(f"{i} + 1",))
+            thread.start()
+            thread.join()
+        self.assertLessEqual(len(calc._buffers), 1)
+        self.assertEqual([r.resultado for r in calc.historico], list(range(1, 201)))
+
+    def test_instrumentacao_indisponivel(self):
+        """Testa que a instrumentação é recusada na criação e na ativação."""
+        with self.assertRaises(ValueError):
+            CalculadoraConcorrente(instrumentar=True)
+        with self.assertRaises(ValueError):
+            self.calc.ativar_instrumentacao()
+        self.assertIsNone(self.calc.instrumentacao)
+
+    @unittest.skipUnless(SEM_GIL and (os.cpu_count() or 1) >= 4,
+                         "requer CPython sem GIL e 4 CPUs")
+    def test_vazao_escala_sem_gil(self):
+        """Testa que a vazão cresce com as threads em um CPython sem GIL."""
+        vazao = benchmark.medir_threads([1, 4], chamadas=20000)
+        self.assertGreater(vazao[4], 2 * vazao[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
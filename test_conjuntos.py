@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da avaliação de expressões sobre arquivos CSV e Parquet
+Autor: Calculadora Team
+Versão: 2.0.0
+"""
+
+import unittest
+import sys
+import os
+import csv
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+# Adiciona o diretório atual ao path para importar o módulo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import calculadora
+from calculadora import CalculadoraOtimizada
+
+NUMPY = calculadora._numpy() is not None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+LINHAS = [
+    ['1', '10', '0.5', 'a'],
+    ['2', '20', '0.25', 'b, com vírgula'],
+    ['3', '', '0.1', 'vazio'],
+    ['4', 'abc', '0.1', 'texto'],
+    ['5', '-4', '0', 'negativo'],
+]
+
+
+class TestAvaliarConjunto(unittest.TestCase):
+    """Testes para calc.avaliar_conjunto() com CSV."""
+
+    def setUp(self):
+        """Cria o arquivo de entrada em um diretório temporário."""
+        self.diretorio = tempfile.mkdtemp()
+        self.entrada = self.caminho('dados.csv')
+        with open(self.entrada, 'w', newline='', encoding='utf-8') as arquivo:
+            escritor = csv.writer(arquivo)
+            escritor.writerow(['id', 'preco', 'taxa', 'nome'])
+            escritor.writerows(LINHAS)
+        self.calc = CalculadoraOtimizada()
+
+    def tearDown(self):
+        """Remove o diretório temporário."""
+        shutil.rmtree(self.diretorio)
+
+    def caminho(self, nome):
+        return os.path.join(self.diretorio, nome)
+
+    def ler(self, nome):
+        with open(self.caminho(nome), newline='', encoding='utf-8') as arquivo:
+            return list(csv.reader(arquivo))
+
+    def verificar(self, bloco):
+        self.calc.memoria['k'] = 2
+        saida = self.caminho('saida.csv')
+        linhas = self.calc.avaliar_conjunto("k * preco * (1 + taxa) + sqrt(preco)",
+                                            self.entrada, saida, bloco=bloco)
+        self.assertEqual(linhas, 5)
+        tabela = self.ler('saida.csv')
+        self.assertEqual(tabela[0], ['id', 'preco', 'taxa', 'nome', 'resultado'])
+        self.assertEqual([linha[:4] for linha in tabela[1:]], LINHAS)
+        resultados = [linha[4] for linha in tabela[1:]]
+        self.assertAlmostEqual(float(resultados[0]), 30 + 10 ** 0.5)
+        self.assertAlmostEqual(float(resultados[1]), 50 + 20 ** 0.5)
+        # Células vazias, texto e pontos fora do domínio ficam vazios
+        self.assertEqual(resultados[2:], ['', '', ''])
+
+    def test_python(self):
+        """Testa a avaliação linha a linha, em vários blocos."""
+        with patch('calculadora._numpy', return_value=None):
+            self.verificar(bloco=2)
+
+    @unittest.skipUnless(NUMPY, "NumPy não instalado")
+    def test_numpy(self):
+        """Testa a avaliação vetorizada, em vários blocos."""
+        self.verificar(bloco=2)
+
+    def verificar_constantes(self):
+        with open(self.caminho('constantes.csv'), 'w', encoding='utf-8') as arquivo:
+            arquivo.write("x,e\n4,1\n-4,1\n9,\n")
+        saida = self.caminho('saida.csv')
+        self.calc.avaliar_conjunto("x**0.5 + e", self.caminho('constantes.csv'), saida)
+        # A coluna `e` vale mais que a constante; raízes de negativos ficam vazias
+        self.assertEqual([linha[-1] for linha in self.ler('saida.csv')[1:]], ['3.0', '', ''])
+
+    def test_colunas_com_nomes_de_constantes_python(self):
+        """Testa colunas que sombreiam constantes, linha a linha."""
+        with patch('calculadora._numpy', return_value=None):
+            self.verificar_constantes()
+
+    @unittest.skipUnless(NUMPY, "NumPy não instalado")
+    def test_colunas_com_nomes_de_constantes_numpy(self):
+        """Testa colunas que sombreiam constantes, em blocos vetorizados."""
+        self.verificar_constantes()
+
+    def test_backend_exato(self):
+        """Testa que os backends exatos gravam o valor completo."""
+        calc = CalculadoraOtimizada(numerico='fracao')
+        saida = self.caminho('saida.csv')
+        calc.avaliar_conjunto("preco / 3", self.entrada, saida, coluna='terco')
+        tabela = self.ler('saida.csv')
+        self.assertEqual(tabela[0][-1], 'terco')
+        self.assertEqual([linha[-1] for linha in tabela[1:]], ['10/3', '20/3', '', '', '-4/3'])
+
+    def test_erros_nao_deixam_saida(self):
+        """Testa que os erros são mensagens e nenhum arquivo é gravado."""
+        saida = self.caminho('saida.csv')
+        self.assertEqual(self.calc.avaliar_conjunto("preco * q", self.entrada, saida),
+                         "Erro: name 'q' is not defined")
+        self.assertEqual(self.calc.avaliar_conjunto("preco", self.entrada, saida, coluna='taxa'),
+                         "Erro: Valor inválido - a coluna 'taxa' já existe na entrada")
+        with open(self.entrada, 'a', encoding='utf-8') as arquivo:
+            arquivo.write("6,1\n")
+        self.assertEqual(self.calc.avaliar_conjunto("preco", self.entrada, saida, bloco=2),
+                         "Erro: Valor inválido - registro 7: 2 campos, esperados 4")
+        self.assertEqual(os.listdir(self.diretorio), ['dados.csv'])
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_subcomando(self, saida):
+        """Testa `calculadora eval-dataset` com a saída padrão."""
+        calculadora.main(['eval-dataset', '--expr', 'id * 2', '--in', self.entrada,
+                          '--out', '-', '--coluna', 'dobro'])
+        linhas = saida.getvalue().splitlines()
+        self.assertEqual(linhas[0], 'id,preco,taxa,nome,dobro')
+        self.assertEqual([linha.rsplit(',', 1)[1] for linha in linhas[1:]],
+                         ['2.0', '4.0', '6.0', '8.0', '10.0'])
+
+    @unittest.skipUnless(pyarrow, "pyarrow não instalado")
+    def test_parquet(self):
+        """Testa a conversão CSV -> Parquet -> CSV."""
+        parquet = self.caminho('saida.parquet')
+        self.assertEqual(self.calc.avaliar_conjunto("preco * 2", self.entrada, parquet), 5)
+        tabela = pyarrow.parquet.read_table(parquet)
+        self.assertEqual(tabela.column('resultado').to_pylist(),
+                         [20.0, 40.0, None, None, -8.0])
+        saida = self.caminho('saida.csv')
+        self.calc.avaliar_conjunto("resultado + 1", parquet, saida, coluna='final')
+        self.assertEqual([linha[-1] for linha in self.ler('saida.csv')[1:]],
+                         ['21.0', '41.0', '', '', '-7.0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
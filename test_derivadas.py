@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da derivação simbólica e do gradiente da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+"""
+
+import unittest
+import sys
+import os
+import math
+from decimal import Decimal
+from fractions import Fraction
+
+# Adiciona o diretório atual ao path para importar o módulo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from calculadora import CalculadoraOtimizada
+from derivadas import derivar_texto
+
+EXPRESSOES = [
+    "x**3 - 2*x + 1",
+    "sin(x)*cos(x)",
+    "x**x",
+    "exp(2*x)/(1 + x**2)",
+    "sqrt(x) + ln(x, 2) + log(x)",
+    "tan(x) + asin(x/2) + acos(x/3) + atan(x)",
+    "abs(x - 3) * pi",
+    "e**(x*y) - y/x",
+]
+
+
+class TestDerivadaSimbolica(unittest.TestCase):
+    """Testes para calc.derivar()."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+
+    def test_textos_simplificados(self):
+        """Testa a forma simplificada de derivadas comuns."""
+        casos = {
+            "x**2": "2 * x",
+            "sin(x)*cos(x)": "cos(x) ** 2 - sin(x) ** 2",
+            "x**x": "x ** x * (ln(x) + 1)",
+            "pi*x**2": "2 * pi * x",
+            "e**(2*x)": "2 * e ** (2 * x)",
+            "0.5*x**2": "x",
+            "x**(1/3)": "1/3 * x ** (-2/3)",
+            "3*x*y": "3 * y",
+            "y + 1": "0",
+        }
+        for expressao, esperado in casos.items():
+            with self.subTest(expressao=expressao):
+                self.assertEqual(self.calc.derivar(expressao, 'x'), esperado)
+
+    def test_derivada_confere_com_diferencas_finitas(self):
+        """Testa o valor da derivada contra diferenças centrais."""
+        h = 1e-6
+        for expressao in EXPRESSOES:
+            with self.subTest(expressao=expressao):
+                derivada = self.calc.derivar(expressao, 'x')
+                self.assertFalse(derivada.startswith("Erro"), derivada)
+                ponto = {'x': 0.7, 'y': 1.3}
+                aproximada = (self.calc.avaliar(expressao, dict(ponto, x=0.7 + h))
+                              - self.calc.avaliar(expressao, dict(ponto, x=0.7 - h))) / (2 * h)
+                self.assertAlmostEqual(self.calc.avaliar(derivada, ponto), aproximada, places=5)
+
+    def test_funcao_sem_regra(self):
+        """Testa funções do usuário sem regra de derivação."""
+        self.calc.funcoes_disponiveis['dobro'] = lambda v: 2 * v
+        self.assertEqual(self.calc.derivar("dobro(x)", 'x'),
+                         "Erro: Valor inválido - derivada de 'dobro' não disponível")
+        with self.assertRaises(ValueError):
+            derivar_texto("dobro(x)", 'x', self.calc.funcoes_disponiveis)
+        # Sem depender de x, a chamada é uma constante
+        self.assertEqual(self.calc.derivar("dobro(y) * x", 'x'), "dobro(y)")
+
+    def test_sintaxe_invalida(self):
+        """Testa que erros de sintaxe viram mensagens."""
+        self.assertTrue(self.calc.derivar("2 +", 'x').startswith("Erro"))
+
+
+class TestGradiente(unittest.TestCase):
+    """Testes para calc.gradiente() e calc.compilar_gradiente()."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+
+    def test_gradiente_igual_as_derivadas(self):
+        """Testa o gradiente contra as derivadas simbólicas."""
+        ponto = {'x': 0.7, 'y': 1.3}
+        for expressao in EXPRESSOES:
+            with self.subTest(expressao=expressao):
+                valor, gradiente = self.calc.gradiente(expressao, ponto)
+                self.assertAlmostEqual(valor, self.calc.avaliar(expressao, ponto))
+                for var, derivada in gradiente.items():
+                    texto = self.calc.derivar(expressao, var)
+                    self.assertAlmostEqual(derivada, self.calc.avaliar(texto, ponto))
+
+    def test_variaveis_da_memoria(self):
+        """Testa que as variáveis livres vêm da memória e dos argumentos."""
+        self.calc.memoria['c'] = 1
+        valor, gradiente = self.calc.gradiente("a*sin(b) + c", {'a': 2, 'b': 0.5})
+        self.assertAlmostEqual(valor, 2 * math.sin(0.5) + 1)
+        self.assertEqual(set(gradiente), {'a', 'b', 'c'})
+        self.assertAlmostEqual(gradiente['a'], math.sin(0.5))
+        self.assertAlmostEqual(gradiente['b'], 2 * math.cos(0.5))
+        self.assertEqual(gradiente['c'], 1)
+
+    def test_funcao_compilada(self):
+        """Testa a função reutilizável com parâmetros escolhidos."""
+        self.calc.memoria['k'] = 3
+        funcao = self.calc.compilar_gradiente("k * x**2 + y", parametros=['x', 'y'])
+        self.assertEqual(funcao.variaveis, ('x', 'y'))
+        self.assertEqual(funcao(2, 1), (13, (12, 1)))
+        self.assertEqual(funcao(y=1, x=2), (13, (12, 1)))
+        constante = self.calc.compilar_gradiente("k + 1", parametros=['x'])
+        self.assertEqual(constante(5), (4, (0,)))
+
+    def test_erros(self):
+        """Testa erros de avaliação, nomes e funções sem regra."""
+        self.assertEqual(self.calc.gradiente("1/x", {'x': 0}), "Erro: Divisão por zero")
+        self.assertTrue(self.calc.gradiente("y*2").startswith("Erro"))
+        self.calc.funcoes_disponiveis['dobro'] = lambda v: 2 * v
+        self.assertEqual(self.calc.gradiente("dobro(x)", {'x': 1}),
+                         "Erro: Valor inválido - derivada de 'dobro' não disponível")
+        self.assertEqual(self.calc.gradiente("dobro(3) * x", {'x': 1}), (6, {'x': 6}))
+
+    def test_backends_exatos(self):
+        """Testa o gradiente com os backends decimal e fracionário."""
+        calc = CalculadoraOtimizada(numerico='decimal', precisao=30)
+        valor, gradiente = calc.gradiente("x**2 + sin(x)", {'x': 1})
+        self.assertIsInstance(gradiente['x'], Decimal)
+        self.assertAlmostEqual(float(gradiente['x']), 2 + math.cos(1))
+        calc = CalculadoraOtimizada(numerico='fracao')
+        valor, gradiente = calc.gradiente("x**3/3 + x/y", {'x': 0.5, 'y': 3})
+        self.assertEqual(valor, Fraction(5, 24))
+        self.assertEqual(gradiente, {'x': Fraction(7, 12), 'y': Fraction(-1, 18)})
+
+
+if __name__ == '__main__':
+    unittest.main()
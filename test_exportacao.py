@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da exportação e importação do histórico e da memória
+Autor: Calculadora Team
+Versão: 2.0.0
+"""
+
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+from decimal import Decimal
+from fractions import Fraction
+from io import StringIO
+from unittest.mock import patch
+
+# Adiciona o diretório atual ao path para importar o módulo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import exportacao
+from calculadora import CalculadoraOtimizada
+
+FORMATOS = ('jsonl', 'csv', 'bin')
+
+
+class TestExportacao(unittest.TestCase):
+    """Testes para calc.exportar() e calc.importar()."""
+
+    def setUp(self):
+        """Cria uma calculadora com histórico, memória e funções."""
+        self.diretorio = tempfile.mkdtemp()
+        self.calc = CalculadoraOtimizada(numerico='fracao')
+        for instante, expressao, resultado in ((100.0, "1/3", Fraction(1, 3)),
+                                               (200.0, "2**100", 2 ** 100),
+                                               (300.0, "sqrt(4) + 1", 3),
+                                               (400.0, "1/0", "Erro: Divisão por zero")):
+            self.calc.historico.adicionar(expressao, resultado, instante)
+        self.calc.memoria['k'] = Fraction(1, 7)
+        self.calc.definir_funcao('f', ['x'], 'x * 2')
+
+    def tearDown(self):
+        """Remove o diretório temporário."""
+        shutil.rmtree(self.diretorio)
+
+    def caminho(self, nome):
+        return os.path.join(self.diretorio, nome)
+
+    def historico(self, calc):
+        return [(r.expressao, r.resultado, r.instante) for r in calc.historico]
+
+    def test_ida_e_volta(self):
+        """Testa que os três formatos preservam tipos, instantes e funções."""
+        for extensao in FORMATOS:
+            with self.subTest(formato=extensao):
+                arquivo = self.caminho(f'sessao.{extensao}')
+                self.assertEqual(self.calc.exportar(arquivo), 6)
+                restaurada = CalculadoraOtimizada(numerico='fracao')
+                self.assertEqual(restaurada.importar(arquivo), 6)
+                self.assertEqual(self.historico(restaurada), self.historico(self.calc))
+                self.assertIs(type(restaurada.historico[1].resultado), int)
+                self.assertEqual(restaurada.memoria, {'k': Fraction(1, 7)})
+                self.assertEqual(restaurada.calcular("f(k)"), Fraction(2, 7))
+
+    def test_decimal_e_float(self):
+        """Testa Decimal com todos os dígitos e floats não finitos."""
+        for numerico, memoria in (('decimal', {'d': Decimal('0.1000000000000000000001')}),
+                                  ('float', {'n': float('inf'), 'o': float('-inf'), 'm': -0.1})):
+            calc = CalculadoraOtimizada(numerico=numerico, precisao=None)
+            calc.memoria.update(memoria)
+            for extensao in FORMATOS:
+                with self.subTest(numerico=numerico, formato=extensao):
+                    arquivo = self.caminho(f'memoria.{extensao}')
+                    calc.exportar(arquivo, conteudo='memoria')
+                    restaurada = CalculadoraOtimizada(numerico=numerico)
+                    restaurada.importar(arquivo)
+                    self.assertEqual(restaurada.memoria, memoria)
+                    self.assertEqual([type(v) for v in restaurada.memoria.values()],
+                                     [type(v) for v in memoria.values()])
+
+    def test_complexos(self):
+        """Testa que resultados complexos voltam como complex nos três formatos."""
+        calc = CalculadoraOtimizada()
+        resultado = calc.calcular("(-8)**0.5")
+        self.assertIs(type(resultado), complex)
+        calc.memoria['z'] = complex(1, -2)
+        for extensao in FORMATOS:
+            with self.subTest(formato=extensao):
+                arquivo = self.caminho(f'complexos.{extensao}')
+                self.assertEqual(calc.exportar(arquivo), 2)
+                restaurada = CalculadoraOtimizada()
+                restaurada.importar(arquivo)
+                self.assertEqual(restaurada.historico[0].resultado, resultado)
+                self.assertEqual(restaurada.memoria, {'z': complex(1, -2)})
+                self.assertIs(type(restaurada.memoria['z']), complex)
+
+    def test_jsonl_estrito(self):
+        """Testa que NaN e infinitos não geram constantes fora do padrão JSON."""
+        self.calc = CalculadoraOtimizada()
+        self.calc.memoria.update(n=float('nan'), i=float('inf'))
+        self.calc.historico.adicionar("1e308 * 10", float('inf'), 500.0)
+        arquivo = self.caminho('sessao.jsonl')
+        self.calc.exportar(arquivo)
+
+        def recusar(constante):
+            raise ValueError(f"constante fora do padrão: {constante}")
+        with open(arquivo, encoding='utf-8') as entrada:
+            registros = [json.loads(linha, parse_constant=recusar) for linha in entrada]
+        self.assertEqual(registros[0]['resultado'], 'inf')
+        self.assertEqual(registros[0]['tipo'], 'float')
+        restaurada = CalculadoraOtimizada()
+        restaurada.importar(arquivo)
+        self.assertEqual(restaurada.historico[0].resultado, float('inf'))
+        self.assertNotEqual(restaurada.memoria['n'], restaurada.memoria['n'])
+        self.assertEqual(restaurada.memoria['i'], float('inf'))
+
+    def test_entre_backends(self):
+        """Testa que os valores importados são convertidos para o backend atual."""
+        arquivo = self.caminho('sessao.jsonl')
+        self.calc.exportar(arquivo)
+        flutuante = CalculadoraOtimizada()
+        flutuante.importar(arquivo)
+        self.assertIs(type(flutuante.memoria['k']), float)
+        self.assertAlmostEqual(flutuante.calcular("k * 1.5"), 1.5 / 7)
+        self.assertEqual(flutuante.historico[0].resultado, 1 / 3)
+        self.assertEqual(flutuante.historico[3].resultado, "Erro: Divisão por zero")
+        decimal = CalculadoraOtimizada(numerico='decimal')
+        decimal.importar(arquivo)
+        self.assertIs(type(decimal.memoria['k']), Decimal)
+        self.assertEqual(decimal.calcular("k * 7"), 1)
+        reativa = CalculadoraOtimizada(reativo=True)
+        reativa.atribuir('k', '1')
+        reativa.atribuir('y', 'k * 7')
+        self.assertEqual(reativa.memoria['y'], 7)
+        reativa.importar(arquivo, conteudo='memoria')
+        self.assertAlmostEqual(reativa.memoria['y'], 1.0)
+
+    def test_filtros(self):
+        """Testa o intervalo de instantes e o padrão de expressão nos dois sentidos."""
+        arquivo = self.caminho('filtrado.jsonl')
+        self.assertEqual(self.calc.exportar(arquivo, conteudo='historico', inicio=150,
+                                            fim=400), 2)
+        with open(arquivo, encoding='utf-8') as entrada:
+            linhas = [json.loads(linha) for linha in entrada]
+        self.assertEqual([linha['expressao'] for linha in linhas], ["2**100", "sqrt(4) + 1"])
+        self.assertEqual(self.calc.exportar(arquivo, conteudo='historico', padrao='*/*'), 2)
+        completo = self.caminho('completo.csv')
+        self.calc.exportar(completo)
+        restaurada = CalculadoraOtimizada(numerico='fracao')
+        self.assertEqual(restaurada.importar(completo, conteudo='historico',
+                                             padrao='sqrt*'), 1)
+        self.assertEqual(restaurada.historico[0].expressao, "sqrt(4) + 1")
+        self.assertEqual(restaurada.memoria, {})
+
+    def test_armazenamento_persistente(self):
+        """Testa a cópia do log, a busca por instante e a importação em blocos."""
+        origem = CalculadoraOtimizada(diretorio_dados=self.caminho('origem'))
+        registros = [(f"x * {i}", i * 0.5, 1000.0 + i) for i in range(10000)]
+        origem.armazenamento.adicionar_varios(registros)
+        self.assertEqual(origem.armazenamento[9999].expressao, "x * 9999")
+        arquivo = self.caminho('log.bin')
+        with patch('exportacao.BLOCO', 4000):
+            self.assertEqual(origem.exportar(arquivo, inicio=1500, fim=9500), 8000)
+            destino = CalculadoraOtimizada(diretorio_dados=self.caminho('destino'))
+            self.assertEqual(destino.importar(arquivo), 8000)
+        self.assertEqual(len(destino.armazenamento), 8000)
+        self.assertEqual(destino.armazenamento[0].instante, 1500.0)
+        self.assertEqual(list(destino.armazenamento.intervalo(9000, 9002))[1].expressao,
+                         "x * 8001")
+        self.assertEqual(self.historico(destino)[-1], ("x * 8499", 8499 * 0.5, 9499.0))
+
+    def test_erros(self):
+        """Testa extensões, arquivos corrompidos e opções inválidas."""
+        self.assertEqual(self.calc.exportar(self.caminho('sessao.txt')),
+                         "Erro: Valor inválido - extensão desconhecida; use .jsonl, .csv ou .bin")
+        self.assertEqual(self.calc.exportar(self.caminho('x.csv'), conteudo='tudo?'),
+                         "Erro: Valor inválido - conteúdo desconhecido: tudo?")
+        arquivo = self.caminho('sessao.bin')
+        self.calc.exportar(arquivo)
+        with open(arquivo, 'rb') as entrada:
+            dados = entrada.read()
+        with open(arquivo, 'wb') as saida:
+            saida.write(dados[:-3])
+        self.assertEqual(CalculadoraOtimizada().importar(arquivo),
+                         "Erro: Valor inválido - arquivo binário truncado")
+        csv = self.caminho('ruim.csv')
+        with open(csv, 'w', encoding='utf-8') as saida:
+            saida.write("registro,expressao,resultado,tipo,instante\nmemoria,k,abc,int,\n")
+        self.assertTrue(CalculadoraOtimizada().importar(csv).startswith(
+            "Erro: Valor inválido - linha 2: valor inválido"))
+        self.assertEqual(sorted(os.listdir(self.diretorio)), ['ruim.csv', 'sessao.bin'])
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_comandos(self, saida):
+        """Testa os comandos `export` e `import` do modo interativo."""
+        self.assertEqual(self.calc.interpretar_transferencia(
+            "'com espaço.csv' hist desde=2024-01-01 padrao=*sqrt*"),
+            ('com espaço.csv', {'conteudo': 'historico', 'inicio': '2024-01-01',
+                                'padrao': '*sqrt*'}))
+        with self.assertRaises(ValueError):
+            self.calc.interpretar_transferencia("a.csv tudo")
+        arquivo = self.caminho('mem.jsonl')
+        self.calc.exibir_transferencia('export', f"{arquivo} mem")
+        CalculadoraOtimizada().exibir_transferencia('import', arquivo)
+        self.assertEqual(saida.getvalue().splitlines(),
+                         [f"✅ 2 registros exportados para {arquivo}",
+                          f"✅ 2 registros importados de {arquivo}"])
+
+    def test_instante(self):
+        """Testa a conversão dos limites de tempo."""
+        from datetime import datetime
+        momento = datetime(2024, 1, 2, 3, 4, 5)
+        self.assertEqual(exportacao.instante(momento.isoformat()), momento.timestamp())
+        self.assertEqual(exportacao.instante("12.5"), 12.5)
+        self.assertIsNone(exportacao.instante(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes dos backends numéricos da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+"""
+
+import unittest
+import sys
+import os
+from decimal import Decimal
+from fractions import Fraction
+from unittest.mock import patch
+from io import StringIO
+
+# Adiciona o diretório atual ao path para importar o módulo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import calculadora
+from calculadora import CalculadoraOtimizada, BACKEND_FLOAT
+from numerico import criar_backend
+
+try:
+    import mpmath
+except ImportError:
+    mpmath = None
+
+PI_50 = Decimal('3.1415926535897932384626433832795028841971693993751')
+
+
+class TestBackendDecimal(unittest.TestCase):
+    """Testes para o backend decimal com precisão configurável."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada(numerico='decimal', precisao=50)
+
+    def assertProximo(self, valor, esperado, digitos=45):
+        self.assertIsInstance(valor, Decimal)
+        self.assertLess(abs(valor - Decimal(esperado)), Decimal(10) ** -digitos)
+
+    def test_literais_e_precisao(self):
+        """Testa literais exatos a partir do texto e a precisão do contexto."""
+        self.assertEqual(self.calc.calcular("0.1 + 0.2"), Decimal('0.3'))
+        self.assertEqual(str(self.calc.calcular("1 / 3")), '0.' + '3' * 50)
+        self.assertEqual(self.calc.calcular("pi"), PI_50)
+        curta = CalculadoraOtimizada(numerico='decimal', precisao=5)
+        self.assertEqual(curta.calcular("1 / 3"), Decimal('0.33333'))
+
+    def test_funcoes(self):
+        """Testa as funções derivadas das receitas do módulo decimal."""
+        self.assertProximo(self.calc.calcular("sin(pi / 6)"), '0.5')
+        self.assertProximo(self.calc.calcular("cos(pi / 3)"), '0.5')
+        self.assertProximo(self.calc.calcular("tan(pi / 4)"), '1')
+        self.assertProximo(self.calc.calcular("4 * atan(1)"), PI_50)
+        self.assertProximo(self.calc.calcular("2 * asin(1)"), PI_50)
+        self.assertProximo(self.calc.calcular("acos(-1)"), PI_50)
+        self.assertProximo(self.calc.calcular("sin(1000000) ** 2 + cos(1000000) ** 2"), '1')
+        self.assertProximo(self.calc.calcular("exp(ln(2))"), '2')
+        self.assertEqual(self.calc.calcular("sqrt(16) + log(1000) + floor(2.5)"), Decimal(9))
+
+    def test_erros(self):
+        """Testa erros de domínio, divisão por zero e estouro."""
+        self.assertEqual(self.calc.calcular("1 / 0"), "Erro: Divisão por zero")
+        self.assertEqual(self.calc.calcular("sqrt(-1)"), "Erro: Valor inválido - math domain error")
+        self.assertEqual(self.calc.calcular("ln(0)"), "Erro: Valor inválido - math domain error")
+        self.assertEqual(self.calc.calcular("2 ** 10 ** 9"),
+                         "Erro: Operação decimal inválida - Overflow")
+
+    def test_memoria_e_variaveis(self):
+        """Testa a conversão da memória e das variáveis na fronteira."""
+        calc = CalculadoraOtimizada()
+        calc.memoria['taxa'] = 0.1
+        calc.usar_numerico('decimal')
+        self.assertEqual(calc.memoria['taxa'], Decimal('0.1'))
+        self.assertEqual(calc.avaliar("taxa * x", {'x': 3.3}), Decimal('0.33'))
+        self.assertEqual(calc.atribuir('total', "taxa * 3"), Decimal('0.3'))
+        self.assertEqual(calc.memoria['total'], Decimal('0.3'))
+        calc.memoria.update({'a': 1, 'b': 3})
+        self.assertIsInstance(calc.calcular("a / b"), Decimal)
+
+    def test_lote(self):
+        """Testa o lote no backend, com None nos pontos inválidos."""
+        resultado = self.calc.calcular_lote("1 / x", x=[4, 0, 0.5])
+        self.assertEqual(resultado, [Decimal('0.25'), None, Decimal(2)])
+
+
+class TestBackendFracao(unittest.TestCase):
+    """Testes para o backend de racionais exatos."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada(numerico='fracao')
+
+    def test_aritmetica_exata(self):
+        """Testa resultados racionais exatos."""
+        self.assertEqual(self.calc.calcular("0.1 + 0.2"), Fraction(3, 10))
+        self.assertEqual(self.calc.calcular("1/3 + 1/6"), Fraction(1, 2))
+        self.assertEqual(self.calc.calcular("2 ** -3"), Fraction(1, 8))
+        self.assertEqual(self.calc.calcular("(8/27) ** (2/3)"), Fraction(4, 9))
+        self.assertEqual(self.calc.calcular("sqrt(9/4) + log(0.001)"), Fraction(-3, 2))
+        self.calc.memoria.update({'a': 1, 'b': 3})
+        self.assertEqual(self.calc.calcular("a / b"), Fraction(1, 3))
+
+    def test_inexatos_falham(self):
+        """Testa que resultados irracionais são erros, não aproximações."""
+        self.assertEqual(self.calc.calcular("sqrt(2)"),
+                         "Erro: Valor inválido - o resultado não é racional")
+        self.assertEqual(self.calc.calcular("2 ** 0.5"),
+                         "Erro: Valor inválido - o resultado não é racional")
+        self.assertEqual(self.calc.calcular("pi"), "Erro: Valor inválido - pi não é racional")
+        self.assertIn("não é racional", self.calc.calcular("exp(1)"))
+        self.assertEqual(self.calc.calcular("sin(0) + cos(0)"), 1)
+
+    def test_potencias_grandes(self):
+        """Testa o limite de tamanho das potências exatas."""
+        self.assertTrue(self.calc.calcular("3 ** 10 ** 9").startswith("Erro: Limite excedido"))
+        self.calc.definir_orcamento(None)
+        self.assertEqual(self.calc.calcular("3 ** 10 ** 9"), "Erro: resultado exato grande demais")
+        self.assertEqual(self.calc.calcular("1 ** 10 ** 9"), 1)
+        self.assertEqual(self.calc.calcular("(-1) ** (10 ** 9 + 1)"), -1)
+
+
+class TestSelecaoBackend(unittest.TestCase):
+    """Testes para a troca de backend na calculadora."""
+
+    def test_cache_por_backend(self):
+        """Testa que cada backend compila a expressão uma vez."""
+        calc = CalculadoraOtimizada()
+        self.assertEqual(calc.calcular("1 / 4"), 0.25)
+        calc.usar_numerico('fracao')
+        self.assertEqual(calc.calcular("1 / 4"), Fraction(1, 4))
+        calc.usar_numerico('decimal', 10)
+        self.assertEqual(calc.calcular("1 / 4"), Decimal('0.25'))
+        calc.usar_numerico('float')
+        self.assertIs(calc.backend, BACKEND_FLOAT)
+        falhas = calc.cache_expressoes.falhas
+        self.assertEqual(calc.calcular("1 / 4"), 0.25)
+        self.assertEqual(calc.cache_expressoes.falhas, falhas)
+        self.assertEqual(len(calc.cache_expressoes), 3)
+
+    def test_resto_e_divisao_inteira(self):
+        """Testa que `%` e `//` arredondam para baixo em todos os backends."""
+        casos = {"-7 % 3": 2, "7 % -3": -2, "-7 // 2": -4, "7 // -2": -4,
+                 "7.5 % 2": 1.5, "-7.5 // 2": -4, "6 % 3": 0, "-6 // 3": -2, "x % y": 2}
+        for nome in ('float', 'decimal', 'fracao'):
+            calc = CalculadoraOtimizada(numerico=nome)
+            calc.memoria.update(x=-7, y=3)
+            for expressao, esperado in casos.items():
+                self.assertEqual(calc.calcular(expressao), esperado, (nome, expressao))
+            for expressao in ("10 % 0", "10 // 0", "0.5 % 0", "0.5 // 0"):
+                self.assertEqual(calc.calcular(expressao), "Erro: Divisão por zero",
+                                 (nome, expressao))
+
+    def test_funcoes_do_usuario(self):
+        """Testa que funções e constantes do usuário seguem no backend."""
+        calc = CalculadoraOtimizada(numerico='decimal')
+        calc.funcoes_disponiveis['dobro'] = lambda x: x * 2
+        calc.funcoes_disponiveis['g'] = 9.81
+        self.assertEqual(calc.calcular("dobro(g)"), Decimal('19.62'))
+
+    def test_planilha_reativa(self):
+        """Testa a recompilação das definições ao trocar de backend."""
+        calc = CalculadoraOtimizada(reativo=True)
+        calc.atribuir('x', "1")
+        calc.atribuir('y', "x / 3")
+        calc.usar_numerico('fracao')
+        calc.planilha.alterar('x', 2)
+        self.assertEqual(calc.memoria['y'], Fraction(2, 3))
+
+    def test_processos(self):
+        """Testa que o pool de processos usa o mesmo backend."""
+        calc = CalculadoraOtimizada(numerico='fracao')
+        try:
+            resultados = list(calc.calcular_muitos(["1/3", ("x / 2", {'x': 0.5})], workers=2))
+        finally:
+            calc.encerrar_processos()
+        self.assertEqual(resultados, [Fraction(1, 3), Fraction(1, 4)])
+
+    def test_backend_invalido(self):
+        """Testa nomes e precisões inválidos."""
+        with self.assertRaises(ValueError):
+            criar_backend('complexo')
+        with self.assertRaises(ValueError):
+            criar_backend('fracao', 10)
+        with self.assertRaises(ValueError):
+            criar_backend('decimal', 0)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_comando_modo_e_cli(self, mock_stdout):
+        """Testa o comando `modo` e a opção --numerico."""
+        calc = CalculadoraOtimizada()
+        calc.alterar_modo(['decimal', '40'])
+        calc.alterar_modo(['binario'])
+        self.assertEqual(calc.backend.precisao, 40)
+        calculadora.main(['--numerico', 'fracao', '-c', '1/3 + 1/3'])
+        saida = mock_stdout.getvalue()
+        self.assertIn("Modo numérico: decimal (precisão 40)", saida)
+        self.assertIn("desconhecido", saida)
+        self.assertTrue(saida.endswith("2/3\n"))
+
+    @unittest.skipUnless(mpmath is not None, "mpmath não instalado")
+    def test_mpmath(self):
+        """Testa o backend mpmath com a precisão pedida."""
+        calc = CalculadoraOtimizada(numerico='mpmath', precisao=50)
+        self.assertEqual(mpmath.nstr(calc.calcular("pi"), 50), str(PI_50))
+        self.assertEqual(calc.calcular("sqrt(-1)"), "Erro: Valor inválido - math domain error")
+        self.assertEqual(calc.calcular("1 / 0"), "Erro: Divisão por zero")
+        # Sem pool: o pickle reduziria os valores a 53 bits
+        terco = list(calc.calcular_muitos(["1/3"], workers=2))[0]
+        self.assertEqual(mpmath.nstr(terco, 50), '0.' + '3' * 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
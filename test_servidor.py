@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do serviço HTTP da Calculadora Otimizada
+Autor: Calculadora Team
+Versão: 2.0.0
+"""
+
+import unittest
+import sys
+import os
+import json
+import asyncio
+import threading
+import time
+import http.client
+from decimal import Decimal
+
+# Adiciona o diretório atual ao path para importar o módulo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from servidor import ServidorCalculadora
+
+class TestServidor(unittest.TestCase):
+    """Testes contra o serviço em localhost."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Inicia o serviço em uma porta livre, em outra thread."""
+        cls.laco = asyncio.new_event_loop()
+        cls.thread = threading.Thread(target=cls.laco.run_forever, daemon=True)
+        cls.thread.start()
+        cls.servidor = ServidorCalculadora(workers=1, max_sessoes=4)
+        cls.host, cls.porta = asyncio.run_coroutine_threadsafe(
+            cls.servidor.iniciar('127.0.0.1', 0), cls.laco).result()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Encerra o serviço e o laço de eventos."""
+        asyncio.run_coroutine_threadsafe(cls.servidor.encerrar(), cls.laco).result()
+        cls.laco.call_soon_threadsafe(cls.laco.stop)
+        cls.thread.join()
+        cls.laco.close()
+
+    def requisitar(self, metodo, caminho, dados=None, sessao=None, conexao=None):
+        """Faz uma requisição e retorna (status, corpo JSON, cabeçalhos)."""
+        conexao = conexao or http.client.HTTPConnection(self.host, self.porta, timeout=10)
+        cabecalhos = {'Content-Type': 'application/json'}
+        if sessao:
+            cabecalhos['X-Sessao'] = sessao
+        corpo = json.dumps(dados) if dados is not None else None
+        conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+        resposta = conexao.getresponse()
+        conteudo = resposta.read()
+        return resposta.status, json.loads(conteudo) if conteudo else None, resposta.headers
+
+    def test_calcular_e_sessoes_isoladas(self):
+        """Testa atribuições por sessão sem vazar para outras sessões."""
+        status, dados, cabecalhos = self.requisitar('POST', '/calcular', {'expressao': 'x = 2 * 3'})
+        self.assertEqual(status, 200)
+        self.assertEqual(dados['resultado'], 6)
+        sessao = dados['sessao']
+        self.assertEqual(cabecalhos['X-Sessao'], sessao)
+
+        self.assertEqual(self.requisitar('POST', '/calcular', {'expressao': 'x + 1'},
+                                         sessao)[1]['resultado'], 7)
+        outra = self.requisitar('POST', '/calcular', {'expressao': 'x + 1'}, 'outra-sessao')[1]
+        self.assertIn("not defined", outra['erro'])
+        self.assertEqual(self.requisitar('POST', '/calcular', {'expressao': '1 / 0'},
+                                         sessao)[1]['erro'], "Erro: Divisão por zero")
+
+    def test_lote_e_conversao(self):
+        """Testa avaliação em lote (itens e colunas) e conversão de unidades."""
+        sessao = 'lote'
+        self.requisitar('POST', '/memoria', {'variaveis': {'k': 10}}, sessao)
+        resultados = self.requisitar('POST', '/lote', {'itens': ['k * 2', ['k + y', {'y': 1}], '(']},
+                                     sessao)[1]['resultados']
+        self.assertEqual(resultados[:2], [{'resultado': 20}, {'resultado': 11}])
+        self.assertIn('erro', resultados[2])
+
+        colunas = self.requisitar('POST', '/lote', {'expressao': 'a * k', 'colunas': {'a': [1, 2]}},
+                                  sessao)[1]
+        self.assertEqual(colunas['resultado'], [10.0, 20.0])
+
+        self.assertEqual(self.requisitar('POST', '/converter', {'valor': 100, 'de': 'celsius',
+                                                                'para': 'fahrenheit'})[1]['resultado'], 212.0)
+        self.assertEqual(self.requisitar('POST', '/converter', {'valores': [1, 2], 'de': 'km',
+                                                                'para': 'm'})[1]['resultado'], [1000.0, 2000.0])
+
+    def test_historico_e_memoria(self):
+        """Testa as rotas de histórico e memória de uma sessão."""
+        sessao = 'historico'
+        for expressao in ['1 + 1', '2 + 2', '3 + 3']:
+            self.requisitar('POST', '/calcular', {'expressao': expressao}, sessao)
+        dados = self.requisitar('GET', '/historico?por_pagina=2', sessao=sessao)[1]
+        self.assertEqual(dados['total'], 3)
+        self.assertEqual([r['resultado'] for r in dados['registros']], [4, 6])
+        self.requisitar('DELETE', '/historico', sessao=sessao)
+        self.assertEqual(self.requisitar('GET', '/historico', sessao=sessao)[1]['total'], 0)
+
+        self.assertEqual(self.requisitar('POST', '/memoria', {'variaveis': {'z': 1.5}},
+                                         sessao)[1]['memoria'], {'z': 1.5})
+        self.assertEqual(self.requisitar('POST', '/memoria', {'variaveis': {'z': 'a'}},
+                                         sessao)[0], 400)
+        self.assertEqual(self.requisitar('DELETE', '/memoria', sessao=sessao)[1]['memoria'], {})
+
+    def test_inteiros_grandes(self):
+        """Testa resultados e variáveis além do limite de dígitos de int -> texto."""
+        sessao = 'inteiros'
+        dados = self.requisitar('POST', '/calcular', {'expressao': '2**100000'}, sessao)[1]
+        self.assertEqual(dados['resultado'], str(Decimal(2 ** 100000)))
+        self.requisitar('POST', '/calcular', {'expressao': 'x = 2**20000'}, sessao)
+        status, dados, _ = self.requisitar('GET', '/memoria', sessao=sessao)
+        self.assertEqual(status, 200)
+        self.assertEqual(dados['memoria']['x'], str(Decimal(2 ** 20000)))
+        self.assertEqual(self.requisitar('POST', '/calcular', {'expressao': '2**64'},
+                                         sessao)[1]['resultado'], 2 ** 64)
+
+    def test_erros_de_requisicao(self):
+        """Testa rotas e métodos desconhecidos e corpos inválidos."""
+        self.assertEqual(self.requisitar('GET', '/nada')[0], 404)
+        self.assertEqual(self.requisitar('PUT', '/calcular')[0], 405)
+        self.assertEqual(self.requisitar('POST', '/calcular', {'x': 1})[0], 400)
+        self.assertEqual(self.requisitar('POST', '/calcular', [1])[0], 400)
+        self.assertEqual(self.requisitar('POST', '/calcular', {'expressao': '1'}, 'inválida!')[0], 400)
+
+    def test_keep_alive_e_limite_de_simultaneas(self):
+        """Testa várias requisições na mesma conexão e a resposta 503."""
+        conexao = http.client.HTTPConnection(self.host, self.porta, timeout=10)
+        for _ in range(3):
+            self.assertEqual(self.requisitar('GET', '/saude', conexao=conexao)[0], 200)
+        self.servidor.max_simultaneas = 0
+        try:
+            status, dados, cabecalhos = self.requisitar('GET', '/saude', conexao=conexao)
+        finally:
+            self.servidor.max_simultaneas = 64
+        self.assertEqual(status, 503)
+        self.assertEqual(cabecalhos['Retry-After'], '1')
+        conexao.close()
+
+    def test_sessoes_limitadas(self):
+        """Testa que as sessões menos usadas são descartadas."""
+        for i in range(6):
+            self.requisitar('POST', '/calcular', {'expressao': '1'}, f's{i}')
+        self.assertLessEqual(len(self.servidor.sessoes), 4)
+        self.assertIn('s5', self.servidor.sessoes)
+
+    def test_laco_responde_durante_lote(self):
+        """Testa que o serviço atende outras requisições durante um lote."""
+        liberar = threading.Event()
+        funcoes = self.servidor.calculadora.funcoes_disponiveis
+        funcoes['espera'] = lambda x: liberar.wait(10) and x
+        resultado = {}
+
+        def lote():
+            resultado['lote'] = self.requisitar('POST', '/lote', {'itens': ['espera(7)']})
+
+        thread = threading.Thread(target=lote)
+        thread.start()
+        try:
+            # O lote fica bloqueado no executor enquanto /saude responde
+            limite = time.monotonic() + 10
+            simultaneas = 0
+            while simultaneas < 2 and time.monotonic() < limite:
+                simultaneas = self.requisitar('GET', '/saude')[1]['simultaneas']
+        finally:
+            liberar.set()
+            thread.join()
+            del funcoes['espera']
+        self.assertEqual(simultaneas, 2)
+        self.assertEqual(resultado['lote'][1]['resultados'], [{'resultado': 7}])
+
+    def test_interface_web(self):
+        """Testa que a interface web é servida na raiz."""
+        conexao = http.client.HTTPConnection(self.host, self.porta, timeout=10)
+        conexao.request('GET', '/')
+        resposta = conexao.getresponse()
+        self.assertEqual(resposta.status, 200)
+        self.assertIn(b'calculateOnServer', resposta.read())
+        conexao.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da tabulação, das grades e da amostragem adaptativa
+Autor: Calculadora Team
+Versão: 2.0.0
+"""
+
+import unittest
+import sys
+import os
+import math
+import types
+from decimal import Decimal
+from fractions import Fraction
+from io import StringIO
+from unittest.mock import patch
+
+# Adiciona o diretório atual ao path para importar o módulo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import calculadora
+import tabulacao
+from calculadora import CalculadoraOtimizada
+
+NUMPY = calculadora._numpy() is not None
+
+
+class TestTabular(unittest.TestCase):
+    """Testes para calc.tabular() com e sem NumPy."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+
+    def verificar(self):
+        pontos = self.calc.tabular("sin(x) / x", 'x', -1, 1, 0.5)
+        self.assertIsInstance(pontos, types.GeneratorType)
+        pontos = list(pontos)
+        self.assertEqual([x for x, _ in pontos], [-1.0, -0.5, 0.0, 0.5, 1.0])
+        self.assertAlmostEqual(pontos[0][1], math.sin(1))
+        self.assertTrue(math.isnan(pontos[2][1]))
+        self.assertEqual(len(self.calc.historico), 0)
+
+    def test_python(self):
+        """Testa a tabela ponto a ponto."""
+        with patch('calculadora._numpy', return_value=None):
+            self.verificar()
+
+    @unittest.skipUnless(NUMPY, "NumPy não instalado")
+    def test_numpy(self):
+        """Testa a tabela avaliada em blocos vetorizados."""
+        self.verificar()
+
+    @unittest.skipUnless(NUMPY, "NumPy não instalado")
+    def test_numpy_igual_python(self):
+        """Testa funções com dois argumentos nos dois caminhos."""
+        expressao = "ln(x, 2) + round(x / 3, 1)"
+        vetorizado = list(self.calc.tabular(expressao, 'x', 1, 8, 0.5))
+        with patch('calculadora._numpy', return_value=None):
+            ponto_a_ponto = list(self.calc.tabular(expressao, 'x', 1, 8, 0.5))
+        for (x1, y1), (x2, y2) in zip(vetorizado, ponto_a_ponto):
+            self.assertEqual(x1, x2)
+            self.assertAlmostEqual(y1, y2)
+
+    def tabelas(self, expressao):
+        """Tabela de -1 a 1 pelos dois caminhos, vetorizado e ponto a ponto."""
+        vetorizado = self.calc.tabular(expressao, 'x', -1, 1, 0.5)
+        with patch('calculadora._numpy', return_value=None):
+            ponto_a_ponto = self.calc.tabular(expressao, 'x', -1, 1, 0.5)
+        return vetorizado, ponto_a_ponto
+
+    @unittest.skipUnless(NUMPY, "NumPy não instalado")
+    def test_fora_do_dominio_real(self):
+        """Testa que resultados complexos viram NaN nos dois caminhos."""
+        for expressao in ("x**0.5", "(-8)**(1/3) + x"):
+            vetorizado, ponto_a_ponto = map(list, self.tabelas(expressao))
+            self.assertEqual(len(vetorizado), 5)
+            for (x1, y1), (x2, y2) in zip(vetorizado, ponto_a_ponto):
+                self.assertEqual(x1, x2)
+                if math.isnan(y2):
+                    self.assertTrue(math.isnan(y1), (expressao, x1))
+                else:
+                    self.assertAlmostEqual(y1, y2)
+        pontos = list(self.calc.amostrar("x**0.5", 'x', -1, 1))
+        self.assertTrue(math.isnan(pontos[0][1]))
+        self.assertEqual(pontos[-1], (1.0, 1.0))
+
+    @unittest.skipUnless(NUMPY, "NumPy não instalado")
+    def test_quantidade_de_argumentos(self):
+        """Testa que chamadas com argumentos demais falham antes do primeiro ponto."""
+        for expressao in ("log(x, 2)", "sqrt(x, 2)", "sqrt()"):
+            vetorizado, ponto_a_ponto = self.tabelas(expressao)
+            self.assertEqual(vetorizado, ponto_a_ponto)
+            self.assertTrue(vetorizado.startswith("Erro:"), vetorizado)
+        self.assertEqual(self.tabelas("log(x, 2)")[0],
+                         "Erro: log() recebe 1 argumento(s), 2 informado(s)")
+        self.calc.definir_funcao("f", ["a", "b"], "a + b")
+        self.assertEqual(self.tabelas("f(x)")[0],
+                         "Erro: f() recebe 2 argumento(s), 1 informado(s)")
+        self.assertIn("round() recebe de 1 a 2", self.calc.amostrar("round(x, 1, 2)", 'x', 0, 1))
+
+    def test_fim_incluido_e_passo_inexato(self):
+        """Testa que o fim entra na tabela mesmo com passos como 0.1."""
+        self.assertEqual(tabulacao.quantidade_pontos(0, 1, 0.1), 11)
+        self.assertEqual(tabulacao.quantidade_pontos(-10, 10, 0.001), 20001)
+        self.assertEqual(tabulacao.quantidade_pontos(1, 0, -0.25), 5)
+        self.assertEqual(tabulacao.quantidade_pontos(0, 1, -1), 0)
+
+    def test_blocos_limitados(self):
+        """Testa que intervalos grandes são gerados em blocos de tamanho fixo."""
+        for numpy in ((None,) + ((calculadora._numpy(),) if NUMPY else ())):
+            with self.subTest(numpy=numpy is not None), \
+                    patch('calculadora._numpy', return_value=numpy):
+                blocos = self.calc.tabular("x * 2", 'x', 0, 9999, 1, blocos=True)
+                tamanhos = [len(xs) for xs, _ in blocos]
+                self.assertEqual(sum(tamanhos), 10000)
+                self.assertLessEqual(max(tamanhos), tabulacao.BLOCO)
+
+    def test_memoria_e_erros(self):
+        """Testa variáveis da memória e os erros antes do primeiro ponto."""
+        self.calc.memoria['k'] = 3
+        self.assertEqual([y for _, y in self.calc.tabular("k * x", 'x', 0, 2, 1)],
+                         [0.0, 3.0, 6.0])
+        self.assertEqual(self.calc.tabular("x +", 'x', 0, 1, 1),
+                         "Erro: Sintaxe inválida - fim inesperado da expressão na posição 3")
+        self.assertTrue(self.calc.tabular("x + z", 'x', 0, 1, 1).startswith("Erro"))
+        self.assertEqual(self.calc.tabular("x", 'x', 0, 1, 0),
+                         "Erro: Valor inválido - o passo deve ser diferente de zero")
+
+    def test_backend_decimal(self):
+        """Testa limites e resultados no backend decimal."""
+        calc = CalculadoraOtimizada(numerico='decimal', precisao=30)
+        pontos = list(calc.tabular("1 / x", 'x', -1, 1, "0.5"))
+        self.assertEqual(pontos[1], (Decimal('-0.5'), Decimal('-2')))
+        self.assertIsNone(pontos[2][1])
+
+
+class TestVarrerEAmostrar(unittest.TestCase):
+    """Testes para calc.varrer() e calc.amostrar()."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+
+    def test_grade(self):
+        """Testa a ordem da grade e a igualdade entre os caminhos."""
+        eixos = {'x': (0, 1, 1), 'y': (0, 2, 1)}
+        esperado = [((0.0, 0.0), 0.0), ((0.0, 1.0), 1.0), ((0.0, 2.0), 2.0),
+                    ((1.0, 0.0), 10.0), ((1.0, 1.0), 11.0), ((1.0, 2.0), 12.0)]
+        with patch('calculadora._numpy', return_value=None):
+            self.assertEqual(list(self.calc.varrer("x * 10 + y", eixos)), esperado)
+        self.assertEqual(list(self.calc.varrer("x * 10 + y", eixos)), esperado)
+        self.assertTrue(self.calc.varrer("x", {}).startswith("Erro"))
+
+    def test_grade_fracao(self):
+        """Testa a grade com racionais exatos."""
+        calc = CalculadoraOtimizada(numerico='fracao')
+        pontos = dict(calc.varrer("x * y", {'x': (0, 1, 0.5), 'y': (1, 2, 1)}))
+        self.assertEqual(pontos[(Fraction(1, 2), 2)], 1)
+        self.assertEqual(len(pontos), 6)
+
+    def test_amostragem_adaptativa(self):
+        """Testa que os pontos se concentram onde a função muda rápido."""
+        pontos = list(self.calc.amostrar("sin(1 / x)", 'x', 0.01, 1, pontos=33))
+        xs = [x for x, _ in pontos]
+        self.assertEqual(xs, sorted(xs))
+        self.assertEqual((xs[0], xs[-1]), (0.01, 1.0))
+        perto = sum(1 for x in xs if x < 0.1)
+        self.assertGreater(perto, 10 * sum(1 for x in xs if x > 0.5))
+        # Uma reta não precisa de pontos além dos iniciais
+        self.assertEqual(len(list(self.calc.amostrar("2 * x + 1", 'x', 0, 1, pontos=9))), 9)
+
+    def test_amostragem_borda_de_dominio(self):
+        """Testa o refinamento na borda do domínio."""
+        pontos = list(self.calc.amostrar("sqrt(x)", 'x', -1, 1, pontos=9, profundidade=8))
+        validos = [x for x, y in pontos if not math.isnan(y)]
+        self.assertEqual(min(validos), 0.0)
+        self.assertGreater(max(x for x, y in pontos if math.isnan(y)), -0.005)
+
+
+class TestComandosTabela(unittest.TestCase):
+    """Testes do comando `tab` e do modo --tabular."""
+
+    def setUp(self):
+        """Configuração inicial."""
+        self.calc = CalculadoraOtimizada()
+
+    def test_interpretar(self):
+        """Testa limites dados por expressões e vírgulas dentro da expressão."""
+        self.assertEqual(self.calc.interpretar_tabulacao("ln(x, 2), x, 1, 2*2, 1"),
+                         ("ln(x, 2)", 'x', 1, 4, 1))
+        with self.assertRaises(ValueError):
+            self.calc.interpretar_tabulacao("x, x, 0")
+        with self.assertRaises(ValueError):
+            self.calc.interpretar_tabulacao("x, x, 0, q, 1")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_modo_tabular_csv(self, saida):
+        """Testa o modo --tabular em CSV."""
+        calculadora.main(['--tabular', '1 / x, x, -1, 1, 1', '--formato', 'csv'])
+        self.assertEqual(saida.getvalue(), "x,resultado\n-1.0,-1.0\n0.0,\n1.0,1.0\n")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_comando_tab(self, saida):
+        """Testa o comando `tab` do modo interativo."""
+        self.calc.exibir_tabela("x ** 2, x, 0, 2, 1")
+        self.assertIn("x = 2.0\t4.0", saida.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()